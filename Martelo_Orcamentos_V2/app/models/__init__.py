@@ -1,7 +1,7 @@
 from .user import User
 from .client import Client
 from .cliente_temporario import ClienteTemporario
-from .orcamento import Orcamento, OrcamentoItem
+from .orcamento import Orcamento, OrcamentoContador, OrcamentoItem, OrcamentoPesquisa
 from .orcamento_task import OrcamentoTask
 from .item_children import (
     DadosModuloMedidas,
@@ -95,6 +95,10 @@ class OrcamentoItem(Base):
     # continua a funcionar apontando para 'item'
     item_nome = synonym("item")
 
+    # Numero apresentado na coluna Item (1..N por versao ou o rotulo do utilizador),
+    # calculado na leitura por `numerar_items`; nao e gravado.
+    numero_visivel = None
+
     codigo = Column(String(64), nullable=True)
     descricao = Column(Text, nullable=True)
     altura = Column(Numeric(10, 2), nullable=True, default=0)
@@ -135,3 +139,35 @@ class OrcamentoItem(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     orcamento = relationship("Orcamento", back_populates="items")
+
+
+class OrcamentoPesquisa(Base):
+    """Texto de pesquisa já normalizado de cada orçamento (mantido na escrita; ver services.orcamentos)."""
+
+    __tablename__ = "orcamento_pesquisa"
+
+    id_orcamento = Column(BigInteger, ForeignKey("orcamentos.id", ondelete="CASCADE"), primary_key=True)
+    # campos pesquisaveis do orcamento (cliente, utilizador, notas, ...) numa so string
+    texto = Column(Text, nullable=True)
+    # secoes usadas na ordenacao dos resultados
+    referencia = Column(Text, nullable=True)
+    cliente = Column(Text, nullable=True)
+    obra = Column(Text, nullable=True)
+    descricao = Column(Text, nullable=True)
+    items = Column(Text, nullable=True)
+    info = Column(Text, nullable=True)
+    estado = Column(Text, nullable=True)
+    n_items = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class OrcamentoContador(Base):
+    """Ultimo numero atribuido: sequencia do ano (num_orcamento vazio) ou versao de um orcamento."""
+
+    __tablename__ = "orcamento_contadores"
+
+    ano = Column(String(4), primary_key=True)
+    # "" = contador da sequencia NNNN do ano; "YYNNNN" = contador das versoes desse orcamento
+    num_orcamento = Column(String(16), primary_key=True, default="")
+    valor = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
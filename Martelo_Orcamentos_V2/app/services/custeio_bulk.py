@@ -0,0 +1,569 @@
+"""Recalculo em bloco das colunas derivadas do Custeio.
+
+Calcula area, perimetro, SPP, custo MP, somas de producao e custos de orlas
+para todas as linhas de um item (ou de um orcamento inteiro) numa unica
+passagem vetorizada em NumPy.
+
+Os valores de entrada sao convertidos para inteiros em escala fixa (1e-4) e
+quase todas as operacoes sao feitas em aritmetica inteira exata, com o mesmo
+arredondamento (ROUND_HALF_UP / ROUND_HALF_EVEN) do calculo linha a linha.
+Os dois passos que envolvem fatores nao decimais (desperdicio das orlas e
+base M2/ML do custo MP) sao feitos em float com detecao de empates: qualquer
+linha com um valor demasiado perto de uma fronteira de arredondamento, fora
+dos limites seguros de int64 ou com entradas nao representaveis em 4 casas
+decimais e recalculada pelo caminho de referencia
+(`custeio_items._recalcular_registro_custeio`). Assim os numeros gravados sao
+identicos aos do calculo linha a linha; os `Decimal` so sao criados no fim,
+quando os valores sao escritos nos registos.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioItem
+from Martelo_Orcamentos_V2.app.services import custeio_items as svc_custeio
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - numpy opcional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+ORLA_SIDES: Tuple[str, ...] = ("c1", "c2", "l1", "l2")
+
+# Limite (em unidades de 1e-4) para entradas e resultados intermedios; garante
+# que nenhum produto em int64 transborda e que o erro do float fica muito
+# abaixo da tolerancia de empate.
+_MAX_QUANTA = 10**9
+_TIE_TOLERANCE = 1e-6
+
+
+@dataclass(frozen=True)
+class ResultadoRecalculo:
+    total: int
+    vetorizadas: int
+    linha_a_linha: int
+
+
+def numpy_disponivel() -> bool:
+    return np is not None
+
+
+def recalcular_custeio_item(session: Session, orcamento_id: int, item_id: int) -> ResultadoRecalculo:
+    """Recalcula as colunas derivadas de todas as linhas de um item."""
+    stmt = (
+        select(CusteioItem)
+        .where(
+            CusteioItem.orcamento_id == orcamento_id,
+            CusteioItem.item_id == item_id,
+        )
+        .order_by(CusteioItem.ordem, CusteioItem.id)
+    )
+    registros = session.execute(stmt).scalars().all()
+    resultado = recalcular_registros(session, registros)
+    session.flush(registros)
+    return resultado
+
+
+def recalcular_custeio_orcamento(
+    session: Session,
+    orcamento_id: int,
+    item_ids: Optional[Iterable[int]] = None,
+) -> ResultadoRecalculo:
+    """Recalcula as colunas derivadas de todos os items do orcamento (ou apenas `item_ids`)."""
+    if orcamento_id is None:
+        return ResultadoRecalculo(0, 0, 0)
+    stmt = select(CusteioItem).where(CusteioItem.orcamento_id == orcamento_id)
+    if item_ids is not None:
+        ids = sorted({int(i) for i in item_ids if i is not None})
+        if not ids:
+            return ResultadoRecalculo(0, 0, 0)
+        stmt = stmt.where(CusteioItem.item_id.in_(ids))
+    stmt = stmt.order_by(CusteioItem.item_id, CusteioItem.ordem, CusteioItem.id)
+    registros = session.execute(stmt).scalars().all()
+    resultado = recalcular_registros(session, registros)
+    session.flush(registros)
+    return resultado
+
+
+def recalcular_registros(session: Session, registros: Sequence[CusteioItem]) -> ResultadoRecalculo:
+    """Recalcula os registos indicados (ordenados por item/ordem) sem fazer flush.
+
+    As referencias de orla sao resolvidas por item, pela mesma ordem do calculo
+    linha a linha, para que a cache de referencias tenha exatamente o mesmo
+    conteudo.
+    """
+    registros = list(registros)
+    if not registros:
+        return ResultadoRecalculo(0, 0, 0)
+
+    resolver = _OrlaResolver(session)
+    ref_idx = resolver.resolver(registros)
+
+    if np is None:
+        for reg in registros:
+            svc_custeio._recalcular_registro_custeio(session, reg, resolver.cache_do_item(reg.item_id))
+        return ResultadoRecalculo(len(registros), 0, len(registros))
+
+    colunas = _Colunas(registros, resolver, ref_idx)
+    calculo = _calcular(colunas)
+
+    vetorizadas = 0
+    for pos, reg in enumerate(registros):
+        if calculo.fallback[pos]:
+            svc_custeio._recalcular_registro_custeio(session, reg, resolver.cache_do_item(reg.item_id))
+            continue
+        _escrever_registro(reg, calculo, colunas, pos)
+        vetorizadas += 1
+    linha_a_linha = len(registros) - vetorizadas
+    if linha_a_linha:
+        logger.debug("Recalculo custeio: %s linhas vetorizadas, %s linha a linha.", vetorizadas, linha_a_linha)
+    return ResultadoRecalculo(len(registros), vetorizadas, linha_a_linha)
+
+
+# ---------------------------------------------------------------------------
+# Resolucao de referencias de orla
+# ---------------------------------------------------------------------------
+
+
+def _ref_orla_para_espessura(reg: CusteioItem, esp_orla: float) -> Optional[str]:
+    if abs(esp_orla - 0.4) < 0.01:
+        ref_cand = reg.orl_0_4
+    elif abs(esp_orla - 1.0) < 0.01:
+        ref_cand = reg.orl_1_0
+    else:
+        ref_cand = reg.orl_1_0 or reg.orl_0_4
+    if ref_cand:
+        ref_cand = str(ref_cand).strip() or None
+    return ref_cand or None
+
+
+class _OrlaResolver:
+    """Resolve as referencias de orla com uma cache por item igual a do calculo linha a linha."""
+
+    def __init__(self, session: Session) -> None:
+        self._session = session
+        self._caches: Dict[Any, Dict[str, Dict[str, Any]]] = {}
+        self._detalhes: Dict[Tuple[str, Optional[float]], Dict[str, Any]] = {}
+        self.infos: List[Optional[Dict[str, Any]]] = [None]
+        self._info_idx: Dict[int, int] = {}
+        self._materiais: Optional[svc_custeio.MateriaisOrla] = None
+
+    def cache_do_item(self, item_id: Any) -> Dict[str, Dict[str, Any]]:
+        return self._caches.setdefault(item_id, {})
+
+    def _detalhes_orla(self, ref: str, esp: float) -> Dict[str, Any]:
+        chave = (ref, esp)
+        info = self._detalhes.get(chave)
+        if info is None:
+            info = svc_custeio._obter_detalhes_orla_por_ref(
+                self._session, ref, esp_esperada=esp, materiais=self._materiais
+            )
+            self._detalhes[chave] = info
+        return info
+
+    def _indice(self, info: Dict[str, Any]) -> int:
+        idx = self._info_idx.get(id(info))
+        if idx is None:
+            idx = len(self.infos)
+            self.infos.append(info)
+            self._info_idx[id(info)] = idx
+        return idx
+
+    def resolver(self, registros: Sequence[CusteioItem]) -> List[Tuple[int, int, int, int]]:
+        """Devolve, por registo, o indice em `infos` de cada lado (0 = sem referencia)."""
+        resultado: List[Tuple[int, int, int, int]] = []
+        self._materiais = svc_custeio.carregar_materiais_orla(self._session, registros)
+        for reg in registros:
+            cache = self.cache_do_item(reg.item_id)
+            indices: List[int] = []
+            for side in ORLA_SIDES:
+                esp_orla = svc_custeio._parse_float_value(getattr(reg, f"orl_{side}"))
+                if esp_orla in (None, 0):
+                    indices.append(0)
+                    continue
+                ref_cand = _ref_orla_para_espessura(reg, esp_orla)
+                if not ref_cand:
+                    indices.append(0)
+                    continue
+                info = cache.get(ref_cand)
+                if info is None:
+                    info = self._detalhes_orla(ref_cand, esp_orla)
+                    cache[ref_cand] = info
+                indices.append(self._indice(info))
+            resultado.append(tuple(indices))  # type: ignore[arg-type]
+        return resultado
+
+
+# ---------------------------------------------------------------------------
+# Conversao das entradas para inteiros em escala fixa
+# ---------------------------------------------------------------------------
+
+
+class _Quantizador:
+    """Converte valores para inteiros em unidades de 1e-4, com memoizacao.
+
+    Devolve None quando o valor nao e representavel exatamente em 4 casas
+    decimais (a linha segue entao pelo calculo linha a linha).
+    """
+
+    _ESCALA = Decimal("0.0001")
+
+    def __init__(self) -> None:
+        self._memo: Dict[Any, Optional[int]] = {}
+
+    def decimal(self, valor: Optional[Decimal]) -> Optional[int]:
+        if valor is None:
+            return 0
+        try:
+            return self._memo[valor]
+        except KeyError:
+            pass
+        except TypeError:
+            return None
+        quanta: Optional[int]
+        try:
+            escalado = valor.scaleb(4)
+            quanta = int(escalado) if escalado == escalado.to_integral_value() else None
+        except Exception:
+            quanta = None
+        if quanta is not None and abs(quanta) > _MAX_QUANTA:
+            quanta = None
+        self._memo[valor] = quanta
+        return quanta
+
+
+class _Colunas:
+    """Entradas de cada registo em arrays NumPy (unidades de 1e-4) e mascaras."""
+
+    def __init__(
+        self,
+        registros: Sequence[CusteioItem],
+        resolver: _OrlaResolver,
+        ref_idx: Sequence[Tuple[int, int, int, int]],
+    ) -> None:
+        n = len(registros)
+        q = _Quantizador()
+        parse = svc_custeio._parse_float_value
+        to_decimal = svc_custeio._to_decimal
+        coerce_bool = svc_custeio._coerce_checkbox_to_bool
+
+        divisao_memo: Dict[Any, bool] = {}
+        spp_memo: Dict[Tuple[str, Any], bool] = {}
+        desp_memo: Dict[Any, Optional[int]] = {}
+        float_memo: Dict[float, Optional[int]] = {}
+
+        def float_quanta(valor: Optional[float]) -> Optional[int]:
+            # Mesmo caminho do calculo de referencia: Decimal(str(float(valor))).
+            if valor is None:
+                return 0
+            quanta = float_memo.get(valor)
+            if quanta is None and valor not in float_memo:
+                quanta = q.decimal(Decimal(str(valor)))
+                float_memo[valor] = quanta
+            return quanta
+
+        def desp_quanta(valor: Any) -> Optional[int]:
+            try:
+                return desp_memo[valor]
+            except KeyError:
+                pass
+            except TypeError:
+                return None
+            frac = svc_custeio._coerce_percent_fraction(valor)
+            if frac is None or frac <= Decimal("0"):
+                frac = Decimal(str(svc_custeio.DEFAULT_MP_DESP_FRACTION))
+            quanta = q.decimal(frac)
+            desp_memo[valor] = quanta
+            return quanta
+
+        self.n = n
+        comp = np.zeros(n, dtype=np.int64)
+        larg = np.zeros(n, dtype=np.int64)
+        comp_has = np.zeros(n, dtype=bool)
+        esp_res: List[float] = [0.0] * n
+        qt = np.zeros(n, dtype=np.int64)
+        qt_orla = np.zeros(n, dtype=np.int64)
+        pliq = np.zeros(n, dtype=np.int64)
+        pliq_has = np.zeros(n, dtype=bool)
+        desp = np.zeros(n, dtype=np.int64)
+        soma_cp = np.zeros(n, dtype=np.int64)
+        cp09 = np.zeros(n, dtype=np.int64)
+        orla_antiga = np.zeros(n, dtype=np.int64)
+        divisao = np.zeros(n, dtype=bool)
+        spp = np.zeros(n, dtype=bool)
+        und_m2 = np.zeros(n, dtype=bool)
+        und_ml = np.zeros(n, dtype=bool)
+        und_und = np.zeros(n, dtype=bool)
+        mps = np.zeros(n, dtype=bool)
+        mo = np.zeros(n, dtype=bool)
+        orla = np.zeros(n, dtype=bool)
+        invalida = np.zeros(n, dtype=bool)
+
+        for pos, reg in enumerate(registros):
+            comp_val = parse(reg.comp_res)
+            larg_val = parse(reg.larg_res)
+            comp_q = float_quanta(comp_val)
+            larg_q = float_quanta(larg_val)
+            esp_val = parse(reg.esp_res)
+            esp_res[pos] = esp_val or 0.0
+            qt_q = q.decimal(to_decimal(getattr(reg, "qt_total", None)))
+            qt_orla_q = float_quanta(parse(reg.qt_total) or 1.0)
+            pliq_val = parse(getattr(reg, "pliq", None))
+            pliq_q = float_quanta(pliq_val) if pliq_val not in (None, 0) else 0
+            desp_q = desp_quanta(getattr(reg, "desp", None))
+            cp_total: Optional[int] = 0
+            for field in svc_custeio.PRODUCTION_CP_SUM_FIELDS:
+                cp_q = q.decimal(to_decimal(getattr(reg, field, None)))
+                if cp_q is None or cp_total is None:
+                    cp_total = None
+                else:
+                    cp_total += cp_q
+            cp09_q = q.decimal(to_decimal(getattr(reg, "cp09_colagem_und", None)))
+            orla_q = q.decimal(to_decimal(getattr(reg, "custo_total_orla", None)))
+
+            valores = (comp_q, larg_q, qt_q, qt_orla_q, pliq_q, desp_q, cp_total, cp09_q, orla_q)
+            if any(v is None for v in valores):
+                invalida[pos] = True
+                continue
+            comp[pos], larg[pos] = comp_q, larg_q
+            comp_has[pos] = comp_val is not None
+            qt[pos], qt_orla[pos] = qt_q, qt_orla_q
+            pliq[pos] = pliq_q
+            pliq_has[pos] = pliq_val not in (None, 0)
+            desp[pos] = desp_q
+            soma_cp[pos] = cp_total
+            cp09[pos] = cp09_q
+            orla_antiga[pos] = orla_q
+
+            def_peca = getattr(reg, "def_peca", None)
+            is_div = divisao_memo.get(def_peca)
+            if is_div is None:
+                is_div = divisao_memo[def_peca] = svc_custeio._is_divisao_def(def_peca)
+            divisao[pos] = is_div
+            und_val = (getattr(reg, "und", None) or "").strip().upper()
+            spp_key = (und_val, def_peca)
+            is_spp = spp_memo.get(spp_key)
+            if is_spp is None:
+                is_spp = spp_memo[spp_key] = svc_custeio._is_spp_context(und_val, def_peca)
+            spp[pos] = is_spp
+            und_m2[pos] = und_val == "M2"
+            und_ml[pos] = und_val == "ML"
+            und_und[pos] = und_val == "UND"
+            mps[pos] = coerce_bool(getattr(reg, "mps", None))
+            mo[pos] = coerce_bool(getattr(reg, "mo", None))
+            orla[pos] = coerce_bool(getattr(reg, "orla", None))
+
+        self.comp, self.larg, self.comp_has = comp, larg, comp_has
+        self.qt, self.qt_orla = qt, qt_orla
+        self.pliq, self.pliq_has, self.desp = pliq, pliq_has, desp
+        self.soma_cp, self.cp09, self.orla_antiga = soma_cp, cp09, orla_antiga
+        self.divisao, self.spp = divisao, spp
+        self.und_m2, self.und_ml, self.und_und = und_m2, und_ml, und_und
+        self.mps, self.mo, self.orla = mps, mo, orla
+        self.invalida = invalida
+
+        # Orlas: por lado, fator de desperdicio (float) e preco por ml (centimos, exato).
+        infos = resolver.infos
+        fator_ref: List[Decimal] = [Decimal("1.08")]
+        for info in infos[1:]:
+            fator_ref.append(Decimal("1") + _desp_orla_decimal(info.get("desp")))
+        self.fator_orla_float = np.array([float(f) for f in fator_ref], dtype=np.float64)
+
+        self.ref_idx = np.array(ref_idx, dtype=np.int64).reshape(n, len(ORLA_SIDES))
+        self.lado_ativo = np.zeros((n, len(ORLA_SIDES)), dtype=bool)
+        self.euro_ml = np.zeros((n, len(ORLA_SIDES)), dtype=np.int64)
+        euro_memo: Dict[Tuple[int, float], Optional[int]] = {}
+        for pos, reg in enumerate(registros):
+            for lado, side in enumerate(ORLA_SIDES):
+                esp_orla = parse(getattr(reg, f"orl_{side}"))
+                if esp_orla in (None, 0):
+                    continue
+                self.lado_ativo[pos, lado] = True
+                idx = int(self.ref_idx[pos, lado])
+                chave = (idx, esp_res[pos])
+                euro_q = euro_memo.get(chave)
+                if euro_q is None and chave not in euro_memo:
+                    info = infos[idx] or {}
+                    euro, _ = svc_custeio._resolver_preco_orla_por_ml(
+                        pliq=float(info.get("pliq") or 0.0),
+                        und=info.get("und"),
+                        esp_peca=esp_res[pos],
+                    )
+                    euro_q = q.decimal(euro)
+                    euro_q = euro_q // 100 if euro_q is not None else None
+                    euro_memo[chave] = euro_q
+                if euro_q is None:
+                    self.invalida[pos] = True
+                else:
+                    self.euro_ml[pos, lado] = euro_q
+
+
+def _desp_orla_decimal(desp_percent: Any) -> Decimal:
+    """Fracao de desperdicio da orla, com as mesmas conversoes do calculo de referencia."""
+    try:
+        desp_pct = float(desp_percent or 0.0)
+        if desp_pct <= 1:
+            desp_pct *= 100.0
+    except Exception:
+        desp_pct = 0.0
+    if not desp_pct:
+        desp_pct = 8.0
+    try:
+        return Decimal(str(desp_pct)) / Decimal("100")
+    except Exception:
+        return Decimal("0.08")
+
+
+# ---------------------------------------------------------------------------
+# Calculo vetorizado
+# ---------------------------------------------------------------------------
+
+
+def _div_round(numerador, divisor: int, *, half_even: bool = False):
+    """Divisao inteira exata com arredondamento HALF_UP (ou HALF_EVEN), simetrica no sinal."""
+    sinal = np.where(numerador < 0, -1, 1)
+    absoluto = np.abs(numerador)
+    quociente, resto = np.divmod(absoluto, divisor)
+    dobro = resto * 2
+    if half_even:
+        sobe = (dobro > divisor) | ((dobro == divisor) & (quociente % 2 == 1))
+    else:
+        sobe = dobro >= divisor
+    return sinal * (quociente + sobe.astype(np.int64))
+
+
+def _round_float(valores):
+    """Arredonda floats (em quanta) ao inteiro mais proximo; assinala empates e excessos."""
+    absoluto = np.abs(valores)
+    base = np.floor(absoluto)
+    frac = absoluto - base
+    ambiguo = (np.abs(frac - 0.5) < _TIE_TOLERANCE) | ~np.isfinite(valores) | (absoluto > _MAX_QUANTA)
+    arredondado = np.where(frac > 0.5, base + 1, base)
+    arredondado = np.where(np.isfinite(arredondado), arredondado, 0)
+    return (np.sign(valores) * arredondado).astype(np.int64), ambiguo
+
+
+def _calcular(c: _Colunas) -> SimpleNamespace:
+    r = SimpleNamespace()
+    fallback = c.invalida.copy()
+    fallback |= (np.abs(c.comp) > _MAX_QUANTA) | (np.abs(c.larg) > _MAX_QUANTA)
+
+    # Dimensoes (unidades de 1e-4 m), area e perimetro: quantize por defeito (HALF_EVEN).
+    comp_m = _div_round(c.comp, 1000, half_even=True)
+    larg_m = _div_round(c.larg, 1000, half_even=True)
+    area_exata = c.comp * c.larg  # escala 1e-8 mm2 = 1e-14 m2
+    tem_area = (c.comp != 0) & (c.larg != 0)
+    r.area = np.where(tem_area, _div_round(area_exata, 10**10, half_even=True), 0)
+    r.perimetro = _div_round(2 * (c.comp + c.larg), 1000, half_even=True)
+
+    # SPP: comp/1000 * 1.06 (escala 1e-9 m), gravado a 4 casas HALF_UP.
+    spp_exato = c.comp * 106
+    r.spp_ativo = ~c.divisao & c.spp & c.comp_has
+    r.spp = _div_round(spp_exato, 10**5)
+
+    # Custo MP unitario (centimos).
+    fator = 10000 + c.desp  # escala 1e-4
+    fator_pliq = fator * c.pliq  # escala 1e-8
+    base_m2 = c.und_m2 & (area_exata > 0)
+    base_ml = ~base_m2 & c.und_ml & r.spp_ativo & (spp_exato != 0)
+    base_und = ~base_m2 & ~base_ml & c.und_und
+    base_positiva = base_m2 | (base_ml & (spp_exato > 0)) | base_und
+    mp_und_m2, amb_m2 = _round_float(area_exata.astype(np.float64) * fator_pliq.astype(np.float64) / 1e20)
+    mp_und_ml, amb_ml = _round_float(spp_exato.astype(np.float64) * fator_pliq.astype(np.float64) / 1e15)
+    mp_und_und = _div_round(fator_pliq, 10**6)
+    calcula_mp = ~c.mps & base_positiva & c.pliq_has & ~c.divisao
+    fallback |= calcula_mp & base_m2 & amb_m2
+    fallback |= calcula_mp & base_ml & amb_ml
+    r.mp_und = np.select([base_m2, base_ml], [mp_und_m2, mp_und_ml], default=mp_und_und)
+    r.mp_und_ativo = calcula_mp
+    r.mp_und = np.where(calcula_mp, r.mp_und, 0)
+    excesso_mp = np.abs(r.mp_und) > _MAX_QUANTA
+    fallback |= excesso_mp
+    r.mp_und = np.where(excesso_mp, 0, r.mp_und)
+
+    qt_positivo = c.qt > 0
+    r.mp_total_ativo = calcula_mp & qt_positivo
+    r.mp_total = np.where(r.mp_total_ativo, _div_round(r.mp_und * c.qt, 10**4), 0)
+
+    # Somas de producao.
+    r.soma_und = np.where(c.mo, 0, _div_round(c.soma_cp, 100))
+    maquinas = np.where(~c.mo & qt_positivo, _div_round(c.soma_cp * c.qt, 10**6), 0)
+    orla_antiga = np.where(c.orla, 0, c.orla_antiga)
+    cp09_total = np.where(qt_positivo & (c.cp09 != 0), _div_round(c.cp09 * c.qt, 10**6), 0)
+    soma_total_q4 = (maquinas + r.mp_total + cp09_total) * 100 + orla_antiga
+    r.soma_total = _div_round(soma_total_q4, 100)
+
+    # Orlas por lado (centimos).
+    dims = np.stack([comp_m, comp_m, larg_m, larg_m], axis=1)
+    ml_base = _div_round(dims, 100, half_even=True)
+    fator_orla = c.fator_orla_float[c.ref_idx]
+    ml_unit, amb_unit = _round_float(ml_base.astype(np.float64) * fator_orla)
+    ml_val = _div_round(ml_unit * c.qt_orla[:, None], 10**4)
+    excesso = np.abs(ml_val) > _MAX_QUANTA
+    ml_val = np.where(excesso, 0, ml_val)
+    custo = _div_round(ml_val * c.euro_ml, 100)
+    fallback |= np.any(c.lado_ativo & (amb_unit | excesso), axis=1)
+    r.ml_orla = np.where(c.lado_ativo, ml_val, 0)
+    r.custo_orla = np.where(c.lado_ativo, custo, 0)
+    r.soma_ml = r.ml_orla.sum(axis=1)
+    r.custo_total_orla = r.custo_orla.sum(axis=1)
+
+    r.fallback = fallback
+    return r
+
+
+# ---------------------------------------------------------------------------
+# Escrita dos resultados
+# ---------------------------------------------------------------------------
+
+
+def _dec(quanta: Any, casas: int) -> Decimal:
+    return Decimal(int(quanta)).scaleb(-casas)
+
+
+def _escrever_registro(reg: CusteioItem, r: SimpleNamespace, c: _Colunas, pos: int) -> None:
+    divisao = bool(c.divisao[pos])
+    if divisao:
+        reg.area_m2_und = None
+        reg.perimetro_und = None
+        reg.spp_ml_und = None
+        reg.custo_mp_und = None
+        reg.custo_mp_total = None
+        reg.soma_custo_und = None
+        reg.soma_custo_total = None
+    else:
+        reg.area_m2_und = _dec(r.area[pos], 4)
+        reg.perimetro_und = _dec(r.perimetro[pos], 4)
+        reg.spp_ml_und = _dec(r.spp[pos], 4) if r.spp_ativo[pos] else None
+        mps = bool(c.mps[pos])
+        if mps:
+            reg.custo_mp_und = Decimal("0.00")
+            reg.custo_mp_total = Decimal("0.00")
+        else:
+            reg.custo_mp_und = _dec(r.mp_und[pos], 2) if r.mp_und_ativo[pos] else None
+            reg.custo_mp_total = _dec(r.mp_total[pos], 2) if r.mp_total_ativo[pos] else None
+        reg.soma_custo_und = _dec(r.soma_und[pos], 2)
+        reg.soma_custo_total = _dec(r.soma_total[pos], 2)
+
+    for lado, side in enumerate(ORLA_SIDES):
+        if c.lado_ativo[pos, lado]:
+            ml_val = _dec(r.ml_orla[pos, lado], 2)
+            custo_val = _dec(r.custo_orla[pos, lado], 2)
+        else:
+            ml_val = Decimal("0")
+            custo_val = Decimal("0")
+        setattr(reg, f"ml_orl_{side}", ml_val)
+        setattr(reg, f"custo_orl_{side}", custo_val)
+
+    reg.soma_total_ml_orla = _dec(r.soma_ml[pos] * 100, 4)
+    reg.custo_total_orla = Decimal("0.0000") if c.orla[pos] else _dec(r.custo_total_orla[pos] * 100, 4)
@@ -3,15 +3,16 @@ from __future__ import annotations
 FULL_PLATES_MODE = False
 
 from copy import deepcopy
+from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
 import json
 import re
 import unicodedata
 import uuid
-from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
 import logging
 
-from sqlalchemy import delete, select, func
+from sqlalchemy import Boolean, Numeric, and_, delete, insert, inspect as sa_inspect, or_, select, func, update
 from sqlalchemy.orm import Session
 
 from Martelo_Orcamentos_V2.app.models.client import Client
@@ -21,7 +22,9 @@ from Martelo_Orcamentos_V2.app.models.materia_prima import MateriaPrima
 from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
 from Martelo_Orcamentos_V2.app.models.user import User
 from Martelo_Orcamentos_V2.app.services import dados_items as svc_dados_items
+from Martelo_Orcamentos_V2.app.services import dados_referencia as svc_referencia
 from Martelo_Orcamentos_V2.app.services import def_pecas as svc_def_pecas
+from Martelo_Orcamentos_V2.app.services.custeio_metricas import etapa_medida
 from Martelo_Orcamentos_V2.app.services.settings import get_setting, set_setting
 
 logger = logging.getLogger(__name__)
@@ -122,6 +125,128 @@ def _normalize_token(value: Optional[str]) -> str:
     return text.casefold()
 
 
+# Mesmo padrao usado historicamente na procura de definicoes CP (nao alterar:
+# o resultado tem de coincidir com o da procura linear anterior).
+_SUFIXO_DEF_CP = re.compile(r"[_\\s]+\\d+$")
+_SEM_INDICE = 1 << 62
+
+
+class _NoTrieCP:
+    __slots__ = ("filhos", "min_idx", "idx")
+
+    def __init__(self) -> None:
+        self.filhos: Dict[str, "_NoTrieCP"] = {}
+        self.min_idx = _SEM_INDICE
+        self.idx = _SEM_INDICE
+
+
+class _IndiceDefinicoesCP:
+    """Indice sobre as chaves do mapa CP (ordem de insercao = ordem da procura linear).
+
+    Resolve a mesma definicao que a procura original (exata, sem sufixo e depois
+    a primeira chave que comeca/contem ou esta contida no nome), mas sem percorrer
+    todas as chaves: trie de prefixos com o menor indice por no, mais um indice de
+    trigramas (e de substrings curtas) para "nome contido na chave".
+    """
+
+    def __init__(self, mapa: Mapping[str, Dict[str, float]]) -> None:
+        self.mapa = mapa
+        self.tamanho = len(mapa)
+        self._chaves: List[str] = list(mapa.keys())
+        self._raiz = _NoTrieCP()
+        self._curtas: Dict[str, int] = {}
+        self._trigramas: Dict[str, List[int]] = {}
+        for idx, chave in enumerate(self._chaves):
+            if not chave:
+                continue
+            no = self._raiz
+            for ch in chave:
+                no = no.filhos.setdefault(ch, _NoTrieCP())
+                if idx < no.min_idx:
+                    no.min_idx = idx
+            if idx < no.idx:
+                no.idx = idx
+            for tamanho in (1, 2):
+                for inicio in range(len(chave) - tamanho + 1):
+                    self._curtas.setdefault(chave[inicio : inicio + tamanho], idx)
+            vistos: Set[str] = set()
+            for inicio in range(len(chave) - 2):
+                trigrama = chave[inicio : inicio + 3]
+                if trigrama not in vistos:
+                    vistos.add(trigrama)
+                    self._trigramas.setdefault(trigrama, []).append(idx)
+
+    def _menor_contida_em(self, texto: str, melhor: int) -> int:
+        """Menor indice de uma chave que seja substring de `texto`."""
+        for inicio in range(len(texto)):
+            no = self._raiz
+            for ch in texto[inicio:]:
+                no = no.filhos.get(ch)
+                if no is None or no.min_idx >= melhor:
+                    break
+                if no.idx < melhor:
+                    melhor = no.idx
+        return melhor
+
+    def _menor_que_contem(self, texto: str, melhor: int) -> int:
+        """Menor indice de uma chave que contenha `texto`."""
+        if len(texto) < 3:
+            return min(melhor, self._curtas.get(texto, _SEM_INDICE))
+        listas = []
+        for inicio in range(len(texto) - 2):
+            lista = self._trigramas.get(texto[inicio : inicio + 3])
+            if not lista:
+                return melhor
+            listas.append(lista)
+        for idx in min(listas, key=len):
+            if idx >= melhor:
+                break
+            if texto in self._chaves[idx]:
+                return idx
+        return melhor
+
+    def procurar(self, chave: str) -> Optional[Dict[str, float]]:
+        if not chave:
+            return None
+        if chave in self.mapa:
+            return self.mapa[chave]
+        # tentar sem sufixos _n
+        sem_sufixo = _SUFIXO_DEF_CP.sub("", chave)
+        if sem_sufixo and sem_sufixo in self.mapa:
+            return self.mapa[sem_sufixo]
+        # aproximacao: comeca/contem (primeira chave pela ordem do mapa)
+        melhor = _SEM_INDICE
+        if sem_sufixo:
+            no: Optional[_NoTrieCP] = self._raiz
+            for ch in sem_sufixo:
+                no = no.filhos.get(ch)
+                if no is None:
+                    break
+                if no.idx < melhor:
+                    melhor = no.idx
+            if no is not None and no.min_idx < melhor:
+                melhor = no.min_idx
+        melhor = self._menor_contida_em(chave, melhor)
+        melhor = self._menor_que_contem(chave, melhor)
+        if melhor == _SEM_INDICE:
+            return None
+        return self.mapa[self._chaves[melhor]]
+
+
+_ULTIMO_INDICE_CP: Optional[_IndiceDefinicoesCP] = None
+
+
+def _indice_definicoes_cp(mapa: Mapping[str, Dict[str, float]]) -> _IndiceDefinicoesCP:
+    """Indice para `mapa`, reutilizado enquanto o mapa (versao das definicoes) for o mesmo."""
+    global _ULTIMO_INDICE_CP
+    indice = _ULTIMO_INDICE_CP
+    if indice is None or indice.mapa is not mapa or indice.tamanho != len(mapa):
+        indice = _IndiceDefinicoesCP(mapa)
+        _ULTIMO_INDICE_CP = indice
+    return indice
+
+
+@etapa_medida("aplicar_definicao_cp_linha")
 def aplicar_definicao_cp_linha(
     session: Session,
     linha: Dict[str, Any],
@@ -143,31 +268,12 @@ def aplicar_definicao_cp_linha(
         return cache or {}
     if _is_divisao_def(nome):
         linha["_cp_def_found"] = True
-        return cache or svc_def_pecas.mapa_por_nome(session)
+        return cache or obter_mapa_definicoes_cp(session)
 
-    mapa = cache or svc_def_pecas.mapa_por_nome(session)
+    mapa = cache or obter_mapa_definicoes_cp(session)
     chave = _normalize_token(nome)
 
-    def _find_def(chave_normalizada: str) -> Optional[Dict[str, float]]:
-        if not chave_normalizada:
-            return None
-        if chave_normalizada in mapa:
-            return mapa[chave_normalizada]
-        # tentar sem sufixos _n
-        chave_sem_sufixo = re.sub(r"[_\\s]+\\d+$", "", chave_normalizada)
-        if chave_sem_sufixo and chave_sem_sufixo in mapa:
-            return mapa[chave_sem_sufixo]
-        # tentar aproximação: contém/começa
-        for k, v in mapa.items():
-            if not k:
-                continue
-            if chave_sem_sufixo and (k.startswith(chave_sem_sufixo) or chave_sem_sufixo.startswith(k)):
-                return v
-            if k in chave_normalizada or chave_normalizada in k:
-                return v
-        return None
-
-    definicao = _find_def(chave)
+    definicao = _indice_definicoes_cp(mapa).procurar(chave)
     linha["_cp_def_found"] = bool(definicao)
 
     if not definicao:
@@ -1706,7 +1812,8 @@ def _format_formula_value(value: Any) -> Optional[str]:
 
 
 def _to_decimal(value: Any) -> Optional[Decimal]:
-    if value in (None, "", False):
+    # `value in (None, "", False)` apanharia tambem 0 e 0.0 (0 == False)
+    if value is None or value is False or value == "":
         return None
     try:
         return Decimal(str(value))
@@ -1759,7 +1866,13 @@ def _build_orla_lookup(session: Session) -> Dict[str, str]:
 
 
 def obter_mapa_orlas(session: Session) -> Dict[str, str]:
-    return _build_orla_lookup(session)
+    """Mapa descricao_orcamento -> espessura das orlas (partilhado; nao alterar)."""
+    return svc_referencia.obter(session, "orlas", lambda s: _build_orla_lookup(s))
+
+
+def obter_mapa_definicoes_cp(session: Session) -> Dict[str, Dict[str, float]]:
+    """`def_pecas.mapa_por_nome` em cache (partilhado; nao alterar)."""
+    return svc_referencia.obter(session, "definicoes_cp", lambda s: svc_def_pecas.mapa_por_nome(s))
 
 
 def _resolver_espessura_orla(
@@ -1821,7 +1934,7 @@ def _aplicar_orla_espessuras(
 
 
 def calcular_espessuras_orla(session: Session, linha: Dict[str, Any]) -> Dict[str, Optional[float]]:
-    lookup = _build_orla_lookup(session)
+    lookup = obter_mapa_orlas(session)
     return _aplicar_orla_espessuras(linha, lookup)
 
 
@@ -1852,10 +1965,12 @@ def _parse_float_value(valor: Any) -> Optional[float]:
         return None
 
 
+@etapa_medida("preencher_info_orlas_linha")
 def preencher_info_orlas_linha(
     session: Session,
     linha: Dict[str, Any],
     ref_cache: Optional[Dict[str, Tuple[float, float, Optional[str]]]] = None,
+    materiais: Optional["MateriaisOrla"] = None,
 ) -> None:
     """Preenche campos orl_ref_*, orl_pliq_* e orl_desp_* com base nas refer├¬ncias das colunas ORL 0.4/1.0."""
     if ref_cache is None:
@@ -1887,6 +2002,7 @@ def preencher_info_orlas_linha(
                     session,
                     chosen_ref,
                     esp_esperada=esp_orla,
+                    materiais=materiais,
                 )
                 ref_cache[cache_key] = (preco_m2, desp_percent, matched)
             pliq = preco_m2 or 0.0
@@ -1922,10 +2038,102 @@ def _get_orla_width_factor(esp_peca: Any) -> Tuple[float, float]:
     return 60, 16
 
 
+def _detalhes_orla_de_materia(mat: Optional[MateriaPrima], fallback_ref: Optional[str] = None) -> Dict[str, Any]:
+    if not mat:
+        return {
+            "pliq": 0.0,
+            "desp": 0.0,
+            "matched_ref": fallback_ref,
+            "und": None,
+            "tipo": None,
+            "familia": None,
+        }
+    try:
+        return {
+            "pliq": float(mat.pliq or 0.0),
+            "desp": float(getattr(mat, "desp", 0) or 0.0),
+            "matched_ref": mat.ref_le or fallback_ref,
+            "und": getattr(mat, "und", None),
+            "tipo": getattr(mat, "tipo", None),
+            "familia": getattr(mat, "familia", None),
+        }
+    except Exception:
+        return {
+            "pliq": 0.0,
+            "desp": 0.0,
+            "matched_ref": fallback_ref,
+            "und": getattr(mat, "und", None),
+            "tipo": getattr(mat, "tipo", None),
+            "familia": getattr(mat, "familia", None),
+        }
+
+
+class MateriaisOrla:
+    """Materias-primas das orlas referidas num conjunto de linhas, lidas numa unica query IN.
+
+    `procurar` devolve o mesmo resultado que as consultas de `_obter_detalhes_orla_por_ref`
+    (ref_le exata, depois descricao_orcamento sem distinguir maiusculas). Quando a
+    correspondencia pode depender da collation da base de dados, ou nao ha
+    correspondencia, devolve None e a consulta individual e feita como antes.
+    """
+
+    def __init__(self, session: Session, refs: Iterable[Any]) -> None:
+        self._por_ref: Dict[str, MateriaPrima] = {}
+        self._por_ref_ci: Set[str] = set()
+        self._por_descricao: Dict[str, MateriaPrima] = {}
+        chaves = sorted({str(ref).strip() for ref in refs if ref not in (None, "")} - {""})
+        self.refs = tuple(chaves)
+        if not chaves:
+            return
+        descricao_lower = func.lower(MateriaPrima.descricao_orcamento)
+        stmt = (
+            select(MateriaPrima, descricao_lower)
+            .where(
+                or_(
+                    MateriaPrima.ref_le.in_(chaves),
+                    descricao_lower.in_(sorted({chave.lower() for chave in chaves})),
+                )
+            )
+            .order_by(MateriaPrima.id_mp)
+        )
+        for mat, descricao in session.execute(stmt):
+            ref_le = mat.ref_le
+            if ref_le:
+                self._por_ref.setdefault(ref_le, mat)
+                self._por_ref_ci.add(ref_le.casefold())
+            if descricao:
+                self._por_descricao.setdefault(descricao, mat)
+
+    def procurar(self, chave: str) -> Optional[Dict[str, Any]]:
+        mat = self._por_ref.get(chave)
+        if mat is not None:
+            return _detalhes_orla_de_materia(mat, chave)
+        if chave.casefold() in self._por_ref_ci:
+            # Collation sem distincao de maiusculas: deixa a base de dados decidir.
+            return None
+        mat = self._por_descricao.get(chave.lower())
+        if mat is not None:
+            return _detalhes_orla_de_materia(mat, chave)
+        return None
+
+
+def carregar_materiais_orla(session: Session, linhas: Iterable[Any]) -> MateriaisOrla:
+    """Pre-carrega as orlas (orl_0_4 / orl_1_0) de linhas (dicts ou CusteioItem)."""
+    refs: List[Any] = []
+    for linha in linhas:
+        for campo in ("orl_0_4", "orl_1_0"):
+            if isinstance(linha, Mapping):
+                refs.append(linha.get(campo))
+            else:
+                refs.append(getattr(linha, campo, None))
+    return MateriaisOrla(session, refs)
+
+
 def _obter_detalhes_orla_por_ref(
     session: Session,
     ref_candidate: Optional[str],
     esp_esperada: Optional[float] = None,
+    materiais: Optional[MateriaisOrla] = None,
 ) -> Dict[str, Any]:
     """Retorna detalhes da materia-prima usada para a orla escolhida."""
     if not ref_candidate:
@@ -1935,34 +2143,10 @@ def _obter_detalhes_orla_por_ref(
     if not chave:
         return {"pliq": 0.0, "desp": 0.0, "matched_ref": None, "und": None, "tipo": None, "familia": None}
 
-    def _build_result(mat: Optional[MateriaPrima], fallback_ref: Optional[str] = None) -> Dict[str, Any]:
-        if not mat:
-            return {
-                "pliq": 0.0,
-                "desp": 0.0,
-                "matched_ref": fallback_ref,
-                "und": None,
-                "tipo": None,
-                "familia": None,
-            }
-        try:
-            return {
-                "pliq": float(mat.pliq or 0.0),
-                "desp": float(getattr(mat, "desp", 0) or 0.0),
-                "matched_ref": mat.ref_le or fallback_ref,
-                "und": getattr(mat, "und", None),
-                "tipo": getattr(mat, "tipo", None),
-                "familia": getattr(mat, "familia", None),
-            }
-        except Exception:
-            return {
-                "pliq": 0.0,
-                "desp": 0.0,
-                "matched_ref": fallback_ref,
-                "und": getattr(mat, "und", None),
-                "tipo": getattr(mat, "tipo", None),
-                "familia": getattr(mat, "familia", None),
-            }
+    if materiais is not None:
+        info = materiais.procurar(chave)
+        if info is not None:
+            return info
 
     stmt = (
         select(MateriaPrima)
@@ -1971,7 +2155,7 @@ def _obter_detalhes_orla_por_ref(
     )
     mat = session.execute(stmt).scalar_one_or_none()
     if mat:
-        return _build_result(mat, chave)
+        return _detalhes_orla_de_materia(mat, chave)
 
     stmt2 = (
         select(MateriaPrima)
@@ -1980,7 +2164,7 @@ def _obter_detalhes_orla_por_ref(
     )
     mat = session.execute(stmt2).scalar_one_or_none()
     if mat:
-        return _build_result(mat, chave)
+        return _detalhes_orla_de_materia(mat, chave)
 
     if esp_esperada is not None:
         try:
@@ -1996,7 +2180,7 @@ def _obter_detalhes_orla_por_ref(
             )
             mat = session.execute(stmt3).scalar_one_or_none()
             if mat:
-                return _build_result(mat, None)
+                return _detalhes_orla_de_materia(mat, None)
 
     return {"pliq": 0.0, "desp": 0.0, "matched_ref": None, "und": None, "tipo": None, "familia": None}
 
@@ -2005,9 +2189,10 @@ def _obter_info_orla_por_ref(
     session: Session,
     ref_candidate: Optional[str],
     esp_esperada: Optional[float] = None,
+    materiais: Optional[MateriaisOrla] = None,
 ) -> Tuple[float, float, Optional[str]]:
     """Compat: retorna (preco, desperdicio, ref) para a orla escolhida."""
-    info = _obter_detalhes_orla_por_ref(session, ref_candidate, esp_esperada=esp_esperada)
+    info = _obter_detalhes_orla_por_ref(session, ref_candidate, esp_esperada=esp_esperada, materiais=materiais)
     return (
         float(info.get("pliq") or 0.0),
         float(info.get("desp") or 0.0),
@@ -2049,219 +2234,220 @@ def _resolver_preco_orla_por_ml(
     return Decimal("0.00"), "missing"
 
 
+@etapa_medida("atualizar_orlas_custeio", orcamento=lambda args: args.get("orcamento_id"))
 def atualizar_orlas_custeio(session: Session, orcamento_id: int, item_id: int) -> None:
-    """Recalcula ml/custo de orlas para as linhas do item informado."""
+    """Recalcula ml/custo de orlas para as linhas do item informado.
+
+    Delegado ao motor em bloco (`custeio_bulk`), que produz os mesmos valores
+    que o calculo linha a linha de `_recalcular_registro_custeio`.
+    """
     if orcamento_id is None or item_id is None:
         return
 
-    stmt = (
-        select(CusteioItem)
-        .where(
-            CusteioItem.orcamento_id == orcamento_id,
-            CusteioItem.item_id == item_id,
-        )
-        .order_by(CusteioItem.ordem, CusteioItem.id)
-    )
-    registros = session.execute(stmt).scalars().all()
+    from Martelo_Orcamentos_V2.app.services import custeio_bulk
 
-    ref_cache: Dict[str, Dict[str, Any]] = {}
+    custeio_bulk.recalcular_custeio_item(session, orcamento_id, item_id)
 
-    for reg in registros:
-        comp_res_val = _parse_float_value(reg.comp_res)
-        larg_res_val = _parse_float_value(reg.larg_res)
-        esp_res_val = _parse_float_value(reg.esp_res)
-
-        comp_res_mm = Decimal(str(comp_res_val)) if comp_res_val is not None else Decimal("0")
-        larg_res_mm = Decimal(str(larg_res_val)) if larg_res_val is not None else Decimal("0")
-        esp_res = esp_res_val or 0.0
-        und_val = (getattr(reg, "und", None) or "").strip().upper()
-        comp_m = (comp_res_mm / Decimal("1000")).quantize(Decimal("0.0001"))
-        larg_m = (larg_res_mm / Decimal("1000")).quantize(Decimal("0.0001"))
-        mps_flag = _coerce_checkbox_to_bool(getattr(reg, "mps", None))
-        mo_flag = _coerce_checkbox_to_bool(getattr(reg, "mo", None))
-        orla_flag = _coerce_checkbox_to_bool(getattr(reg, "orla", None))
-
-        if _is_divisao_def(reg.def_peca):
-            reg.area_m2_und = None
-            reg.perimetro_und = None
-        else:
-            area_decimal = (comp_res_mm * larg_res_mm) / Decimal("1000000") if comp_res_mm and larg_res_mm else Decimal("0")
-            perimetro_decimal = ((comp_res_mm + larg_res_mm) * Decimal("2")) / Decimal("1000") if comp_res_mm or larg_res_mm else Decimal("0")
-            reg.area_m2_und = area_decimal.quantize(Decimal("0.0001"))
-            reg.perimetro_und = perimetro_decimal.quantize(Decimal("0.0001"))
 
-        spp_decimal_precise: Optional[Decimal] = None
-        if _is_divisao_def(reg.def_peca):
-            reg.spp_ml_und = None
-        elif _is_spp_context(und_val, getattr(reg, "def_peca", None)):
-            if comp_res_val is not None:
-                base_ml = Decimal(str(comp_res_val)) / Decimal("1000")
-                spp_decimal_precise = base_ml * (Decimal("1") + SPP_WASTE_FRACTION)
-                reg.spp_ml_und = spp_decimal_precise.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-            else:
-                reg.spp_ml_und = None
+def _recalcular_registro_custeio(
+    session: Session,
+    reg: CusteioItem,
+    ref_cache: Dict[str, Dict[str, Any]],
+) -> None:
+    """Calculo linha a linha (referencia) de area, SPP, MP e orlas de um registo."""
+    comp_res_val = _parse_float_value(reg.comp_res)
+    larg_res_val = _parse_float_value(reg.larg_res)
+    esp_res_val = _parse_float_value(reg.esp_res)
+
+    comp_res_mm = Decimal(str(comp_res_val)) if comp_res_val is not None else Decimal("0")
+    larg_res_mm = Decimal(str(larg_res_val)) if larg_res_val is not None else Decimal("0")
+    esp_res = esp_res_val or 0.0
+    und_val = (getattr(reg, "und", None) or "").strip().upper()
+    comp_m = (comp_res_mm / Decimal("1000")).quantize(Decimal("0.0001"))
+    larg_m = (larg_res_mm / Decimal("1000")).quantize(Decimal("0.0001"))
+    mps_flag = _coerce_checkbox_to_bool(getattr(reg, "mps", None))
+    mo_flag = _coerce_checkbox_to_bool(getattr(reg, "mo", None))
+    orla_flag = _coerce_checkbox_to_bool(getattr(reg, "orla", None))
+
+    if _is_divisao_def(reg.def_peca):
+        reg.area_m2_und = None
+        reg.perimetro_und = None
+    else:
+        area_decimal = (comp_res_mm * larg_res_mm) / Decimal("1000000") if comp_res_mm and larg_res_mm else Decimal("0")
+        perimetro_decimal = ((comp_res_mm + larg_res_mm) * Decimal("2")) / Decimal("1000") if comp_res_mm or larg_res_mm else Decimal("0")
+        reg.area_m2_und = area_decimal.quantize(Decimal("0.0001"))
+        reg.perimetro_und = perimetro_decimal.quantize(Decimal("0.0001"))
+
+    spp_decimal_precise: Optional[Decimal] = None
+    if _is_divisao_def(reg.def_peca):
+        reg.spp_ml_und = None
+    elif _is_spp_context(und_val, getattr(reg, "def_peca", None)):
+        if comp_res_val is not None:
+            base_ml = Decimal(str(comp_res_val)) / Decimal("1000")
+            spp_decimal_precise = base_ml * (Decimal("1") + SPP_WASTE_FRACTION)
+            reg.spp_ml_und = spp_decimal_precise.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
         else:
             reg.spp_ml_und = None
+    else:
+        reg.spp_ml_und = None
 
-        if _is_divisao_def(reg.def_peca):
+    if _is_divisao_def(reg.def_peca):
+        reg.custo_mp_und = None
+        reg.custo_mp_total = None
+        reg.soma_custo_und = None
+        reg.soma_custo_total = None
+    else:
+        desp_fraction = _coerce_percent_fraction(getattr(reg, "desp", None))
+        if desp_fraction is None or desp_fraction <= Decimal("0"):
+            desp_fraction = Decimal(str(DEFAULT_MP_DESP_FRACTION))
+        fator_desp = Decimal("1") + desp_fraction
+        pliq_val = _parse_float_value(getattr(reg, "pliq", None))
+        pliq_decimal = Decimal(str(pliq_val)) if pliq_val not in (None, 0) else None
+        qt_total_decimal = _to_decimal(getattr(reg, "qt_total", None)) or Decimal("0")
+        base_decimal: Optional[Decimal] = None
+        if und_val == "M2" and area_decimal > Decimal("0"):
+            base_decimal = area_decimal
+        elif und_val == "ML" and spp_decimal_precise:
+            base_decimal = spp_decimal_precise
+        elif und_val == "UND":
+            base_decimal = Decimal("1")
+
+        if mps_flag:
+            custo_mp_und_decimal = Decimal("0.00")
+            reg.custo_mp_und = custo_mp_und_decimal
+        elif base_decimal is not None and base_decimal > Decimal("0") and pliq_decimal not in (None, Decimal("0")):
+            custo_mp_und_decimal = (base_decimal * fator_desp * pliq_decimal).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            reg.custo_mp_und = custo_mp_und_decimal
+        else:
+            custo_mp_und_decimal = None
             reg.custo_mp_und = None
-            reg.custo_mp_total = None
-            reg.soma_custo_und = None
-            reg.soma_custo_total = None
+
+        if mps_flag:
+            custo_mp_total_decimal = Decimal("0.00")
+            reg.custo_mp_total = custo_mp_total_decimal
+        elif custo_mp_und_decimal is not None and qt_total_decimal > Decimal("0"):
+            custo_mp_total_decimal = (custo_mp_und_decimal * qt_total_decimal).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            reg.custo_mp_total = custo_mp_total_decimal
         else:
-            desp_fraction = _coerce_percent_fraction(getattr(reg, "desp", None))
-            if desp_fraction is None or desp_fraction <= Decimal("0"):
-                desp_fraction = Decimal(str(DEFAULT_MP_DESP_FRACTION))
-            fator_desp = Decimal("1") + desp_fraction
-            pliq_val = _parse_float_value(getattr(reg, "pliq", None))
-            pliq_decimal = Decimal(str(pliq_val)) if pliq_val not in (None, 0) else None
-            qt_total_decimal = _to_decimal(getattr(reg, "qt_total", None)) or Decimal("0")
-            base_decimal: Optional[Decimal] = None
-            if und_val == "M2" and area_decimal > Decimal("0"):
-                base_decimal = area_decimal
-            elif und_val == "ML" and spp_decimal_precise:
-                base_decimal = spp_decimal_precise
-            elif und_val == "UND":
-                base_decimal = Decimal("1")
-
-            if mps_flag:
-                custo_mp_und_decimal = Decimal("0.00")
-                reg.custo_mp_und = custo_mp_und_decimal
-            elif base_decimal is not None and base_decimal > Decimal("0") and pliq_decimal not in (None, Decimal("0")):
-                custo_mp_und_decimal = (base_decimal * fator_desp * pliq_decimal).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                reg.custo_mp_und = custo_mp_und_decimal
-            else:
-                custo_mp_und_decimal = None
-                reg.custo_mp_und = None
-
-            if mps_flag:
-                custo_mp_total_decimal = Decimal("0.00")
-                reg.custo_mp_total = custo_mp_total_decimal
-            elif custo_mp_und_decimal is not None and qt_total_decimal > Decimal("0"):
-                custo_mp_total_decimal = (custo_mp_und_decimal * qt_total_decimal).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                reg.custo_mp_total = custo_mp_total_decimal
-            else:
-                custo_mp_total_decimal = None
-                reg.custo_mp_total = None
-
-            soma_custo_und_decimal = Decimal("0")
-            for field in PRODUCTION_CP_SUM_FIELDS:
-                valor_field = _to_decimal(getattr(reg, field, None))
-                if valor_field is not None:
-                    soma_custo_und_decimal += valor_field
-            if mo_flag:
-                soma_custo_und_decimal = Decimal("0.00")
-            reg.soma_custo_und = soma_custo_und_decimal.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            maquinas_total_decimal = Decimal("0")
-            if not mo_flag and qt_total_decimal > Decimal("0"):
-                maquinas_total_decimal = (soma_custo_und_decimal * qt_total_decimal).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            custo_total_orla_decimal = _to_decimal(getattr(reg, "custo_total_orla", None)) or Decimal("0")
-            if orla_flag:
-                custo_total_orla_decimal = Decimal("0.00")
-            custo_mp_total_component = custo_mp_total_decimal if custo_mp_total_decimal is not None else Decimal("0")
-
-            cp09_unit_decimal = _to_decimal(getattr(reg, "cp09_colagem_und", None)) or Decimal("0.00")
-            cp09_total_decimal = Decimal("0.00")
-            if qt_total_decimal > Decimal("0") and cp09_unit_decimal != Decimal("0.00"):
-                cp09_total_decimal = (cp09_unit_decimal * qt_total_decimal).quantize(
-                    Decimal("0.01"), rounding=ROUND_HALF_UP
-                )
+            custo_mp_total_decimal = None
+            reg.custo_mp_total = None
 
-            soma_total_decimal = (
-                maquinas_total_decimal + custo_total_orla_decimal + custo_mp_total_component + cp09_total_decimal
+        soma_custo_und_decimal = Decimal("0")
+        for field in PRODUCTION_CP_SUM_FIELDS:
+            valor_field = _to_decimal(getattr(reg, field, None))
+            if valor_field is not None:
+                soma_custo_und_decimal += valor_field
+        if mo_flag:
+            soma_custo_und_decimal = Decimal("0.00")
+        reg.soma_custo_und = soma_custo_und_decimal.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+        maquinas_total_decimal = Decimal("0")
+        if not mo_flag and qt_total_decimal > Decimal("0"):
+            maquinas_total_decimal = (soma_custo_und_decimal * qt_total_decimal).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+        custo_total_orla_decimal = _to_decimal(getattr(reg, "custo_total_orla", None)) or Decimal("0")
+        if orla_flag:
+            custo_total_orla_decimal = Decimal("0.00")
+        custo_mp_total_component = custo_mp_total_decimal if custo_mp_total_decimal is not None else Decimal("0")
+
+        cp09_unit_decimal = _to_decimal(getattr(reg, "cp09_colagem_und", None)) or Decimal("0.00")
+        cp09_total_decimal = Decimal("0.00")
+        if qt_total_decimal > Decimal("0") and cp09_unit_decimal != Decimal("0.00"):
+            cp09_total_decimal = (cp09_unit_decimal * qt_total_decimal).quantize(
+                Decimal("0.01"), rounding=ROUND_HALF_UP
             )
-            reg.soma_custo_total = soma_total_decimal.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        soma_ml = Decimal("0")
-        soma_custos = Decimal("0")
-
-        for chave, dim_m in (("c1", comp_m), ("c2", comp_m), ("l1", larg_m), ("l2", larg_m)):
-            esp_orla = _parse_float_value(getattr(reg, f"orl_{chave}"))
-            ml_val = Decimal("0")
-            custo_val = Decimal("0")
-
-            if esp_orla not in (None, 0):
-                ref_cand: Optional[str] = None
-                if abs(esp_orla - 0.4) < 0.01:
-                    ref_cand = reg.orl_0_4
-                elif abs(esp_orla - 1.0) < 0.01:
-                    ref_cand = reg.orl_1_0
+
+        soma_total_decimal = (
+            maquinas_total_decimal + custo_total_orla_decimal + custo_mp_total_component + cp09_total_decimal
+        )
+        reg.soma_custo_total = soma_total_decimal.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    soma_ml = Decimal("0")
+    soma_custos = Decimal("0")
+
+    for chave, dim_m in (("c1", comp_m), ("c2", comp_m), ("l1", larg_m), ("l2", larg_m)):
+        esp_orla = _parse_float_value(getattr(reg, f"orl_{chave}"))
+        ml_val = Decimal("0")
+        custo_val = Decimal("0")
+
+        if esp_orla not in (None, 0):
+            ref_cand: Optional[str] = None
+            if abs(esp_orla - 0.4) < 0.01:
+                ref_cand = reg.orl_0_4
+            elif abs(esp_orla - 1.0) < 0.01:
+                ref_cand = reg.orl_1_0
+            else:
+                ref_cand = reg.orl_1_0 or reg.orl_0_4
+
+            if ref_cand:
+                ref_cand = str(ref_cand).strip() or None
+
+            pliq_orla = 0.0
+            desp_percent = 0.0
+            matched_ref: Optional[str] = None
+            und_orla: Optional[str] = None
+            if ref_cand:
+                cache_key = ref_cand
+                if cache_key in ref_cache:
+                    info_orla = ref_cache[cache_key]
                 else:
-                    ref_cand = reg.orl_1_0 or reg.orl_0_4
-
-                if ref_cand:
-                    ref_cand = str(ref_cand).strip() or None
-
-                pliq_orla = 0.0
-                desp_percent = 0.0
-                matched_ref: Optional[str] = None
-                und_orla: Optional[str] = None
-                if ref_cand:
-                    cache_key = ref_cand
-                    if cache_key in ref_cache:
-                        info_orla = ref_cache[cache_key]
-                    else:
-                        info_orla = _obter_detalhes_orla_por_ref(session, ref_cand, esp_esperada=esp_orla)
-                        ref_cache[cache_key] = info_orla
-                    pliq_orla = float(info_orla.get("pliq") or 0.0)
-                    desp_percent = float(info_orla.get("desp") or 0.0)
-                    matched_ref = info_orla.get("matched_ref")
-                    und_orla = info_orla.get("und")
-
-                ml_base = dim_m.quantize(Decimal("0.01"))
-
-                try:
-                    desp_pct = float(desp_percent or 0.0)
-                    if desp_pct <= 1:
-                        desp_pct *= 100.0
-                except Exception:
-                    desp_pct = 0.0
-
-                if not desp_pct:
-                    desp_pct = 8.0
-
-                try:
-                    desp_decimal = Decimal(str(desp_pct)) / Decimal("100")
-                except Exception:
-                    desp_decimal = Decimal("0.08")
-
-                ml_unit_with_waste = (ml_base * (Decimal("1") + desp_decimal)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-                qt_total_val = _parse_float_value(reg.qt_total) or 1.0
-                qt_total = Decimal(str(qt_total_val))
-
-                ml_val = (ml_unit_with_waste * qt_total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-                euro_por_ml, _ = _resolver_preco_orla_por_ml(
-                    pliq=pliq_orla,
-                    und=und_orla,
-                    esp_peca=esp_res,
-                )
+                    info_orla = _obter_detalhes_orla_por_ref(session, ref_cand, esp_esperada=esp_orla)
+                    ref_cache[cache_key] = info_orla
+                pliq_orla = float(info_orla.get("pliq") or 0.0)
+                desp_percent = float(info_orla.get("desp") or 0.0)
+                matched_ref = info_orla.get("matched_ref")
+                und_orla = info_orla.get("und")
+
+            ml_base = dim_m.quantize(Decimal("0.01"))
+
+            try:
+                desp_pct = float(desp_percent or 0.0)
+                if desp_pct <= 1:
+                    desp_pct *= 100.0
+            except Exception:
+                desp_pct = 0.0
+
+            if not desp_pct:
+                desp_pct = 8.0
 
-                custo_val = (ml_val * euro_por_ml).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            try:
+                desp_decimal = Decimal(str(desp_pct)) / Decimal("100")
+            except Exception:
+                desp_decimal = Decimal("0.08")
+
+            ml_unit_with_waste = (ml_base * (Decimal("1") + desp_decimal)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+            qt_total_val = _parse_float_value(reg.qt_total) or 1.0
+            qt_total = Decimal(str(qt_total_val))
 
-            if chave == "c1":
-                reg.ml_orl_c1 = ml_val
-                reg.custo_orl_c1 = custo_val
-            elif chave == "c2":
-                reg.ml_orl_c2 = ml_val
-                reg.custo_orl_c2 = custo_val
-            elif chave == "l1":
-                reg.ml_orl_l1 = ml_val
-                reg.custo_orl_l1 = custo_val
-            elif chave == "l2":
-                reg.ml_orl_l2 = ml_val
-                reg.custo_orl_l2 = custo_val
+            ml_val = (ml_unit_with_waste * qt_total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-            soma_ml += ml_val
-            soma_custos += custo_val
+            euro_por_ml, _ = _resolver_preco_orla_por_ml(
+                pliq=pliq_orla,
+                und=und_orla,
+                esp_peca=esp_res,
+            )
+
+            custo_val = (ml_val * euro_por_ml).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-        reg.soma_total_ml_orla = soma_ml.quantize(Decimal("0.0001"))
-        reg.custo_total_orla = Decimal("0.0000") if orla_flag else soma_custos.quantize(Decimal("0.0001"))
+        if chave == "c1":
+            reg.ml_orl_c1 = ml_val
+            reg.custo_orl_c1 = custo_val
+        elif chave == "c2":
+            reg.ml_orl_c2 = ml_val
+            reg.custo_orl_c2 = custo_val
+        elif chave == "l1":
+            reg.ml_orl_l1 = ml_val
+            reg.custo_orl_l1 = custo_val
+        elif chave == "l2":
+            reg.ml_orl_l2 = ml_val
+            reg.custo_orl_l2 = custo_val
 
-    session.flush(registros)
+        soma_ml += ml_val
+        soma_custos += custo_val
+
+    reg.soma_total_ml_orla = soma_ml.quantize(Decimal("0.0001"))
+    reg.custo_total_orla = Decimal("0.0000") if orla_flag else soma_custos.quantize(Decimal("0.0001"))
 
 
 def _registro_precisa_recalculo(reg: CusteioItem) -> bool:
@@ -2310,6 +2496,117 @@ def _registro_precisa_recalculo_acabamento(reg: CusteioItem) -> bool:
     return valor not in (None, "", 0)
 
 
+# --- Projecao (Core) das linhas de Custeio -------------------------------
+
+_CAMPOS_FORMULA = ("comp", "larg", "esp")
+
+
+def _plano_projecao_custeio() -> Tuple[Tuple[str, str], ...]:
+    """(chave, conversao) pela ordem de CUSTEIO_COLUMN_SPECS."""
+    plano: List[Tuple[str, str]] = []
+    for spec in CUSTEIO_COLUMN_SPECS:
+        key = spec["key"]
+        if key == "id":
+            plano.append((key, "id"))
+        elif key in _CAMPOS_FORMULA:
+            plano.append((key, "formula"))
+        elif spec["type"] == "numeric":
+            plano.append((key, "numeric"))
+        elif spec["type"] == "bool":
+            plano.append((key, "bool"))
+        else:
+            plano.append((key, "raw"))
+    return tuple(plano)
+
+
+_PLANO_PROJECAO_CUSTEIO = _plano_projecao_custeio()
+_COLUNAS_PROJECAO_CUSTEIO = tuple(
+    CusteioItem.__table__.c[nome]
+    for nome in (
+        *(key for key, _ in _PLANO_PROJECAO_CUSTEIO),
+        *(f"{key}_expr" for key in _CAMPOS_FORMULA),
+        "qt_manual_override",
+    )
+)
+
+
+def _linha_de_mapping(dados: Mapping[str, Any]) -> Dict[str, Any]:
+    """Converte uma linha projetada (Core) no dict usado pela UI (sem enriquecimento)."""
+    linha: Dict[str, Any] = {}
+    for key, conversao in _PLANO_PROJECAO_CUSTEIO:
+        valor = dados[key]
+        if conversao == "numeric":
+            linha[key] = None if valor is None else float(valor)
+        elif conversao == "bool":
+            linha[key] = _coerce_checkbox_to_bool(valor)
+        elif conversao == "formula":
+            expr_val = dados[f"{key}_expr"]
+            linha[key] = expr_val if expr_val not in (None, "") else _format_formula_value(valor)
+        else:
+            linha[key] = valor
+    linha["qt_manual_override"] = bool(dados["qt_manual_override"])
+    return linha
+
+
+def projetar_custeio(
+    session: Session,
+    orcamento_id: int,
+    *,
+    item_id: Optional[int] = None,
+    versao: Optional[str] = None,
+    colunas: Optional[Sequence[str]] = None,
+    tamanho_lote: Optional[int] = None,
+) -> Iterator[Any]:
+    """Le linhas de custeio_items com um SELECT Core, sem passar pelo ORM.
+
+    Devolve `Row`s so de leitura (acesso por atributo, valores em bruto) pela
+    ordem (ordem, id). `colunas` limita o SELECT; nomes inexistentes sao
+    ignorados (o `getattr(row, nome, None)` devolve None). Com `tamanho_lote`
+    as linhas sao lidas em streaming, `tamanho_lote` de cada vez.
+    """
+    tabela = CusteioItem.__table__
+    if colunas is None:
+        selecionadas = list(tabela.c)
+    else:
+        selecionadas = [tabela.c[nome] for nome in dict.fromkeys(colunas) if nome in tabela.c]
+    stmt = select(*selecionadas).where(tabela.c.orcamento_id == orcamento_id)
+    if item_id is not None:
+        stmt = stmt.where(tabela.c.item_id == item_id)
+    if versao is not None:
+        stmt = stmt.where(tabela.c.versao == versao)
+    stmt = stmt.order_by(tabela.c.ordem, tabela.c.id)
+    if tamanho_lote:
+        stmt = stmt.execution_options(yield_per=int(tamanho_lote))
+    return iter(session.execute(stmt))
+
+
+def iterar_linhas_custeio(
+    session: Session,
+    orcamento_id: int,
+    item_id: int,
+    *,
+    tamanho_lote: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Linhas do item ja convertidas como em `listar_custeio_items`, mas sem enriquecimento.
+
+    Seleciona apenas as colunas de CUSTEIO_COLUMN_SPECS (mais *_expr e
+    qt_manual_override). Com `tamanho_lote` as linhas sao lidas em streaming.
+    """
+    stmt = (
+        select(*_COLUNAS_PROJECAO_CUSTEIO)
+        .where(
+            CusteioItem.__table__.c.orcamento_id == orcamento_id,
+            CusteioItem.__table__.c.item_id == item_id,
+        )
+        .order_by(CusteioItem.__table__.c.ordem, CusteioItem.__table__.c.id)
+    )
+    if tamanho_lote:
+        stmt = stmt.execution_options(yield_per=int(tamanho_lote))
+    for dados in session.execute(stmt).mappings():
+        yield _linha_de_mapping(dados)
+
+
+@etapa_medida("listar_custeio_items", orcamento=lambda args: args.get("orcamento_id"))
 def listar_custeio_items(session: Session, orcamento_id: int, item_id: Optional[int]) -> List[Dict[str, Any]]:
     """Carrega linhas do Custeio sem persistir recalculos implicitos.
 
@@ -2320,49 +2617,17 @@ def listar_custeio_items(session: Session, orcamento_id: int, item_id: Optional[
     if not item_id:
         return []
 
-    stmt = (
-        select(CusteioItem)
-        .where(
-            CusteioItem.orcamento_id == orcamento_id,
-            CusteioItem.item_id == item_id,
-        )
-        .order_by(CusteioItem.ordem, CusteioItem.id)
-    )
-    registros = session.execute(stmt).scalars().all()
+    linhas = list(iterar_linhas_custeio(session, orcamento_id, item_id))
 
-    linhas: List[Dict[str, Any]] = []
-    orla_lookup = _build_orla_lookup(session)
-    cp_cache = svc_def_pecas.mapa_por_nome(session)
+    orla_lookup = obter_mapa_orlas(session)
+    cp_cache = obter_mapa_definicoes_cp(session)
     missing_cp_defs: Set[str] = set()
     ref_cache: Dict[str, Tuple[float, float, Optional[str]]] = {}
-    for registro in registros:
-        linha = _empty_row()
-        linha["id"] = registro.id
-        for spec in CUSTEIO_COLUMN_SPECS:
-            key = spec["key"]
-            if key == "id":
-                continue
-
-            if key in {"comp", "larg", "esp"}:
-                expr_attr = f"{key}_expr"
-                expr_val = getattr(registro, expr_attr, None)
-                if expr_val not in (None, ""):
-                    linha[key] = expr_val
-                else:
-                    linha[key] = _format_formula_value(getattr(registro, key, None))
-                continue
-
-            valor = getattr(registro, key, None)
-            if spec["type"] == "numeric":
-                linha[key] = _decimal_to_float(valor)
-            elif spec["type"] == "bool":
-                linha[key] = _coerce_checkbox_to_bool(valor)
-            else:
-                linha[key] = valor
-        linha["qt_manual_override"] = bool(getattr(registro, "qt_manual_override", False))
+    materiais_orla = carregar_materiais_orla(session, linhas)
+    for linha in linhas:
         _aplicar_orla_espessuras(linha, orla_lookup)
 
-        preencher_info_orlas_linha(session, linha, ref_cache)
+        preencher_info_orlas_linha(session, linha, ref_cache, materiais_orla)
         cp_cache = aplicar_definicao_cp_linha(
             session,
             linha,
@@ -2400,7 +2665,6 @@ def listar_custeio_items(session: Session, orcamento_id: int, item_id: Optional[
                 linha["spp_ml_und"] = None
         else:
             linha["spp_ml_und"] = None
-        linhas.append(linha)
         linha["_nst_manual_override"] = bool(linha.get("_nst_manual_override", False))
         if "_nst_source" not in linha:
             base_nst = linha.get("nst")
@@ -2412,24 +2676,41 @@ def listar_custeio_items(session: Session, orcamento_id: int, item_id: Optional[
     return linhas
 
 
+@dataclass(frozen=True)
+class ResultadoGravacaoCusteio:
+    """Linhas escritas por `salvar_custeio_items` (para monitorizar a amplificacao de escrita)."""
+
+    inseridas: int = 0
+    atualizadas: int = 0
+    removidas: int = 0
+    inalteradas: int = 0
+
+    @property
+    def linhas_tocadas(self) -> int:
+        return self.inseridas + self.atualizadas + self.removidas
+
+
+@etapa_medida("salvar_custeio_items", orcamento=lambda args: getattr(args.get("ctx"), "orcamento_id", None))
 def salvar_custeio_items(
     session: Session,
     ctx: svc_dados_items.DadosItemsContext,
     linhas: Sequence[Mapping[str, Any]],
     dimensoes: Optional[Mapping[str, Any]] = None,
-) -> None:
-    # Remove registros antigos
-    session.execute(
-        delete(CusteioItem).where(
-            CusteioItem.orcamento_id == ctx.orcamento_id,
-            CusteioItem.item_id == ctx.item_id,
-        )
-    )
-    session.flush()
-
+    *,
+    incremental: bool = False,
+) -> ResultadoGravacaoCusteio:
+    """Grava as linhas do Custeio do item.
+
+    - incremental=False: apaga todas as linhas do item e volta a inseri-las.
+    - incremental=True: associa as linhas recebidas as existentes pelo `id` e
+      emite UPDATEs em bloco apenas com as colunas alteradas, INSERTs em bloco
+      para linhas novas e um unico DELETE para os ids removidos. Os ids (e as
+      referencias em custeio_desp_backup) mantem-se estaveis.
+    """
     acabamento_cache: Dict[str, Optional[Dict[str, Any]]] = {}
-    cp_cache = svc_def_pecas.mapa_por_nome(session)
+    cp_cache = obter_mapa_definicoes_cp(session)
     missing_cp_defs: Set[str] = set()
+    registros: List[CusteioItem] = []
 
     for ordem, linha in enumerate(linhas):
         logger.debug(
@@ -2529,7 +2810,21 @@ def salvar_custeio_items(
             except Exception:
                 linha["soma_custo_acb"] = None
 
-        session.add(registro)
+        registros.append(registro)
+
+    if incremental:
+        resultado = _gravar_custeio_incremental(session, ctx, linhas, registros)
+    else:
+        # Remove registros antigos
+        removidas = session.execute(
+            delete(CusteioItem).where(
+                CusteioItem.orcamento_id == ctx.orcamento_id,
+                CusteioItem.item_id == ctx.item_id,
+            )
+        ).rowcount
+        session.flush()
+        session.add_all(registros)
+        resultado = ResultadoGravacaoCusteio(inseridas=len(registros), removidas=max(removidas or 0, 0))
 
     if dimensoes is not None:
         try:
@@ -2547,6 +2842,103 @@ def salvar_custeio_items(
         pass
 
     session.commit()
+    logger.debug(
+        "Salvar Custeio item=%s incremental=%s inseridas=%s atualizadas=%s removidas=%s inalteradas=%s",
+        ctx.item_id,
+        incremental,
+        resultado.inseridas,
+        resultado.atualizadas,
+        resultado.removidas,
+        resultado.inalteradas,
+    )
+    return resultado
+
+
+def _coerce_row_id(valor: Any) -> Optional[int]:
+    if valor in (None, "", False):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _valores_coluna_iguais(coluna: Any, atual: Any, novo: Any) -> bool:
+    if atual is None or novo is None:
+        return atual is None and novo is None
+    if isinstance(coluna.type, Boolean):
+        return bool(atual) == bool(novo)
+    if isinstance(coluna.type, Numeric):
+        escala = Decimal(1).scaleb(-(coluna.type.scale or 0))
+        try:
+            return (
+                Decimal(str(atual)).quantize(escala, rounding=ROUND_HALF_UP)
+                == Decimal(str(novo)).quantize(escala, rounding=ROUND_HALF_UP)
+            )
+        except Exception:
+            return False
+    return atual == novo
+
+
+def _gravar_custeio_incremental(
+    session: Session,
+    ctx: svc_dados_items.DadosItemsContext,
+    linhas: Sequence[Mapping[str, Any]],
+    registros: Sequence[CusteioItem],
+) -> ResultadoGravacaoCusteio:
+    tabela = CusteioItem.__table__
+    existentes: Dict[int, Mapping[str, Any]] = {
+        row["id"]: row
+        for row in session.execute(
+            select(tabela).where(
+                tabela.c.orcamento_id == ctx.orcamento_id,
+                tabela.c.item_id == ctx.item_id,
+            )
+        ).mappings()
+    }
+
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    inalteradas = 0
+    for linha, registro in zip(linhas, registros):
+        valores = {
+            chave: valor
+            for chave, valor in sa_inspect(registro).dict.items()
+            if chave in tabela.c and chave != "id"
+        }
+        linha_id = _coerce_row_id(linha.get("id"))
+        atual = existentes.pop(linha_id, None) if linha_id is not None else None
+        if atual is None:
+            inserts.append(valores)
+            continue
+        alterados = {
+            chave: valor
+            for chave, valor in valores.items()
+            if not _valores_coluna_iguais(tabela.c[chave], atual.get(chave), valor)
+        }
+        if alterados:
+            alterados["id"] = linha_id
+            updates.append(alterados)
+        else:
+            inalteradas += 1
+
+    removidos = sorted(existentes)
+    if removidos:
+        session.execute(delete(CusteioItem).where(CusteioItem.id.in_(removidos)))
+    if updates:
+        # Agrupa pelas mesmas colunas para que cada grupo seja um unico executemany.
+        updates.sort(key=lambda params: tuple(sorted(params)))
+        session.execute(update(CusteioItem), updates)
+    if inserts:
+        session.execute(insert(CusteioItem), inserts)
+    session.flush()
+
+    return ResultadoGravacaoCusteio(
+        inseridas=len(inserts),
+        atualizadas=len(updates),
+        removidas=len(removidos),
+        inalteradas=inalteradas,
+    )
 
 
 def gerar_linhas_para_selecoes(
@@ -2555,8 +2947,8 @@ def gerar_linhas_para_selecoes(
     selecoes: Sequence[str],
 ) -> List[Dict[str, Any]]:
     linhas: List[Dict[str, Any]] = []
-    orla_lookup = _build_orla_lookup(session)
-    cp_cache = svc_def_pecas.mapa_por_nome(session)
+    orla_lookup = obter_mapa_orlas(session)
+    cp_cache = obter_mapa_definicoes_cp(session)
     missing_cp_defs: Set[str] = set()
     for selecao in selecoes:
         parts = [p.strip() for p in selecao.split(">") if p.strip()]
@@ -3263,29 +3655,105 @@ def _coerce_decimal_two(value: Any) -> Decimal:
         return Decimal("0.00")
 
 
+_DOIS_DECIMAIS = Decimal("0.01")
+
+
+def _colunas_soma_resumo_custos() -> Tuple[Any, ...]:
+    """SUMs de custeio_items usados no resumo de custos do item (por esta ordem)."""
+    return (
+        func.coalesce(func.sum(CusteioItem.soma_custo_total), 0),
+        func.coalesce(func.sum(CusteioItem.custo_total_orla), 0),
+        func.coalesce(func.sum(CusteioItem.custo_mp_total), 0),
+        func.coalesce(func.sum(CusteioItem.soma_custo_acb), 0),
+        func.coalesce(
+            func.sum(
+                func.coalesce(CusteioItem.cp09_colagem_und, 0)
+                * func.coalesce(CusteioItem.qt_total, 0)
+            ),
+            0,
+        ),
+    )
+
+
+_CAMPOS_RESUMO_CUSTOS = (
+    "custo_total_orlas",
+    "custo_total_mao_obra",
+    "custo_total_materia_prima",
+    "custo_total_acabamentos",
+    "custo_colagem",
+    "custo_produzido",
+)
+
+
+def _valores_resumo_custos(somas: Optional[Sequence[Any]]) -> Dict[str, Decimal]:
+    """Converte os SUMs de `_colunas_soma_resumo_custos` nos totais de OrcamentoItem."""
+    if not somas:
+        somas = (0, 0, 0, 0, 0)
+    base_total, total_orlas, total_mp, total_acab, total_colagem = (_coerce_decimal_two(value) for value in somas)
+
+    total_mo = (base_total - total_orlas - total_mp - total_colagem).quantize(
+        _DOIS_DECIMAIS, rounding=ROUND_HALF_UP
+    )
+    # Evita negativos por arredondamentos acumulados.
+    if total_mo < Decimal("0.00"):
+        total_mo = Decimal("0.00")
+
+    return {
+        "custo_total_orlas": total_orlas,
+        "custo_total_mao_obra": total_mo,
+        "custo_total_materia_prima": total_mp,
+        "custo_total_acabamentos": total_acab,
+        "custo_colagem": total_colagem,
+        "custo_produzido": (base_total + total_acab).quantize(_DOIS_DECIMAIS, rounding=ROUND_HALF_UP),
+    }
+
+
+@etapa_medida("atualizar_resumo_custos_orcamento", orcamento=lambda args: args.get("orcamento_id"))
 def atualizar_resumo_custos_orcamento(session: Session, orcamento_id: Optional[int]) -> int:
     """
     Copia os custos agregados do custeio (custeio_items) para a tabela de orcamento_items.
     Retorna o n├║mero de itens atualizados.
+
+    Os totais de todos os items sao calculados num unico SELECT com GROUP BY
+    (LEFT JOIN a custeio_items pela versao do item), que le tambem os totais
+    atuais; so os items com totais diferentes sao gravados, com um UPDATE em
+    bloco por chave primaria (sem mexer no updated_at dos restantes).
     """
     if not orcamento_id:
         return 0
 
-    itens = (
-        session.execute(
-            select(OrcamentoItem).where(OrcamentoItem.id_orcamento == orcamento_id)
+    versao_item = func.coalesce(func.nullif(func.trim(OrcamentoItem.versao), ""), "01")
+    atuais = [getattr(OrcamentoItem, campo) for campo in _CAMPOS_RESUMO_CUSTOS]
+    stmt = (
+        select(OrcamentoItem.id_item, *atuais, *_colunas_soma_resumo_custos())
+        .select_from(OrcamentoItem)
+        .outerjoin(
+            CusteioItem,
+            and_(
+                CusteioItem.orcamento_id == OrcamentoItem.id_orcamento,
+                CusteioItem.item_id == OrcamentoItem.id_item,
+                CusteioItem.versao == versao_item,
+            ),
         )
-        .scalars()
-        .all()
+        .where(OrcamentoItem.id_orcamento == orcamento_id)
+        .group_by(OrcamentoItem.id_item, *atuais)
+        .order_by(OrcamentoItem.id_item)
     )
-
-    atualizados = 0
-    for item in itens:
-        if _aplicar_resumo_custos_item(session, item):
-            atualizados += 1
+    tabela = OrcamentoItem.__table__
+    updates = []
+    for id_item, *valores in session.execute(stmt):
+        novos = _valores_resumo_custos(valores[len(atuais) :])
+        if all(
+            _valores_coluna_iguais(tabela.c[campo], atual, novos[campo])
+            for campo, atual in zip(_CAMPOS_RESUMO_CUSTOS, valores)
+        ):
+            continue
+        updates.append({"id_item": id_item, **novos})
+    if updates:
+        session.execute(update(OrcamentoItem), updates)
 
     session.flush()
-    return atualizados
+    return len(updates)
 
 
 def _aplicar_resumo_custos_item(session: Session, item: Optional[OrcamentoItem]) -> bool:
@@ -3295,19 +3763,7 @@ def _aplicar_resumo_custos_item(session: Session, item: Optional[OrcamentoItem])
     versao = (getattr(item, "versao", "") or "").strip() or "01"
 
     stmt = (
-        select(
-            func.coalesce(func.sum(CusteioItem.soma_custo_total), 0),
-            func.coalesce(func.sum(CusteioItem.custo_total_orla), 0),
-            func.coalesce(func.sum(CusteioItem.custo_mp_total), 0),
-            func.coalesce(func.sum(CusteioItem.soma_custo_acb), 0),
-            func.coalesce(
-                func.sum(
-                    func.coalesce(CusteioItem.cp09_colagem_und, 0)
-                    * func.coalesce(CusteioItem.qt_total, 0)
-                ),
-                0,
-            ),
-        )
+        select(*_colunas_soma_resumo_custos())
         .where(
             CusteioItem.orcamento_id == item.id_orcamento,
             CusteioItem.item_id == item.id_item,
@@ -3315,25 +3771,8 @@ def _aplicar_resumo_custos_item(session: Session, item: Optional[OrcamentoItem])
         )
     )
 
-    res = session.execute(stmt).one()
-    if not res:
-        res = (0, 0, 0, 0, 0)
-
-    base_total, total_orlas, total_mp, total_acab, total_colagem = (_coerce_decimal_two(value) for value in res)
-
-    total_mo = (base_total - total_orlas - total_mp - total_colagem).quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP
-    )
-    # Evita negativos por arredondamentos acumulados.
-    if total_mo < Decimal("0.00"):
-        total_mo = Decimal("0.00")
-
-    item.custo_total_orlas = total_orlas
-    item.custo_total_mao_obra = total_mo
-    item.custo_total_materia_prima = total_mp
-    item.custo_total_acabamentos = total_acab
-    item.custo_colagem = total_colagem
-    item.custo_produzido = (base_total + total_acab).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    for campo, valor in _valores_resumo_custos(session.execute(stmt).one()).items():
+        setattr(item, campo, valor)
 
     return True
 
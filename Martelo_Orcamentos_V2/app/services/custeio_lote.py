@@ -0,0 +1,268 @@
+"""Recalculo do Custeio de todos os items de um orçamento.
+
+Os items são calculados com o motor sem Qt (`custeio_engine`), em série ou num
+`ProcessPoolExecutor`: cada processo abre o seu próprio engine/sessão e apenas
+calcula as linhas. A gravação é sempre feita pelo chamador, item a item e pela
+ordem dos items, para que o resultado final seja o mesmo do modo sequencial.
+Com as métricas de Custeio ligadas, cada processo devolve as suas medições com
+o resultado do item e o chamador junta-as às suas.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from Martelo_Orcamentos_V2.app.models.orcamento import OrcamentoItem
+from Martelo_Orcamentos_V2.app.services import custeio_engine
+from Martelo_Orcamentos_V2.app.services import custeio_items as svc_custeio
+from Martelo_Orcamentos_V2.app.services import custeio_metricas
+from Martelo_Orcamentos_V2.app.services import dados_items as svc_dados_items
+
+logger = logging.getLogger(__name__)
+
+# Limite por omissão de processos; acima disto o ganho é anulado pela base de dados.
+MAX_PROCESSOS = 4
+# Intervalo (segundos) entre verificações de cancelamento enquanto se espera por um item.
+_INTERVALO_CANCELAMENTO = 0.2
+
+
+@dataclass(frozen=True)
+class FalhaItem:
+    item_id: int
+    etapa: str
+    mensagem: str
+
+
+@dataclass
+class RelatorioRecalculo:
+    total: int = 0
+    atualizados: List[int] = field(default_factory=list)
+    ignorados: List[int] = field(default_factory=list)
+    falhas: List[FalhaItem] = field(default_factory=list)
+    cancelado: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.falhas and not self.cancelado
+
+    def resumo(self) -> str:
+        linhas = [f"Items atualizados: {len(self.atualizados)}/{self.total}"]
+        for falha in self.falhas:
+            linhas.append(f"Item {falha.item_id} ({falha.etapa}): {falha.mensagem}")
+        return "\n".join(linhas)
+
+
+@dataclass
+class _ResultadoItem:
+    item_id: int
+    ctx: Optional[svc_dados_items.DadosItemsContext] = None
+    dimensoes: Dict[str, Optional[float]] = field(default_factory=dict)
+    linhas: Optional[List[Dict[str, Any]]] = None
+    erro: Optional[str] = None
+    metricas: Optional[custeio_metricas.Registos] = None
+
+
+def _mensagem_erro(exc: BaseException) -> str:
+    texto = str(exc).strip()
+    return f"{type(exc).__name__}: {texto}" if texto else type(exc).__name__
+
+
+def calcular_item(
+    session: Session,
+    orcamento_id: int,
+    item_id: int,
+    production_mode: str,
+    taxas: Mapping[str, Mapping[str, float]],
+) -> _ResultadoItem:
+    """Calcula (sem gravar) as linhas de Custeio de um item."""
+    resultado = _ResultadoItem(item_id=item_id)
+    try:
+        ctx = svc_dados_items.carregar_contexto(session, orcamento_id, item_id=item_id)
+        if ctx is None:
+            return resultado
+        try:
+            dimensoes, _ = svc_custeio.carregar_dimensoes(session, ctx)
+        except Exception:
+            dimensoes = {}
+        linhas = svc_custeio.listar_custeio_items(session, orcamento_id, item_id)
+        resultado.ctx = ctx
+        resultado.dimensoes = dict(dimensoes or {})
+        if not linhas:
+            return resultado
+        ambiente = custeio_engine.AmbienteCusteio(
+            session,
+            ctx,
+            production_mode=production_mode,
+            dimension_values=resultado.dimensoes,
+            production_rates=taxas,
+        )
+        resultado.linhas, _ = custeio_engine.recalcular_linhas(linhas, ambiente)
+    except Exception as exc:
+        logger.exception("Falha ao calcular custeio do item %s", item_id)
+        try:
+            session.rollback()
+        except Exception:
+            pass
+        resultado.erro = _mensagem_erro(exc)
+    return resultado
+
+
+# --- processos de trabalho ------------------------------------------------
+
+_SessaoProcesso: Optional[sessionmaker] = None
+
+
+def _inicializar_processo(db_url: str, metricas: bool = False) -> None:
+    global _SessaoProcesso
+    custeio_metricas.limpar(todos=True)  # com fork, o processo herda os registos do chamador
+    custeio_metricas.ativar(metricas)
+    engine = create_engine(db_url, pool_pre_ping=True)
+    _SessaoProcesso = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _calcular_item_no_processo(
+    orcamento_id: int,
+    item_id: int,
+    production_mode: str,
+    taxas: Mapping[str, Mapping[str, float]],
+) -> _ResultadoItem:
+    if _SessaoProcesso is None:  # pragma: no cover - initializer sempre corre antes
+        raise RuntimeError("Processo de custeio sem sessao inicializada.")
+    session = _SessaoProcesso()
+    try:
+        resultado = calcular_item(session, orcamento_id, item_id, production_mode, taxas)
+    finally:
+        session.close()
+    if custeio_metricas.esta_ativo():
+        resultado.metricas = custeio_metricas.recolher()
+    return resultado
+
+
+def _url_da_sessao(session: Session) -> str:
+    bind = session.get_bind()
+    engine = getattr(bind, "engine", bind)
+    return engine.url.render_as_string(hide_password=False)
+
+
+def numero_processos(total_items: int, max_processos: Optional[int] = None) -> int:
+    limite = max_processos if max_processos is not None else min(MAX_PROCESSOS, os.cpu_count() or 1)
+    return max(1, min(int(limite), total_items))
+
+
+# --- orquestração ---------------------------------------------------------
+
+
+def listar_item_ids(session: Session, orcamento_id: int) -> List[int]:
+    return list(
+        session.execute(
+            select(OrcamentoItem.id_item)
+            .where(OrcamentoItem.id_orcamento == orcamento_id)
+            .order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _gravar_resultado(session: Session, resultado: _ResultadoItem, relatorio: RelatorioRecalculo) -> None:
+    custeio_metricas.fundir(resultado.metricas)
+    if resultado.erro:
+        relatorio.falhas.append(FalhaItem(resultado.item_id, "calculo", resultado.erro))
+        return
+    if resultado.ctx is None or not resultado.linhas:
+        relatorio.ignorados.append(resultado.item_id)
+        return
+    try:
+        svc_custeio.salvar_custeio_items(
+            session,
+            resultado.ctx,
+            resultado.linhas,
+            resultado.dimensoes,
+            incremental=True,
+        )
+    except Exception as exc:
+        logger.exception("Falha ao gravar custeio do item %s", resultado.item_id)
+        try:
+            session.rollback()
+        except Exception:
+            pass
+        relatorio.falhas.append(FalhaItem(resultado.item_id, "gravacao", _mensagem_erro(exc)))
+        return
+    relatorio.atualizados.append(resultado.item_id)
+
+
+def recalcular_orcamento(
+    session: Session,
+    orcamento_id: int,
+    *,
+    production_mode: str,
+    taxas: Mapping[str, Mapping[str, float]],
+    max_processos: Optional[int] = None,
+    progresso: Optional[Callable[[int, int], None]] = None,
+    cancelado: Optional[Callable[[], bool]] = None,
+) -> RelatorioRecalculo:
+    """Recalcula e grava o Custeio de todos os items do orçamento.
+
+    Com mais de um processo, os items são calculados em paralelo mas gravados
+    (com commit por item) pela ordem de `item_ord`. `cancelado` é consultado
+    entre items; os items já gravados mantêm-se.
+    """
+    production_mode = (production_mode or "STD").upper()
+    taxas = {key: dict(value) for key, value in taxas.items()}
+    item_ids = listar_item_ids(session, orcamento_id)
+    relatorio = RelatorioRecalculo(total=len(item_ids))
+    deve_parar = cancelado or (lambda: False)
+
+    def _avancar(idx: int) -> None:
+        if progresso is not None:
+            progresso(idx, relatorio.total)
+
+    processos = numero_processos(len(item_ids), max_processos)
+    if processos <= 1:
+        for idx, item_id in enumerate(item_ids, start=1):
+            if deve_parar():
+                relatorio.cancelado = True
+                break
+            resultado = calcular_item(session, orcamento_id, item_id, production_mode, taxas)
+            _gravar_resultado(session, resultado, relatorio)
+            _avancar(idx)
+        return relatorio
+
+    executor = ProcessPoolExecutor(
+        max_workers=processos,
+        initializer=_inicializar_processo,
+        initargs=(_url_da_sessao(session), custeio_metricas.esta_ativo()),
+    )
+    try:
+        futuros: Dict[int, Future] = {
+            item_id: executor.submit(_calcular_item_no_processo, orcamento_id, item_id, production_mode, taxas)
+            for item_id in item_ids
+        }
+        for idx, item_id in enumerate(item_ids, start=1):
+            futuro = futuros[item_id]
+            resultado: Optional[_ResultadoItem] = None
+            while resultado is None and not relatorio.cancelado:
+                if deve_parar():
+                    relatorio.cancelado = True
+                    break
+                try:
+                    resultado = futuro.result(timeout=_INTERVALO_CANCELAMENTO)
+                except FuturesTimeout:
+                    continue
+                except Exception as exc:
+                    # O processo morreu ou o resultado nao pode ser transferido.
+                    resultado = _ResultadoItem(item_id=item_id, erro=_mensagem_erro(exc))
+            if relatorio.cancelado:
+                break
+            _gravar_resultado(session, resultado, relatorio)
+            _avancar(idx)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return relatorio
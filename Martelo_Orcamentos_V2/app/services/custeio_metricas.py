@@ -0,0 +1,247 @@
+"""Medição opcional (tempo e nº de SQL) das etapas do cálculo de Custeio.
+
+Desligada por omissão: `ativar()` (ou a variável de ambiente
+MARTELO_CUSTEIO_METRICAS=1) liga a recolha. Cada etapa acumula, por orçamento,
+o nº de chamadas, o tempo de parede e o nº de instruções SQL emitidas. Os tempos
+e contagens são inclusivos: uma etapa chamada dentro de outra conta nas duas.
+Etapas sem orçamento explícito herdam o da etapa exterior.
+
+Cada processo mede-se a si próprio: os processos do recálculo em lote
+(`custeio_lote`) devolvem com cada item o que mediram (`recolher`) e o processo
+principal junta-o aos seus registos (`fundir`).
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENV_METRICAS = "MARTELO_CUSTEIO_METRICAS"
+
+# Etapas instrumentadas (ordem usada na apresentação quando os tempos empatam).
+ETAPAS = (
+    "listar_custeio_items",
+    "aplicar_definicao_cp_linha",
+    "preencher_info_orlas_linha",
+    "recalculate_all",
+    "salvar_custeio_items",
+    "atualizar_orlas_custeio",
+    "atualizar_resumo_custos_orcamento",
+)
+
+
+@dataclass
+class EstatisticaEtapa:
+    chamadas: int = 0
+    tempo_total: float = 0.0
+    tempo_max: float = 0.0
+    sql: int = 0
+
+    def como_dict(self, etapa: str) -> Dict[str, Any]:
+        medio = self.tempo_total / self.chamadas if self.chamadas else 0.0
+        return {
+            "etapa": etapa,
+            "chamadas": self.chamadas,
+            "tempo_total_ms": round(self.tempo_total * 1000.0, 3),
+            "tempo_medio_ms": round(medio * 1000.0, 3),
+            "tempo_max_ms": round(self.tempo_max * 1000.0, 3),
+            "sql": self.sql,
+        }
+
+
+class _Medicao:
+    __slots__ = ("sql",)
+
+    def __init__(self) -> None:
+        self.sql = 0
+
+
+_ativo = os.environ.get(ENV_METRICAS, "").strip().lower() in {"1", "true", "yes", "sim"}
+_lock = threading.Lock()
+_registos: Dict[Optional[int], Dict[str, EstatisticaEtapa]] = {}
+_pilha = threading.local()
+_orcamento_atual: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "custeio_metricas_orcamento", default=None
+)
+_ouvinte_sql_registado = False
+
+
+def _medicoes_ativas() -> List[_Medicao]:
+    pilha = getattr(_pilha, "medicoes", None)
+    if pilha is None:
+        pilha = _pilha.medicoes = []
+    return pilha
+
+
+def _contar_sql(*_args: Any, **_kwargs: Any) -> None:
+    for medicao in getattr(_pilha, "medicoes", ()):
+        medicao.sql += 1
+
+
+def _registar_ouvinte_sql() -> None:
+    global _ouvinte_sql_registado
+    with _lock:
+        if not _ouvinte_sql_registado:
+            event.listen(Engine, "before_cursor_execute", _contar_sql)
+            _ouvinte_sql_registado = True
+
+
+def ativar(ligado: bool = True) -> None:
+    global _ativo
+    if ligado:
+        _registar_ouvinte_sql()
+    _ativo = bool(ligado)
+
+
+def esta_ativo() -> bool:
+    return _ativo
+
+
+def _normalizar_orcamento(orcamento_id: Any) -> Optional[int]:
+    try:
+        return int(orcamento_id) if orcamento_id not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _registar(etapa: str, orcamento_id: Optional[int], duracao: float, sql: int) -> None:
+    with _lock:
+        stats = _registos.setdefault(orcamento_id, {}).setdefault(etapa, EstatisticaEtapa())
+        stats.chamadas += 1
+        stats.tempo_total += duracao
+        stats.sql += sql
+        if duracao > stats.tempo_max:
+            stats.tempo_max = duracao
+
+
+@contextmanager
+def medir(etapa: str, orcamento_id: Any = None) -> Iterator[None]:
+    """Mede o bloco como `etapa` (sem custo quando a medição está desligada)."""
+    if not _ativo:
+        yield
+        return
+    if not _ouvinte_sql_registado:
+        _registar_ouvinte_sql()
+    orcamento = _normalizar_orcamento(orcamento_id)
+    token = None
+    if orcamento is None:
+        orcamento = _orcamento_atual.get()
+    else:
+        token = _orcamento_atual.set(orcamento)
+    medicao = _Medicao()
+    pilha = _medicoes_ativas()
+    pilha.append(medicao)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        pilha.remove(medicao)
+        if token is not None:
+            _orcamento_atual.reset(token)
+        _registar(etapa, orcamento, duracao, medicao.sql)
+
+
+def etapa_medida(
+    etapa: str,
+    orcamento: Optional[Callable[[Mapping[str, Any]], Any]] = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorador de `medir`. `orcamento` recebe os argumentos (por nome) e devolve o id."""
+
+    def decorador(func: Callable[..., Any]) -> Callable[..., Any]:
+        assinatura = inspect.signature(func) if orcamento is not None else None
+
+        @functools.wraps(func)
+        def envolvida(*args: Any, **kwargs: Any) -> Any:
+            if not _ativo:
+                return func(*args, **kwargs)
+            orcamento_id = None
+            if assinatura is not None:
+                try:
+                    orcamento_id = orcamento(assinatura.bind(*args, **kwargs).arguments)
+                except Exception:
+                    orcamento_id = None
+            with medir(etapa, orcamento_id):
+                return func(*args, **kwargs)
+
+        return envolvida
+
+    return decorador
+
+
+def resultados(orcamento_id: Any = None) -> List[Dict[str, Any]]:
+    """Estatísticas do orçamento, da etapa mais demorada para a mais rápida."""
+    orcamento = _normalizar_orcamento(orcamento_id)
+    with _lock:
+        etapas = dict(_registos.get(orcamento, {}))
+    linhas = [stats.como_dict(etapa) for etapa, stats in etapas.items()]
+    ordem = {etapa: idx for idx, etapa in enumerate(ETAPAS)}
+    linhas.sort(key=lambda linha: (-linha["tempo_total_ms"], ordem.get(linha["etapa"], len(ordem)), linha["etapa"]))
+    return linhas
+
+
+Registos = Dict[Optional[int], Dict[str, EstatisticaEtapa]]
+
+
+def recolher() -> Registos:
+    """Devolve e limpa os registos deste processo (para enviar a outro processo)."""
+    with _lock:
+        registos = {orcamento: dict(etapas) for orcamento, etapas in _registos.items()}
+        _registos.clear()
+    return registos
+
+
+def fundir(registos: Optional[Registos]) -> None:
+    """Acrescenta registos medidos noutro processo (ver `recolher`)."""
+    if not registos:
+        return
+    with _lock:
+        for orcamento, etapas in registos.items():
+            destino = _registos.setdefault(orcamento, {})
+            for etapa, origem in etapas.items():
+                stats = destino.setdefault(etapa, EstatisticaEtapa())
+                stats.chamadas += origem.chamadas
+                stats.tempo_total += origem.tempo_total
+                stats.sql += origem.sql
+                if origem.tempo_max > stats.tempo_max:
+                    stats.tempo_max = origem.tempo_max
+
+
+def orcamentos_medidos() -> List[Optional[int]]:
+    with _lock:
+        return sorted(_registos, key=lambda oid: (oid is None, oid or 0))
+
+
+def limpar(orcamento_id: Any = None, *, todos: bool = False) -> None:
+    with _lock:
+        if todos:
+            _registos.clear()
+        else:
+            _registos.pop(_normalizar_orcamento(orcamento_id), None)
+
+
+def exportar_json(orcamento_id: Any = None) -> str:
+    dados = {
+        "orcamento_id": _normalizar_orcamento(orcamento_id),
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "ativo": _ativo,
+        "etapas": resultados(orcamento_id),
+    }
+    return json.dumps(dados, ensure_ascii=False, indent=2)
+
+
+def guardar_json(caminho: str, orcamento_id: Any = None) -> None:
+    with open(caminho, "w", encoding="utf-8") as fh:
+        fh.write(exportar_json(orcamento_id))
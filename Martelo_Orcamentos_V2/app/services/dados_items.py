@@ -25,6 +25,7 @@ from Martelo_Orcamentos_V2.app.models import (
 )
 from Martelo_Orcamentos_V2.app.services import dados_gerais as svc_dg
 from Martelo_Orcamentos_V2.app.services import dados_gerais as svc_dados_gerais
+from Martelo_Orcamentos_V2.app.services.orcamentos import numero_item
 
 MENU_MATERIAIS = svc_dg.MENU_MATERIAIS
 MENU_FERRAGENS = svc_dg.MENU_FERRAGENS
@@ -121,7 +122,7 @@ def carregar_contexto(db: Session, orcamento_id: int, item_id: Optional[int] = N
         ano=str(orc.ano),
         num_orcamento=str(orc.num_orcamento),
         versao=str(item.versao or orc.versao or "00"),
-        item_ordem=getattr(item, "item_ord", None),
+        item_ordem=numero_item(db, item),
     )
 
 
@@ -0,0 +1,120 @@
+"""Cache (por processo) dos dados de referência usados no Custeio.
+
+Guarda em memória o mapa de espessuras das orlas (`materias_primas`) e as
+definições CP (`definicoes_pecas`), para que a navegação entre items não volte
+a ler o catálogo completo. Dados por item (ex.: acabamentos) não passam por
+aqui: mudam com cada gravação e a cache só seria invalidada localmente.
+
+A validade é controlada por um carimbo de versão guardado em `app_settings`
+(`VERSAO_SETTING_KEY`). Quem altera estes dados chama `incrementar_versao`;
+os restantes processos detetam a mudança na verificação seguinte.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from Martelo_Orcamentos_V2.app.services import settings as svc_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+VERSAO_SETTING_KEY = "custeio_referencia_versao"
+# Intervalo mínimo entre leituras do carimbo de versão (segundos).
+INTERVALO_VERIFICACAO = 2.0
+
+
+class _EstadoCache:
+    __slots__ = ("versao", "verificado_em", "valores")
+
+    def __init__(self) -> None:
+        self.versao: Optional[str] = None
+        self.verificado_em = 0.0
+        self.valores: Dict[Hashable, Any] = {}
+
+
+_lock = threading.RLock()
+# Um estado por Engine: bases de dados diferentes nunca partilham entradas.
+_estados: "weakref.WeakKeyDictionary[Any, _EstadoCache]" = weakref.WeakKeyDictionary()
+
+
+def _bind_da_sessao(session: Session) -> Any:
+    bind = session.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def ler_versao(session: Session) -> str:
+    return svc_settings.get_setting(session, VERSAO_SETTING_KEY) or "0"
+
+
+def _estado_atual(session: Session) -> _EstadoCache:
+    bind = _bind_da_sessao(session)
+    agora = time.monotonic()
+    with _lock:
+        estado = _estados.get(bind)
+        if estado is None:
+            estado = _EstadoCache()
+            _estados[bind] = estado
+        if estado.versao is not None and agora - estado.verificado_em < INTERVALO_VERIFICACAO:
+            return estado
+    versao = ler_versao(session)
+    with _lock:
+        if versao != estado.versao:
+            if estado.versao is not None:
+                logger.debug("dados_referencia: versao %s -> %s; cache limpa", estado.versao, versao)
+            estado.valores.clear()
+            estado.versao = versao
+        estado.verificado_em = agora
+    return estado
+
+
+def obter(session: Session, chave: Hashable, carregar: Callable[[Session], T]) -> T:
+    """Devolve o valor em cache para `chave`, carregando-o com `carregar` se necessário.
+
+    O valor devolvido é partilhado entre chamadas e não deve ser alterado.
+    """
+    try:
+        estado = _estado_atual(session)
+    except Exception:
+        # Sem carimbo de versao (sessao sem bind, tabela em falta, ...): carrega sem cache.
+        logger.debug("dados_referencia: versao indisponivel; %r carregado sem cache", chave, exc_info=True)
+        return carregar(session)
+    with _lock:
+        if chave in estado.valores:
+            return estado.valores[chave]
+    valor = carregar(session)
+    with _lock:
+        return estado.valores.setdefault(chave, valor)
+
+
+def invalidar(chave: Optional[Hashable] = None) -> None:
+    """Remove `chave` (ou tudo, se None) das caches locais de todas as bases de dados."""
+    with _lock:
+        for estado in list(_estados.values()):
+            if chave is None:
+                estado.valores.clear()
+                estado.versao = None
+            else:
+                estado.valores.pop(chave, None)
+
+
+def incrementar_versao(session: Session) -> str:
+    """Incrementa o carimbo de versão (o commit fica a cargo de quem chama)."""
+    atual = ler_versao(session)
+    try:
+        nova = str(int(atual) + 1)
+    except (TypeError, ValueError):
+        nova = "1"
+    svc_settings.set_setting(session, VERSAO_SETTING_KEY, nova)
+    invalidar()
+    # Leituras feitas antes do commit podem ter voltado a guardar dados antigos.
+    event.listen(session, "after_commit", lambda _session: invalidar(), once=True)
+    return nova
@@ -10,6 +10,7 @@ from sqlalchemy import delete, func, select
 from sqlalchemy.orm import Session
 
 from Martelo_Orcamentos_V2.app.models.definicao_peca import DefinicaoPeca
+from Martelo_Orcamentos_V2.app.services import dados_referencia as svc_referencia
 import unicodedata
 
 
@@ -233,6 +234,7 @@ def guardar_definicoes(session: Session, linhas: Iterable[Mapping[str, Optional[
     else:
         session.execute(delete(DefinicaoPeca))
 
+    svc_referencia.incrementar_versao(session)
     session.commit()
 
 
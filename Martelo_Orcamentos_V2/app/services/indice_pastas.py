@@ -0,0 +1,256 @@
+"""Índice das subpastas da árvore de produção no servidor.
+
+Guarda, por pasta lida, o mtime e os nomes das subpastas. Uma pasta só volta a
+ser listada quando o mtime muda (criar/apagar/renomear uma subpasta altera o
+mtime da pasta-mãe), por isso a consulta normal custa um `stat` em vez de uma
+listagem com um `stat` por entrada.
+
+Com a atualização em segundo plano ligada (`IndicePastas.iniciar`), uma thread
+percorre as raízes indicadas, relê apenas as subárvores alteradas e guarda o
+índice em disco; as consultas confiam na cópia em memória durante o intervalo
+entre passagens e não tocam no servidor.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSAO_FORMATO = 1
+# Pasta do ficheiro persistido: vazio = %LOCALAPPDATA%/Martelo_Orcamentos_V2/indice_pastas; "off" desliga.
+ENV_INDICE_PASTAS_DIR = "MARTELO_INDICE_PASTAS_DIR"
+
+
+@dataclass
+class _Entrada:
+    mtime_ns: int
+    subpastas: Tuple[str, ...]
+    validado_em: float = 0.0
+
+
+def _chave(pasta: str | Path) -> str:
+    return os.path.normcase(os.path.abspath(str(pasta)))
+
+
+def _listar_subpastas(pasta: str) -> Tuple[str, ...]:
+    nomes: List[str] = []
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            try:
+                if entrada.is_dir():
+                    nomes.append(entrada.name)
+            except OSError:
+                continue
+    return tuple(sorted(nomes, key=str.casefold))
+
+
+def caminho_indice_pastas() -> Optional[Path]:
+    base = (os.environ.get(ENV_INDICE_PASTAS_DIR) or "").strip()
+    if base.lower() in {"off", "0", "nao"}:
+        return None
+    pasta = (
+        Path(base)
+        if base
+        else Path(os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()) / "Martelo_Orcamentos_V2" / "indice_pastas"
+    )
+    return pasta / "pastas_producao.json"
+
+
+class IndicePastas:
+    def __init__(self) -> None:
+        self._entradas: Dict[str, _Entrada] = {}
+        self.lock = threading.RLock()
+        # > 0: durante estes segundos uma entrada é usada sem voltar ao disco
+        self.validade_s = 0.0
+        self.caminho: Optional[Path] = None
+        self.por_guardar = False
+        self._raizes: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._acordar = threading.Event()
+        self._forcar_proxima = False
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    # ---------------------------------------------------------------- consulta
+    def subpastas(
+        self, pasta: str | Path, *, revalidar: bool = False, forcar: bool = False
+    ) -> Optional[Tuple[str, ...]]:
+        """Nomes das subpastas de `pasta` (ordem alfabética); None se não existir ou não for acessível.
+
+        `revalidar` confirma o mtime mesmo dentro de `validade_s`; `forcar` lista sempre a pasta.
+        """
+        chave = _chave(pasta)
+        agora = time.monotonic()
+        with self.lock:
+            entrada = self._entradas.get(chave)
+            recente = self.validade_s and agora - entrada.validado_em < self.validade_s if entrada else False
+            if recente and not (revalidar or forcar):
+                return entrada.subpastas
+        try:
+            info = os.stat(pasta)
+            if not stat.S_ISDIR(info.st_mode):
+                raise NotADirectoryError(str(pasta))
+            if entrada is not None and not forcar and entrada.mtime_ns == info.st_mtime_ns:
+                with self.lock:
+                    entrada.validado_em = agora
+                return entrada.subpastas
+            nomes = _listar_subpastas(str(pasta))
+        except OSError:
+            with self.lock:
+                if self._entradas.pop(chave, None) is not None:
+                    self.por_guardar = True
+            return None
+        with self.lock:
+            self._entradas[chave] = _Entrada(info.st_mtime_ns, nomes, agora)
+            self.por_guardar = True
+        return nomes
+
+    def invalidar(self, pasta: str | Path) -> None:
+        """Esquece `pasta` e as pastas acima dela (ex.: depois de criar pastas pela aplicação)."""
+        caminho = Path(os.path.abspath(str(pasta)))
+        with self.lock:
+            for atual in (caminho, *caminho.parents):
+                if self._entradas.pop(_chave(atual), None) is not None:
+                    self.por_guardar = True
+
+    def limpar(self) -> None:
+        with self.lock:
+            self._entradas.clear()
+            self.por_guardar = True
+
+    def atualizar(self, raiz: str | Path, *, profundidade: int, forcar: bool = False) -> int:
+        """Revalida a subárvore de `raiz` até `profundidade` níveis abaixo; devolve as pastas percorridas."""
+        nivel: List[Path] = [Path(raiz)]
+        total = 0
+        for profundidade_atual in range(profundidade + 1):
+            seguinte: List[Path] = []
+            for pasta in nivel:
+                if self._parar.is_set():
+                    return total
+                nomes = self.subpastas(pasta, revalidar=True, forcar=forcar)
+                total += 1
+                if nomes and profundidade_atual < profundidade:
+                    seguinte.extend(pasta / nome for nome in nomes)
+            nivel = seguinte
+        return total
+
+    # ------------------------------------------------------- segundo plano
+    def iniciar(
+        self,
+        raizes: Iterable[str | Path],
+        *,
+        profundidade: int,
+        intervalo_s: float = 60.0,
+        caminho: Optional[Path] = None,
+    ) -> None:
+        """Percorre `raizes` em segundo plano a cada `intervalo_s` (chamadas repetidas só juntam raízes)."""
+        with self.lock:
+            for raiz in raizes:
+                self._raizes[str(raiz)] = max(profundidade, self._raizes.get(str(raiz), 0))
+            if self._thread is not None and self._thread.is_alive():
+                self._acordar.set()
+                return
+            if caminho is not None and self.caminho is None:
+                self.caminho = Path(caminho)
+                self._carregar()
+            self.validade_s = float(intervalo_s)
+            self._parar.clear()
+            self._thread = threading.Thread(
+                target=self._ciclo, args=(float(intervalo_s),), name="indice-pastas-producao", daemon=True
+            )
+            self._thread.start()
+
+    def pedir_atualizacao(self, *, forcar: bool = True) -> None:
+        """Acorda a thread para uma passagem imediata (com `forcar`, lista todas as pastas de novo)."""
+        with self.lock:
+            self._forcar_proxima = self._forcar_proxima or forcar
+        self._acordar.set()
+
+    def parar(self, timeout: Optional[float] = 5.0) -> None:
+        self._parar.set()
+        self._acordar.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.validade_s = 0.0
+
+    def em_execucao(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _ciclo(self, intervalo_s: float) -> None:
+        while not self._parar.is_set():
+            with self.lock:
+                raizes = dict(self._raizes)
+                forcar, self._forcar_proxima = self._forcar_proxima, False
+            for raiz, profundidade in raizes.items():
+                try:
+                    self.atualizar(raiz, profundidade=profundidade, forcar=forcar)
+                except Exception as exc:  # a thread nunca deve morrer por causa do servidor
+                    logger.warning("Falha ao atualizar o indice de pastas em %s: %s", raiz, exc)
+            try:
+                self.guardar_se_necessario()
+            except OSError as exc:
+                logger.warning("Nao foi possivel guardar o indice de pastas em %s: %s", self.caminho, exc)
+            self._acordar.wait(intervalo_s)
+            self._acordar.clear()
+
+    # ------------------------------------------------------------- persistência
+    def guardar_se_necessario(self) -> bool:
+        if self.caminho is None or not self.por_guardar:
+            return False
+        with self.lock:
+            dados = {
+                "versao_formato": VERSAO_FORMATO,
+                "pastas": [[chave, entrada.mtime_ns, list(entrada.subpastas)] for chave, entrada in self._entradas.items()],
+            }
+            self.por_guardar = False
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = self.caminho.with_suffix(self.caminho.suffix + ".tmp")
+        temporario.write_text(json.dumps(dados, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporario, self.caminho)
+        return True
+
+    def _carregar(self) -> None:
+        """Lê as entradas guardadas; cada uma é revalidada pelo mtime no primeiro uso."""
+        try:
+            dados = json.loads(self.caminho.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if not isinstance(dados, dict) or dados.get("versao_formato") != VERSAO_FORMATO:
+            return
+        try:
+            for chave, mtime_ns, nomes in dados.get("pastas") or ():
+                self._entradas.setdefault(str(chave), _Entrada(int(mtime_ns), tuple(str(nome) for nome in nomes)))
+        except (TypeError, ValueError):
+            return
+
+
+_INDICE = IndicePastas()
+
+
+def indice_pastas() -> IndicePastas:
+    return _INDICE
+
+
+def _guardar_ao_sair() -> None:
+    try:
+        _INDICE.guardar_se_necessario()
+    except Exception:
+        pass
+
+
+atexit.register(_guardar_ao_sair)
@@ -0,0 +1,568 @@
+"""Índice invertido em memória para pesquisa de texto normalizado.
+
+Cada documento (id inteiro) tem um texto normalizado por campo (ex.: "orcamento",
+"items"). Um termo encontra um documento quando é substring do texto desse
+campo — a mesma semântica de `ILIKE '%termo%'` sobre texto normalizado — mas a
+procura percorre apenas o vocabulário (palavras distintas) e as listas de
+documentos por palavra, em vez de todos os registos.
+
+Para a pesquisa aproximada, o vocabulário tem também um índice de trigramas de
+caracteres (`IndiceTrigramas`): as palavras parecidas com um termo saem das que
+partilham trigramas com ele e o difflib só corre sobre essa lista curta.
+
+O índice pode ser guardado/carregado em JSON. `SincronizacaoIndice` mantém um
+índice por base de dados alinhado com as tabelas de origem (marcas de
+`updated_at`, contagens e ids pendentes); a construção dos documentos fica a
+cargo de quem o usa.
+"""
+
+from __future__ import annotations
+
+import datetime
+import difflib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+VERSAO_FORMATO = 1
+# updated_at é preenchido quando a linha é escrita, não no commit: uma transação longa
+# (ex.: gravar o custeio noutro posto) confirma linhas com updated_at já abaixo da marca.
+# Enquanto o relógio do BD não passar a marca mais esta janela, a sincronização volta a
+# ler os registos da janela atrás da marca.
+JANELA_REVISAO = datetime.timedelta(minutes=10)
+# Transações mais longas do que a janela ficam cobertas pela reconstrução periódica
+# (o índice é persistido e sobreviveria a reinícios).
+RECONSTRUIR_APOS = datetime.timedelta(days=1)
+LOTE_IDS = 500
+
+
+def trigramas(palavra: str) -> Set[str]:
+    """Trigramas de caracteres da palavra, com "$" a marcar o início e o fim."""
+    texto = f"${palavra}$"
+    return {texto[pos : pos + 3] for pos in range(len(texto) - 2)}
+
+
+class IndiceTrigramas:
+    """Trigrama -> palavras que o contêm, para encontrar palavras parecidas com um termo.
+
+    Se `ratio` (difflib) >= cutoff > CUTOFF_MINIMO, a palavra partilha pelo menos um
+    trigrama com o termo e tem comprimento dentro dos limites de `_limites_comprimento`:
+    com a maior subsequência comum L >= cutoff*(la+lb)/2, a edição de uma na outra
+    preserva pelo menos 5L - 2(la+lb) > 0 trigramas. A lista curta nunca perde
+    palavras que o difflib aceitaria. Com cutoff <= 0.8 usa-se o vocabulário todo.
+    """
+
+    CUTOFF_MINIMO = 0.8
+
+    def __init__(self, palavras: Iterable[str] = ()) -> None:
+        self._por_trigrama: Dict[str, Set[str]] = defaultdict(set)
+        # nº de vezes que cada palavra foi adicionada (ex.: presente em vários campos)
+        self._contagem: Dict[str, int] = {}
+        for palavra in palavras:
+            self.adicionar(palavra)
+
+    def __len__(self) -> int:
+        return len(self._contagem)
+
+    def __contains__(self, palavra: object) -> bool:
+        return palavra in self._contagem
+
+    def adicionar(self, palavra: str) -> None:
+        contagem = self._contagem.get(palavra, 0)
+        self._contagem[palavra] = contagem + 1
+        if contagem:
+            return
+        for trigrama in trigramas(palavra):
+            self._por_trigrama[trigrama].add(palavra)
+
+    def remover(self, palavra: str) -> None:
+        contagem = self._contagem.get(palavra, 0)
+        if contagem > 1:
+            self._contagem[palavra] = contagem - 1
+            return
+        if not contagem:
+            return
+        del self._contagem[palavra]
+        for trigrama in trigramas(palavra):
+            palavras = self._por_trigrama.get(trigrama)
+            if palavras is None:
+                continue
+            palavras.discard(palavra)
+            if not palavras:
+                del self._por_trigrama[trigrama]
+
+    @staticmethod
+    def _limites_comprimento(termo: str, cutoff: float) -> Tuple[float, float]:
+        # ratio = 2M/(la+lb) <= 2*min(la, lb)/(la+lb)
+        tamanho = len(termo)
+        folga = 1e-9
+        return tamanho * cutoff / (2.0 - cutoff) - folga, tamanho * (2.0 - cutoff) / cutoff + folga
+
+    def candidatas(self, termo: str, cutoff: float) -> Set[str]:
+        """Lista curta de palavras que podem ter `ratio` >= cutoff com o termo."""
+        if not termo:
+            return set()
+        if cutoff <= self.CUTOFF_MINIMO:
+            return set(self._contagem)
+        minimo, maximo = self._limites_comprimento(termo, cutoff)
+        palavras: Set[str] = set()
+        for trigrama in trigramas(termo):
+            palavras.update(self._por_trigrama.get(trigrama, ()))
+        return {palavra for palavra in palavras if minimo <= len(palavra) <= maximo}
+
+    def proximas(self, termo: str, *, cutoff: float, n: Optional[int] = None) -> List[str]:
+        """Como `difflib.get_close_matches(termo, vocabulario, n, cutoff)` (mesma ordem)."""
+        candidatas = self.candidatas(termo, cutoff)
+        if not candidatas:
+            return []
+        return difflib.get_close_matches(termo, candidatas, n=n or len(candidatas), cutoff=cutoff)
+
+
+class IndiceTexto:
+    def __init__(self, campos: Sequence[str], caminho: Optional[Path] = None) -> None:
+        self.campos: Tuple[str, ...] = tuple(campos)
+        self.caminho = Path(caminho) if caminho else None
+        self.por_guardar = False
+        self._guardado_em = 0.0
+        self.documentos: Dict[int, Dict[str, str]] = {}
+        self.meta: Dict[int, Any] = {}
+        self.estado: Dict[str, Any] = {}
+        # ids a reler na próxima sincronização (alterações locais ainda não confirmadas)
+        self.pendentes: Set[int] = set()
+        self.lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, Set[int]]] = {campo: defaultdict(set) for campo in self.campos}
+        self._cache_palavras: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        self._trigramas = IndiceTrigramas()
+
+    def __len__(self) -> int:
+        return len(self.documentos)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.documentos
+
+    # ------------------------------------------------------------------ escrita
+    def definir(self, doc_id: int, textos: Mapping[str, str], meta: Any = None) -> bool:
+        """Substitui os textos (já normalizados) do documento. Devolve True se mudou algo."""
+        doc_id = int(doc_id)
+        novo = {campo: str(textos.get(campo) or "") for campo in self.campos}
+        antigo = self.documentos.get(doc_id)
+        self.meta[doc_id] = meta
+        if antigo == novo:
+            return False
+        if antigo is not None:
+            self._desindexar(doc_id, antigo)
+        self.documentos[doc_id] = novo
+        for campo, texto in novo.items():
+            postings = self._postings[campo]
+            for palavra in set(texto.split()):
+                if palavra not in postings:
+                    self._trigramas.adicionar(palavra)
+                postings[palavra].add(doc_id)
+        self._cache_palavras.clear()
+        self.por_guardar = True
+        return True
+
+    def remover(self, doc_id: int) -> bool:
+        doc_id = int(doc_id)
+        antigo = self.documentos.pop(doc_id, None)
+        self.meta.pop(doc_id, None)
+        if antigo is None:
+            return False
+        self._desindexar(doc_id, antigo)
+        self._cache_palavras.clear()
+        self.por_guardar = True
+        return True
+
+    def limpar(self) -> None:
+        self.documentos.clear()
+        self.meta.clear()
+        self.estado.clear()
+        self.pendentes.clear()
+        self._postings = {campo: defaultdict(set) for campo in self.campos}
+        self._cache_palavras.clear()
+        self._trigramas = IndiceTrigramas()
+        self.por_guardar = True
+
+    def _desindexar(self, doc_id: int, textos: Mapping[str, str]) -> None:
+        for campo, texto in textos.items():
+            postings = self._postings[campo]
+            for palavra in set(texto.split()):
+                docs = postings.get(palavra)
+                if docs is None:
+                    continue
+                docs.discard(doc_id)
+                if not docs:
+                    del postings[palavra]
+                    self._trigramas.remover(palavra)
+
+    # ------------------------------------------------------------------ leitura
+    def texto(self, doc_id: int, campo: str) -> str:
+        return (self.documentos.get(int(doc_id)) or {}).get(campo, "")
+
+    def secoes(self, doc_ids: Iterable[int], campos: Sequence[str] = ()) -> Dict[int, Dict[str, str]]:
+        """`meta["secoes"]` de cada documento indexado, mais o texto dos `campos` indicados."""
+        resultado: Dict[int, Dict[str, str]] = {}
+        for doc_id in doc_ids:
+            doc_id = int(doc_id)
+            meta = self.meta.get(doc_id)
+            if not meta:
+                continue
+            resultado[doc_id] = {**meta["secoes"], **{campo: self.texto(doc_id, campo) for campo in campos}}
+        return resultado
+
+    def vocabulario(self, campos: Optional[Iterable[str]] = None) -> Set[str]:
+        palavras: Set[str] = set()
+        for campo in campos or self.campos:
+            palavras.update(self._postings[campo])
+        return palavras
+
+    def _palavras_com(self, campo: str, parte: str) -> Tuple[str, ...]:
+        chave = (campo, parte)
+        palavras = self._cache_palavras.get(chave)
+        if palavras is None:
+            palavras = tuple(palavra for palavra in self._postings[campo] if parte in palavra)
+            self._cache_palavras[chave] = palavras
+        return palavras
+
+    def procurar(self, termo: str, campos: Optional[Iterable[str]] = None) -> Set[int]:
+        """Documentos cujo texto (num dos `campos`) contém `termo` (normalizado)."""
+        partes = termo.split()
+        if not partes:
+            return set()
+        encontrados: Set[int] = set()
+        for campo in campos or self.campos:
+            postings = self._postings[campo]
+            docs: Optional[Set[int]] = None
+            for parte in partes:
+                docs_parte: Set[int] = set()
+                for palavra in self._palavras_com(campo, parte):
+                    docs_parte.update(postings[palavra])
+                docs = docs_parte if docs is None else docs & docs_parte
+                if not docs:
+                    break
+            if not docs:
+                continue
+            if len(partes) > 1:
+                # frase: as palavras existem, confirmar que aparecem seguidas
+                docs = {doc_id for doc_id in docs if termo in self.documentos[doc_id][campo]}
+            encontrados.update(docs)
+        return encontrados
+
+    def documentos_com_palavras(self, palavras: Iterable[str], campos: Optional[Iterable[str]] = None) -> Dict[str, Set[int]]:
+        campos = tuple(campos or self.campos)
+        resultado: Dict[str, Set[int]] = {}
+        for palavra in palavras:
+            docs: Set[int] = set()
+            for campo in campos:
+                docs.update(self._postings[campo].get(palavra, ()))
+            if docs:
+                resultado[palavra] = docs
+        return resultado
+
+    def palavras_proximas(
+        self,
+        termo: str,
+        *,
+        cutoff: float,
+        campos: Optional[Iterable[str]] = None,
+        n: Optional[int] = None,
+    ) -> List[str]:
+        """Palavras do vocabulário com semelhança (difflib) >= cutoff ao termo, da mais
+        parecida para a menos parecida (como `difflib.get_close_matches`)."""
+        if not termo:
+            return []
+        candidatas = self._trigramas.candidatas(termo, cutoff)
+        campos = tuple(campos or self.campos)
+        if campos != self.campos:
+            candidatas = {palavra for palavra in candidatas if any(palavra in self._postings[campo] for campo in campos)}
+        if not candidatas:
+            return []
+        return difflib.get_close_matches(termo, candidatas, n=n or len(candidatas), cutoff=cutoff)
+
+    def pontuacao_aproximada(
+        self,
+        termos: Sequence[str],
+        *,
+        cutoff: float,
+        alternativas: Optional[Mapping[str, Sequence[str]]] = None,
+        tamanho_minimo: int = 4,
+    ) -> Dict[int, float]:
+        """Documentos em que todos os termos aparecem (1.0), aparecem por alternativa
+        (0.95) ou têm uma palavra próxima (ratio difflib); devolve a soma por documento.
+
+        Equivale a testar cada termo contra as palavras do texto de cada documento
+        (`difflib.get_close_matches(termo, palavras, n=1, cutoff)`), mas as palavras
+        próximas saem do vocabulário uma vez por termo.
+        """
+        if not termos:
+            return {doc_id: 0.0 for doc_id in self.documentos}
+        alternativas = alternativas or {}
+        pontuacoes: Optional[Dict[int, float]] = None
+        for termo in termos:
+            do_termo: Dict[int, float] = {}
+            if len(termo) >= tamanho_minimo:
+                # por documento vale a palavra mais parecida (a primeira da lista ordenada)
+                for palavra in self.palavras_proximas(termo, cutoff=cutoff):
+                    ratio = difflib.SequenceMatcher(None, termo, palavra).ratio()
+                    for docs in self.documentos_com_palavras([palavra]).values():
+                        for doc_id in docs:
+                            do_termo.setdefault(doc_id, ratio)
+            for alternativa in alternativas.get(termo, ()):
+                for doc_id in self.procurar(alternativa):
+                    do_termo[doc_id] = 0.95
+            for doc_id in self.procurar(termo):
+                do_termo[doc_id] = 1.0
+            if pontuacoes is None:
+                pontuacoes = do_termo
+            else:
+                pontuacoes = {doc_id: pontuacao + do_termo[doc_id] for doc_id, pontuacao in pontuacoes.items() if doc_id in do_termo}
+            if not pontuacoes:
+                return {}
+        return pontuacoes or {}
+
+    # ------------------------------------------------------------- persistência
+    def para_dict(self) -> Dict[str, Any]:
+        return {
+            "versao_formato": VERSAO_FORMATO,
+            "campos": list(self.campos),
+            "estado": self.estado,
+            "documentos": [
+                [doc_id, [textos[campo] for campo in self.campos], self.meta.get(doc_id)]
+                for doc_id, textos in self.documentos.items()
+            ],
+        }
+
+    @classmethod
+    def de_dict(cls, dados: Mapping[str, Any]) -> "IndiceTexto":
+        indice = cls(dados["campos"])
+        indice.estado = dict(dados.get("estado") or {})
+        for doc_id, textos, meta in dados.get("documentos") or ():
+            indice.definir(doc_id, dict(zip(indice.campos, textos)), meta)
+        return indice
+
+    def guardar(self, caminho: Optional[Path] = None) -> None:
+        caminho = Path(caminho or self.caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho.with_suffix(caminho.suffix + ".tmp")
+        with self.lock:
+            temporario.write_text(json.dumps(self.para_dict(), ensure_ascii=False), encoding="utf-8")
+            os.replace(temporario, caminho)
+            self.por_guardar = False
+            self._guardado_em = time.monotonic()
+
+    def guardar_se_necessario(self, intervalo_s: float = 0.0) -> bool:
+        """Guarda em `caminho` se houver alterações e já passou `intervalo_s` desde a última escrita."""
+        if self.caminho is None or not self.por_guardar:
+            return False
+        if self._guardado_em and time.monotonic() - self._guardado_em < intervalo_s:
+            return False
+        self.guardar()
+        return True
+
+    @classmethod
+    def carregar(cls, caminho: Path, campos: Sequence[str]) -> Optional["IndiceTexto"]:
+        """Lê um índice guardado; None se não existir, estiver corrompido ou tiver outros campos."""
+        try:
+            dados = json.loads(Path(caminho).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(dados, dict) or dados.get("versao_formato") != VERSAO_FORMATO:
+            return None
+        if list(dados.get("campos") or ()) != list(campos):
+            return None
+        try:
+            indice = cls.de_dict(dados)
+        except (KeyError, TypeError, ValueError):
+            return None
+        indice.caminho = Path(caminho)
+        indice.por_guardar = False
+        return indice
+
+
+
+# --------------------------------------------------------------- sincronização
+def engine_da_sessao(session: Session) -> Any:
+    bind = session.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def lotes_ids(ids: Iterable[int], tamanho: int = LOTE_IDS) -> List[List[int]]:
+    ordenados = sorted({int(doc_id) for doc_id in ids})
+    return [ordenados[pos : pos + tamanho] for pos in range(0, len(ordenados), tamanho)]
+
+
+def _sem_fuso(valor: Any) -> Any:
+    return valor.replace(tzinfo=None) if isinstance(valor, datetime.datetime) else valor
+
+
+class SincronizacaoIndice:
+    """Um `IndiceTexto` por base de dados, alinhado com as tabelas de origem a cada pedido.
+
+    - `id_documento`: coluna com o id dos documentos (ex.: `Orcamento.id`); a contagem
+      da sua tabela diferente do nº de documentos obriga a comparar ids (apagados noutro posto).
+    - `tabelas`: (nome, coluna updated_at, select dos ids de documento afetados); os
+      registos com updated_at acima da marca guardada (menos `JANELA_REVISAO`) são relidos.
+    - `reindexar(session, indice, ids)`: relê os documentos indicados (todos se None) e
+      remove do índice os que já não existem.
+    - `contagens` / `divergentes`: contagens extra lidas na mesma consulta e função que,
+      com esses valores, devolve mais ids a reler (ex.: nº de items por orçamento).
+    - `formato`: mudar o valor obriga a reconstruir índices guardados.
+    - `caminho(engine)`: ficheiro onde o índice é persistido (None = só em memória).
+    """
+
+    def __init__(
+        self,
+        *,
+        campos: Sequence[str],
+        id_documento: Any,
+        tabelas: Sequence[Tuple[str, Any, Any]],
+        reindexar: Callable[[Session, IndiceTexto, Optional[Set[int]]], None],
+        contagens: Optional[Mapping[str, Any]] = None,
+        divergentes: Optional[Callable[[Session, IndiceTexto, Mapping[str, int]], Set[int]]] = None,
+        formato: int = 1,
+        caminho: Optional[Callable[[Any], Optional[Path]]] = None,
+        intervalo_guardar_s: float = 30.0,
+    ) -> None:
+        self.campos = tuple(campos)
+        self.id_documento = id_documento
+        self.tabelas = tuple(tabelas)
+        self.reindexar = reindexar
+        self.contagens = dict(contagens or {})
+        self.divergentes = divergentes
+        self.formato = formato
+        self.caminho = caminho
+        self.intervalo_guardar_s = intervalo_guardar_s
+        self._indices: "weakref.WeakKeyDictionary[Any, IndiceTexto]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def existente(self, session: Session) -> Optional[IndiceTexto]:
+        """Índice já criado para o BD da sessão (sem o criar nem sincronizar)."""
+        try:
+            engine = engine_da_sessao(session)
+        except Exception:
+            return None
+        with self._lock:
+            return self._indices.get(engine)
+
+    def indices(self) -> List[IndiceTexto]:
+        with self._lock:
+            return list(self._indices.values())
+
+    def marcar(self, session: Session, ids: Iterable[Optional[int]]) -> None:
+        """Pede a releitura dos documentos indicados na próxima sincronização (se já houver índice)."""
+        indice = self.existente(session)
+        if indice is None:
+            return
+        with indice.lock:
+            indice.pendentes.update(int(doc_id) for doc_id in ids if doc_id is not None)
+
+    def indice(self, session: Session) -> IndiceTexto:
+        """Índice do BD da sessão, sincronizado com o estado atual."""
+        engine = engine_da_sessao(session)
+        with self._lock:
+            indice = self._indices.get(engine)
+            if indice is None:
+                caminho = self.caminho(engine) if self.caminho else None
+                indice = (IndiceTexto.carregar(caminho, self.campos) if caminho else None) or IndiceTexto(
+                    self.campos, caminho
+                )
+                self._indices[engine] = indice
+        with indice.lock:
+            self._sincronizar(session, indice)
+        return indice
+
+    def reconstruir(self, session: Session) -> IndiceTexto:
+        """Descarta o índice atual e volta a indexar todos os documentos."""
+        indice = self.existente(session)
+        if indice is not None:
+            with indice.lock:
+                indice.limpar()
+        return self.indice(session)
+
+    def guardar_todos(self) -> None:
+        for indice in self.indices():
+            if indice.caminho is None or not indice.caminho.parent.is_dir():
+                continue
+            try:
+                indice.guardar_se_necessario()
+            except Exception:
+                pass
+
+    def _ids_alterados(
+        self, session: Session, indice: IndiceTexto, maximos: Mapping[str, Any], agora: Any
+    ) -> Set[int]:
+        anteriores = indice.estado.get("marcas") or {}
+        consultas = []
+        for nome, coluna, stmt in self.tabelas:
+            maximo = maximos.get(nome)
+            if maximo is None:
+                continue  # tabela vazia
+            desde = datetime.datetime.fromisoformat(anteriores[nome]) if anteriores.get(nome) else None
+            if desde is None:
+                consultas.append(stmt)
+                continue
+            if not isinstance(agora, datetime.datetime) or agora - JANELA_REVISAO < desde:
+                desde -= JANELA_REVISAO
+            if maximo > desde:
+                consultas.append(stmt.where(coluna > desde))
+        if not consultas:
+            return set()
+        stmt = consultas[0] if len(consultas) == 1 else union(*consultas)
+        return {int(doc_id) for doc_id in session.execute(stmt).scalars() if doc_id is not None}
+
+    def _precisa_reconstruir(self, indice: IndiceTexto, agora: Any) -> bool:
+        if not indice.estado.get("construido") or indice.estado.get("formato") != self.formato:
+            return True
+        if not isinstance(agora, datetime.datetime):
+            return False
+        construido_em = indice.estado.get("construido_em")
+        return not construido_em or agora - datetime.datetime.fromisoformat(construido_em) > RECONSTRUIR_APOS
+
+    def _sincronizar(self, session: Session, indice: IndiceTexto) -> None:
+        nomes = [nome for nome, _, _ in self.tabelas]
+        valores = session.execute(
+            select(
+                func.now(),
+                select(func.count()).select_from(self.id_documento.table).scalar_subquery(),
+                *(select(func.max(coluna)).scalar_subquery() for _, coluna, _ in self.tabelas),
+                *(stmt.scalar_subquery() for stmt in self.contagens.values()),
+            )
+        ).one()
+        agora, total = _sem_fuso(valores[0]), int(valores[1] or 0)
+        maximos = {nome: _sem_fuso(valor) for nome, valor in zip(nomes, valores[2 : 2 + len(nomes)])}
+        contagens = {nome: int(valor or 0) for nome, valor in zip(self.contagens, valores[2 + len(nomes) :])}
+        if self._precisa_reconstruir(indice, agora):
+            indice.limpar()
+            self.reindexar(session, indice, None)
+            indice.estado.update(construido=True, formato=self.formato)
+            if isinstance(agora, datetime.datetime):
+                indice.estado["construido_em"] = agora.isoformat()
+        else:
+            pendentes = set(indice.pendentes)
+            ids = pendentes | self._ids_alterados(session, indice, maximos, agora)
+            if total != len(indice):
+                ids_bd = {int(doc_id) for doc_id in session.execute(select(self.id_documento)).scalars()}
+                ids.update(ids_bd.symmetric_difference(indice.documentos))
+            if self.divergentes is not None:
+                ids |= self.divergentes(session, indice, contagens)
+            if ids:
+                self.reindexar(session, indice, ids)
+            indice.pendentes.difference_update(pendentes)
+        indice.estado["marcas"] = {
+            nome: (valor.isoformat() if isinstance(valor, datetime.datetime) else valor) for nome, valor in maximos.items()
+        }
+        try:
+            indice.guardar_se_necessario(self.intervalo_guardar_s)
+        except OSError as exc:
+            logger.warning("Nao foi possivel guardar o indice de pesquisa em %s: %s", indice.caminho, exc)
@@ -15,6 +15,7 @@ from sqlalchemy import cast, select, or_, String
 from sqlalchemy.orm import Session
 
 from ..models.materia_prima import MateriaPrima, MateriaPrimaPreference
+from ..services import dados_referencia as svc_referencia
 from ..services.settings import get_setting, set_setting
 
 # Config keys / defaults
@@ -379,6 +380,7 @@ def import_materias_primas(db: Session, base_path: Optional[str] = None) -> int:
             inserted += 1
 
         db.flush()
+        svc_referencia.incrementar_versao(db)
         return inserted
     finally:
         try:
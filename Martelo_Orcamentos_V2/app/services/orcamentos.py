@@ -1,21 +1,52 @@
-﻿import datetime
+﻿import atexit
+import datetime
 import json
 import difflib
+import hashlib
 import logging
+import os
 import re
+import tempfile
 import unicodedata
+import weakref
+from collections import defaultdict
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import List, Optional, Sequence
-
-from sqlalchemy import String, cast, select, func, and_, or_, delete
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    MetaData,
+    String,
+    Table,
+    and_,
+    case,
+    cast,
+    delete,
+    event,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import Session
 
 from ..utils.date_utils import today_storage
+from .indice_texto import LOTE_IDS, IndiceTexto, SincronizacaoIndice, engine_da_sessao, lotes_ids
 
 from ..models import (
     Orcamento,
+    OrcamentoContador,
     OrcamentoItem,
+    OrcamentoPesquisa,
     Client,
     ClienteTemporario,
     User,
@@ -43,7 +74,28 @@ logger = logging.getLogger(__name__)
 PRECO_MANUAL_KEY = "preco_manual"
 TEMP_CLIENT_ID_KEY = "temp_client_id"
 TEMP_CLIENT_NAME_KEY = "temp_client_nome"
-ORCAMENTO_FUZZY_CANDIDATE_LIMIT = 5000
+# Linhas por pagina na lista de orcamentos (ver `list_orcamentos_pagina`).
+ORCAMENTOS_POR_PAGINA = 200
+
+# Indice de pesquisa (ver `indice_pesquisa_orcamentos`). Pasta do ficheiro
+# persistido: vazio = %LOCALAPPDATA%/Martelo_Orcamentos_V2/indice_pesquisa; "off" desliga.
+ENV_INDICE_PESQUISA_DIR = "MARTELO_INDICE_PESQUISA_DIR"
+_CAMPOS_INDICE_PESQUISA = ("orcamento", "items")
+_INTERVALO_GUARDAR_INDICE_S = 30.0
+# Muda quando o conteudo dos documentos/meta do indice muda (obriga a reconstruir).
+_FORMATO_INDICE_PESQUISA = 4
+_TABELA_PESQUISA_EXISTE: "weakref.WeakKeyDictionary[object, bool]" = weakref.WeakKeyDictionary()
+
+# Secoes da ordenacao dos resultados: (coluna de OrcamentoPesquisa, rotulo, peso).
+_SECOES_PESQUISA = (
+    ("referencia", "Referencia", 8.0),
+    ("cliente", "Cliente", 7.0),
+    ("obra", "Obra", 6.0),
+    ("descricao", "Descricao", 5.0),
+    ("items", "Item", 4.5),
+    ("info", "Info/Localizacao", 3.0),
+    ("estado", "Estado/Utilizador/Data", 2.0),
+)
 
 _SEARCH_SYNONYMS_ORCAMENTOS: dict[str, tuple[str, ...]] = {
     "armario": ("roupeiro", "closet"),
@@ -304,64 +356,70 @@ def _select_orcamentos():
     )
 
 
-def _rows_from_stmt(db: Session, stmt) -> List[OrcamentoResumo]:
-    rows = db.execute(stmt).all()
-    extras_list: List[dict] = []
-    temp_ids: set[int] = set()
-    for row in rows:
-        extras_raw = getattr(row, "extras", None)
-        extras = {}
-        if isinstance(extras_raw, dict):
-            extras = extras_raw
-        elif extras_raw not in (None, ""):
-            try:
-                extras = json.loads(extras_raw)
-            except Exception:
-                extras = {}
-        extras_list.append(extras if isinstance(extras, dict) else {})
-        temp_id_val = extras.get(TEMP_CLIENT_ID_KEY) if isinstance(extras, dict) else None
-        if temp_id_val not in (None, ""):
-            try:
-                temp_ids.add(int(temp_id_val))
-            except Exception:
-                pass
+def _extras_dict(extras_raw) -> dict:
+    if isinstance(extras_raw, dict):
+        return extras_raw
+    if extras_raw in (None, ""):
+        return {}
+    try:
+        extras = json.loads(extras_raw)
+    except Exception:
+        return {}
+    return extras if isinstance(extras, dict) else {}
+
+
+def _temp_client_id_de_extras(extras: dict) -> Optional[int]:
+    temp_id_val = extras.get(TEMP_CLIENT_ID_KEY)
+    if temp_id_val in (None, ""):
+        return None
+    try:
+        return int(temp_id_val)
+    except Exception:
+        return None
+
 
+def _temp_simplex_por_id(db: Session, temp_ids: set[int]) -> dict[int, str]:
     temp_simplex_map: dict[int, str] = {}
-    if temp_ids:
-        try:
-            temps = (
-                db.execute(select(ClienteTemporario).where(ClienteTemporario.id.in_(temp_ids)))
-                .scalars()
-                .all()
-            )
-        except Exception:
-            temps = []
-        for temp in temps:
-            name = str(getattr(temp, "nome_simplex", None) or getattr(temp, "nome", None) or "").strip()
-            if name:
-                temp_simplex_map[int(getattr(temp, "id", 0) or 0)] = name
+    if not temp_ids:
+        return temp_simplex_map
+    try:
+        temps = (
+            db.execute(select(ClienteTemporario).where(ClienteTemporario.id.in_(temp_ids)))
+            .scalars()
+            .all()
+        )
+    except Exception:
+        temps = []
+    for temp in temps:
+        name = str(getattr(temp, "nome_simplex", None) or getattr(temp, "nome", None) or "").strip()
+        if name:
+            temp_simplex_map[int(getattr(temp, "id", 0) or 0)] = name
+    return temp_simplex_map
+
+
+def _cliente_da_linha(row, extras: dict, temp_simplex_map: dict[int, str]) -> str:
+    """Nome mostrado na coluna Cliente: cliente temporario (simplex/nome) ou simplex/nome do cliente."""
+    temp_simplex = temp_simplex_map.get(_temp_client_id_de_extras(extras) or -1, "")
+    if temp_simplex:
+        return temp_simplex
+    temp_nome = str(extras.get(TEMP_CLIENT_NAME_KEY) or "").strip()
+    if temp_nome:
+        return temp_nome
+    return (row.cliente_simplex or row.cliente_nome or "").strip()
+
+
+def _rows_from_stmt(db: Session, stmt) -> List[OrcamentoResumo]:
+    rows = db.execute(stmt).all()
+    extras_list = [_extras_dict(getattr(row, "extras", None)) for row in rows]
+    temp_ids = {temp_id for temp_id in map(_temp_client_id_de_extras, extras_list) if temp_id is not None}
+    temp_simplex_map = _temp_simplex_por_id(db, temp_ids)
     parsed: List[OrcamentoResumo] = []
     for row, extras in zip(rows, extras_list):
         legacy_preco_manual = bool(extras.get(PRECO_MANUAL_KEY)) if isinstance(extras, dict) else False
         preco_total_manual = 1 if bool(getattr(row, "preco_total_manual", 0) or legacy_preco_manual) else 0
-        temp_nome = ""
-        temp_id = None
-        if isinstance(extras, dict):
-            temp_nome = str(extras.get(TEMP_CLIENT_NAME_KEY) or "").strip()
-            temp_id_val = extras.get(TEMP_CLIENT_ID_KEY)
-            if temp_id_val not in (None, ""):
-                try:
-                    temp_id = int(temp_id_val)
-                except Exception:
-                    temp_id = None
-        temp_simplex = temp_simplex_map.get(temp_id or -1, "")
-        cliente_base = (row.cliente_simplex or row.cliente_nome or "").strip()
-        if temp_simplex:
-            cliente = temp_simplex
-        elif temp_nome:
-            cliente = temp_nome
-        else:
-            cliente = cliente_base
+        temp_nome = str(extras.get(TEMP_CLIENT_NAME_KEY) or "").strip()
+        temp_id = _temp_client_id_de_extras(extras)
+        cliente = _cliente_da_linha(row, extras, temp_simplex_map)
         parsed.append(
             OrcamentoResumo(
                 id=row.id,
@@ -397,6 +455,140 @@ def list_orcamentos(db: Session) -> List[OrcamentoResumo]:
     return _rows_from_stmt(db, stmt)
 
 
+@dataclass
+class PaginaOrcamentos:
+    rows: List[OrcamentoResumo]
+    # (ano, num_orcamento, versao) da ultima linha, tal como estao no BD; None = nao ha mais
+    seguinte: Optional[tuple[str, str, str]]
+
+
+def _texto_filtro(valor: Optional[str]) -> str:
+    texto = (valor or "").strip().lower()
+    return "" if texto == "todos" else texto
+
+
+def _temp_client_id_expr():
+    return Orcamento.extras[TEMP_CLIENT_ID_KEY]
+
+
+def _temp_client_nome_expr():
+    return Orcamento.extras[TEMP_CLIENT_NAME_KEY].as_string()
+
+
+def _filtrar_orcamentos(db: Session, stmt, *, estado: str = "", cliente: str = "", utilizador: str = ""):
+    """Filtros da lista (texto contido, sem distinguir maiusculas) no WHERE de `_select_orcamentos`.
+
+    O cliente mostrado pode vir do cliente temporario (ver `_cliente_da_linha`): o WHERE aceita
+    qualquer um dos nomes possiveis e a coluna final e confirmada ao montar a lista.
+    """
+    estado, cliente, utilizador = _texto_filtro(estado), _texto_filtro(cliente), _texto_filtro(utilizador)
+    if estado:
+        stmt = stmt.where(func.lower(Orcamento.status).contains(estado, autoescape=True))
+    if utilizador:
+        stmt = stmt.where(func.lower(User.username).contains(utilizador, autoescape=True))
+    if cliente:
+        condicoes = [
+            func.lower(Client.nome_simplex).contains(cliente, autoescape=True),
+            func.lower(Client.nome).contains(cliente, autoescape=True),
+            func.lower(_temp_client_nome_expr()).contains(cliente, autoescape=True),
+        ]
+        temp_ids = db.execute(
+            select(ClienteTemporario.id).where(
+                or_(
+                    func.lower(ClienteTemporario.nome_simplex).contains(cliente, autoescape=True),
+                    func.lower(ClienteTemporario.nome).contains(cliente, autoescape=True),
+                )
+            )
+        ).scalars().all()
+        if temp_ids:
+            temp_id = _temp_client_id_expr()
+            condicoes.append(temp_id.as_integer().in_(temp_ids))
+            condicoes.append(temp_id.as_string().in_([str(valor) for valor in temp_ids]))
+        stmt = stmt.where(or_(*condicoes))
+    return stmt
+
+
+def list_orcamentos_pagina(
+    db: Session,
+    *,
+    depois_de: Optional[Sequence[str]] = None,
+    limite: int = ORCAMENTOS_POR_PAGINA,
+    estado: str = "",
+    cliente: str = "",
+    utilizador: str = "",
+) -> PaginaOrcamentos:
+    """Uma pagina de `list_orcamentos` (mesma ordem), por keyset sobre
+    (ano, num_orcamento, versao): `depois_de` e o `seguinte` da pagina anterior.
+    `estado`/`cliente`/`utilizador` filtram no BD (ver `_filtrar_orcamentos`)."""
+    stmt = _filtrar_orcamentos(db, _select_orcamentos(), estado=estado, cliente=cliente, utilizador=utilizador)
+    if depois_de is not None:
+        ano, num_orcamento, versao = depois_de
+        stmt = stmt.where(
+            or_(
+                Orcamento.ano < ano,
+                and_(
+                    Orcamento.ano == ano,
+                    or_(
+                        Orcamento.num_orcamento < num_orcamento,
+                        and_(Orcamento.num_orcamento == num_orcamento, Orcamento.versao > versao),
+                    ),
+                ),
+            )
+        )
+    limite = max(1, int(limite))
+    stmt = stmt.order_by(Orcamento.ano.desc(), Orcamento.num_orcamento.desc(), Orcamento.versao).limit(limite + 1)
+    rows = _rows_from_stmt(db, stmt)
+    if len(rows) <= limite:
+        return PaginaOrcamentos(rows=rows, seguinte=None)
+    rows = rows[:limite]
+    # a versao de OrcamentoResumo vem formatada; a chave tem de ser a do BD
+    chave = db.execute(
+        select(Orcamento.ano, Orcamento.num_orcamento, Orcamento.versao).where(Orcamento.id == rows[-1].id)
+    ).one_or_none()
+    if chave is None:
+        chave = (rows[-1].ano, rows[-1].num_orcamento, rows[-1].versao)
+    return PaginaOrcamentos(rows=rows, seguinte=tuple(chave))
+
+
+def list_orcamento_filter_values(db: Session) -> tuple[list[str], list[str], list[str]]:
+    """Estados, clientes e utilizadores de todos os orcamentos (para os filtros da lista),
+    com SELECT DISTINCT em vez de carregar as linhas."""
+    estados = db.execute(
+        select(Orcamento.status).where(Orcamento.status.is_not(None), Orcamento.status != "").distinct()
+    ).scalars().all()
+    users = db.execute(
+        select(User.username).join(Orcamento, Orcamento.created_by == User.id).where(User.username != "").distinct()
+    ).scalars().all()
+    # o cliente temporario (se houver) substitui o cliente: so as duas chaves de extras entram
+    # no DISTINCT e os nomes dos temporarios vem de uma consulta aos ids distintos
+    clientes_rows = db.execute(
+        select(
+            Client.nome_simplex.label("cliente_simplex"),
+            Client.nome.label("cliente_nome"),
+            _temp_client_id_expr().as_string().label("temp_id"),
+            _temp_client_nome_expr().label("temp_nome"),
+        )
+        .select_from(Orcamento)
+        .outerjoin(Client, Orcamento.client_id == Client.id)
+        .distinct()
+    ).all()
+    extras_list = [
+        {TEMP_CLIENT_ID_KEY: row.temp_id, TEMP_CLIENT_NAME_KEY: row.temp_nome} for row in clientes_rows
+    ]
+    temp_ids = {temp_id for temp_id in map(_temp_client_id_de_extras, extras_list) if temp_id is not None}
+    temp_simplex_map = _temp_simplex_por_id(db, temp_ids)
+    clientes = {_cliente_da_linha(row, extras, temp_simplex_map) for row, extras in zip(clientes_rows, extras_list)}
+    return (
+        sorted({str(v) for v in estados if v}),
+        sorted(v for v in clientes if v),
+        sorted({str(v) for v in users if v}),
+    )
+
+
+def count_orcamentos(db: Session) -> int:
+    return int(db.execute(select(func.count(Orcamento.id))).scalar_one() or 0)
+
+
 def get_orcamento(db: Session, orc_id: int) -> Optional[Orcamento]:
     return db.get(Orcamento, orc_id)
 
@@ -438,8 +630,10 @@ def create_orcamento(
         status="Falta Orcamentar",
         created_by=created_by,
     )
+    registar_num_orcamento(db, o.ano, o.num_orcamento, versao)
     db.add(o)
     db.flush()
+    _marcar_indice_pesquisa(db, o.id)
     return o
 
 
@@ -448,24 +642,76 @@ def delete_orcamento(db: Session, orc_id: int) -> None:
     if not o:
         return
     db.delete(o)
+    _marcar_indice_pesquisa(db, orc_id)
 
 
 def list_items(db: Session, orc_id: int, versao: str | None = None) -> List[OrcamentoItem]:
     stmt = select(OrcamentoItem).where(OrcamentoItem.id_orcamento == orc_id)
     if versao:
         stmt = stmt.where(OrcamentoItem.versao == versao)
-    return db.execute(stmt.order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)).scalars().all()
+    rows = db.execute(stmt.order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)).scalars().all()
+    numerar_items(rows)
+    return rows
+
+
+def numerar_items(rows: Sequence[OrcamentoItem]) -> None:
+    """
+    Numeracao visivel (coluna Item 1..N por versao) calculada na leitura a partir da ordem das linhas.
+    Fica em `numero_visivel` (nao e coluna): a coluna `item` nao e tocada e os restantes items nao
+    sao reescritos ao mover/eliminar. Um rotulo escrito pelo utilizador (nao numerico) e mantido.
+    """
+    posicoes: dict = defaultdict(int)
+    for row in rows:
+        posicoes[row.versao] += 1
+        row.numero_visivel = rotulo_item(row.item) or str(posicoes[row.versao])
+
+
+def rotulo_item(valor: Optional[str]) -> Optional[str]:
+    """Valor de `item` escrito pelo utilizador; None se vazio ou so a numeracao automatica."""
+    texto = str(valor or "").strip()
+    return texto if texto and not texto.isdigit() else None
+
+
+def numero_item(db: Session, item: OrcamentoItem) -> int:
+    """Posicao (1..N) do item na sua versao, pela mesma ordem de `list_items`."""
+    return int(
+        db.execute(
+            select(func.count(OrcamentoItem.id_item)).where(
+                OrcamentoItem.id_orcamento == item.id_orcamento,
+                OrcamentoItem.versao == item.versao,
+                or_(
+                    OrcamentoItem.item_ord < item.item_ord,
+                    and_(OrcamentoItem.item_ord == item.item_ord, OrcamentoItem.id_item <= item.id_item),
+                ),
+            )
+        ).scalar()
+        or 1
+    )
+
+
+# item_ord e esparso (passos de ITEM_ORD_PASSO): inserir/mover um item so escreve essa linha;
+# a numeracao 1..N visivel e calculada na leitura (`numerar_items` / `numero_item`).
+ITEM_ORD_PASSO = 1024
 
 
 def _next_item_ord(db: Session, orc_id: int) -> int:
-    # jÃ¡ existe no ficheiro, deixo aqui por referÃªncia
     q = db.execute(
         select(func.max(OrcamentoItem.item_ord)).where(OrcamentoItem.id_orcamento == orc_id)
     ).scalar()
-    return int(q or 0) + 1
+    return int(q or 0) + ITEM_ORD_PASSO
 
 
-def _reindex_items(
+def _next_item_numero(db: Session, orc_id: int, versao: str) -> int:
+    total = db.execute(
+        select(func.count(OrcamentoItem.id_item)).where(
+            OrcamentoItem.id_orcamento == orc_id,
+            OrcamentoItem.versao == versao,
+        )
+    ).scalar()
+    return int(total or 0) + 1
+
+
+def _reequilibrar_items(
     db: Session,
     orc_id: int,
     *,
@@ -473,10 +719,10 @@ def _reindex_items(
     updated_by: Optional[int] = None,
 ) -> List[OrcamentoItem]:
     """
-    Reaplica ordenacao e numeracao (item_ord e Item) sequencialmente para o orcamento/versao.
-    Renumera sempre a coluna Item para manter a correspondencia 1..N visivel.
+    Volta a espacar item_ord (ITEM_ORD_PASSO, 2*ITEM_ORD_PASSO, ...) e grava a numeracao Item 1..N.
+    So e preciso quando ja nao ha intervalo livre entre dois items vizinhos; so escreve as linhas que mudam.
     """
-    # Garantir que quaisquer alteracoes pendentes (ex.: troca de item_ord) entram no SELECT
+    # Garantir que quaisquer alteracoes pendentes entram no SELECT
     db.flush()
 
     stmt = select(OrcamentoItem).where(OrcamentoItem.id_orcamento == orc_id)
@@ -486,7 +732,9 @@ def _reindex_items(
     rows = db.execute(stmt.order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)).scalars().all()
 
     for idx, row in enumerate(rows, start=1):
-        row.item_ord = idx
+        if row.item_ord == idx * ITEM_ORD_PASSO and row.item == str(idx):
+            continue
+        row.item_ord = idx * ITEM_ORD_PASSO
         row.item = str(idx)
         if updated_by is not None:
             row.updated_by = updated_by
@@ -514,7 +762,7 @@ def create_item(
     Cria um novo item associado ao orÃ§amento.
     - 'item' Ã© preenchido automaticamente com a prÃ³xima sequÃªncia (1, 2, 3, ...)
       se o utilizador nÃ£o indicar um nome.
-    - 'item_ord' Ã© a ordem visual (1..N) e acompanha a sequÃªncia.
+    - 'item_ord' Ã© a ordem visual (esparsa, ver ITEM_ORD_PASSO); o novo item fica no fim.
     """
 
     # Normaliza versÃ£o para '01', '02', ...
@@ -524,7 +772,7 @@ def create_item(
     prox_ord = _next_item_ord(db, orc_id)
 
     # Se o utilizador nÃ£o escreveu nome, usamos a sequÃªncia como texto
-    item_val = _normalize_text(item) if item is not None else str(prox_ord)
+    item_val = _normalize_text(item) if item is not None else str(_next_item_numero(db, orc_id, versao_norm))
 
     # ConstrÃ³i a entidade ORM
     row = OrcamentoItem(
@@ -545,6 +793,7 @@ def create_item(
 
     db.add(row)
     db.flush()   # para obter id_item imediatamente, se precisares
+    _marcar_indice_pesquisa(db, orc_id)
     return row
 
 
@@ -579,8 +828,8 @@ def delete_item(
     db.delete(it)
     db.flush()
 
-    # Reorganizar ordenacao/numeracao dos restantes itens da mesma versao
-    _reindex_items(db, orc_id, versao=versao, updated_by=deleted_by)
+    # item_ord dos restantes fica como esta (a numeracao Item e calculada na leitura)
+    _marcar_indice_pesquisa(db, orc_id)
     logger.info(
         "Item '%s' (ID=%s) removido do orcamento %s versao %s por utilizador %s",
         item_nome,
@@ -630,6 +879,7 @@ def update_item(
     it.updated_by = updated_by
 
     db.flush()
+    _marcar_indice_pesquisa(db, it.id_orcamento)
     return it
 
 
@@ -649,40 +899,49 @@ def move_item(
         return False
 
     versao = it.versao
-    base_query = select(OrcamentoItem).where(OrcamentoItem.id_orcamento == it.id_orcamento)
+    db.flush()
+    ordem_stmt = select(OrcamentoItem.id_item, OrcamentoItem.item_ord).where(
+        OrcamentoItem.id_orcamento == it.id_orcamento
+    )
     if versao:
-        base_query = base_query.where(OrcamentoItem.versao == versao)
-
-    if direction > 0:
-        neighbor = db.execute(
-            base_query.where(OrcamentoItem.item_ord > it.item_ord)
-            .order_by(OrcamentoItem.item_ord.asc())
-            .limit(1)
-        ).scalar_one_or_none()
-    else:
-        neighbor = db.execute(
-            base_query.where(OrcamentoItem.item_ord < it.item_ord)
-            .order_by(OrcamentoItem.item_ord.desc())
-            .limit(1)
-        ).scalar_one_or_none()
-
-    if not neighbor:
-        logger.debug("Movimento ignorado: sem vizinho disponivel para item %s", id_item)
+        ordem_stmt = ordem_stmt.where(OrcamentoItem.versao == versao)
+    ordem_stmt = ordem_stmt.order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)
+
+    nova_ordem = None
+    for tentativa in range(2):
+        ordem = db.execute(ordem_stmt).all()
+        pos = next(idx for idx, (rid, _) in enumerate(ordem) if rid == id_item)
+        alvo = pos + (1 if direction > 0 else -1)
+        if not 0 <= alvo < len(ordem):
+            logger.debug("Movimento ignorado: sem vizinho disponivel para item %s", id_item)
+            return False
+        # o item passa para o intervalo entre o vizinho e o item seguinte (no sentido do movimento)
+        neighbor_id, vizinho = ordem[alvo]
+        if direction > 0:
+            limite = ordem[alvo + 1][1] if alvo + 1 < len(ordem) else vizinho + 2 * ITEM_ORD_PASSO
+            inferior, superior = vizinho, limite
+        else:
+            limite = ordem[alvo - 1][1] if alvo > 0 else 0
+            inferior, superior = limite, vizinho
+        if superior - inferior >= 2:
+            nova_ordem = (inferior + superior) // 2
+            break
+        if tentativa == 0:
+            _reequilibrar_items(db, it.id_orcamento, versao=versao, updated_by=moved_by)
+
+    if nova_ordem is None:
         return False
-
-    it.item_ord, neighbor.item_ord = neighbor.item_ord, it.item_ord
+    it.item_ord = nova_ordem
     it.updated_by = moved_by
-    neighbor.updated_by = moved_by
+    db.flush()
 
     logger.info(
-        "Item ID=%s trocado com ID=%s no orcamento %s por utilizador %s",
+        "Item ID=%s movido para junto de ID=%s no orcamento %s por utilizador %s",
         id_item,
-        neighbor.id_item,
+        neighbor_id,
         it.id_orcamento,
         moved_by,
     )
-
-    _reindex_items(db, it.id_orcamento, versao=versao, updated_by=moved_by)
     return True
 
 
@@ -708,30 +967,87 @@ def _clone_rows(db: Session, model, filters, overrides: dict) -> list:
     return clones
 
 
-def _clone_rows_with_item_map(db: Session, model, item_map: dict, overrides: dict) -> list:
-    if not item_map:
-        return []
-    rows = db.query(model).filter(model.item_id.in_(item_map.keys())).all()
-    clones = []
-    for row in rows:
-        data = {}
-        for col in model.__table__.columns:
-            if col.primary_key:
-                continue
-            name = col.name
-            if name in {"created_at", "updated_at"}:
-                continue
-            if name == "item_id":
-                data[name] = item_map.get(getattr(row, "item_id"))
-            elif name in overrides:
-                data[name] = overrides[name]
-            else:
-                data[name] = getattr(row, name)
-        clone = model(**data)
-        db.add(clone)
-        clones.append(clone)
-    db.flush()
-    return clones
+# Mapa id antigo -> id novo (por tipo: item, modelo, custeio, config) das linhas copiadas
+# em `duplicate_orcamento_version`; tabela temporaria da ligacao (nao faz commit implicito).
+_MAPA_DUPLICACAO = Table(
+    "tmp_duplicacao_ids",
+    MetaData(),
+    Column("tipo", String(16), primary_key=True),
+    Column("id_antigo", BigInteger, primary_key=True, autoincrement=False),
+    Column("id_novo", BigInteger, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+_COLUNAS_NAO_COPIADAS = {"created_at", "updated_at"}
+
+
+def _preparar_mapa_duplicacao(db: Session) -> None:
+    db.execute(CreateTable(_MAPA_DUPLICACAO, if_not_exists=True))
+    db.execute(delete(_MAPA_DUPLICACAO))
+
+
+def _clonar_linhas_sql(
+    db: Session,
+    model,
+    filters,
+    overrides: dict,
+    *,
+    mapa: Optional[tuple[str, str]] = None,
+    mapa_opcional: bool = False,
+    ordem: Sequence = (),
+    registar: Optional[tuple[str, list]] = None,
+) -> int:
+    """Copia no servidor (INSERT ... SELECT) as linhas de `model` que cumprem `filters`.
+
+    `overrides`: coluna -> valor da copia. `mapa=(tipo, coluna)`: a coluna passa para o
+    id novo do mesmo tipo em _MAPA_DUPLICACAO (so copia linhas com correspondencia, ou
+    com a coluna a NULL se `mapa_opcional`). `registar=(tipo, filtros_das_copias)`: guarda
+    no mapa id antigo -> id novo das linhas copiadas. Devolve o nº de linhas copiadas.
+    """
+    tabela = model.__table__
+    (pk,) = tabela.primary_key.columns
+    colunas = [col for col in tabela.columns if not col.primary_key and col.name not in _COLUNAS_NAO_COPIADAS]
+    valores = {nome: literal(valor, type_=tabela.c[nome].type) for nome, valor in overrides.items() if nome in tabela.c}
+
+    origem = tabela
+    condicoes = list(filters)
+    if mapa is not None:
+        tipo, nome = mapa
+        ligacao = and_(_MAPA_DUPLICACAO.c.tipo == tipo, _MAPA_DUPLICACAO.c.id_antigo == tabela.c[nome])
+        if mapa_opcional:
+            origem = tabela.outerjoin(_MAPA_DUPLICACAO, ligacao)
+            condicoes.append(or_(tabela.c[nome].is_(None), _MAPA_DUPLICACAO.c.id_novo.is_not(None)))
+        else:
+            origem = tabela.join(_MAPA_DUPLICACAO, ligacao)
+        valores[nome] = _MAPA_DUPLICACAO.c.id_novo
+    ordem = tuple(ordem) or (pk,)
+
+    if registar is not None:
+        ids_antigos = db.execute(select(pk).select_from(origem).where(*condicoes).order_by(*ordem)).scalars().all()
+        if not ids_antigos:
+            return 0
+        max_antes = db.execute(select(func.max(pk))).scalar()
+
+    copia = select(*(valores.get(col.name, col).label(col.name) for col in colunas)).select_from(origem)
+    copia = copia.where(*condicoes).order_by(*ordem)
+    copiadas = db.execute(insert(tabela).from_select([col.name for col in colunas], copia)).rowcount
+
+    if registar is not None:
+        tipo, filtros_copias = registar
+        # os ids autoincrementais das copias seguem a ordem do SELECT (um so INSERT)
+        stmt_novos = select(pk).where(*filtros_copias)
+        if max_antes is not None:
+            stmt_novos = stmt_novos.where(pk > max_antes)
+        ids_novos = db.execute(stmt_novos.order_by(pk)).scalars().all()
+        if len(ids_novos) != len(ids_antigos):
+            raise RuntimeError(
+                f"Duplicacao de {tabela.name}: {len(ids_antigos)} linhas de origem, {len(ids_novos)} copias."
+            )
+        db.execute(
+            insert(_MAPA_DUPLICACAO),
+            [{"tipo": tipo, "id_antigo": antigo, "id_novo": novo} for antigo, novo in zip(ids_antigos, ids_novos)],
+        )
+        copiadas = len(ids_novos)
+    return copiadas
 
 
 def duplicate_item(db: Session, item_id: int, *, created_by: Optional[int] = None) -> OrcamentoItem:
@@ -742,9 +1058,9 @@ def duplicate_item(db: Session, item_id: int, *, created_by: Optional[int] = Non
     if not src:
         raise ValueError("Item nÃ£o encontrado.")
 
-    new_item_ord = _next_item_ord(db, src.id_orcamento)
-    new_item_num = str(new_item_ord)
     versao = _format_versao(src.versao or "01")
+    new_item_ord = _next_item_ord(db, src.id_orcamento)
+    new_item_num = str(_next_item_numero(db, src.id_orcamento, versao))
 
     new_item = OrcamentoItem(
         id_orcamento=src.id_orcamento,
@@ -848,39 +1164,14 @@ def duplicate_item(db: Session, item_id: int, *, created_by: Optional[int] = Non
         {"item_id": new_item.id_item},
     )
 
-    _reindex_items(db, src.id_orcamento, versao=versao, updated_by=created_by)
     db.flush()
+    _marcar_indice_pesquisa(db, src.id_orcamento)
     return new_item
 
 
-def next_num_orcamento(db: Session, ano: Optional[str] = None) -> str:
-    """Gera 'YYNNNN' baseado no ano (atual por defeito)."""
-    if not ano:
-        ano = str(datetime.datetime.now().year)
-    yy = ano[-2:]
-    # encontrar maior sequencia comeÃ§ando por YY
-    max_seq = 0
-    rows = db.execute(select(Orcamento.num_orcamento).where(Orcamento.num_orcamento.like(f"{yy}%"))).scalars().all()
-    for s in rows:
-        try:
-            if len(s) >= 6 and s[:2] == yy:
-                seq = int(s[2:6])
-                if seq > max_seq:
-                    max_seq = seq
-        except Exception:
-            continue
-    return f"{yy}{(max_seq+1):04d}"
-
-
-def next_seq_for_year(db: Session, ano: Optional[str] = None) -> str:
-    """Devolve apenas a parte sequencial (NNNN) para o ano indicado."""
-    if not ano:
-        ano = str(datetime.datetime.now().year)
-    ano_txt = str(ano).strip() or str(datetime.datetime.now().year)
-    yy = ano_txt[-2:]
+def _maior_seq_ano(db: Session, ano_txt: str) -> int:
+    """Maior sequencia NNNN ja usada em `orcamentos` no ano (semente do contador do ano)."""
     max_seq = 0
-    largura = 4
-
     rows = db.execute(
         select(Orcamento.num_orcamento).where(Orcamento.ano == ano_txt)
     ).scalars().all()
@@ -894,38 +1185,14 @@ def next_seq_for_year(db: Session, ano: Optional[str] = None) -> str:
         if not texto:
             continue
 
-        sufixo = ""
-        prefixo = ""
-
-
-        if texto.startswith(yy):
-            prefixo = texto[: len(yy)]
-            sufixo = texto[len(yy):]
-        else:
-            m = re.search(r"(\d+)$", texto)
-            if m:
-                sufixo = m.group(1)
-                prefixo = texto[: -len(sufixo)]
-
-        if not sufixo:
-            continue
-        try:
-            seq = int(sufixo)
-        except ValueError:
-            continue
+        seq = _seq_de_num(ano_txt, texto)
+        if seq is not None:
+            max_seq = max(max_seq, seq)
+    return max_seq
 
-    # Devolve apenas a parte sequencial com zero Ã  esquerda
-        if seq > max_seq:
-            max_seq = seq
-            largura = len(sufixo)
-            if not prefixo.strip():
-                largura = max(largura, 4)
 
-    largura = max(largura, 4)
-    return f"{max_seq + 1:0{largura}d}"
-
-
-def next_version_for(db: Session, ano: str, num_orc: str) -> str:
+def _maior_versao(db: Session, ano: str, num_orc: str) -> int:
+    """Maior versao ja usada para ano/num_orcamento (semente do contador de versoes)."""
     cur = db.execute(select(Orcamento.versao).where(and_(Orcamento.ano == str(ano), Orcamento.num_orcamento == str(num_orc)))).scalars().all()
     maxv = 0
     for v in cur:
@@ -935,7 +1202,117 @@ def next_version_for(db: Session, ano: str, num_orc: str) -> str:
                 maxv = n
         except Exception:
             continue
-    return f"{(maxv+1):02d}"
+    return maxv
+
+
+def _ano_txt(ano: Optional[str]) -> str:
+    return str(ano or "").strip() or str(datetime.datetime.now().year)
+
+
+def _seq_de_num(ano_txt: str, num_orcamento: str) -> Optional[int]:
+    """Parte sequencial de um num_orcamento ('260531' -> 531), como em `_maior_seq_ano`."""
+    texto = str(num_orcamento or "").strip()
+    yy = ano_txt[-2:]
+    if texto.startswith(yy):
+        sufixo = texto[len(yy):]
+    else:
+        m = re.search(r"(\d+)$", texto)
+        sufixo = m.group(1) if m else ""
+    try:
+        return int(sufixo)
+    except ValueError:
+        return None
+
+
+def _atribuir_contador(
+    db: Session,
+    ano: str,
+    num_orcamento: str,
+    *,
+    semente: Callable[[], int],
+    minimo: Optional[int] = None,
+) -> int:
+    """
+    Atualiza o contador (ano, num_orcamento) com um so UPDATE (a linha fica bloqueada ate ao commit)
+    e devolve o novo valor. Sem `minimo` soma 1 (reserva o proximo numero); com `minimo` garante
+    valor >= minimo (numero escolhido pelo utilizador). Se o contador ainda nao existir e criado a
+    partir de `semente()` (maior numero ja usado em `orcamentos`).
+    """
+    chave = and_(OrcamentoContador.ano == ano, OrcamentoContador.num_orcamento == num_orcamento)
+    tabela = OrcamentoContador.__table__
+    if minimo is None:
+        novo_valor = tabela.c.valor + 1
+    else:
+        novo_valor = case((tabela.c.valor < minimo, minimo), else_=tabela.c.valor)
+
+    db.flush()
+    atualizadas = db.execute(
+        update(tabela).where(chave).values(valor=novo_valor, atualizado_em=func.now())
+    ).rowcount
+    if not atualizadas:
+        base = int(semente() or 0)
+        inicial = base + 1 if minimo is None else max(base, minimo)
+        valores = {"ano": ano, "num_orcamento": num_orcamento, "valor": inicial}
+        if db.get_bind().dialect.name in ("mysql", "mariadb"):
+            stmt = mysql_insert(tabela).values(**valores)
+            stmt = stmt.on_duplicate_key_update(valor=novo_valor)
+        else:
+            stmt = sqlite_insert(tabela).values(**valores)
+            stmt = stmt.on_conflict_do_update(index_elements=["ano", "num_orcamento"], set_={"valor": novo_valor})
+        db.execute(stmt)
+    return int(db.execute(select(OrcamentoContador.valor).where(chave)).scalar_one())
+
+
+def _valor_contador(db: Session, ano: str, num_orcamento: str) -> Optional[int]:
+    return db.execute(
+        select(OrcamentoContador.valor).where(
+            OrcamentoContador.ano == ano, OrcamentoContador.num_orcamento == num_orcamento
+        )
+    ).scalar()
+
+
+def reservar_num_orcamento(db: Session, ano: Optional[str] = None) -> str:
+    """Reserva (ate ao commit/rollback da transacao) o proximo 'YYNNNN' do ano; seguro entre postos."""
+    ano_txt = _ano_txt(ano)
+    seq = _atribuir_contador(db, ano_txt, "", semente=lambda: _maior_seq_ano(db, ano_txt))
+    return f"{ano_txt[-2:]}{seq:04d}"
+
+
+def registar_num_orcamento(db: Session, ano: str, num_orcamento: str, versao: Optional[str] = None) -> None:
+    """Acerta os contadores para um numero/versao escolhido fora de `reservar_num_orcamento`."""
+    ano_txt = _ano_txt(ano)
+    num_txt = str(num_orcamento)
+    seq = _seq_de_num(ano_txt, num_txt)
+    if seq is not None:
+        _atribuir_contador(db, ano_txt, "", semente=lambda: _maior_seq_ano(db, ano_txt), minimo=seq)
+    try:
+        versao_n = int(str(versao))
+    except (TypeError, ValueError):
+        return
+    _atribuir_contador(db, ano_txt, num_txt, semente=lambda: _maior_versao(db, ano_txt, num_txt), minimo=versao_n)
+
+
+def next_num_orcamento(db: Session, ano: Optional[str] = None) -> str:
+    """Sugere o proximo 'YYNNNN' do ano (atual por defeito) sem o reservar."""
+    ano_txt = _ano_txt(ano)
+    return f"{ano_txt[-2:]}{next_seq_for_year(db, ano_txt)}"
+
+
+def next_seq_for_year(db: Session, ano: Optional[str] = None) -> str:
+    """Devolve apenas a parte sequencial (NNNN) sugerida para o ano indicado (sem a reservar)."""
+    ano_txt = _ano_txt(ano)
+    atual = _valor_contador(db, ano_txt, "")
+    if atual is None:
+        atual = _maior_seq_ano(db, ano_txt)
+    return f"{atual + 1:04d}"
+
+
+def next_version_for(db: Session, ano: str, num_orc: str) -> str:
+    """Reserva a proxima versao de ano/num_orcamento (contador bloqueado ate ao commit)."""
+    ano_txt = str(ano)
+    num_txt = str(num_orc)
+    versao = _atribuir_contador(db, ano_txt, num_txt, semente=lambda: _maior_versao(db, ano_txt, num_txt))
+    return f"{versao:02d}"
 
 
 def duplicate_orcamento_version(
@@ -972,56 +1349,41 @@ def duplicate_orcamento_version(
     db.add(dup)
     db.flush()
 
+    _preparar_mapa_duplicacao(db)
+
     dados_gerais_overrides = {
         "ano": o.ano,
         "num_orcamento": o.num_orcamento,
         "versao": new_ver,
         "cliente_id": o.client_id,
     }
-    def _dados_gerais_filters(model):
-        return [
-            model.ano == o.ano,
-            model.num_orcamento == o.num_orcamento,
-            model.versao == old_ver,
-            model.cliente_id == o.client_id,
-        ]
-
-    _clone_rows(db, DadosGeraisMaterial, _dados_gerais_filters(DadosGeraisMaterial), dados_gerais_overrides)
-    _clone_rows(db, DadosGeraisFerragem, _dados_gerais_filters(DadosGeraisFerragem), dados_gerais_overrides)
-    _clone_rows(db, DadosGeraisSistemaCorrer, _dados_gerais_filters(DadosGeraisSistemaCorrer), dados_gerais_overrides)
-    _clone_rows(db, DadosGeraisAcabamento, _dados_gerais_filters(DadosGeraisAcabamento), dados_gerais_overrides)
+    for model in (DadosGeraisMaterial, DadosGeraisFerragem, DadosGeraisSistemaCorrer, DadosGeraisAcabamento):
+        _clonar_linhas_sql(
+            db,
+            model,
+            [
+                model.ano == o.ano,
+                model.num_orcamento == o.num_orcamento,
+                model.versao == old_ver,
+                model.cliente_id == o.client_id,
+            ],
+            dados_gerais_overrides,
+        )
 
-    items = (
-        db.query(OrcamentoItem)
-        .filter(OrcamentoItem.id_orcamento == o.id, OrcamentoItem.versao == old_ver)
-        .order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)
-        .all()
+    item_overrides = {"id_orcamento": dup.id, "versao": new_ver}
+    if created_by:
+        item_overrides.update(created_by=created_by, updated_by=created_by)
+    _clonar_linhas_sql(
+        db,
+        OrcamentoItem,
+        [OrcamentoItem.id_orcamento == o.id, OrcamentoItem.versao == old_ver],
+        item_overrides,
+        ordem=(OrcamentoItem.item_ord, OrcamentoItem.id_item),
+        registar=("item", [OrcamentoItem.id_orcamento == dup.id]),
     )
-    item_map = {}
-    for item in items:
-        data = {}
-        for col in OrcamentoItem.__table__.columns:
-            if col.primary_key:
-                continue
-            name = col.name
-            if name in {"created_at", "updated_at"}:
-                continue
-            if name == "id_orcamento":
-                data[name] = dup.id
-            elif name == "versao":
-                data[name] = new_ver
-            elif name in {"created_by", "updated_by"}:
-                data[name] = created_by or getattr(item, name)
-            else:
-                data[name] = getattr(item, name)
-        new_item = OrcamentoItem(**data)
-        db.add(new_item)
-        db.flush()
-        item_map[item.id_item] = new_item.id_item
 
-    for old_item_id, new_item_id in item_map.items():
-        _clone_rows(db, DadosModuloMedidas, [DadosModuloMedidas.id_item_fk == old_item_id], {"id_item_fk": new_item_id})
-        _clone_rows(db, DadosDefPecas, [DadosDefPecas.id_item_fk == old_item_id], {"id_item_fk": new_item_id})
+    _clonar_linhas_sql(db, DadosModuloMedidas, [], {}, mapa=("item", "id_item_fk"))
+    _clonar_linhas_sql(db, DadosDefPecas, [], {}, mapa=("item", "id_item_fk"))
 
     item_context_overrides = {
         "orcamento_id": dup.id,
@@ -1030,132 +1392,49 @@ def duplicate_orcamento_version(
         "num_orcamento": o.num_orcamento,
         "cliente_id": o.client_id,
     }
-    _clone_rows_with_item_map(db, DadosItemsMaterial, item_map, item_context_overrides)
-    _clone_rows_with_item_map(db, DadosItemsFerragem, item_map, item_context_overrides)
-    _clone_rows_with_item_map(db, DadosItemsSistemaCorrer, item_map, item_context_overrides)
-    _clone_rows_with_item_map(db, DadosItemsAcabamento, item_map, item_context_overrides)
+    for model in (DadosItemsMaterial, DadosItemsFerragem, DadosItemsSistemaCorrer, DadosItemsAcabamento):
+        _clonar_linhas_sql(db, model, [], item_context_overrides, mapa=("item", "item_id"))
 
-    modelos = db.query(DadosItemsModelo).filter(DadosItemsModelo.orcamento_id == o.id).all()
-    modelo_map = {}
-    for modelo in modelos:
-        if modelo.item_id is not None and modelo.item_id not in item_map:
-            continue
-        data = {}
-        for col in DadosItemsModelo.__table__.columns:
-            if col.primary_key:
-                continue
-            name = col.name
-            if name in {"created_at", "updated_at"}:
-                continue
-            if name == "orcamento_id":
-                data[name] = dup.id
-            elif name == "item_id":
-                data[name] = item_map.get(modelo.item_id) if modelo.item_id is not None else None
-            else:
-                data[name] = getattr(modelo, name)
-        new_modelo = DadosItemsModelo(**data)
-        db.add(new_modelo)
-        db.flush()
-        modelo_map[modelo.id] = new_modelo.id
-    for old_id, new_id in modelo_map.items():
-        _clone_rows(db, DadosItemsModeloItem, [DadosItemsModeloItem.modelo_id == old_id], {"modelo_id": new_id})
+    # modelos sem item (item_id NULL) tambem passam para o novo orcamento
+    _clonar_linhas_sql(
+        db,
+        DadosItemsModelo,
+        [DadosItemsModelo.orcamento_id == o.id],
+        {"orcamento_id": dup.id},
+        mapa=("item", "item_id"),
+        mapa_opcional=True,
+        registar=("modelo", [DadosItemsModelo.orcamento_id == dup.id]),
+    )
+    _clonar_linhas_sql(db, DadosItemsModeloItem, [], {}, mapa=("modelo", "modelo_id"))
 
-    custeio_rows = []
-    if item_map:
-        custeio_rows = db.query(CusteioItem).filter(
-            CusteioItem.orcamento_id == o.id,
-            CusteioItem.item_id.in_(item_map.keys()),
-            CusteioItem.versao == old_ver,
-        ).all()
-    custeio_map = {}
-    for row in custeio_rows:
-        data = {}
-        for col in CusteioItem.__table__.columns:
-            if col.primary_key:
-                continue
-            name = col.name
-            if name in {"created_at", "updated_at"}:
-                continue
-            if name == "orcamento_id":
-                data[name] = dup.id
-            elif name == "item_id":
-                data[name] = item_map.get(row.item_id)
-            elif name == "versao":
-                data[name] = new_ver
-            elif name == "ano":
-                data[name] = o.ano
-            elif name == "num_orcamento":
-                data[name] = o.num_orcamento
-            elif name == "cliente_id":
-                data[name] = o.client_id
-            else:
-                data[name] = getattr(row, name)
-        new_row = CusteioItem(**data)
-        db.add(new_row)
-        db.flush()
-        custeio_map[row.id] = new_row.id
-
-    _clone_rows_with_item_map(db, CusteioItemDimensoes, item_map, item_context_overrides)
-
-    if custeio_map:
-        backup_rows = db.query(CusteioDespBackup).filter(
-            CusteioDespBackup.orcamento_id == o.id,
-            CusteioDespBackup.versao == old_ver,
-            CusteioDespBackup.custeio_item_id.in_(custeio_map.keys()),
-        ).all()
-        for row in backup_rows:
-            data = {}
-            for col in CusteioDespBackup.__table__.columns:
-                if col.primary_key:
-                    continue
-                name = col.name
-                if name in {"created_at", "updated_at"}:
-                    continue
-                if name == "orcamento_id":
-                    data[name] = dup.id
-                elif name == "versao":
-                    data[name] = new_ver
-                elif name == "custeio_item_id":
-                    data[name] = custeio_map.get(row.custeio_item_id)
-                else:
-                    data[name] = getattr(row, name)
-            db.add(CusteioDespBackup(**data))
-        db.flush()
+    _clonar_linhas_sql(
+        db,
+        CusteioItem,
+        [CusteioItem.orcamento_id == o.id, CusteioItem.versao == old_ver],
+        item_context_overrides,
+        mapa=("item", "item_id"),
+        registar=("custeio", [CusteioItem.orcamento_id == dup.id]),
+    )
+    _clonar_linhas_sql(db, CusteioItemDimensoes, [], item_context_overrides, mapa=("item", "item_id"))
+    _clonar_linhas_sql(
+        db,
+        CusteioDespBackup,
+        [CusteioDespBackup.orcamento_id == o.id, CusteioDespBackup.versao == old_ver],
+        {"orcamento_id": dup.id, "versao": new_ver},
+        mapa=("custeio", "custeio_item_id"),
+    )
 
-    configs = db.query(CusteioProducaoConfig).filter(
-        CusteioProducaoConfig.orcamento_id == o.id,
-        CusteioProducaoConfig.versao == old_ver,
-    ).all()
-    for cfg in configs:
-        data = {}
-        for col in CusteioProducaoConfig.__table__.columns:
-            if col.primary_key:
-                continue
-            name = col.name
-            if name in {"created_at", "updated_at"}:
-                continue
-            if name == "orcamento_id":
-                data[name] = dup.id
-            elif name == "versao":
-                data[name] = new_ver
-            elif name == "ano":
-                data[name] = o.ano
-            elif name == "num_orcamento":
-                data[name] = o.num_orcamento
-            elif name == "cliente_id":
-                data[name] = o.client_id
-            else:
-                data[name] = getattr(cfg, name)
-        new_cfg = CusteioProducaoConfig(**data)
-        db.add(new_cfg)
-        db.flush()
-        _clone_rows(
-            db,
-            CusteioProducaoValor,
-            [CusteioProducaoValor.config_id == cfg.id],
-            {"config_id": new_cfg.id},
-        )
+    _clonar_linhas_sql(
+        db,
+        CusteioProducaoConfig,
+        [CusteioProducaoConfig.orcamento_id == o.id, CusteioProducaoConfig.versao == old_ver],
+        item_context_overrides,
+        registar=("config", [CusteioProducaoConfig.orcamento_id == dup.id]),
+    )
+    _clonar_linhas_sql(db, CusteioProducaoValor, [], {}, mapa=("config", "config_id"))
 
+    db.execute(delete(_MAPA_DUPLICACAO))
+    _marcar_indice_pesquisa(db, dup.id)
     return dup
 
 
@@ -1213,67 +1492,6 @@ def _term_alternatives(term: str, *, expand: bool) -> tuple[str, ...]:
     return tuple(_uniq_search_terms(alternatives))
 
 
-def _item_search_exists(term: str):
-    like = f"%{term}%"
-    return (
-        select(OrcamentoItem.id_item)
-        .where(
-            OrcamentoItem.id_orcamento == Orcamento.id,
-            OrcamentoItem.versao == Orcamento.versao,
-            or_(*[field.ilike(like) for field in _SEARCH_FIELDS_ORCAMENTO_ITEMS]),
-        )
-        .correlate(Orcamento)
-        .exists()
-    )
-
-
-def _build_search_filters_orcamentos(
-    terms: Sequence[str],
-    *,
-    expand: bool = False,
-    include_items: bool = False,
-):
-    filters = []
-    for term in terms:
-        term_filters = []
-        for alternative in _term_alternatives(term, expand=expand):
-            like = f"%{alternative}%"
-            term_filters.extend(field.ilike(like) for field in _SEARCH_FIELDS_ORCAMENTOS)
-            if include_items:
-                term_filters.append(_item_search_exists(alternative))
-        if term_filters:
-            filters.append(or_(*term_filters))
-    return filters
-
-
-def _orcamento_blob(row: OrcamentoResumo) -> str:
-    parts = []
-    for attr in (
-        "id",
-        "ano",
-        "num_orcamento",
-        "versao",
-        "enc_phc",
-        "cliente",
-        "temp_client_nome",
-        "data",
-        "preco",
-        "utilizador",
-        "estado",
-        "obra",
-        "descricao",
-        "localizacao",
-        "info_1",
-        "info_2",
-        "ref_cliente",
-    ):
-        value = getattr(row, attr, None)
-        if value in (None, ""):
-            continue
-        parts.append(str(value))
-    return " | ".join(parts)
-
-
 def _item_blobs_for_orcamentos(db: Session, rows: Sequence[OrcamentoResumo]) -> dict[int, str]:
     ids = [int(row.id) for row in rows if getattr(row, "id", None) is not None]
     if not ids:
@@ -1293,7 +1511,7 @@ def _item_blobs_for_orcamentos(db: Session, rows: Sequence[OrcamentoResumo]) ->
     for row in db.execute(stmt).all():
         parts = [
             str(value)
-            for value in row[1:]
+            for value in (rotulo_item(row.item), *row[2:])
             if value not in (None, "")
         ]
         if not parts:
@@ -1302,16 +1520,384 @@ def _item_blobs_for_orcamentos(db: Session, rows: Sequence[OrcamentoResumo]) ->
     return {oid: " || ".join(parts) for oid, parts in item_blobs.items()}
 
 
+# --------------------------------------------------------------------------- #
+# Indice de pesquisa de orcamentos
+# --------------------------------------------------------------------------- #
+# Um documento por orcamento com dois textos normalizados: "orcamento" (os
+# campos de _SEARCH_FIELDS_ORCAMENTOS + cliente temporario) e "items" (os campos
+# de _SEARCH_FIELDS_ORCAMENTO_ITEMS dos items da mesma versao). Fica em memoria
+# por engine, persistido em disco, e e atualizado incrementalmente por
+# `SincronizacaoIndice` (ver indice_texto).
+
+
+def _caminho_indice_pesquisa(engine) -> Optional[Path]:
+    url = getattr(engine, "url", None)
+    if url is None:
+        return None
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return None
+    base = (os.environ.get(ENV_INDICE_PESQUISA_DIR) or "").strip()
+    if base.lower() in {"off", "0", "nao"}:
+        return None
+    pasta = (
+        Path(base)
+        if base
+        else Path(os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()) / "Martelo_Orcamentos_V2" / "indice_pesquisa"
+    )
+    chave = hashlib.sha1(url.render_as_string(hide_password=True).encode("utf-8")).hexdigest()[:16]
+    return pasta / f"orcamentos_{chave}.json"
+
+
+def _marcar_indice_pesquisa(db: Session, *orc_ids: Optional[int]) -> None:
+    """Pede a releitura dos orcamentos indicados na proxima pesquisa (se ja houver indice)."""
+    _SINCRONIZACAO_PESQUISA.marcar(db, orc_ids)
+
+
+def _secoes_pesquisa(row: OrcamentoResumo, item_blob: str) -> dict[str, str]:
+    """Secoes normalizadas de `_SECOES_PESQUISA` para uma linha de `_rows_from_stmt`."""
+    return {
+        "referencia": _normalize_search_text(f"{row.num_orcamento} {row.enc_phc} {row.ref_cliente} {row.ano} {row.versao}"),
+        "cliente": _normalize_search_text(f"{row.cliente} {row.temp_client_nome}"),
+        "obra": _normalize_search_text(row.obra),
+        "descricao": _normalize_search_text(row.descricao),
+        "items": _normalize_search_text(item_blob),
+        "info": _normalize_search_text(f"{row.info_1} {row.info_2} {row.localizacao}"),
+        "estado": _normalize_search_text(f"{row.estado} {row.utilizador} {row.data}"),
+    }
+
+
+def _calcular_pesquisa_orcamentos(db: Session, orc_ids: Optional[Sequence[int]]) -> dict[int, dict]:
+    """Texto e secoes de pesquisa (como em OrcamentoPesquisa) calculados das tabelas de origem."""
+    stmt_resumo = _select_orcamentos()
+    stmt_campos = (
+        select(
+            Orcamento.id,
+            *(field.label(f"campo_{pos}") for pos, field in enumerate(_SEARCH_FIELDS_ORCAMENTOS)),
+        )
+        .select_from(Orcamento)
+        .outerjoin(Client, Orcamento.client_id == Client.id)
+        .outerjoin(User, Orcamento.created_by == User.id)
+    )
+    stmt_items = select(
+        OrcamentoItem.id_orcamento,
+        OrcamentoItem.versao,
+        *(field.label(f"campo_{pos}") for pos, field in enumerate(_SEARCH_FIELDS_ORCAMENTO_ITEMS)),
+    )
+    if orc_ids is not None:
+        stmt_resumo = stmt_resumo.where(Orcamento.id.in_(orc_ids))
+        stmt_campos = stmt_campos.where(Orcamento.id.in_(orc_ids))
+        stmt_items = stmt_items.where(OrcamentoItem.id_orcamento.in_(orc_ids))
+    campos = {int(row.id): row[1:] for row in db.execute(stmt_campos).all()}
+    items_por_orcamento: dict[int, list] = defaultdict(list)
+    for item in db.execute(stmt_items).all():
+        items_por_orcamento[int(item.id_orcamento)].append(item)
+
+    dados: dict[int, dict] = {}
+    for row in _rows_from_stmt(db, stmt_resumo):
+        orc_id = int(row.id)
+        items = items_por_orcamento.get(orc_id, ())
+        textos_items = []
+        for item in items:
+            if _format_versao(item.versao) != row.versao:
+                continue
+            valores_item = (rotulo_item(item[2]), *item[3:])  # a numeracao guardada pode estar desatualizada
+            texto = _normalize_search_text(" ".join(str(value) for value in valores_item if value not in (None, "")))
+            if texto:
+                textos_items.append(texto)
+        valores = [value for value in campos.get(orc_id, ()) if value not in (None, "")]
+        if row.temp_client_nome:
+            valores.append(row.temp_client_nome)
+        secoes = _secoes_pesquisa(row, "")
+        secoes["items"] = " ".join(textos_items)
+        dados[orc_id] = {
+            "texto": _normalize_search_text(" ".join(str(value) for value in valores)),
+            **secoes,
+            "n_items": len(items),
+        }
+    return dados
+
+
+def _tem_tabela_pesquisa(db: Session) -> bool:
+    engine = engine_da_sessao(db)
+    if _TABELA_PESQUISA_EXISTE.get(engine):
+        return True
+    existe = sa_inspect(db.connection()).has_table(OrcamentoPesquisa.__tablename__)
+    if existe:
+        _TABELA_PESQUISA_EXISTE[engine] = True
+    return existe
+
+
+def atualizar_pesquisa_orcamentos(db: Session, orc_ids: Optional[Iterable[int]] = None) -> int:
+    """Recalcula e grava OrcamentoPesquisa dos orcamentos indicados (todos se None).
+
+    Orcamentos que ja nao existem perdem a linha. Nao faz commit. Devolve o nº de linhas gravadas.
+    """
+    if orc_ids is None:
+        orc_ids = db.execute(select(Orcamento.id)).scalars().all()
+    gravadas = 0
+    for lote in lotes_ids(orc_ids):
+        dados = _calcular_pesquisa_orcamentos(db, lote)
+        db.execute(delete(OrcamentoPesquisa).where(OrcamentoPesquisa.id_orcamento.in_(lote)))
+        if dados:
+            db.execute(
+                insert(OrcamentoPesquisa),
+                [
+                    {
+                        "id_orcamento": orc_id,
+                        "texto": valores["texto"],
+                        **{chave: valores[chave] for chave, _, _ in _SECOES_PESQUISA},
+                        "n_items": valores["n_items"],
+                    }
+                    for orc_id, valores in dados.items()
+                ],
+            )
+        gravadas += len(dados)
+    return gravadas
+
+
+# Manutencao de OrcamentoPesquisa na escrita: qualquer sessao ORM que altere campos
+# pesquisaveis de orcamentos, items ou clientes recalcula as linhas afetadas antes do commit.
+_INFO_PESQUISA_PENDENTE = "orcamento_pesquisa_pendente"
+_CAMPOS_PESQUISA_ORCAMENTO = (
+    "ano", "num_orcamento", "versao", "client_id", "status", "data", "preco_total", "ref_cliente", "enc_phc",
+    "obra", "descricao_orcamento", "localizacao", "info_1", "info_2", "notas", "extras", "created_by",
+)
+_CAMPOS_PESQUISA_ITEM = (
+    "id_orcamento", "versao", "item", "codigo", "descricao", "altura", "largura", "profundidade", "und", "qt", "notas",
+)
+_CAMPOS_PESQUISA_CLIENTE = ("nome", "nome_simplex")
+
+
+def _campos_alterados(obj, campos: Sequence[str]) -> bool:
+    attrs = sa_inspect(obj).attrs
+    return any(attrs[campo].history.has_changes() for campo in campos)
+
+
+@event.listens_for(Session, "before_flush")
+def _registar_alteracoes_pesquisa(session: Session, _flush_context, _instances) -> None:
+    pendente = None
+    for colecao, novo_ou_apagado in ((session.new, True), (session.dirty, False), (session.deleted, True)):
+        for obj in colecao:
+            if isinstance(obj, Orcamento):
+                campos = _CAMPOS_PESQUISA_ORCAMENTO
+            elif isinstance(obj, OrcamentoItem):
+                campos = _CAMPOS_PESQUISA_ITEM
+            elif isinstance(obj, Client):
+                campos = _CAMPOS_PESQUISA_CLIENTE
+            else:
+                continue
+            if not novo_ou_apagado and not _campos_alterados(obj, campos):
+                continue
+            if pendente is None:
+                pendente = session.info.setdefault(_INFO_PESQUISA_PENDENTE, {"objetos": [], "ids": set()})
+            if obj in session.deleted:
+                # depois do flush os atributos de um objeto apagado deixam de estar acessiveis
+                orc_id = obj.id if isinstance(obj, Orcamento) else getattr(obj, "id_orcamento", None)
+                if orc_id is not None:
+                    pendente["ids"].add(int(orc_id))
+            else:
+                pendente["objetos"].append(obj)
+
+
+@event.listens_for(Session, "before_commit")
+def _atualizar_pesquisa_antes_commit(session: Session) -> None:
+    session.flush()  # o commit so faz o flush final depois deste evento
+    pendente = session.info.pop(_INFO_PESQUISA_PENDENTE, None)
+    if not pendente:
+        return
+    orc_ids = set(pendente["ids"])
+    clientes: set[int] = set()
+    for obj in pendente["objetos"]:
+        # valores ja carregados (sem ir ao BD: o registo pode entretanto ter sido apagado)
+        valores = sa_inspect(obj).dict
+        if isinstance(obj, Client):
+            if valores.get("id") is not None:
+                clientes.add(int(valores["id"]))
+            continue
+        orc_id = valores.get("id") if isinstance(obj, Orcamento) else valores.get("id_orcamento")
+        if orc_id is not None:
+            orc_ids.add(int(orc_id))
+    # Corre num savepoint: uma falha so desfaz a atualizacao da pesquisa. Se a base de dados
+    # ja tiver desfeito a transacao inteira (ex.: deadlock no MySQL) o rollback do savepoint
+    # falha e o erro chega ao commit, em vez de gravar uma transacao vazia sem aviso.
+    savepoint = session.begin_nested()
+    try:
+        if clientes:
+            orc_ids.update(
+                session.execute(select(Orcamento.id).where(Orcamento.client_id.in_(clientes))).scalars()
+            )
+        if orc_ids and _tem_tabela_pesquisa(session):
+            atualizar_pesquisa_orcamentos(session, orc_ids)
+    except Exception as exc:
+        savepoint.rollback()
+        logger.warning("Falha ao atualizar o texto de pesquisa dos orcamentos %s: %s", sorted(orc_ids), exc)
+    else:
+        savepoint.commit()
+    _marcar_indice_pesquisa(session, *orc_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pesquisa_pendente(session: Session) -> None:
+    session.info.pop(_INFO_PESQUISA_PENDENTE, None)
+
+
+def _pesquisa_guardada(db: Session) -> dict[int, dict]:
+    """Linhas de OrcamentoPesquisa ainda atuais (gravadas depois da ultima alteracao do orcamento)."""
+    if not _tem_tabela_pesquisa(db):
+        return {}
+    stmt = (
+        select(
+            Orcamento.id,
+            OrcamentoPesquisa.texto,
+            *(getattr(OrcamentoPesquisa, chave) for chave, _, _ in _SECOES_PESQUISA),
+            OrcamentoPesquisa.n_items,
+        )
+        .join(OrcamentoPesquisa, OrcamentoPesquisa.id_orcamento == Orcamento.id)
+        .where(OrcamentoPesquisa.atualizado_em >= Orcamento.updated_at)
+    )
+    dados: dict[int, dict] = {}
+    for row in db.execute(stmt).all():
+        valores = row._mapping
+        dados[int(row.id)] = {
+            "texto": row.texto or "",
+            **{chave: valores[chave] or "" for chave, _, _ in _SECOES_PESQUISA},
+            "n_items": int(row.n_items or 0),
+        }
+    return dados
+
+
+def _definir_no_indice(indice: IndiceTexto, orc_id: int, valores: dict) -> None:
+    meta = {
+        "n_items": valores["n_items"],
+        # a secao "items" ja e o campo "items" do indice
+        "secoes": {chave: valores[chave] for chave, _, _ in _SECOES_PESQUISA if chave != "items"},
+    }
+    indice.definir(orc_id, {"orcamento": valores["texto"], "items": valores["items"]}, meta)
+
+
+def _reindexar_orcamentos(
+    db: Session,
+    indice: IndiceTexto,
+    orc_ids: Optional[Iterable[int]],
+) -> None:
+    """Rele do BD os orcamentos indicados (todos se None); os que ja nao existem saem do indice.
+
+    Na construcao completa aproveita o texto ja normalizado de OrcamentoPesquisa e so
+    calcula os orcamentos sem linha atual; nas releituras incrementais calcula sempre
+    a partir das tabelas de origem.
+    """
+    if orc_ids is None:
+        guardados = _pesquisa_guardada(db)
+        for orc_id, valores in guardados.items():
+            _definir_no_indice(indice, orc_id, valores)
+        em_falta = set(db.execute(select(Orcamento.id)).scalars()) - set(guardados)
+        if len(em_falta) > len(guardados):
+            lotes: list[Optional[list[int]]] = [None]  # base sem backfill: uma leitura completa
+        else:
+            lotes = list(lotes_ids(em_falta))
+    else:
+        lotes = list(lotes_ids(orc_ids))
+    for lote in lotes:
+        dados = _calcular_pesquisa_orcamentos(db, lote)
+        for orc_id, valores in dados.items():
+            _definir_no_indice(indice, orc_id, valores)
+        for orc_id in set(lote or ()) - set(dados):
+            indice.remover(orc_id)
+
+
+def _ids_com_items_divergentes(db: Session, indice: IndiceTexto, contagens: dict) -> set[int]:
+    """Orcamentos cujo nº de items no BD difere do indice (items apagados noutro posto)."""
+    if contagens["items"] == sum(int((meta or {}).get("n_items") or 0) for meta in indice.meta.values()):
+        return set()
+    ids: set[int] = set()
+    por_orcamento = dict(
+        db.execute(select(OrcamentoItem.id_orcamento, func.count()).group_by(OrcamentoItem.id_orcamento)).all()
+    )
+    for orc_id, meta in indice.meta.items():
+        if por_orcamento.pop(orc_id, 0) != int((meta or {}).get("n_items") or 0):
+            ids.add(orc_id)
+    ids.update(int(orc_id) for orc_id in por_orcamento if orc_id is not None)
+    return ids
+
+
+# Releitura: orcamentos marcados pelas funcoes de escrita deste modulo, registos com
+# updated_at recente (orcamentos, items, clientes), contagens divergentes.
+_SINCRONIZACAO_PESQUISA = SincronizacaoIndice(
+    campos=_CAMPOS_INDICE_PESQUISA,
+    id_documento=Orcamento.id,
+    tabelas=(
+        ("orcamentos", Orcamento.updated_at, select(Orcamento.id)),
+        ("orcamento_items", OrcamentoItem.updated_at, select(OrcamentoItem.id_orcamento)),
+        ("clients", Client.updated_at, select(Orcamento.id).join(Client, Orcamento.client_id == Client.id)),
+    ),
+    reindexar=lambda db, indice, ids: _reindexar_orcamentos(db, indice, ids),
+    contagens={"items": select(func.count()).select_from(OrcamentoItem)},
+    divergentes=_ids_com_items_divergentes,
+    formato=_FORMATO_INDICE_PESQUISA,
+    caminho=_caminho_indice_pesquisa,
+    intervalo_guardar_s=_INTERVALO_GUARDAR_INDICE_S,
+)
+
+
+def indice_pesquisa_orcamentos(db: Session) -> IndiceTexto:
+    """Indice de pesquisa do BD da sessao, sincronizado com o estado atual."""
+    return _SINCRONIZACAO_PESQUISA.indice(db)
+
+
+def reconstruir_indice_pesquisa(db: Session) -> IndiceTexto:
+    """Descarta o indice atual e volta a indexar todos os orcamentos."""
+    return _SINCRONIZACAO_PESQUISA.reconstruir(db)
+
+
+atexit.register(_SINCRONIZACAO_PESQUISA.guardar_todos)
+
+
+def _ids_indice_por_termos(
+    indice: IndiceTexto,
+    terms: Sequence[str],
+    *,
+    expand: bool = False,
+    include_items: bool = False,
+) -> set[int]:
+    campos = _CAMPOS_INDICE_PESQUISA if include_items else ("orcamento",)
+    resultado: Optional[set[int]] = None
+    for term in terms:
+        alternatives = _term_alternatives(term, expand=expand)
+        docs: set[int] = set()
+        for alternative in _uniq_search_terms([_normalize_search_text(alt) for alt in alternatives]):
+            docs |= indice.procurar(alternative, campos)
+        resultado = docs if resultado is None else resultado & docs
+        if not resultado:
+            return set()
+    return resultado or set()
+
+
+def _rows_por_ids(db: Session, ids: Iterable[int]) -> List[OrcamentoResumo]:
+    ordenados = sorted({int(orc_id) for orc_id in ids})
+    rows: List[OrcamentoResumo] = []
+    for pos in range(0, len(ordenados), LOTE_IDS):
+        lote = ordenados[pos : pos + LOTE_IDS]
+        stmt = _select_orcamentos().where(Orcamento.id.in_(lote))
+        stmt = stmt.order_by(Orcamento.ano.desc(), Orcamento.num_orcamento.desc(), Orcamento.versao)
+        rows.extend(_rows_from_stmt(db, stmt))
+    return rows
+
+
 def _expanded_normalized_terms(term_norm: str) -> list[str]:
     terms = [term_norm]
     terms.extend(_SEARCH_SYNONYMS_ORCAMENTOS.get(term_norm, ()))
     return _uniq_search_terms([_normalize_search_text(term) for term in terms if term])
 
 
-def _score_term_in_text(term_norm: str, text_norm: str) -> tuple[float, str, str]:
+def _score_term_in_text(
+    term_norm: str,
+    text_norm: str,
+    alternatives: Optional[Sequence[str]] = None,
+) -> tuple[float, str, str]:
     if not term_norm or not text_norm:
         return 0.0, "", ""
-    alternatives = _expanded_normalized_terms(term_norm)
+    if alternatives is None:
+        alternatives = _expanded_normalized_terms(term_norm)
     for alt in alternatives:
         if alt and alt in text_norm:
             if alt == term_norm:
@@ -1340,24 +1926,24 @@ def _rank_orcamento_rows(
     query: str,
     *,
     item_blobs: Optional[dict[int, str]] = None,
+    secoes: Optional[dict[int, dict[str, str]]] = None,
 ) -> List[OrcamentoResumo]:
+    """Ordena por relevancia. `secoes` (texto ja normalizado por orcamento, ver
+    `_SECOES_PESQUISA`) evita normalizar os campos de cada linha."""
     rows_list = list(rows)
     terms_norm = _split_terms_normalized(query)
     if not rows_list or not terms_norm:
         return rows_list
-    item_blobs = item_blobs if item_blobs is not None else _item_blobs_for_orcamentos(db, rows_list)
+    secoes = secoes or {}
+    if item_blobs is None:
+        sem_secoes = [row for row in rows_list if int(row.id) not in secoes]
+        item_blobs = _item_blobs_for_orcamentos(db, sem_secoes) if sem_secoes else {}
+    alternatives = {term_norm: _expanded_normalized_terms(term_norm) for term_norm in terms_norm}
 
     ranked: list[tuple[float, str, str, str, OrcamentoResumo]] = []
     for row in rows_list:
-        sections = (
-            ("Referencia", 8.0, f"{row.num_orcamento} {row.enc_phc} {row.ref_cliente} {row.ano} {row.versao}"),
-            ("Cliente", 7.0, f"{row.cliente} {row.temp_client_nome}"),
-            ("Obra", 6.0, row.obra),
-            ("Descricao", 5.0, row.descricao),
-            ("Item", 4.5, item_blobs.get(int(row.id), "")),
-            ("Info/Localizacao", 3.0, f"{row.info_1} {row.info_2} {row.localizacao}"),
-            ("Estado/Utilizador/Data", 2.0, f"{row.estado} {row.utilizador} {row.data}"),
-        )
+        textos = secoes.get(int(row.id)) or _secoes_pesquisa(row, item_blobs.get(int(row.id), ""))
+        sections = [(label, weight, textos.get(chave, "")) for chave, label, weight in _SECOES_PESQUISA]
         score = 0.0
         best_reason = ""
         best_reason_score = 0.0
@@ -1365,7 +1951,7 @@ def _rank_orcamento_rows(
             best_term_score = 0.0
             best_term_reason = ""
             for label, weight, text_value in sections:
-                match_score, match_kind, matched = _score_term_in_text(term_norm, _normalize_search_text(text_value))
+                match_score, match_kind, matched = _score_term_in_text(term_norm, text_value, alternatives[term_norm])
                 if match_score <= 0:
                     continue
                 weighted = weight * match_score
@@ -1385,49 +1971,15 @@ def _rank_orcamento_rows(
     return [row for _, _, _, _, row in ranked]
 
 
-def _fuzzy_match_blob(blob_norm: str, *, terms_norm: Sequence[str]) -> Optional[float]:
-    if not terms_norm:
-        return 0.0
-    if not blob_norm:
-        return None
-    words = set(blob_norm.split())
-    score = 0.0
-    for term in terms_norm:
-        if term in blob_norm:
-            score += 1.0
-            continue
-        alternatives = _SEARCH_SYNONYMS_ORCAMENTOS.get(term, ())
-        if any(alt in blob_norm for alt in alternatives):
-            score += 0.95
-            continue
-        if len(term) < 4:
-            return None
-        close = difflib.get_close_matches(term, words, n=1, cutoff=0.82)
-        if not close:
-            return None
-        score += difflib.SequenceMatcher(None, term, close[0]).ratio()
-    return score
-
-
-def _fuzzy_search_orcamentos(db: Session, query: str) -> List[OrcamentoResumo]:
+def _fuzzy_search_orcamentos(db: Session, query: str, indice: Optional[IndiceTexto] = None) -> List[OrcamentoResumo]:
+    """Aproximacao sobre todos os orcamentos: cada termo tem de aparecer (direto/sinonimo)
+    ou ter uma palavra proxima (difflib >= 0.82) no texto do orcamento ou dos items."""
     terms_norm = _split_terms_normalized(query)
-    stmt = (
-        _select_orcamentos()
-        .order_by(Orcamento.ano.desc(), Orcamento.num_orcamento.desc(), Orcamento.versao)
-        .limit(ORCAMENTO_FUZZY_CANDIDATE_LIMIT)
-    )
-    candidates = _rows_from_stmt(db, stmt)
-    item_blobs = _item_blobs_for_orcamentos(db, candidates)
-    scored: list[tuple[float, OrcamentoResumo]] = []
-    for row in candidates:
-        blob = f"{_orcamento_blob(row)} | {item_blobs.get(int(row.id), '')}"
-        score = _fuzzy_match_blob(_normalize_search_text(blob), terms_norm=terms_norm)
-        if score is None:
-            continue
-        scored.append((float(score), row))
-    scored.sort(key=lambda item: (item[0], str(item[1].ano), str(item[1].num_orcamento), str(item[1].versao)), reverse=True)
-    fuzzy_scores = {int(getattr(row, "id", 0) or 0): float(score) for score, row in scored}
-    ranked_rows = _rank_orcamento_rows(db, [row for _, row in scored], query, item_blobs=item_blobs)
+    indice = indice if indice is not None else indice_pesquisa_orcamentos(db)
+    with indice.lock:
+        fuzzy_scores = indice.pontuacao_aproximada(terms_norm, cutoff=0.82, alternativas=_SEARCH_SYNONYMS_ORCAMENTOS)
+    rows = _rows_por_ids(db, fuzzy_scores)
+    ranked_rows = _rank_orcamento_rows(db, rows, query, secoes=indice.secoes((row.id for row in rows), ("items",)))
     for row in ranked_rows:
         row_id = int(getattr(row, "id", 0) or 0)
         row.search_score = max(float(getattr(row, "search_score", 0.0) or 0.0), fuzzy_scores.get(row_id, 0.0))
@@ -1441,56 +1993,42 @@ def search_orcamentos(db: Session, query: str, *, approx: bool = True) -> List[O
     if not (query or "").strip():
         return list_orcamentos(db)
 
-    def _run_sql(
-        terms: Sequence[str],
-        *,
-        expand: bool = False,
-        include_items: bool = False,
-    ) -> List[OrcamentoResumo]:
-        filters = _build_search_filters_orcamentos(terms, expand=expand, include_items=include_items)
-        if not filters:
-            return []
-        stmt = _select_orcamentos().where(*filters)
-        stmt = stmt.order_by(Orcamento.ano.desc(), Orcamento.num_orcamento.desc(), Orcamento.versao)
-        return _rank_orcamento_rows(db, _rows_from_stmt(db, stmt), query)
-
     # 1) comportamento antigo: multi-termos apenas por '%'.
     legacy_terms = _split_terms_percent(query)
     if not legacy_terms:
         return list_orcamentos(db)
-    rows = _run_sql(legacy_terms)
-    if rows:
-        return rows
+
+    # As etapas abaixo sao respondidas pelo indice (uma leitura incremental) e so
+    # a primeira etapa com resultados vai ao BD buscar as linhas a ordenar.
+    etapas: list[tuple[Sequence[str], bool, bool]] = [(legacy_terms, False, False)]
 
     # 2) pesquisa natural: '%' e espaco como separadores de multi-termos.
     raw_terms = _split_terms_raw(query)
     if raw_terms and raw_terms != legacy_terms:
-        rows = _run_sql(raw_terms)
-        if rows:
-            return rows
+        etapas.append((raw_terms, False, False))
 
     # 3) expansao leve: texto sem acentos/pontuacao e sinonimos do dominio.
     search_terms = raw_terms or legacy_terms
-    rows = _run_sql(search_terms, expand=True)
-    if rows:
-        return rows
-
-    rows = _run_sql(search_terms, expand=True, include_items=True)
-    if rows:
-        return rows
+    etapas.append((search_terms, True, False))
+    etapas.append((search_terms, True, True))
 
     norm_terms = _split_terms_normalized(query)
     if norm_terms and norm_terms != search_terms:
-        rows = _run_sql(norm_terms, expand=True)
-        if rows:
-            return rows
-        rows = _run_sql(norm_terms, expand=True, include_items=True)
-        if rows:
-            return rows
-
-    if not approx:
-        return []
+        etapas.append((norm_terms, True, False))
+        etapas.append((norm_terms, True, True))
+
+    indice = indice_pesquisa_orcamentos(db)
+    with indice.lock:
+        for terms, expand, include_items in etapas:
+            ids = _ids_indice_por_termos(indice, terms, expand=expand, include_items=include_items)
+            if ids:
+                rows = _rows_por_ids(db, ids)
+                if rows:
+                    return _rank_orcamento_rows(db, rows, query, secoes=indice.secoes((row.id for row in rows), ("items",)))
+
+        if not approx:
+            return []
 
-    # 4) fallback aproximado em memoria sobre os orcamentos mais recentes.
-    return _fuzzy_search_orcamentos(db, query)
+        # 4) fallback aproximado sobre todos os orcamentos.
+        return _fuzzy_search_orcamentos(db, query, indice)
 
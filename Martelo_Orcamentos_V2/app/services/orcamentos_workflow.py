@@ -3,14 +3,19 @@ from __future__ import annotations
 import datetime
 import os
 import shutil
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional
 
 from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 
 from Martelo_Orcamentos_V2.app.models import Client, Orcamento
-from Martelo_Orcamentos_V2.app.services.orcamentos import create_orcamento, delete_orcamento, duplicate_orcamento_version
+from Martelo_Orcamentos_V2.app.services.orcamentos import (
+    create_orcamento,
+    delete_orcamento,
+    duplicate_orcamento_version,
+    reservar_num_orcamento,
+)
 
 
 @dataclass(frozen=True)
@@ -44,6 +49,8 @@ class OrcamentoSaveRequest:
     localizacao: Optional[str]
     info_1: Optional[str]
     info_2: Optional[str]
+    # novo orcamento com o numero sugerido: o numero definitivo e reservado ao gravar
+    reservar_numero: bool = False
 
 
 @dataclass(frozen=True)
@@ -85,6 +92,7 @@ def prepare_orcamento_save_request(
     localizacao: Optional[str],
     info_1: Optional[str],
     info_2: Optional[str],
+    suggested_seq_text: Optional[str] = None,
 ) -> OrcamentoSaveRequest:
     if not cliente_item:
         raise ValueError("Selecione um cliente.")
@@ -125,6 +133,8 @@ def prepare_orcamento_save_request(
         localizacao=localizacao,
         info_1=info_1,
         info_2=info_2,
+        reservar_numero=bool(suggested_seq_text)
+        and str(seq_text or "").strip().zfill(4) == str(suggested_seq_text).strip().zfill(4),
     )
 
 
@@ -137,6 +147,9 @@ def check_orcamento_save_conflicts(
     if current_id is not None:
         return [], False
     matches = find_ref_cliente_matches(db, request.ref_cliente_txt) if request.ref_cliente_txt else []
+    if getattr(request, "reservar_numero", False):
+        # o numero sugerido pode ja ter sido gravado noutro posto; ao gravar e reservado outro
+        return matches, False
     exists = orcamento_identity_exists(
         db,
         ano=request.ano_txt,
@@ -425,6 +438,9 @@ def save_orcamento_request(
     temp_client_name_key: str,
     updated_at: Optional[datetime.datetime] = None,
 ) -> OrcamentoSaveResult:
+    if current_id is None and getattr(request, "reservar_numero", False):
+        # a sugestao do formulario e so uma leitura; o contador bloqueado garante numero unico entre postos
+        request = replace(request, num_orcamento=reservar_num_orcamento(db, request.ano_txt))
     orcamento, was_new = get_or_create_orcamento_target(
         db,
         current_id=current_id,
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import fnmatch
 import importlib
 import json
 import logging
 import os
 import shutil
+import stat
 import struct
 import subprocess
 import tempfile
+import threading
+import time
 import zipfile
 from dataclasses import dataclass
 from datetime import datetime
@@ -69,6 +73,16 @@ CADERNO_PRINT_MACRO_NAME = "todos_setores"
 DM_DUPLEX_FLAG = 0x1000
 DMDUP_VERTICAL = 2
 
+# Snapshots de pastas CNC reaproveitados enquanto nenhuma pasta da arvore mudar de mtime.
+# Reescrever um ficheiro existente nao muda o mtime da pasta, dai o limite de idade.
+_SNAPSHOT_CACHE_MAX_AGE_S = 10.0
+_SNAPSHOT_CACHE: dict[str, tuple[float, dict[str, int], "FolderSnapshot"]] = {}
+_SNAPSHOT_CACHE_LOCK = threading.Lock()
+
+# Tempo maximo de espera por cada verificacao de `collect_preparacao_statuses` (uma
+# partilha inacessivel nao bloqueia o dialogo).
+PREPARACAO_CHECK_TIMEOUT_S = 20.0
+
 
 @dataclass(frozen=True)
 class ProducaoPreparacaoContext:
@@ -190,6 +204,12 @@ CONFIGURABLE_FILE_SPECS: tuple[_FileSpec, ...] = (
 
 CONFIGURABLE_FILE_KEYS = tuple(spec.key for spec in CONFIGURABLE_FILE_SPECS)
 ALWAYS_REQUIRED_KEYS = ("cnc_source", "cnc_work", "mpr_year", "mpr_sent")
+CNC_STATUS_LABELS = {
+    "cnc_source": "Programas CNC na origem IMOS",
+    "cnc_work": "Programas CNC copiados para a obra",
+    "mpr_year": "Pasta anual MPR disponivel",
+    "mpr_sent": "Programas CNC enviados para CNC",
+}
 CRITICAL_PENDING_KEYS = {
     "lista_material_pdf",
     "projeto_pdf",
@@ -299,18 +319,65 @@ def collect_preparacao_statuses(
     context: ProducaoPreparacaoContext,
     *,
     required_keys: Optional[set[str]] = None,
+    timeout_s: float = PREPARACAO_CHECK_TIMEOUT_S,
 ) -> list[ProducaoPreparacaoStatus]:
+    """
+    Avalia em paralelo cada ficheiro configuravel e as pastas CNC, pela ordem habitual.
+
+    As verificacoes partilham um `_StatCache` (cada pasta e listada uma vez) e cada uma
+    tem `timeout_s` para responder; as que nao respondem ficam bloqueadas e continuam em
+    threads daemon. O Caderno de Encargos altera o livro no Excel, por isso e preparado
+    nesta thread, fora da passagem com tempo limite.
+    """
     required = set(required_keys or set(CONFIGURABLE_FILE_KEYS) | set(ALWAYS_REQUIRED_KEYS))
-    statuses = [
-        _build_file_status(context, spec, True)
-        for spec in CONFIGURABLE_FILE_SPECS
-        if spec.key in required
-    ]
-    statuses.extend(_build_cnc_statuses(context, required))
+    specs = [spec for spec in CONFIGURABLE_FILE_SPECS if spec.key in required]
+    cache = _StatCache()
+    started = time.monotonic()
+    tasks = {
+        spec.key: _DaemonTask(_build_file_status, context, spec, True, cache)
+        for spec in specs
+        if spec.key != "caderno_encargos"
+    }
+    cnc_task = _DaemonTask(_build_cnc_statuses, context, required, cache)
+
+    statuses: list[ProducaoPreparacaoStatus] = []
+    for spec in specs:
+        if spec.key not in tasks:
+            statuses.append(_build_file_status(context, spec, True, cache))
+            continue
+        try:
+            statuses.append(tasks[spec.key].result(timeout=max(0.0, started + timeout_s - time.monotonic())))
+        except TimeoutError:
+            statuses.append(_timeout_status(spec.key, spec.label, timeout_s, required=True, configurable=True))
+    try:
+        statuses.extend(cnc_task.result(timeout=max(0.0, started + timeout_s - time.monotonic())))
+    except TimeoutError:
+        statuses.extend(
+            _timeout_status(key, label, timeout_s, required=key in required)
+            for key, label in CNC_STATUS_LABELS.items()
+        )
     statuses.append(_build_ready_status(statuses, required))
     return statuses
 
 
+def _timeout_status(
+    key: str,
+    label: str,
+    timeout_s: float,
+    *,
+    required: bool,
+    configurable: bool = False,
+) -> ProducaoPreparacaoStatus:
+    return ProducaoPreparacaoStatus(
+        key=key,
+        label=label,
+        state=STATUS_BLOCKED,
+        detail=f"Sem resposta da pasta ao fim de {timeout_s:.0f} s (partilha de rede inacessivel?).",
+        required=required,
+        configurable=configurable,
+    )
+
+
 def build_pending_preparacao_labels(
     context: ProducaoPreparacaoContext,
     *,
@@ -443,9 +510,11 @@ def _build_file_status(
     context: ProducaoPreparacaoContext,
     spec: _FileSpec,
     is_required: bool,
+    cache: Optional["_StatCache"] = None,
 ) -> ProducaoPreparacaoStatus:
-    path = _resolve_spec_path(context, spec)
-    source_paths = _resolve_source_paths(context, spec)
+    cache = cache or _StatCache()
+    path = _resolve_spec_path(context, spec, cache)
+    source_paths = _resolve_source_paths(context, spec, cache)
     if spec.key == "projeto_pdf":
         action_key = ACTION_GENERATE_PROJETO_PDF
         action_label = "Gerar"
@@ -466,7 +535,7 @@ def _build_file_status(
             configurable=True,
         )
 
-    if path is None or not path.exists():
+    if path is None or not cache.exists(path):
         detail = _missing_file_detail(context, spec)
         if source_paths:
             detail += "\nOrigem detetada: " + ", ".join(str(source) for source in source_paths[:3])
@@ -517,15 +586,15 @@ def _build_file_status(
             action_label=action_label,
         )
 
-    newest_source = _newest_existing(source_paths)
-    if newest_source and newest_source.stat().st_mtime > path.stat().st_mtime + 1:
+    newest_source = _newest_existing(source_paths, cache)
+    if newest_source and cache.mtime(newest_source) > cache.mtime(path) + 1:
         return ProducaoPreparacaoStatus(
             key=spec.key,
             label=spec.label,
             state=STATUS_OUTDATED,
             detail=(
                 f"{path}\nDesatualizado face a {newest_source.name} "
-                f"({ _fmt_ts(newest_source.stat().st_mtime) } > { _fmt_ts(path.stat().st_mtime) })"
+                f"({ _fmt_ts(cache.mtime(newest_source)) } > { _fmt_ts(cache.mtime(path)) })"
             ),
             required=is_required,
             configurable=True,
@@ -548,17 +617,27 @@ def _build_file_status(
 def _build_cnc_statuses(
     context: ProducaoPreparacaoContext,
     required_keys: set[str],
+    cache: Optional["_StatCache"] = None,
 ) -> list[ProducaoPreparacaoStatus]:
     statuses: list[ProducaoPreparacaoStatus] = []
-    source_snapshot = _snapshot_tree(context.cnc_source_folder)
-    work_snapshot = _snapshot_tree(context.work_programs_folder)
-    mpr_snapshot = _snapshot_tree(context.mpr_programs_folder)
+    mpr_year_exists = (cache or _StatCache()).exists(context.mpr_year_folder)
+    # as tres pastas sao percorridas em paralelo; o estado "enviado para CNC" fica
+    # decidido (bloqueado) sem a pasta MPR quando falta a pasta anual ou a da obra
+    stop_mpr = threading.Event()
+    source_task = _DaemonTask(_snapshot_tree, context.cnc_source_folder)
+    work_task = _DaemonTask(_snapshot_tree, context.work_programs_folder)
+    mpr_task = _DaemonTask(_snapshot_tree, context.mpr_programs_folder, stop=stop_mpr) if mpr_year_exists else None
+    work_snapshot = work_task.result()
+    if work_snapshot is None:
+        stop_mpr.set()
+    source_snapshot = source_task.result()
+    mpr_snapshot = mpr_task.result() if mpr_task is not None else None
 
     if source_snapshot is None:
         statuses.append(
             ProducaoPreparacaoStatus(
                 key="cnc_source",
-                label="Programas CNC na origem IMOS",
+                label=CNC_STATUS_LABELS["cnc_source"],
                 state=STATUS_MISSING,
                 detail=f"{context.cnc_source_folder} (em falta)",
                 required="cnc_source" in required_keys,
@@ -568,7 +647,7 @@ def _build_cnc_statuses(
         statuses.append(
             ProducaoPreparacaoStatus(
                 key="cnc_source",
-                label="Programas CNC na origem IMOS",
+                label=CNC_STATUS_LABELS["cnc_source"],
                 state=STATUS_OK,
                 detail=_folder_detail(context.cnc_source_folder, source_snapshot),
                 required="cnc_source" in required_keys,
@@ -596,7 +675,7 @@ def _build_cnc_statuses(
     statuses.append(
         ProducaoPreparacaoStatus(
             key="cnc_work",
-            label="Programas CNC copiados para a obra",
+            label=CNC_STATUS_LABELS["cnc_work"],
             state=work_state,
             detail=work_detail,
             required="cnc_work" in required_keys,
@@ -605,11 +684,11 @@ def _build_cnc_statuses(
         )
     )
 
-    year_state = STATUS_OK if context.mpr_year_folder.exists() else STATUS_MISSING
+    year_state = STATUS_OK if mpr_year_exists else STATUS_MISSING
     statuses.append(
         ProducaoPreparacaoStatus(
             key="mpr_year",
-            label="Pasta anual MPR disponivel",
+            label=CNC_STATUS_LABELS["mpr_year"],
             state=year_state,
             detail=str(context.mpr_year_folder) if year_state == STATUS_OK else f"{context.mpr_year_folder} (em falta)",
             required="mpr_year" in required_keys,
@@ -641,7 +720,7 @@ def _build_cnc_statuses(
     statuses.append(
         ProducaoPreparacaoStatus(
             key="mpr_sent",
-            label="Programas CNC enviados para CNC",
+            label=CNC_STATUS_LABELS["mpr_sent"],
             state=mpr_state,
             detail=mpr_detail,
             required="mpr_sent" in required_keys,
@@ -677,7 +756,7 @@ def _build_ready_status(
     )
 
 
-def _resolve_spec_path(context: ProducaoPreparacaoContext, spec: _FileSpec) -> Optional[Path]:
+def _resolve_spec_path(context: ProducaoPreparacaoContext, spec: _FileSpec, cache: "_StatCache") -> Optional[Path]:
     if spec.key == "cutrite_pdf":
         return _resolve_cutrite_work_pdf_path(context)
     if spec.key == "conj_pdf":
@@ -685,20 +764,20 @@ def _resolve_spec_path(context: ProducaoPreparacaoContext, spec: _FileSpec) -> O
     if spec.key == "projeto_pdf":
         return context.projeto_pdf_path
 
-    matches = sorted(context.work_folder.glob(spec.pattern))
+    matches = cache.glob(context.work_folder, spec.pattern)
     return matches[0] if matches else None
 
 
-def _resolve_source_paths(context: ProducaoPreparacaoContext, spec: _FileSpec) -> list[Path]:
+def _resolve_source_paths(context: ProducaoPreparacaoContext, spec: _FileSpec, cache: "_StatCache") -> list[Path]:
     if spec.key == "cutrite_pdf":
         source_path = _resolve_cutrite_export_pdf_path(context)
-        return [source_path] if source_path is not None and source_path.exists() else []
+        return [source_path] if source_path is not None and cache.exists(source_path) else []
     if spec.key == "projeto_pdf":
-        return [context.conj_pdf_path] if context.conj_pdf_path.exists() else []
+        return [context.conj_pdf_path] if cache.exists(context.conj_pdf_path) else []
 
     paths: list[Path] = []
     for pattern in spec.source_patterns:
-        paths.extend(sorted(context.work_folder.glob(pattern)))
+        paths.extend(cache.glob(context.work_folder, pattern))
     return paths
 
 
@@ -783,27 +862,200 @@ def _resolve_latest_imos_png_path(context: ProducaoPreparacaoContext) -> Path:
     )
 
 
-def _newest_existing(paths: Iterable[Path]) -> Optional[Path]:
-    existing = [path for path in paths if path.exists()]
+def _newest_existing(paths: Iterable[Path], cache: Optional["_StatCache"] = None) -> Optional[Path]:
+    cache = cache or _StatCache()
+    existing = [path for path in paths if cache.exists(path)]
     if not existing:
         return None
-    return max(existing, key=lambda path: path.stat().st_mtime)
+    return max(existing, key=cache.mtime)
+
+
+class _DaemonTask:
+    """
+    Corre `func` numa thread daemon e guarda o resultado (ou a excecao).
+
+    Ao contrario dos workers de `concurrent.futures`, estas threads nao sao esperadas a
+    saida do interpretador: uma leitura presa numa partilha nao impede fechar a aplicacao.
+    """
+
+    def __init__(self, func, *args, **kwargs) -> None:
+        self._done = threading.Event()
+        self._value = None
+        self._error: Optional[BaseException] = None
+        thread = threading.Thread(
+            target=self._run,
+            args=(func, args, kwargs),
+            name=f"preparacao-{getattr(func, '__name__', 'task')}",
+            daemon=True,
+        )
+        thread.start()
 
+    def _run(self, func, args, kwargs) -> None:
+        try:
+            self._value = func(*args, **kwargs)
+        except BaseException as exc:
+            self._error = exc
+        finally:
+            self._done.set()
+
+    def result(self, timeout: Optional[float] = None):
+        if not self._done.wait(timeout):
+            raise TimeoutError
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class _StatCache:
+    """
+    Listagens e stats partilhados pelas verificacoes de uma chamada (thread-safe).
+
+    Cada pasta e listada no maximo uma vez (os stats dos ficheiros vem da listagem);
+    caminhos cuja pasta nao foi listada sao consultados com um unico `os.stat`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key_locks: dict[tuple[str, str], threading.Lock] = {}
+        self._listings: dict[str, Optional[dict[str, os.DirEntry]]] = {}
+        self._stats: dict[str, Optional[os.stat_result]] = {}
+
+    def _once(self, kind: str, key: str, store: dict, compute):
+        with self._lock:
+            if key in store:
+                return store[key]
+            key_lock = self._key_locks.setdefault((kind, key), threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in store:
+                    return store[key]
+            value = compute()
+            with self._lock:
+                store[key] = value
+            return value
+
+    def entries(self, folder: Path) -> Optional[dict[str, os.DirEntry]]:
+        """Entradas de `folder` por nome (normcase); None se a pasta nao puder ser listada."""
+
+        def _list() -> Optional[dict[str, os.DirEntry]]:
+            try:
+                with os.scandir(folder) as it:
+                    return {os.path.normcase(entry.name): entry for entry in it}
+            except OSError:
+                return None
+
+        return self._once("list", os.path.normcase(os.path.abspath(str(folder))), self._listings, _list)
+
+    def glob(self, folder: Path, pattern: str) -> list[Path]:
+        entries = self.entries(folder) or {}
+        return sorted(folder / entry.name for entry in entries.values() if fnmatch.fnmatch(entry.name, pattern))
+
+    def stat(self, path: Path) -> Optional[os.stat_result]:
+        key = os.path.normcase(os.path.abspath(str(path)))
+        with self._lock:
+            parent = self._listings.get(os.path.dirname(key))
+        if parent is not None:
+            # pasta-mae ja listada: o stat vem da listagem (None se o ficheiro nao existir)
+            entry = parent.get(os.path.basename(key))
+            if entry is None:
+                return None
+            try:
+                return entry.stat()
+            except OSError:
+                return None
 
-def _snapshot_tree(folder: Path) -> Optional[FolderSnapshot]:
-    if not folder.exists() or not folder.is_dir():
+        def _stat() -> Optional[os.stat_result]:
+            try:
+                return os.stat(path)
+            except OSError:
+                return None
+
+        return self._once("stat", key, self._stats, _stat)
+
+    def exists(self, path: Path) -> bool:
+        return self.stat(path) is not None
+
+    def mtime(self, path: Path) -> float:
+        info = self.stat(path)
+        return float(info.st_mtime) if info is not None else 0.0
+
+
+def _snapshot_tree(folder: Path, *, stop: Optional[threading.Event] = None) -> Optional[FolderSnapshot]:
+    """
+    Conta os ficheiros da arvore de `folder` e a data do mais recente.
+
+    Usa `os.scandir` (os dados de stat vem com a listagem no Windows) e reaproveita o
+    ultimo resultado enquanto as pastas da arvore mantiverem o mtime. Devolve None se a
+    pasta nao existir ou se `stop` for ativado a meio (resultado ja nao necessario).
+    """
+    key = os.path.normcase(os.path.abspath(str(folder)))
+    with _SNAPSHOT_CACHE_LOCK:
+        cached = _SNAPSHOT_CACHE.get(key)
+    if cached is not None and time.monotonic() - cached[0] < _SNAPSHOT_CACHE_MAX_AGE_S:
+        if _dir_mtimes_unchanged(cached[1], stop):
+            return cached[2]
+    if stop is not None and stop.is_set():
         return None
+    try:
+        info = os.stat(folder)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode):
+        return None
+
+    started = time.monotonic()
+    dir_mtimes = {str(folder): info.st_mtime_ns}
+    pending = [str(folder)]
     file_count = 0
     latest = 0.0
-    for path in folder.rglob("*"):
-        if not path.is_file():
-            continue
-        file_count += 1
+    while pending:
+        if stop is not None and stop.is_set():
+            return None
+        current = pending.pop()
         try:
-            latest = max(latest, path.stat().st_mtime)
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dir_mtimes[entry.path] = entry.stat(follow_symlinks=False).st_mtime_ns
+                            pending.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    file_count += 1
+                    try:
+                        latest = max(latest, entry.stat().st_mtime)
+                    except OSError:
+                        continue
         except OSError:
             continue
-    return FolderSnapshot(file_count=file_count, latest_mtime=latest)
+    snapshot = FolderSnapshot(file_count=file_count, latest_mtime=latest)
+    with _SNAPSHOT_CACHE_LOCK:
+        _SNAPSHOT_CACHE[key] = (started, dir_mtimes, snapshot)
+    return snapshot
+
+
+def _dir_mtimes_unchanged(dir_mtimes: dict[str, int], stop: Optional[threading.Event]) -> bool:
+    for path, mtime_ns in dir_mtimes.items():
+        if stop is not None and stop.is_set():
+            return False
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _forget_snapshots(*folders: Path) -> None:
+    """Descarta os snapshots de `folders` (e das pastas dentro delas) depois de as alterar."""
+    keys = [os.path.normcase(os.path.abspath(str(folder))) for folder in folders]
+    with _SNAPSHOT_CACHE_LOCK:
+        for cached_key in list(_SNAPSHOT_CACHE):
+            if any(cached_key == key or cached_key.startswith(key + os.sep) for key in keys):
+                del _SNAPSHOT_CACHE[cached_key]
 
 
 def _snapshot_is_older(target: FolderSnapshot, reference: FolderSnapshot) -> bool:
@@ -1404,7 +1656,10 @@ def _replace_tree(source: Path, target: Path) -> None:
     if target.exists():
         shutil.rmtree(target)
     target.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copytree(source, target)
+    try:
+        shutil.copytree(source, target)
+    finally:
+        _forget_snapshots(target)
 
 
 def _generate_projeto_pdf_vector(source_pdf_path: Path, output_pdf_path: Path, *, max_pages: int) -> None:
@@ -1,20 +1,23 @@
 from __future__ import annotations
 
+import datetime
 import difflib
 import re
 import unicodedata
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Sequence, Tuple
+from typing import Iterable, Optional, Sequence, Tuple
 
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import String, cast, desc, or_, select
+from sqlalchemy import String, cast, desc, event, or_, select
 
 from Martelo_Orcamentos_V2.app.config import settings
 from Martelo_Orcamentos_V2.app.models.client import Client
 from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento
 from Martelo_Orcamentos_V2.app.models.producao import Producao
+from Martelo_Orcamentos_V2.app.services.indice_pastas import caminho_indice_pastas, indice_pastas
+from Martelo_Orcamentos_V2.app.services.indice_texto import LOTE_IDS, IndiceTexto, SincronizacaoIndice, lotes_ids
 from Martelo_Orcamentos_V2.app.services.settings import get_setting
 
 # Caminho base fornecido pelo utilizador
@@ -196,6 +199,55 @@ def _producao_root_dir(
 
 _SEP_PATTERN = r"(?:_|-| )"
 
+# Niveis listados abaixo de <base>/<ano> pelo indice de pastas: tipo, ENC, ENC_VV, ENC_VV_PP.
+_PROFUNDIDADE_INDICE_PASTAS = 3
+
+
+def _subpastas(pasta: Path, *, revalidar: bool = False) -> Optional[list[Path]]:
+    """
+    Subpastas de `pasta` pelo indice de pastas (None se nao existir/nao for acessivel).
+
+    Listagens para mostrar aceitam o indice em cache; decisoes (versoes livres, criar pastas)
+    usam `revalidar=True` para confirmar o mtime no servidor.
+    """
+    nomes = indice_pastas().subpastas(pasta, revalidar=revalidar)
+    if nomes is None:
+        return None
+    return [pasta / nome for nome in nomes]
+
+
+def iniciar_indice_pastas(
+    session: Session,
+    *,
+    base_dir: str | Path | None = None,
+    anos: Optional[Sequence[str | int]] = None,
+    intervalo_s: float = 60.0,
+) -> None:
+    """
+    Liga a atualizacao em segundo plano do indice de pastas de producao
+    (por omissao, ano atual e anterior).
+    """
+    base = Path(_resolve_base_dir(session, base_dir))
+    if anos is None:
+        atual = datetime.date.today().year
+        anos = (atual, atual - 1)
+    raizes = [base / _ano_two_digits(ano)[0] for ano in anos]
+    indice_pastas().iniciar(
+        raizes,
+        profundidade=_PROFUNDIDADE_INDICE_PASTAS,
+        intervalo_s=intervalo_s,
+        caminho=caminho_indice_pastas(),
+    )
+
+
+def atualizar_indice_pastas() -> None:
+    """Pede uma releitura completa das pastas do servidor (opcao "atualizar agora")."""
+    indice = indice_pastas()
+    if indice.em_execucao():
+        indice.pedir_atualizacao(forcar=True)
+    else:
+        indice.limpar()
+
 
 def listar_versoes_obra_em_pastas(
     session: Session,
@@ -204,6 +256,7 @@ def listar_versoes_obra_em_pastas(
     num_enc_phc: str | int,
     tipo_pasta: Optional[str] = None,
     base_dir: str | Path | None = None,
+    revalidar: bool = False,
 ) -> set[str]:
     """
     Lista versoes de obra (VV) existentes nas pastas do servidor para o mesmo ano+encomenda.
@@ -211,33 +264,21 @@ def listar_versoes_obra_em_pastas(
     """
     enc = _num_enc_norm(num_enc_phc)
     root = _producao_root_dir(session, ano=ano, tipo_pasta=tipo_pasta, base_dir=base_dir)
-    try:
-        if not root.is_dir():
-            return set()
-    except Exception:
+    seg1_dirs = _subpastas(root, revalidar=revalidar)
+    if seg1_dirs is None:
         return set()
 
     pat_vv = re.compile(rf"^{re.escape(enc)}{_SEP_PATTERN}(?P<vv>\d{{2}}){_SEP_PATTERN}", re.IGNORECASE)
     found: set[str] = set()
 
-    try:
-        for seg1 in root.iterdir():
-            if not seg1.is_dir():
-                continue
-            if not _folder_name_matches_prefix(seg1.name, enc):
-                continue
-            try:
-                for seg2 in seg1.iterdir():
-                    if not seg2.is_dir():
-                        continue
-                    m = pat_vv.match(seg2.name)
-                    if not m:
-                        continue
-                    found.add(_two_digit(m.group("vv")))
-            except Exception:
+    for seg1 in seg1_dirs:
+        if not _folder_name_matches_prefix(seg1.name, enc):
+            continue
+        for seg2 in _subpastas(seg1, revalidar=revalidar) or ():
+            m = pat_vv.match(seg2.name)
+            if not m:
                 continue
-    except Exception:
-        return set()
+            found.add(_two_digit(m.group("vv")))
 
     return found
 
@@ -250,6 +291,7 @@ def listar_versoes_plano_em_pastas(
     versao_obra: str | int,
     tipo_pasta: Optional[str] = None,
     base_dir: str | Path | None = None,
+    revalidar: bool = False,
 ) -> set[str]:
     """
     Lista versoes de plano CUT-RITE (PP) existentes nas pastas do servidor dentro da versao de obra.
@@ -257,10 +299,8 @@ def listar_versoes_plano_em_pastas(
     enc = _num_enc_norm(num_enc_phc)
     vv = _two_digit(versao_obra)
     root = _producao_root_dir(session, ano=ano, tipo_pasta=tipo_pasta, base_dir=base_dir)
-    try:
-        if not root.is_dir():
-            return set()
-    except Exception:
+    seg1_dirs = _subpastas(root, revalidar=revalidar)
+    if seg1_dirs is None:
         return set()
 
     pat_vvpp = re.compile(
@@ -269,32 +309,17 @@ def listar_versoes_plano_em_pastas(
     )
     found: set[str] = set()
 
-    try:
-        for seg1 in root.iterdir():
-            if not seg1.is_dir():
-                continue
-            if not _folder_name_matches_prefix(seg1.name, enc):
-                continue
-            try:
-                for seg2 in seg1.iterdir():
-                    if not seg2.is_dir():
-                        continue
-                    if not _folder_name_matches_prefix(seg2.name, f"{enc}_{vv}"):
-                        continue
-                    try:
-                        for seg3 in seg2.iterdir():
-                            if not seg3.is_dir():
-                                continue
-                            m = pat_vvpp.match(seg3.name)
-                            if not m:
-                                continue
-                            found.add(_two_digit(m.group("pp")))
-                    except Exception:
-                        continue
-            except Exception:
+    for seg1 in seg1_dirs:
+        if not _folder_name_matches_prefix(seg1.name, enc):
+            continue
+        for seg2 in _subpastas(seg1, revalidar=revalidar) or ():
+            if not _folder_name_matches_prefix(seg2.name, f"{enc}_{vv}"):
                 continue
-    except Exception:
-        return set()
+            for seg3 in _subpastas(seg2, revalidar=revalidar) or ():
+                m = pat_vvpp.match(seg3.name)
+                if not m:
+                    continue
+                found.add(_two_digit(m.group("pp")))
 
     return found
 
@@ -318,40 +343,27 @@ def listar_pastas_enc_arvore(
     tree: dict[str, dict[str, list[str]]] = {}
     nodes = 0
 
-    try:
-        if not root.is_dir():
-            return str(root), tree
-    except Exception:
-        return str(root), tree
-
-    try:
-        for seg1 in sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.name.casefold()):
+    # o indice devolve as subpastas ja por ordem alfabetica (casefold)
+    for seg1 in _subpastas(root) or ():
+        if nodes >= max_nodes:
+            break
+        if not _folder_name_matches_prefix(seg1.name, enc):
+            continue
+        nodes += 1
+        tree.setdefault(seg1.name, {})
+        seg2_dirs = _subpastas(seg1)
+        if seg2_dirs is None:
+            continue
+        for seg2 in seg2_dirs:
             if nodes >= max_nodes:
                 break
-            if not _folder_name_matches_prefix(seg1.name, enc):
-                continue
             nodes += 1
-            tree.setdefault(seg1.name, {})
-            try:
-                seg2_dirs = sorted((p for p in seg1.iterdir() if p.is_dir()), key=lambda p: p.name.casefold())
-            except Exception:
-                continue
-            for seg2 in seg2_dirs:
+            tree[seg1.name].setdefault(seg2.name, [])
+            for seg3 in _subpastas(seg2) or ():
                 if nodes >= max_nodes:
                     break
                 nodes += 1
-                tree[seg1.name].setdefault(seg2.name, [])
-                try:
-                    seg3_dirs = sorted((p for p in seg2.iterdir() if p.is_dir()), key=lambda p: p.name.casefold())
-                except Exception:
-                    continue
-                for seg3 in seg3_dirs:
-                    if nodes >= max_nodes:
-                        break
-                    nodes += 1
-                    tree[seg1.name][seg2.name].append(seg3.name)
-    except Exception:
-        pass
+                tree[seg1.name][seg2.name].append(seg3.name)
 
     return str(root), tree
 
@@ -383,6 +395,7 @@ def sugerir_proxima_versao_obra(
                 num_enc_phc=enc_norm,
                 tipo_pasta=tipo_pasta,
                 base_dir=base_dir,
+                revalidar=True,
             )
         )
     except Exception:
@@ -438,6 +451,7 @@ def sugerir_proxima_versao_plano(
                 versao_obra=ver_obra,
                 tipo_pasta=tipo_pasta,
                 base_dir=base_dir,
+                revalidar=True,
             )
         )
     except Exception:
@@ -550,6 +564,8 @@ def criar_pasta_servidor(info: PastaInfo, *, exist_ok: bool = True) -> Path:
         path.mkdir(parents=True, exist_ok=exist_ok)
     except OSError as exc:
         raise OSError(f"Falha ao criar pasta: {path} ({exc})") from exc
+    finally:
+        indice_pastas().invalidar(path)
     return path
 
 
@@ -658,6 +674,7 @@ def criar_processo(
     except IntegrityError as exc:
         session.rollback()
         raise ValueError(f"Codigo de processo duplicado ou chave ja existente: {exc}") from exc
+    _atualizar_indice_processo(session, int(processo.id), processo)
 
     if criar_pasta:
         criar_pasta_para_processo(
@@ -898,42 +915,45 @@ def _build_search_filters(terms: Sequence[str], *, expand: bool = False):
     return filters
 
 
+_CAMPOS_BLOB_PRODUCAO = (
+    "id",
+    "codigo_processo",
+    "ano",
+    "num_enc_phc",
+    "versao_obra",
+    "versao_plano",
+    "orcamento_id",
+    "client_id",
+    "responsavel",
+    "estado",
+    "nome_cliente",
+    "nome_cliente_simplex",
+    "num_cliente_phc",
+    "ref_cliente",
+    "num_orcamento",
+    "versao_orc",
+    "obra",
+    "localizacao",
+    "descricao_orcamento",
+    "data_entrega",
+    "data_inicio",
+    "preco_total",
+    "qt_artigos",
+    "descricao_artigos",
+    "materias_usados",
+    "descricao_producao",
+    "notas1",
+    "notas2",
+    "notas3",
+    "imagem_path",
+    "pasta_servidor",
+    "tipo_pasta",
+)
+
+
 def _producao_blob(proc: Producao) -> str:
     parts = []
-    for attr in (
-        "id",
-        "codigo_processo",
-        "ano",
-        "num_enc_phc",
-        "versao_obra",
-        "versao_plano",
-        "orcamento_id",
-        "client_id",
-        "responsavel",
-        "estado",
-        "nome_cliente",
-        "nome_cliente_simplex",
-        "num_cliente_phc",
-        "ref_cliente",
-        "num_orcamento",
-        "versao_orc",
-        "obra",
-        "localizacao",
-        "descricao_orcamento",
-        "data_entrega",
-        "data_inicio",
-        "preco_total",
-        "qt_artigos",
-        "descricao_artigos",
-        "materias_usados",
-        "descricao_producao",
-        "notas1",
-        "notas2",
-        "notas3",
-        "imagem_path",
-        "pasta_servidor",
-        "tipo_pasta",
-    ):
+    for attr in _CAMPOS_BLOB_PRODUCAO:
         try:
             val = getattr(proc, attr, None)
         except Exception:
@@ -976,7 +996,34 @@ def _build_search_reason(label: str, term_norm: str, kind: str, matched: str) ->
     return f"Encontrado em: {label}"
 
 
-def _rank_processos(rows: Sequence[Producao], query: str) -> list[Producao]:
+# Secoes da ordenacao dos resultados: (rotulo, peso, campos de Producao).
+_SECOES_PROCESSOS = (
+    ("Referencia", 8.0, ("codigo_processo", "num_enc_phc", "num_cliente_phc", "ref_cliente", "num_orcamento", "ano")),
+    ("Cliente", 7.0, ("nome_cliente", "nome_cliente_simplex")),
+    ("Obra", 6.0, ("obra", "localizacao")),
+    ("Descricao Producao", 5.0, ("descricao_producao",)),
+    ("Descricao Artigos", 4.5, ("descricao_artigos",)),
+    ("Materiais", 4.0, ("materias_usados",)),
+    ("Notas", 2.5, ("notas1", "notas2", "notas3")),
+    ("Estado/Responsavel/Data", 2.0, ("estado", "responsavel", "data_inicio", "data_entrega")),
+)
+
+
+def _secoes_processo(proc) -> dict[str, str]:
+    """Texto normalizado de cada secao de `_SECOES_PROCESSOS` (aceita Producao ou linha do BD)."""
+    secoes: dict[str, str] = {}
+    for label, _weight, campos in _SECOES_PROCESSOS:
+        valores = (getattr(proc, campo, None) for campo in campos)
+        secoes[label] = _normalize_txt(" ".join(str(val) for val in valores if val not in (None, "")))
+    return secoes
+
+
+def _rank_processos(
+    rows: Sequence[Producao],
+    query: str,
+    *,
+    secoes: Optional[dict[int, dict[str, str]]] = None,
+) -> list[Producao]:
     rows_list = list(rows)
     terms_norm = _split_terms_normalized(query)
     if not rows_list or not terms_norm:
@@ -984,30 +1031,16 @@ def _rank_processos(rows: Sequence[Producao], query: str) -> list[Producao]:
 
     ranked: list[tuple[float, int, Producao]] = []
     for proc in rows_list:
-        sections = (
-            (
-                "Referencia",
-                8.0,
-                f"{getattr(proc, 'codigo_processo', '')} {getattr(proc, 'num_enc_phc', '')} "
-                f"{getattr(proc, 'num_cliente_phc', '')} {getattr(proc, 'ref_cliente', '')} "
-                f"{getattr(proc, 'num_orcamento', '')} {getattr(proc, 'ano', '')}",
-            ),
-            ("Cliente", 7.0, f"{getattr(proc, 'nome_cliente', '')} {getattr(proc, 'nome_cliente_simplex', '')}"),
-            ("Obra", 6.0, f"{getattr(proc, 'obra', '')} {getattr(proc, 'localizacao', '')}"),
-            ("Descricao Producao", 5.0, getattr(proc, "descricao_producao", "")),
-            ("Descricao Artigos", 4.5, getattr(proc, "descricao_artigos", "")),
-            ("Materiais", 4.0, getattr(proc, "materias_usados", "")),
-            ("Notas", 2.5, f"{getattr(proc, 'notas1', '')} {getattr(proc, 'notas2', '')} {getattr(proc, 'notas3', '')}"),
-            ("Estado/Responsavel/Data", 2.0, f"{getattr(proc, 'estado', '')} {getattr(proc, 'responsavel', '')} {getattr(proc, 'data_inicio', '')} {getattr(proc, 'data_entrega', '')}"),
-        )
+        proc_id = int(getattr(proc, "id", 0) or 0)
+        textos = (secoes or {}).get(proc_id) or _secoes_processo(proc)
         score = 0.0
         best_reason = ""
         best_reason_score = 0.0
         for term_norm in terms_norm:
             best_term_score = 0.0
             best_term_reason = ""
-            for label, weight, text_value in sections:
-                match_score, match_kind, matched = _score_term_in_text(term_norm, _normalize_txt(str(text_value or "")))
+            for label, weight, _campos in _SECOES_PROCESSOS:
+                match_score, match_kind, matched = _score_term_in_text(term_norm, textos.get(label, ""))
                 if match_score <= 0:
                     continue
                 weighted = weight * match_score
@@ -1021,35 +1054,105 @@ def _rank_processos(rows: Sequence[Producao], query: str) -> list[Producao]:
 
         setattr(proc, "search_score", float(score))
         setattr(proc, "search_reason", best_reason)
-        ranked.append((float(score), int(getattr(proc, "id", 0) or 0), proc))
+        ranked.append((float(score), proc_id, proc))
 
     ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
     return [proc for _, _, proc in ranked]
 
 
-def _fuzzy_match_blob(blob_norm: str, *, terms_norm: Sequence[str]) -> Optional[float]:
-    """
-    Match por aproximação:
-    - cada termo tem de existir no blob normalizado OU ter close-match em alguma palavra
-    - retorna score (maior = melhor) ou None se não corresponder
+# -----------------------
+# INDICE DE PESQUISA
+# -----------------------
+
+# Um indice em memoria por BD: texto normalizado de cada processo + secoes da ordenacao.
+# ids alterados pela sessao (a reler do BD depois do commit/rollback)
+_INFO_INDICE_PROCESSOS = "producao_indice_processos"
+
+
+def _definir_processo_no_indice(indice: IndiceTexto, proc) -> None:
+    indice.definir(
+        int(proc.id),
+        {"processo": _normalize_txt(_producao_blob(proc))},
+        {"secoes": _secoes_processo(proc)},
+    )
+
+
+def _reindexar_processos(session: Session, indice: IndiceTexto, proc_ids: Optional[Iterable[int]]) -> None:
+    """Rele do BD os processos indicados (todos se None); os que ja nao existem saem do indice."""
+    stmt = select(*(getattr(Producao, attr) for attr in _CAMPOS_BLOB_PRODUCAO))
+    if proc_ids is None:
+        for row in session.execute(stmt):
+            _definir_processo_no_indice(indice, row)
+        return
+    for lote in lotes_ids(proc_ids):
+        vistos: set[int] = set()
+        for row in session.execute(stmt.where(Producao.id.in_(lote))):
+            _definir_processo_no_indice(indice, row)
+            vistos.add(int(row.id))
+        for proc_id in set(lote) - vistos:
+            indice.remover(proc_id)
+
+
+_SINCRONIZACAO_PROCESSOS = SincronizacaoIndice(
+    campos=("processo",),
+    id_documento=Producao.id,
+    tabelas=(("producao", Producao.updated_at, select(Producao.id)),),
+    reindexar=lambda session, indice, ids: _reindexar_processos(session, indice, ids),
+)
+
+
+def indice_pesquisa_processos(session: Session) -> IndiceTexto:
+    """Indice de pesquisa dos processos do BD da sessao, sincronizado com o estado atual."""
+    return _SINCRONIZACAO_PROCESSOS.indice(session)
+
+
+def _atualizar_indice_processo(session: Session, proc_id: int, proc: Optional[Producao] = None) -> None:
+    """Atualiza logo o documento do processo (ou remove-o se `proc` for None).
+
+    O texto vem do objeto da sessao; depois do commit/rollback o processo volta a
+    ser lido do BD na sincronizacao seguinte.
     """
-    if not terms_norm:
-        return 0.0
-    if not blob_norm:
-        return None
-    words = set(blob_norm.split())
-    score = 0.0
-    for t in terms_norm:
-        if t in blob_norm:
-            score += 1.0
-            continue
-        if len(t) < 4:
-            return None
-        close = difflib.get_close_matches(t, words, n=1, cutoff=0.82)
-        if not close:
-            return None
-        score += difflib.SequenceMatcher(None, t, close[0]).ratio()
-    return score
+    indice = _SINCRONIZACAO_PROCESSOS.existente(session)
+    if indice is None:
+        return
+    with indice.lock:
+        if proc is None:
+            indice.remover(proc_id)
+        else:
+            _definir_processo_no_indice(indice, proc)
+    session.info.setdefault(_INFO_INDICE_PROCESSOS, set()).add(int(proc_id))
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reler_processos_alterados(session: Session) -> None:
+    proc_ids = session.info.pop(_INFO_INDICE_PROCESSOS, None)
+    if proc_ids:
+        _SINCRONIZACAO_PROCESSOS.marcar(session, proc_ids)
+
+
+def _ids_processos_por_termos(indice: IndiceTexto, terms: Sequence[str], *, expand: bool = False) -> set[int]:
+    resultado: Optional[set[int]] = None
+    for term in terms:
+        docs: set[int] = set()
+        for alternative in _uniq_terms([_normalize_txt(alt) for alt in _term_alternatives(term, expand=expand)]):
+            docs |= indice.procurar(alternative)
+        resultado = docs if resultado is None else resultado & docs
+        if not resultado:
+            return set()
+    return resultado or set()
+
+
+def _processos_por_ids(session: Session, base, ids: Sequence[int], limit: int) -> list[Producao]:
+    """Processos de `ids` (pela ordem dada) que passam os filtros de `base`, ate `limit`."""
+    rows: list[Producao] = []
+    for pos in range(0, len(ids), LOTE_IDS):
+        lote = list(ids[pos : pos + LOTE_IDS])
+        por_id = {int(proc.id): proc for proc in session.execute(base.where(Producao.id.in_(lote))).scalars()}
+        rows.extend(por_id[proc_id] for proc_id in lote if proc_id in por_id)
+        if limit and len(rows) >= limit:
+            return rows[: int(limit)]
+    return rows
 
 
 def listar_processos(
@@ -1069,6 +1172,8 @@ def listar_processos(
     - procura em todos os campos relevantes do modelo `Producao` (inclui descrições/notas)
     - suporta multi-termos separados por '%' ou espaço
     - ignora pontuação no fallback (normalização) e tenta aproximação se não houver resultados
+    - os termos sao procurados no indice em memoria (`indice_pesquisa_processos`); so os
+      processos encontrados sao lidos do BD
     """
     base = select(Producao).order_by(desc(Producao.id))
     if estado:
@@ -1087,67 +1192,40 @@ def listar_processos(
     raw_terms = _split_terms_raw(search or "")
     norm_terms = _split_terms_normalized(search or "")
 
-    def _run_sql(terms: Sequence[str]) -> list[Producao]:
-        if not terms:
-            return []
-        stmt = base.where(*_build_search_filters(terms))
-        if limit:
-            stmt = stmt.limit(limit)
-        return _rank_processos(session.execute(stmt).scalars().all(), search or "")
-
-    # 1) tentativa "precisa" (mantém pontuação interna para códigos)
+    # 1) tentativa "precisa" (termos como escritos), 2) normalizada (tokens sem
+    # pontuação), 3) com sinónimos
+    etapas: list[tuple[Sequence[str], bool]] = []
     if raw_terms:
-        rows = _run_sql(raw_terms)
-        if rows:
-            return rows
-
-    # 2) tentativa normalizada (ignora pontuação e separa em tokens)
+        etapas.append((raw_terms, False))
     if norm_terms and norm_terms != raw_terms:
-        rows = _run_sql(norm_terms)
-        if rows:
-            return rows
-
-    search_terms = norm_terms or raw_terms
-    if search_terms:
-        stmt = base.where(*_build_search_filters(search_terms, expand=True))
-        if limit:
-            stmt = stmt.limit(limit)
-        rows = _rank_processos(session.execute(stmt).scalars().all(), search or "")
-        if rows:
-            return rows
-
-    if not approx:
-        return []
-
-    # 3) fallback por aproximação sobre candidatos (normalização + difflib)
-    try:
-        candidate_limit = int(limit or 0)
-    except Exception:
-        candidate_limit = 0
-    candidate_limit = max(candidate_limit, 2000)
-    candidate_limit = min(candidate_limit, 5000)
-
-    cand_stmt = base.limit(candidate_limit) if candidate_limit else base
-    candidates = session.execute(cand_stmt).scalars().all()
-    if not candidates:
-        return []
+        etapas.append((norm_terms, False))
+    if norm_terms or raw_terms:
+        etapas.append((norm_terms or raw_terms, True))
+
+    indice = indice_pesquisa_processos(session)
+    with indice.lock:
+        for terms, expand in etapas:
+            ids = _ids_processos_por_termos(indice, terms, expand=expand)
+            if not ids:
+                continue
+            rows = _processos_por_ids(session, base, sorted(ids, reverse=True), limit)
+            if rows:
+                return _rank_processos(rows, search or "", secoes=indice.secoes(proc.id for proc in rows))
 
-    if not norm_terms:
-        norm_terms = _split_terms_normalized(" ".join(raw_terms))
+        if not approx:
+            return []
 
-    scored: list[tuple[float, Producao]] = []
-    for proc in candidates:
-        blob_norm = _normalize_txt(_producao_blob(proc))
-        score = _fuzzy_match_blob(blob_norm, terms_norm=norm_terms)
-        if score is None:
-            continue
-        scored.append((float(score), proc))
+        # 4) fallback por aproximação: as palavras próximas de cada termo saem do
+        # índice de trigramas do vocabulário
+        if not norm_terms:
+            norm_terms = _split_terms_normalized(" ".join(raw_terms))
+        fuzzy_scores = indice.pontuacao_aproximada(norm_terms, cutoff=0.82)
+        ordem = [proc_id for proc_id, _ in sorted(fuzzy_scores.items(), key=lambda par: (par[1], par[0]), reverse=True)]
+        if not ordem:
+            return []
+        procs = _processos_por_ids(session, base, ordem, limit)
+        rows = _rank_processos(procs, search or "", secoes=indice.secoes(proc.id for proc in procs))
 
-    scored.sort(key=lambda x: (x[0], int(getattr(x[1], "id", 0) or 0)), reverse=True)
-    if limit:
-        scored = scored[: int(limit)]
-    fuzzy_scores = {int(getattr(proc, "id", 0) or 0): float(score) for score, proc in scored}
-    rows = _rank_processos([p for _, p in scored], search or "")
     for proc in rows:
         proc_id = int(getattr(proc, "id", 0) or 0)
         setattr(proc, "search_score", max(float(getattr(proc, "search_score", 0.0) or 0.0), fuzzy_scores.get(proc_id, 0.0)))
@@ -1203,6 +1281,7 @@ def atualizar_processo(session: Session, proc_id: int, data: dict, *, current_us
         proc.updated_by = current_user_id
     session.add(proc)
     session.flush()
+    _atualizar_indice_processo(session, int(proc.id), proc)
     return proc
 
 
@@ -1212,6 +1291,7 @@ def eliminar_processo(session: Session, proc_id: int) -> None:
         return
     session.delete(proc)
     session.flush()
+    _atualizar_indice_processo(session, int(proc_id))
 
 
 # -----------------------
@@ -1252,12 +1332,9 @@ def _prefix_chain_depth(root: Path, prefixes: Sequence[str]) -> int:
     for pref in prefixes:
         next_candidates: list[Path] = []
         for parent in candidates:
-            try:
-                for child in parent.iterdir():
-                    if child.is_dir() and _folder_name_matches_prefix(child.name, pref):
-                        next_candidates.append(child)
-            except Exception:
-                continue
+            for child in _subpastas(parent, revalidar=True) or ():
+                if _folder_name_matches_prefix(child.name, pref):
+                    next_candidates.append(child)
         if not next_candidates:
             break
         depth += 1
@@ -1311,20 +1388,8 @@ def _find_best_dir_match(
         - sufixo preferido (cliente atual) para desempate
         - ordem alfabética para determinismo
     """
-    try:
-        if not parent.is_dir():
-            return None
-    except Exception:
-        return None
-
-    matches: list[Path] = []
-    try:
-        for child in parent.iterdir():
-            if not child.is_dir():
-                continue
-            if _folder_name_matches_prefix(child.name, prefix):
-                matches.append(child)
-    except Exception:
+    children = _subpastas(parent, revalidar=True)
+    if children is None:
         # fallback: se existir um nome preferido, tenta usar mesmo sem conseguir listar
         try:
             if preferred_name:
@@ -1334,6 +1399,7 @@ def _find_best_dir_match(
         except Exception:
             pass
         return None
+    matches = [child for child in children if _folder_name_matches_prefix(child.name, prefix)]
 
     if not matches:
         return None
@@ -1542,6 +1608,8 @@ def resolver_pasta_para_processo_detalhe(
             seg3_dir.mkdir(parents=True, exist_ok=True)
             created_final = True
 
+    if create:
+        indice_pastas().invalidar(seg3_dir)
     proc.pasta_servidor = str(seg3_dir)
     proc.tipo_pasta = tipo_dir
     session.add(proc)
@@ -170,6 +170,8 @@ class PHCStatusUserIssueSummary:
 KEY_PRODUCAO_PHC_STATUS_LAST_SYNC_DATE = "producao_phc_status_last_sync_date"
 KEY_PRODUCAO_PHC_STATUS_ISSUES_CACHE_DATE = "producao_phc_status_issues_cache_date"
 KEY_PRODUCAO_PHC_STATUS_ISSUES_CACHE_JSON = "producao_phc_status_issues_cache_json"
+# updated_at mais recente dos processos ja validados (base do modo incremental)
+KEY_PRODUCAO_PHC_STATUS_WATERMARK = "producao_phc_status_watermark"
 AUTO_SHOW_PRODUCAO_PHC_STATUS_ISSUES_PREFIX = "producao_phc_status_issues_seen"
 HIDDEN_PRODUCAO_PHC_STATUS_ISSUES_PREFIX = "producao_phc_status_issues_hidden"
 
@@ -277,29 +279,86 @@ def _build_phc_status_issue(
     )
 
 
-def _find_direct_phc_status_row(proc: Producao, rows: list[dict]) -> Optional[dict]:
-    proc_ano = str(getattr(proc, "ano", "") or "").strip()
-    proc_enc = _normalize_match_number(getattr(proc, "num_enc_phc", None))
-    proc_num_cliente = _normalize_match_number(getattr(proc, "num_cliente_phc", None))
-    proc_nome = _normalize_match_text(getattr(proc, "nome_cliente", None))
-    if not (proc_ano and proc_enc and proc_num_cliente and proc_nome):
-        return None
+def _phc_direct_match_key(ano: object, enc: object, num_cliente: object, nome: object) -> tuple[str, str, str, str]:
+    return (
+        str(ano or "").strip(),
+        _normalize_match_number(enc),
+        _normalize_match_number(num_cliente),
+        _normalize_match_text(nome),
+    )
+
+
+@dataclass
+class _PHCEstadoIndex:
+    """Linhas de estado do PHC normalizadas uma vez e agrupadas para consulta direta por processo."""
+
+    by_year_enc: dict[tuple[str, str], list[dict]]
+    by_enc: dict[str, list[dict]]
+    direct: dict[tuple[str, str, str, str], dict]
+
+    def rows_for(self, ano: str, enc: object) -> list[dict]:
+        return self.by_year_enc.get((ano, _normalize_match_number(enc)), [])
+
+    def rows_for_enc(self, enc: object) -> list[dict]:
+        return self.by_enc.get(_normalize_match_number(enc), [])
+
 
+def _index_phc_estado_rows(rows: list[dict]) -> _PHCEstadoIndex:
+    index = _PHCEstadoIndex(by_year_enc={}, by_enc={}, direct={})
     for row in rows:
-        row_ano = str(row.get("Ano") or "").strip()
-        row_enc = _normalize_match_number(row.get("Enc_No"))
-        row_num_cliente = _normalize_match_number(row.get("Num_PHC"))
-        row_nome = _normalize_match_text(_row_nome_phc(row))
-        if row_ano != proc_ano:
+        key = _phc_direct_match_key(row.get("Ano"), row.get("Enc_No"), row.get("Num_PHC"), _row_nome_phc(row))
+        row_ano, row_enc = key[0], key[1]
+        if not row_enc:
             continue
-        if row_enc != proc_enc:
-            continue
-        if row_num_cliente != proc_num_cliente:
-            continue
-        if row_nome != proc_nome:
+        index.by_enc.setdefault(row_enc, []).append(row)
+        if row_ano:
+            index.by_year_enc.setdefault((row_ano, row_enc), []).append(row)
+            # a primeira linha do PHC ganha, como na pesquisa linear
+            index.direct.setdefault(key, row)
+    return index
+
+
+def _find_direct_phc_status_row(proc: Producao, index: _PHCEstadoIndex) -> Optional[dict]:
+    key = _phc_direct_match_key(
+        getattr(proc, "ano", None),
+        getattr(proc, "num_enc_phc", None),
+        getattr(proc, "num_cliente_phc", None),
+        getattr(proc, "nome_cliente", None),
+    )
+    if not all(key):
+        return None
+    return index.direct.get(key)
+
+
+def _phc_status_sync_eligible(proc: Producao) -> bool:
+    return (
+        getattr(proc, "tipo_pasta", None) == svc_producao.DEFAULT_PASTA_ENCOMENDA
+        and getattr(proc, "num_enc_phc", None) is not None
+        and getattr(proc, "ano", None) is not None
+        and getattr(proc, "estado", None) != "Arquivado"
+    )
+
+
+def _parse_phc_status_watermark(value: object) -> Optional[datetime]:
+    text = str(value or "").strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _max_updated_at(processes: list[Producao], current: Optional[datetime]) -> Optional[datetime]:
+    result = current
+    for proc in processes:
+        value = getattr(proc, "updated_at", None)
+        if not isinstance(value, datetime):
             continue
-        return row
-    return None
+        value = value.replace(tzinfo=None)
+        if result is None or value > result:
+            result = value
+    return result
 
 
 def _serialize_phc_status_issue(issue: PHCStatusSyncIssue) -> dict:
@@ -473,22 +532,41 @@ def sync_producao_statuses_from_phc(
     current_user_id: Optional[int] = None,
     force: bool = False,
     today: Optional[date] = None,
+    incremental: bool = False,
 ) -> PHCStatusSyncResult:
+    """Valida o estado dos processos de encomenda contra o PHC (uma vez por dia, salvo `force`).
+
+    Com `incremental`, depois da validacao completa do dia so revalida os processos
+    alterados no Martelo desde a ultima validacao (marca `KEY_PRODUCAO_PHC_STATUS_WATERMARK`)
+    e junta o resultado as divergencias ja guardadas hoje. Alteracoes feitas apenas
+    no PHC continuam a ser apanhadas pela validacao diaria completa.
+    """
     today_text = (today or date.today()).isoformat()
     last_sync = str(get_setting(session, KEY_PRODUCAO_PHC_STATUS_LAST_SYNC_DATE, "") or "").strip()
-    if not force and last_sync == today_text:
+    watermark = _parse_phc_status_watermark(get_setting(session, KEY_PRODUCAO_PHC_STATUS_WATERMARK, ""))
+    incremental = incremental and not force and last_sync == today_text and watermark is not None
+    if not (force or incremental) and last_sync == today_text:
         return PHCStatusSyncResult(checked_total=0, changed=(), issues=(), skipped_daily=True)
 
-    processes = session.execute(
-        select(Producao)
-        .where(
-            Producao.tipo_pasta == svc_producao.DEFAULT_PASTA_ENCOMENDA,
-            Producao.num_enc_phc.is_not(None),
-            Producao.ano.is_not(None),
-        )
-        .where((Producao.estado.is_(None)) | (Producao.estado != "Arquivado"))
-        .order_by(Producao.id.desc())
-    ).scalars().all()
+    if incremental:
+        # >= para nao perder gravacoes no mesmo instante da marca; os de fronteira sao revalidados
+        touched = session.execute(
+            select(Producao).where(Producao.updated_at >= watermark).order_by(Producao.id.desc())
+        ).scalars().all()
+        processes = [proc for proc in touched if _phc_status_sync_eligible(proc)]
+    else:
+        touched = []
+        processes = session.execute(
+            select(Producao)
+            .where(
+                Producao.tipo_pasta == svc_producao.DEFAULT_PASTA_ENCOMENDA,
+                Producao.num_enc_phc.is_not(None),
+                Producao.ano.is_not(None),
+            )
+            .where((Producao.estado.is_(None)) | (Producao.estado != "Arquivado"))
+            .order_by(Producao.id.desc())
+        ).scalars().all()
+    new_watermark = _max_updated_at(touched or processes, watermark)
 
     years = sorted({str(getattr(proc, "ano", "") or "").strip() for proc in processes if str(getattr(proc, "ano", "") or "").strip()})
     phc_rows_all: list[dict] = []
@@ -500,16 +578,7 @@ def sync_producao_statuses_from_phc(
                 max_rows=0,
             )
         )
-
-    rows_by_year_enc: dict[tuple[str, str], list[dict]] = {}
-    rows_by_enc: dict[str, list[dict]] = {}
-    for row in phc_rows_all:
-        row_year = str(row.get("Ano") or "").strip()
-        row_enc = str(row.get("Enc_No") or "").strip()
-        if row_year and row_enc:
-            rows_by_year_enc.setdefault((row_year, row_enc), []).append(row)
-        if row_enc:
-            rows_by_enc.setdefault(row_enc, []).append(row)
+    phc_index = _index_phc_estado_rows(phc_rows_all)
 
     changed: list[PHCStatusSyncChange] = []
     issues: list[PHCStatusSyncIssue] = []
@@ -532,12 +601,10 @@ def sync_producao_statuses_from_phc(
             )
             continue
 
-        rows = rows_by_year_enc.get((proc_ano, _normalize_match_number(proc_enc)), [])
-        if not rows:
-            rows = rows_by_year_enc.get((proc_ano, proc_enc), [])
+        rows = phc_index.rows_for(proc_ano, proc_enc)
 
         if not (proc_ano and proc_enc and proc_num_cliente and proc_nome):
-            fallback_rows = rows_by_enc.get(_normalize_match_number(proc_enc), []) or rows_by_enc.get(proc_enc, [])
+            fallback_rows = phc_index.rows_for_enc(proc_enc)
             issues.append(
                 _build_phc_status_issue(
                     proc,
@@ -547,9 +614,9 @@ def sync_producao_statuses_from_phc(
             )
             continue
 
-        match_row = _find_direct_phc_status_row(proc, rows)
+        match_row = _find_direct_phc_status_row(proc, phc_index)
         if match_row is None:
-            fallback_rows = rows_by_enc.get(_normalize_match_number(proc_enc), []) or rows_by_enc.get(proc_enc, [])
+            fallback_rows = phc_index.rows_for_enc(proc_enc)
             issues.append(
                 _build_phc_status_issue(
                     proc,
@@ -583,8 +650,15 @@ def sync_producao_statuses_from_phc(
             )
         )
 
-    set_setting(session, KEY_PRODUCAO_PHC_STATUS_LAST_SYNC_DATE, today_text)
-    _cache_phc_status_issues(session, issues=issues, today_text=today_text)
+    if incremental:
+        checked_ids = {int(getattr(proc, "id", 0) or 0) for proc in touched}
+        kept = [issue for issue in load_cached_phc_status_issues(session, today=today) if issue.processo_id not in checked_ids]
+        _cache_phc_status_issues(session, issues=kept + issues, today_text=today_text)
+    else:
+        set_setting(session, KEY_PRODUCAO_PHC_STATUS_LAST_SYNC_DATE, today_text)
+        _cache_phc_status_issues(session, issues=issues, today_text=today_text)
+    if new_watermark is not None and new_watermark != watermark:
+        set_setting(session, KEY_PRODUCAO_PHC_STATUS_WATERMARK, new_watermark.isoformat())
     session.flush()
     return PHCStatusSyncResult(
         checked_total=checked_total,
@@ -859,6 +933,7 @@ def prepare_external_process_creation(
             ano=ano,
             num_enc_phc=num_enc,
             tipo_pasta=tipo_pasta,
+            revalidar=True,
         )
         for vv in vv_fs:
             for pp in svc_producao.listar_versoes_plano_em_pastas(
@@ -867,6 +942,7 @@ def prepare_external_process_creation(
                 num_enc_phc=num_enc,
                 versao_obra=vv,
                 tipo_pasta=tipo_pasta,
+                revalidar=True,
             ):
                 fs_pairs.add((vv, pp))
     except Exception:
@@ -999,6 +1075,7 @@ def prepare_nova_versao(
             ano=ano,
             num_enc_phc=num_enc,
             tipo_pasta=tipo_pasta,
+            revalidar=True,
         )
         fs_pairs: set[tuple[str, str]] = set()
         for vv in vv_fs:
@@ -1008,6 +1085,7 @@ def prepare_nova_versao(
                 num_enc_phc=num_enc,
                 versao_obra=vv,
                 tipo_pasta=tipo_pasta,
+                revalidar=True,
             ):
                 fs_pairs.add((vv, pp))
         existing |= fs_pairs
@@ -1,6 +1,7 @@
 # run_dev.py
 
 import logging
+import multiprocessing
 from logging.handlers import RotatingFileHandler
 import os
 from pathlib import Path
@@ -321,4 +322,6 @@ def main():
         sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # Necessario para o recalculo do custeio em processos no executavel (PyInstaller).
+    multiprocessing.freeze_support()
     main()
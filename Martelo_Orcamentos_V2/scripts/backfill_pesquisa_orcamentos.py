@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import argparse
+
+from sqlalchemy import func, inspect, select
+
+from Martelo_Orcamentos_V2.app.db import SessionLocal, engine
+from Martelo_Orcamentos_V2.app.models import Orcamento, OrcamentoPesquisa
+from Martelo_Orcamentos_V2.app.services.orcamentos import atualizar_pesquisa_orcamentos
+
+LOTE = 500
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Preenche/recalcula o texto de pesquisa normalizado (orcamento_pesquisa) de todos os orcamentos."
+    )
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Grava as linhas na base de dados. Sem esta flag o script corre em dry-run.",
+    )
+    args = parser.parse_args()
+
+    tabela_existe = inspect(engine).has_table(OrcamentoPesquisa.__tablename__)
+    if args.apply and not tabela_existe:
+        OrcamentoPesquisa.__table__.create(bind=engine, checkfirst=True)
+        print(f"Tabela {OrcamentoPesquisa.__tablename__} criada.")
+    db = SessionLocal()
+    try:
+        ids = db.execute(select(Orcamento.id).order_by(Orcamento.id)).scalars().all()
+        if not args.apply:
+            if tabela_existe:
+                existentes = db.execute(select(func.count()).select_from(OrcamentoPesquisa)).scalar_one()
+                print(f"Orcamentos: {len(ids)} | linhas de pesquisa existentes: {existentes}")
+            else:
+                print(f"Orcamentos: {len(ids)} | tabela {OrcamentoPesquisa.__tablename__} ainda nao existe (criada com --apply)")
+            print("Dry-run concluido. Use --apply para gravar.")
+            return 0
+
+        existentes = db.execute(select(func.count()).select_from(OrcamentoPesquisa)).scalar_one()
+        print(f"Orcamentos: {len(ids)} | linhas de pesquisa existentes: {existentes}")
+
+        gravadas = 0
+        for pos in range(0, len(ids), LOTE):
+            gravadas += atualizar_pesquisa_orcamentos(db, ids[pos : pos + LOTE])
+            db.commit()
+            print(f"{min(pos + LOTE, len(ids))}/{len(ids)} orcamentos processados")
+        print(f"Texto de pesquisa gravado para {gravadas} orcamentos.")
+        return 0
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
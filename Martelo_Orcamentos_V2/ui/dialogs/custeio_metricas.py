@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+from PySide6 import QtCore, QtWidgets
+
+from Martelo_Orcamentos_V2.app.services import custeio_metricas as svc_metricas
+
+logger = logging.getLogger(__name__)
+
+
+class CusteioMetricasDialog(QtWidgets.QDialog):
+    """Tempos e nº de SQL por etapa do Custeio para o orçamento atual."""
+
+    COLUMNS = (
+        ("Etapa", "etapa"),
+        ("Chamadas", "chamadas"),
+        ("Tempo total (ms)", "tempo_total_ms"),
+        ("Tempo medio (ms)", "tempo_medio_ms"),
+        ("Tempo max (ms)", "tempo_max_ms"),
+        ("SQL", "sql"),
+    )
+
+    def __init__(self, orcamento_id: Optional[int], *, titulo_orcamento: str = "", parent=None) -> None:
+        super().__init__(parent)
+        self.orcamento_id = orcamento_id
+        self.setWindowTitle("Metricas do Custeio")
+        self.resize(760, 420)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        info = QtWidgets.QLabel(
+            f"Orcamento: {titulo_orcamento or orcamento_id or '-'}\n"
+            "Tempos e SQL sao inclusivos (uma etapa chamada dentro de outra conta nas duas). "
+            "Ative a medicao e use 'Atualizar Custos' ou o Custeio para recolher dados."
+        )
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        self.chk_ativo = QtWidgets.QCheckBox("Medicao ativa", self)
+        self.chk_ativo.setChecked(svc_metricas.esta_ativo())
+        self.chk_ativo.toggled.connect(self._on_toggle_ativo)
+        layout.addWidget(self.chk_ativo)
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels([header for header, _ in self.COLUMNS])
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        layout.addWidget(self.table, 1)
+
+        buttons = QtWidgets.QHBoxLayout()
+        self.btn_refresh = QtWidgets.QPushButton("Atualizar", self)
+        self.btn_refresh.clicked.connect(self.refresh)
+        self.btn_clear = QtWidgets.QPushButton("Limpar", self)
+        self.btn_clear.clicked.connect(self._on_clear)
+        self.btn_export = QtWidgets.QPushButton("Exportar JSON...", self)
+        self.btn_export.clicked.connect(self._on_export)
+        self.btn_close = QtWidgets.QPushButton("Fechar", self)
+        self.btn_close.clicked.connect(self.accept)
+        buttons.addWidget(self.btn_refresh)
+        buttons.addWidget(self.btn_clear)
+        buttons.addStretch(1)
+        buttons.addWidget(self.btn_export)
+        buttons.addWidget(self.btn_close)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self) -> None:
+        linhas = svc_metricas.resultados(self.orcamento_id)
+        self.table.setRowCount(len(linhas))
+        for row_index, linha in enumerate(linhas):
+            for column_index, (_, key) in enumerate(self.COLUMNS):
+                valor = linha.get(key)
+                item = QtWidgets.QTableWidgetItem(str(valor))
+                if column_index > 0:
+                    item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                self.table.setItem(row_index, column_index, item)
+        self.btn_export.setEnabled(bool(linhas))
+
+    def _on_toggle_ativo(self, checked: bool) -> None:
+        svc_metricas.ativar(checked)
+
+    def _on_clear(self) -> None:
+        svc_metricas.limpar(self.orcamento_id)
+        self.refresh()
+
+    def _on_export(self) -> None:
+        default_name = f"metricas_custeio_{self.orcamento_id or 'sem_orcamento'}.json"
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Exportar metricas do Custeio",
+            str(Path.home() / default_name),
+            "JSON (*.json)",
+        )
+        if not file_path:
+            return
+        try:
+            svc_metricas.guardar_json(file_path, self.orcamento_id)
+        except Exception as exc:
+            logger.exception("Falha ao exportar metricas do custeio: %s", exc)
+            QtWidgets.QMessageBox.critical(
+                self,
+                "Metricas do Custeio",
+                f"Nao foi possivel exportar as metricas.\n\nDetalhe: {exc}",
+            )
+            return
+        QtWidgets.QMessageBox.information(self, "Metricas do Custeio", f"Metricas exportadas:\n{file_path}")
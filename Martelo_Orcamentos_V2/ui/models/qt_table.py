@@ -1,5 +1,5 @@
 from decimal import Decimal
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Callable, Dict, Iterable, Optional
 
 from Martelo_Orcamentos_V2.app.utils.bool_converter import bool_to_int, int_to_bool
 from Martelo_Orcamentos_V2.app.utils.display import repair_mojibake
@@ -12,6 +12,10 @@ class SimpleTableModel(QtCore.QAbstractTableModel):
     Model Qt simples para listas de objetos (ORM, dataclasses) ou dicionarios.
     columns aceita tuplos, dicionarios ou objetos com atributos (ex.: ColumnSpec).
     Linhas podem ser objetos com atributos ou dicionarios.
+
+    Carregamento incremental: `set_rows(rows, fetch_more=funcao)` mostra as primeiras
+    linhas e a view pede as seguintes (canFetchMore/fetchMore) ao chegar ao fim;
+    `funcao()` devolve o lote seguinte e uma lista vazia termina o carregamento.
     """
 
     _NUMERIC_TYPES = {"int", "integer", "number", "float", "decimal"}
@@ -21,15 +25,26 @@ class SimpleTableModel(QtCore.QAbstractTableModel):
         super().__init__(parent)
         self._rows = list(rows) if rows is not None else []
         self._columns = list(columns) if columns is not None else []
+        self._fetch_more: Optional[Callable[[], Iterable[Any]]] = None
         # manter compatibilidade com codigo existente que acede a model.columns
         self.columns = self._columns
 
     # -------- API utilitaria --------
-    def set_rows(self, rows: Optional[Iterable[Any]]) -> None:
+    def set_rows(
+        self,
+        rows: Optional[Iterable[Any]],
+        fetch_more: Optional[Callable[[], Iterable[Any]]] = None,
+    ) -> None:
         self.beginResetModel()
         self._rows = list(rows) if rows is not None else []
+        self._fetch_more = fetch_more
         self.endResetModel()
 
+    def fetch_all(self) -> None:
+        """Carrega todos os lotes ainda pendentes (ex.: antes de ordenar ou exportar)."""
+        while self.canFetchMore():
+            self.fetchMore()
+
     def set_columns(self, columns: Optional[Iterable[Any]]) -> None:
         self.beginResetModel()
         self._columns = list(columns) if columns is not None else []
@@ -149,6 +164,25 @@ class SimpleTableModel(QtCore.QAbstractTableModel):
     def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
         return 0 if parent.isValid() else len(self._columns)
 
+    def canFetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and self._fetch_more is not None
+
+    def fetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> None:
+        if parent.isValid() or self._fetch_more is None:
+            return
+        fetch_more = self._fetch_more
+        rows = self._rows
+        # sem lote pendente enquanto carrega (evita pedidos repetidos da view)
+        self._fetch_more = None
+        new_rows = list(fetch_more() or ())
+        if not new_rows or self._rows is not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(new_rows) - 1)
+        self._rows.extend(new_rows)
+        self.endInsertRows()
+        self._fetch_more = fetch_more
+
     def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
         if not index.isValid():
             return None
@@ -334,6 +368,8 @@ class SimpleTableModel(QtCore.QAbstractTableModel):
     def sort(self, column: int, order: QtCore.Qt.SortOrder = QtCore.Qt.SortOrder.AscendingOrder) -> None:
         if not self._columns or column < 0 or column >= len(self._columns):
             return
+        # ordenar so faz sentido sobre a lista completa
+        self.fetch_all()
         col = self._columns[column]
         spec = self._col_spec(col)
         attr = spec["attr"]
@@ -388,6 +424,7 @@ class SimpleTableModel(QtCore.QAbstractTableModel):
         """
         Devolve lista de dicionarios com os dados atuais do modelo.
         """
+        self.fetch_all()
         exported = []
         for row_obj in self._rows:
             row_dict: Dict[str, Any] = {}
@@ -12,10 +12,7 @@ from functools import partial
 import math
 from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
 import logging
-import ast
 import re
-import unicodedata
-import uuid
 
 
 from PySide6 import QtCore, QtGui, QtWidgets
@@ -26,11 +23,20 @@ import shiboken6
 from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
 
 from Martelo_Orcamentos_V2.app.services import custeio_items as svc_custeio
+from Martelo_Orcamentos_V2.app.services import custeio_metricas as svc_metricas
+from Martelo_Orcamentos_V2.app.services.custeio_engine import (
+    COLAGEM_LABEL,
+    DIMENSION_ALLOWED_VARIABLES,
+    DIMENSION_KEY_ORDER,
+    EMBALAGEM_LABEL,
+    MotorCusteio,
+    _TOKEN_PATTERN,
+    _float_almost_equal,
+)
 from Martelo_Orcamentos_V2.app.services import modulos as svc_modulos
 from Martelo_Orcamentos_V2.app.services import producao as svc_producao
-from Martelo_Orcamentos_V2.app.services import def_pecas as svc_def_pecas
 from Martelo_Orcamentos_V2.app.services import dados_items as svc_dados_items
-from Martelo_Orcamentos_V2.app.services.orcamentos import resolve_orcamento_cliente_nome
+from Martelo_Orcamentos_V2.app.services.orcamentos import numero_item, resolve_orcamento_cliente_nome
 
 from Martelo_Orcamentos_V2.app.db import SessionLocal
 from sqlalchemy import select
@@ -41,7 +47,6 @@ from ..dialogs.custeio_modulos import ImportModuloDialog, SaveModuloDialog, Gere
 
 SPECIAL_MAT_DEFAULTS = svc_custeio.SPECIAL_MAT_DEFAULTS
 
-COLAGEM_LABEL = getattr(svc_custeio, "COLAGEM_REVESTIMENTO_LABEL", "COLAGEM/REVESTIMENTO (M2)")
 _COLAGEM_LABEL_ALIASES = {
     COLAGEM_LABEL.strip().casefold(),
     "COLAGEM SANDWICH (M2)".casefold(),
@@ -53,7 +58,6 @@ COLAGEM_INFO_TEXT = (
     "para permitir o cálculo em m²."
 )
 
-EMBALAGEM_LABEL = "EMBALAGEM (M3)"
 _EMBALAGEM_LABEL_ALIASES = {
     EMBALAGEM_LABEL.strip().casefold(),
 }
@@ -75,26 +79,6 @@ def _is_embalagem_label(value: Optional[str]) -> bool:
     return value.strip().casefold() in _EMBALAGEM_LABEL_ALIASES
 
 
-DEF_LABEL_MAO_OBRA_MIN = "MAO OBRA (Min)"
-DEF_LABEL_CNC_MIN = "CNC (Min)"
-DEF_LABEL_CNC_5_MIN = "CNC (5 Min)"
-DEF_LABEL_CNC_15_MIN = "CNC (15 Min)"
-DEF_LABEL_EMBALAGEM = EMBALAGEM_LABEL
-DEF_LABEL_COLAGEM = COLAGEM_LABEL
-
-DEF_LABEL_MAO_OBRA_MIN_NORM = DEF_LABEL_MAO_OBRA_MIN.casefold()
-DEF_LABEL_CNC_MIN_NORM = DEF_LABEL_CNC_MIN.casefold()
-DEF_LABEL_CNC_5_MIN_NORM = DEF_LABEL_CNC_5_MIN.casefold()
-DEF_LABEL_CNC_15_MIN_NORM = DEF_LABEL_CNC_15_MIN.casefold()
-DEF_LABEL_EMBALAGEM_NORM = DEF_LABEL_EMBALAGEM.casefold()
-DEF_LABEL_COLAGEM_NORM = DEF_LABEL_COLAGEM.casefold()
-MANUAL_CNC_LABELS = {
-    DEF_LABEL_CNC_MIN_NORM,
-    DEF_LABEL_CNC_5_MIN_NORM,
-    DEF_LABEL_CNC_15_MIN_NORM,
-}
-
-
 def _special_default_for_row(row: Mapping[str, Any]) -> Optional[str]:
     def_text = (row.get("def_peca") or row.get("_child_source") or "").strip()
     if not def_text:
@@ -144,18 +128,6 @@ MANUAL_QT_UND_KEYWORDS: Tuple[str, ...] = (
 )
 
 
-def _float_almost_equal(a: Optional[float], b: Optional[float], *, tol: float = 1e-6) -> bool:
-    if a is None or b is None:
-        return False
-    return abs(a - b) <= tol
-
-DIMENSION_KEY_ORDER: Sequence[str] = tuple(svc_custeio.DIMENSION_KEY_ORDER)
-DIMENSION_ALLOWED_VARIABLES: Set[str] = set(svc_custeio.DIMENSION_ALLOWED_VARIABLES)
-_TOKEN_PATTERN = re.compile(r"[A-Z]+[0-9]*")
-_FORMULA_ALLOWED_CHARS = re.compile(r"^[0-9A-Z+\-*/().,\\s]*$")
-_AUTO_QTMOD_PATTERN = re.compile(r"^\s*\d+(?:[.,]\d+)?\s*x\s*\d+(?:[.,]\d+)?\s*$", re.IGNORECASE)
-_NUMERIC_LITERAL_PATTERN = re.compile(r"^\s*[0-9]+(?:[.,][0-9]+)?\s*$")
-
 DIMENSION_GROUPS: Tuple[Tuple[str, str, str], ...] = (
     ("H", "L", "P"),
     ("H1", "L1", "P1"),
@@ -272,18 +244,6 @@ PRODUCTION_COST_UND_KEYS: Set[str] = {
     "cp08_mao_de_obra_und",
     "cp09_colagem_und",
 }
-PRODUCTION_CP_SUM_KEYS: Tuple[Tuple[str, str], ...] = (
-    ("cp01_sec_und", "CP01_SEC_und"),
-    ("cp02_orl_und", "CP02_ORL_und"),
-    ("cp03_cnc_und", "CP03_CNC_und"),
-    ("cp04_abd_und", "CP04_ABD_und"),
-    ("cp05_prensa_und", "CP05_PRENSA_und"),
-    ("cp06_esquad_und", "CP06_ESQUAD_und"),
-    ("cp07_embalagem_und", "CP07_EMBALAGEM_und"),
-    ("cp08_mao_de_obra_und", "CP08_MAO_DE_OBRA_und"),
-)
-SPP_WASTE_PERCENT: float = 0.06
-DEFAULT_MP_DESP_FRACTION: float = 0.18
 UNIT_ML_KEYS: Set[str] = ORLA_ML_KEYS | {"soma_total_ml_orla", "perimetro_und", "spp_ml_und"}
 UNIT_EURO_KEYS: Set[str] = (
     ORLA_COST_KEYS
@@ -579,7 +539,7 @@ class CusteioTreeFilterProxy(QtCore.QSortFilterProxyModel):
 
 
 
-class CusteioTableModel(QtCore.QAbstractTableModel):
+class CusteioTableModel(QtCore.QAbstractTableModel, MotorCusteio):
 
     def __init__(self, parent=None):
 
@@ -623,6 +583,7 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         self.rows: List[Dict[str, Any]] = []
         self._orla_info_cache: Dict[Tuple[str, Optional[float]], Dict[str, Any]] = {}
         self._acabamento_info_cache: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._materiais_orla: Optional[svc_custeio.MateriaisOrla] = None
 
     # --- Helpers ------------------------------------------------------
 
@@ -682,68 +643,6 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         has_support = "SUPORTE" in token
         return has_varao and not has_support
 
-    def _supports_qt_und_override(self, row: Mapping[str, Any]) -> bool:
-        """Return True when the row is an automatic child eligible for override.
-
-        O override continua a ser apenas local a esta linha/orcamento e nao altera
-        as regras base.
-        """
-        if not isinstance(row, Mapping):
-            return False
-
-        if (row.get("_row_type") or "").lower() != "child":
-            return False
-        return True
-
-    @staticmethod
-    def _coerce_numeric(value: Any) -> Optional[float]:
-        if value in (None, "", False):
-            return None
-        # aceita "." ou "," como separador decimal e ignora símbolos de moeda/percentagem/espaços
-        if isinstance(value, str):
-            try:
-                cleaned = value.strip()
-                cleaned = cleaned.replace("€", "").replace("EUR", "").replace("%", "")
-                cleaned = cleaned.replace(" ", "").replace(" ", "")
-                cleaned = cleaned.replace(",", ".")
-                if cleaned.count(".") > 1:
-                    # remove separadores de milhar simples (ex: 1.234,56 -> 1234.56)
-                    parts = cleaned.split(".")
-                    cleaned = "".join(parts[:-1]) + "." + parts[-1]
-                return float(cleaned)
-            except Exception:
-                return None
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
-
-
-    @staticmethod
-    def _coerce_percent(value: Any) -> Optional[float]:
-        if value in (None, "", False):
-            return None
-        if isinstance(value, (int, float)):
-            num = float(value)
-        else:
-            try:
-                text_val = str(value).strip().replace('%', '').replace(',', '.')
-            except Exception:
-                return None
-            if not text_val:
-                return None
-            try:
-                num = float(text_val)
-            except (TypeError, ValueError):
-                return None
-        if abs(num) > 1:
-            num /= 100.0
-        return num
-
-    @staticmethod
-    def _coerce_checked(value: Any) -> bool:
-        return svc_custeio._coerce_checkbox_to_bool(value)
-
     def _ensure_orla_info(self, row_data: Dict[str, Any], side: str) -> Tuple[Optional[float], Optional[float], Optional[str], Optional[str]]:
         """Garante que os campos da orla para o lado indicado estão preenchidos a partir da Matéria Prima."""
         ref_raw = row_data.get(f"orl_ref_{side}") or row_data.get("ref_le")
@@ -796,7 +695,9 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
                 info = self._orla_info_cache.get(cache_key)
                 if info is None:
                     try:
-                        info = svc_custeio._obter_detalhes_orla_por_ref(session, ref_clean, esp_esperada=esp_val)
+                        info = svc_custeio._obter_detalhes_orla_por_ref(
+                            session, ref_clean, esp_esperada=esp_val, materiais=self._materiais_orla
+                        )
                     except Exception:
                         info = {
                             "pliq": 0.0,
@@ -1027,19 +928,6 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
 
         return (divisor, parent_factor, child_factor)
 
-    def _render_qt_mod_formula(self, divisor: Optional[float], parent_factor: Optional[float], child_factor: Optional[float]) -> str:
-        parts: List[str] = []
-        divisor_text = self._format_factor(divisor)
-        if divisor_text:
-            parts.append(divisor_text)
-        parent_text = self._format_factor(parent_factor)
-        if parent_text:
-            parts.append(parent_text)
-        child_text = self._format_factor(child_factor)
-        if child_text:
-            parts.append(child_text)
-        return " x ".join(parts)
-
     def _process_qt_mod_child_edit(self, row_index: int, value: Any) -> bool:
         if not (0 <= row_index < len(self.rows)):
             return False
@@ -1130,79 +1018,7 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         if not changed:
             return
         self._mark_dirty()
-        self.recalculate_all()
-
-    @staticmethod
-    def _normalize_def_peca(value: Optional[str]) -> str:
-        text = (value or "").strip()
-        if not text:
-            return ""
-        normalized = unicodedata.normalize("NFKD", text)
-        cleaned = "".join(ch for ch in normalized if not unicodedata.combining(ch))
-        return cleaned.upper()
-
-    @staticmethod
-    def _extract_child_tokens(def_peca: Optional[str]) -> List[str]:
-        if not def_peca or "+" not in def_peca:
-            return []
-        tokens: List[str] = []
-        for part in def_peca.split("+")[1:]:
-            normalized = CusteioTableModel._normalize_def_peca(part)
-            # Normaliza variações/plurais para permitir detetar corretamente linhas-filho.
-            if normalized == "SUPORTES NIVELADORES":
-                normalized = "SUPORTE NIVELADORES"
-            if normalized:
-                tokens.append(normalized)
-        return tokens
-
-    @staticmethod
-    def _match_expected_child(normalized_child: str, expected_tokens: List[str]) -> bool:
-        if not normalized_child or not expected_tokens:
-            return False
-        stripped = normalized_child.lstrip("_")
-        candidates = {normalized_child, stripped}
-        for idx, token in enumerate(expected_tokens):
-            if not token:
-                continue
-            token_clean = token.lstrip("_")
-            token_match = any(
-                cand == token_clean or cand.startswith(f"{token_clean}_")
-                for cand in candidates
-            )
-            if token_match:
-                expected_tokens.pop(idx)
-                return True
-        return False
-
-    def _is_division_row(self, row: Mapping[str, Any]) -> bool:
-        return self._normalize_def_peca(row.get("def_peca")) == "DIVISAO INDEPENDENTE"
-
-    def _is_modulo_row(self, row: Mapping[str, Any]) -> bool:
-        return self._normalize_def_peca(row.get("def_peca")) == "MODULO"
-
-    def _is_spp_row(self, row: Mapping[str, Any]) -> bool:
-        und = (row.get("und") or "").strip().upper()
-        if und == "ML":
-            return True
-        def_peca_norm = self._normalize_def_peca(row.get("def_peca"))
-        raw_def = (row.get("def_peca") or "").upper()
-        if "{SPP}" in raw_def:
-            return True
-        return def_peca_norm.startswith("SPP")
-
-    @staticmethod
-    def _format_factor(value: Optional[float]) -> Optional[str]:
-        if value in (None, ""):
-            return None
-        try:
-            num = float(value)
-        except Exception:
-            return None
-        if abs(num) < 1e-9:
-            return "0"
-        if abs(num - round(num)) < 1e-9:
-            return str(int(round(num)))
-        return f"{num:.2f}".rstrip("0").rstrip(".")
+        self.recalculate_rows(row_indices)
 
     def _format_qt_mod_display(self, row_index: int) -> str:
         if not (0 <= row_index < len(self.rows)):
@@ -1244,166 +1060,6 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
 
         return " x ".join(parts)
 
-    def _sanitize_formula_input(self, value: Any) -> Optional[str]:
-        if value in (None, False):
-            return ""
-        text = str(value)
-        if not text:
-            return ""
-        text = text.replace(",", ".").upper()
-        # Allow spaces in the expression
-        if not _FORMULA_ALLOWED_CHARS.match(text):
-            return None
-        tokens = _TOKEN_PATTERN.findall(text)
-        for token in tokens:
-            if token not in DIMENSION_ALLOWED_VARIABLES:
-                return None
-        return text.strip()
-
-    @staticmethod
-    def _format_result_number(value: Optional[float]) -> Optional[str]:
-        if value is None:
-            return None
-        if abs(value - int(round(value))) < 1e-6:
-            return str(int(round(value)))
-        return f"{value:.4f}".rstrip("0").rstrip(".")
-
-    def _prepare_formula_expression(self, value: Any) -> str:
-        if value in (None, ""):
-            return ""
-        text = str(value).replace(",", ".").upper()
-        return text.strip()
-
-    def _build_formula_tooltip(
-        self,
-        expression: str,
-        result: Optional[float],
-        error: Optional[str],
-        *,
-        substitutions: Optional[str] = None,
-    ) -> Optional[str]:
-        expression = expression.strip()
-        substitutions = (substitutions or "").strip()
-        if substitutions.startswith("(") and substitutions.endswith(")"):
-            inner = substitutions[1:-1].strip()
-            if inner.count("(") == inner.count(")"):
-                substitutions = inner or substitutions
-
-        if error:
-            base = f"{expression} = erro: {error}" if expression else f"Erro: {error}"
-            return base
-        if expression and substitutions and result is not None:
-            if substitutions.strip() and substitutions.strip() != expression.strip():
-                rendered = f"{expression} = {substitutions} = {self._format_result_number(result)}"
-                return rendered
-        if expression and result is not None:
-            return f"{expression} = {self._format_result_number(result)}"
-        if expression:
-            return expression
-        if result is not None:
-            return self._format_result_number(result)
-        return None
-
-    def _evaluate_formula_expression(
-        self,
-        expression: str,
-        context: Mapping[str, Optional[float]],
-    ) -> Tuple[Optional[float], Optional[str]]:
-        expr = expression.strip()
-        if not expr:
-            return (None, None)
-
-        safe_context: Dict[str, Optional[float]] = {}
-        for key, value in (context or {}).items():
-            if key is None:
-                continue
-            safe_context[key.upper()] = value
-
-        try:
-            node = ast.parse(expr, mode="eval")
-            value, substitution = self._eval_formula_ast(node.body, safe_context)
-            return (float(value), None)
-        except ZeroDivisionError:
-            return (None, "Divisao por zero")
-        except Exception as exc:
-            msg = str(exc).lower()
-            if "variavel" in msg and ("hm" in msg or "lm" in msg or "pm" in msg):
-                return (None, f"Variavel local nao definida: {exc}")
-            return (None, str(exc))
-
-    def _render_formula_substitution(
-        self,
-        expression: str,
-        context: Mapping[str, Optional[float]],
-    ) -> Optional[str]:
-        expr = expression.strip()
-        if not expr:
-            return None
-
-        def replace(match: re.Match) -> str:
-            token = match.group(0)
-            value = context.get(token.upper())
-            if value is None:
-                return token
-            formatted = self._format_result_number(float(value))
-            return formatted or str(value)
-
-        substituted = _TOKEN_PATTERN.sub(replace, expr)
-        substituted = substituted.strip()
-        return substituted or None
-
-    def _evaluate_formula_with_env(
-        self,
-        prepared_expression: str,
-        context: Mapping[str, Optional[float]],
-    ) -> Tuple[Optional[float], Optional[str], Optional[str]]:
-        if not prepared_expression:
-            return (None, None, None)
-        value, error = self._evaluate_formula_expression(prepared_expression, context)
-        substitution = self._render_formula_substitution(prepared_expression, context)
-        if error is None and value is not None:
-            value = round(value, 1)
-        return (value, error, substitution)
-
-    def _eval_formula_ast(self, node: ast.AST, variables: Mapping[str, Optional[float]]) -> Tuple[float, str]:
-        if isinstance(node, ast.BinOp):
-            left_val, left_expr = self._eval_formula_ast(node.left, variables)
-            right_val, right_expr = self._eval_formula_ast(node.right, variables)
-            if isinstance(node.op, ast.Add):
-                return left_val + right_val, f"({left_expr}+{right_expr})"
-            if isinstance(node.op, ast.Sub):
-                return left_val - right_val, f"({left_expr}-{right_expr})"
-            if isinstance(node.op, ast.Mult):
-                return left_val * right_val, f"({left_expr}*{right_expr})"
-            if isinstance(node.op, ast.Div):
-                return left_val / right_val, f"({left_expr}/{right_expr})"
-            raise ValueError("Operador nao suportado")
-        if isinstance(node, ast.UnaryOp):
-            operand_val, operand_expr = self._eval_formula_ast(node.operand, variables)
-            if isinstance(node.op, ast.UAdd):
-                return operand_val, f"+{operand_expr}"
-            if isinstance(node.op, ast.USub):
-                return -operand_val, f"-{operand_expr}"
-            raise ValueError("Operador nao suportado")
-        if isinstance(node, ast.Name):
-            key = node.id.upper()
-            if key not in variables:
-                raise ValueError(f"Variavel {key} desconhecida")
-            valor = variables[key]
-            if valor is None:
-                raise ValueError(f"Variavel {key} sem valor")
-            return float(valor), self._format_result_number(float(valor)) or str(float(valor))
-        if isinstance(node, ast.Constant):
-            if isinstance(node.value, (int, float)):
-                return float(node.value), self._format_result_number(float(node.value)) or str(float(node.value))
-            raise ValueError("Constante invalida")
-        if isinstance(node, ast.Num):  # type: ignore[attr-defined]
-            val = float(node.n)  # pragma: no cover
-            return val, self._format_result_number(val) or str(val)
-        raise ValueError("Expressao invalida")
-
-
-
     # --- Qt API ---------------------------------------------------------
 
     def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
@@ -2483,7 +2139,8 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
 
         if requires_recalc:
 
-            self.recalculate_all()
+            self.recalculate_rows([row])
+            self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole, QtCore.Qt.FontRole, QtCore.Qt.ToolTipRole])
 
         else:
 
@@ -2516,6 +2173,7 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         self.rows = []
         self._orla_info_cache.clear()
         self._acabamento_info_cache.clear()
+        self._materiais_orla = None
 
         self.endResetModel()
         self._mark_dirty(False)
@@ -2529,6 +2187,7 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         self.rows = [self._coerce_row_impl(row) for row in rows]
         self._orla_info_cache.clear()
         self._acabamento_info_cache.clear()
+        self._materiais_orla = None
 
         self.endResetModel()
         self._mark_dirty(False)
@@ -2593,69 +2252,6 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         if modified:
             self._mark_dirty()
 
-    def _coerce_row_impl(self, row: Mapping[str, Any]) -> Dict[str, Any]:
-
-        coerced: Dict[str, Any] = {}
-
-        for spec in self.columns:
-
-            key = spec["key"]
-
-            value = row.get(key) if isinstance(row, Mapping) else None
-
-
-            if spec["type"] == "bool":
-
-                coerced[key] = svc_custeio._coerce_checkbox_to_bool(value)
-
-            elif spec["type"] == "numeric":
-
-                if value in (None, "", False):
-
-                    coerced[key] = None
-
-                else:
-
-                    try:
-
-                        coerced[key] = float(value)
-
-                    except (TypeError, ValueError):
-
-                        coerced[key] = None
-
-            else:
-
-                if key in {"comp", "larg", "esp"}:
-                    sanitized = self._sanitize_formula_input(value)
-                    if sanitized is None and value not in (None, ""):
-                        sanitized = str(value).replace(",", ".").upper().strip()
-                    coerced[key] = sanitized or ""
-                else:
-                    coerced[key] = value
-
-        if isinstance(row, Mapping):
-            for extra_key in ("_row_type", "_parent_uid", "_group_uid", "_child_source", "_normalized_child", "qt_manual_override", "_qt_manual_override", "_qt_manual_value", "_qt_manual_tooltip", "_qt_formula_value", "_regra_nome", "_nst_manual_override", "_nst_source"):
-                if extra_key in row:
-                    coerced[extra_key] = row[extra_key]
-
-        coerced["qt_manual_override"] = bool(coerced.get("qt_manual_override"))
-        if "_qt_manual_override" not in coerced:
-            coerced["_qt_manual_override"] = coerced["qt_manual_override"]
-        else:
-            coerced["_qt_manual_override"] = bool(coerced.get("_qt_manual_override"))
-
-        coerced["_nst_manual_override"] = bool(coerced.get("_nst_manual_override"))
-        if "_nst_source" not in coerced:
-            base_nst = coerced.get("nst")
-            if base_nst in (None, ""):
-                coerced["_nst_source"] = None
-            else:
-                coerced["_nst_source"] = svc_custeio._coerce_checkbox_to_bool(base_nst)
-
-        return coerced
-
-
     def _coerce_row(self, row: Mapping[str, Any]) -> Dict[str, Any]:
 
         return self._coerce_row_impl(row)
@@ -2684,1566 +2280,17 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
 
             return
 
-        page_ref = getattr(self, "_page", None)
-
-        session = getattr(page_ref, "session", None) if page_ref is not None else None
-
-        context = getattr(page_ref, "context", None) if page_ref is not None else None
-
-        def _coerce_dimension(raw: Any) -> Optional[float]:
-            if page_ref is not None and hasattr(page_ref, "_coerce_dimension_value"):
-                try:
-                    coerced = page_ref._coerce_dimension_value(raw)
-                except Exception:
-                    coerced = None
-                if coerced is not None:
-                    return coerced
-            if raw in (None, "", False):
-                return None
-            if isinstance(raw, (int, float)):
-                return float(raw)
-            try:
-                return float(str(raw).replace(",", "."))
-            except (TypeError, ValueError):
-                return None
-
-        if session is not None and context is not None:
-
-            try:
-
-                rules = svc_custeio.load_qt_rules(session, context)
-
-            except Exception:
-
-                rules = svc_custeio.DEFAULT_QT_RULES
-
-        else:
-
-            rules = svc_custeio.DEFAULT_QT_RULES
-
-        global_dimensions: Dict[str, Optional[float]] = {key: None for key in DIMENSION_KEY_ORDER}
-        if page_ref is not None and hasattr(page_ref, "dimension_values"):
-            try:
-                dimension_values = page_ref.dimension_values()
-            except Exception:
-                dimension_values = {}
-            for key in DIMENSION_KEY_ORDER:
-                global_dimensions[key] = _coerce_dimension(dimension_values.get(key))
-        global_context_base: Dict[str, Optional[float]] = {key.upper(): value for key, value in global_dimensions.items()}
-
-        production_mode = "STD"
-        sec_rate_info: Optional[Dict[str, float]] = None
-        sec_rate_value: Optional[float] = None
-        sec_rate_std: Optional[float] = None
-        sec_rate_serie: Optional[float] = None
-        orl_rate_info: Optional[Dict[str, float]] = None
-        orl_rate_value: Optional[float] = None
-        orl_rate_std: Optional[float] = None
-        orl_rate_serie: Optional[float] = None
-        cnc_low_info: Optional[Dict[str, float]] = None
-        cnc_medium_info: Optional[Dict[str, float]] = None
-        cnc_high_info: Optional[Dict[str, float]] = None
-        cnc_hour_info: Optional[Dict[str, float]] = None
-        abd_rate_info: Optional[Dict[str, float]] = None
-        prensa_rate_info: Optional[Dict[str, float]] = None
-        esquad_rate_info: Optional[Dict[str, float]] = None
-        embal_rate_info: Optional[Dict[str, float]] = None
-        colagem_rate_info: Optional[Dict[str, float]] = None
-        mo_rate_info: Optional[Dict[str, float]] = None
-        cnc_rate_low: Optional[float] = None
-        cnc_rate_medium: Optional[float] = None
-        cnc_rate_high: Optional[float] = None
-        cnc_rate_hour: Optional[float] = None
-        abd_rate_value: Optional[float] = None
-        prensa_rate_value: Optional[float] = None
-        prensa_rate_std: Optional[float] = None
-        prensa_rate_serie: Optional[float] = None
-        esquad_rate_value: Optional[float] = None
-        esquad_rate_std: Optional[float] = None
-        esquad_rate_serie: Optional[float] = None
-        embal_rate_value: Optional[float] = None
-        embal_rate_std: Optional[float] = None
-        embal_rate_serie: Optional[float] = None
-        colagem_rate_value: Optional[float] = None
-        colagem_rate_std: Optional[float] = None
-        colagem_rate_serie: Optional[float] = None
-        mo_rate_value: Optional[float] = None
-        mo_rate_std: Optional[float] = None
-        mo_rate_serie: Optional[float] = None
-        if page_ref is not None and hasattr(page_ref, "production_mode"):
-            try:
-                production_mode = page_ref.production_mode()
-            except Exception:
-                production_mode = "STD"
-            production_mode = (production_mode or "STD").upper()
-
-            def _float_or_none(value: Optional[float]) -> Optional[float]:
-                try:
-                    return float(value)
-                except (TypeError, ValueError):
-                    return None
-
-            def _select_rate(info: Optional[Dict[str, float]]) -> Optional[float]:
-                if not info:
-                    return None
-                std_val = _float_or_none(info.get("valor_std"))
-                serie_val = _float_or_none(info.get("valor_serie"))
-                if production_mode == "SERIE":
-                    return serie_val if serie_val is not None else std_val
-                return std_val if std_val is not None else serie_val
-
-            try:
-                sec_rate_info = page_ref.get_production_rate_info("VALOR_SECCIONADORA")
-                if sec_rate_info is None:
-                    sec_rate_info = page_ref.get_production_rate_info("SEC")
-            except Exception:
-                sec_rate_info = None
-            sec_rate_std = _float_or_none(sec_rate_info.get("valor_std")) if sec_rate_info else None
-            sec_rate_serie = _float_or_none(sec_rate_info.get("valor_serie")) if sec_rate_info else None
-            sec_rate_value = _select_rate(sec_rate_info)
-
-            try:
-                orl_rate_info = page_ref.get_production_rate_info("VALOR_ORLADORA")
-                if orl_rate_info is None:
-                    orl_rate_info = page_ref.get_production_rate_info("ORL")
-            except Exception:
-                orl_rate_info = None
-            orl_rate_std = _float_or_none(orl_rate_info.get("valor_std")) if orl_rate_info else None
-            orl_rate_serie = _float_or_none(orl_rate_info.get("valor_serie")) if orl_rate_info else None
-            orl_rate_value = _select_rate(orl_rate_info)
-
-            try:
-                cnc_low_info = page_ref.get_production_rate_info("CNC_PRECO_PECA_BAIXO")
-            except Exception:
-                cnc_low_info = None
-            try:
-                cnc_medium_info = page_ref.get_production_rate_info("CNC_PRECO_PECA_MEDIO")
-            except Exception:
-                cnc_medium_info = None
-            try:
-                cnc_high_info = page_ref.get_production_rate_info("CNC_PRECO_PECA_ALTO")
-            except Exception:
-                cnc_high_info = None
-            try:
-                cnc_hour_info = page_ref.get_production_rate_info("EUROS_HORA_CNC")
-            except Exception:
-                cnc_hour_info = None
-            try:
-                abd_rate_info = page_ref.get_production_rate_info("VALOR_ABD")
-            except Exception:
-                abd_rate_info = None
-            try:
-                prensa_rate_info = page_ref.get_production_rate_info("EUROS_HORA_PRENSA")
-            except Exception:
-                prensa_rate_info = None
-            try:
-                esquad_rate_info = page_ref.get_production_rate_info("EUROS_HORA_ESQUAD")
-            except Exception:
-                esquad_rate_info = None
-            try:
-                embal_rate_info = page_ref.get_production_rate_info("EUROS_EMBALAGEM_M3")
-            except Exception:
-                embal_rate_info = None
-            try:
-                colagem_rate_info = page_ref.get_production_rate_info("COLAGEM/REVESTIMENTO")
-            except Exception:
-                colagem_rate_info = None
-            try:
-                mo_rate_info = page_ref.get_production_rate_info("EUROS_HORA_MO")
-            except Exception:
-                mo_rate_info = None
-
-            cnc_rate_low = _select_rate(cnc_low_info)
-            cnc_rate_medium = _select_rate(cnc_medium_info)
-            cnc_rate_high = _select_rate(cnc_high_info)
-            cnc_rate_hour = _select_rate(cnc_hour_info)
-            abd_rate_value = _select_rate(abd_rate_info)
-            prensa_rate_value = _select_rate(prensa_rate_info)
-            if prensa_rate_info:
-                prensa_rate_std = _float_or_none(prensa_rate_info.get("valor_std"))
-                prensa_rate_serie = _float_or_none(prensa_rate_info.get("valor_serie"))
-            esquad_rate_value = _select_rate(esquad_rate_info)
-            if esquad_rate_info:
-                esquad_rate_std = _float_or_none(esquad_rate_info.get("valor_std"))
-                esquad_rate_serie = _float_or_none(esquad_rate_info.get("valor_serie"))
-            embal_rate_value = _select_rate(embal_rate_info)
-            if embal_rate_info:
-                embal_rate_std = _float_or_none(embal_rate_info.get("valor_std"))
-                embal_rate_serie = _float_or_none(embal_rate_info.get("valor_serie"))
-            colagem_rate_value = _select_rate(colagem_rate_info)
-            if colagem_rate_info:
-                colagem_rate_std = _float_or_none(colagem_rate_info.get("valor_std"))
-                colagem_rate_serie = _float_or_none(colagem_rate_info.get("valor_serie"))
-            mo_rate_value = _select_rate(mo_rate_info)
-            if mo_rate_info:
-                mo_rate_std = _float_or_none(mo_rate_info.get("valor_std"))
-                mo_rate_serie = _float_or_none(mo_rate_info.get("valor_serie"))
-
-
-        divisor = 1.0
-
-        current_group_uid = str(uuid.uuid4())
-
-        current_parent_row: Optional[Dict[str, Any]] = None
-        current_parent_uid: Optional[str] = None
-        current_parent_child_tokens: List[str] = []
-        current_parent_has_explicit_children = False
-
-        current_local_dimensions: Dict[str, Optional[float]] = {"HM": None, "LM": None, "PM": None}
-
-        def _build_eval_env(include_locals: bool = True) -> Dict[str, Optional[float]]:
-            env: Dict[str, Optional[float]] = dict(global_context_base)
-            if include_locals:
-                for key in ("HM", "LM", "PM"):
-                    env[key] = current_local_dimensions.get(key)
-            else:
-                for key in ("HM", "LM", "PM"):
-                    env.setdefault(key, None)
-            return env
-
-        def _evaluate_dimension(
-            expression: str, env: Mapping[str, Optional[float]]
-        ) -> Tuple[Optional[float], Optional[str], Optional[str]]:
-            value, error = self._evaluate_formula_expression(expression, env)
-            substitution = self._render_formula_substitution(expression, env)
-            if error is None and value is not None:
-                value = round(value, 1)
-            return value, error, substitution
-
-        def _update_qt_mod_expression(row: Dict[str, Any], divisor_value: Optional[float], parent_factor_value: Optional[float]) -> None:
-            row_type_local = row.get("_row_type")
-            if row_type_local in ("child", "division", "parent"):
-                return
-            raw_qt_mod = row.get("qt_mod")
-            auto_manage = False
-            if raw_qt_mod in (None, ""):
-                auto_manage = True
-            elif isinstance(raw_qt_mod, str):
-                if _AUTO_QTMOD_PATTERN.match(raw_qt_mod.strip()):
-                    auto_manage = True
-            elif isinstance(raw_qt_mod, (int, float)):
-                auto_manage = True
-            if not auto_manage:
-                return
-            if divisor_value is None or parent_factor_value is None:
-                return
-            divisor_text = self._format_factor(divisor_value)
-            parent_text = self._format_factor(parent_factor_value)
-            if not divisor_text or not parent_text:
-                return
-            new_value = f"{divisor_text} x {parent_text}"
-            if row.get("qt_mod") != new_value:
-                row["qt_mod"] = new_value
-
-        def _coerce_factor_value(raw: Any) -> Optional[float]:
-            if raw in (None, "", False):
-                return None
-            if isinstance(raw, (int, float)):
-                try:
-                    return float(raw)
-                except (TypeError, ValueError):
-                    return None
-            text = str(raw).strip()
-            if not text:
-                return None
-            text = text.replace(",", ".")
-            try:
-                return float(text)
-            except (TypeError, ValueError):
-                pass
-            matches = re.findall(r"[0-9]+(?:\\.[0-9]+)?", text)
-            if matches:
-                try:
-                    return float(matches[-1])
-                except (TypeError, ValueError):
-                    return None
-            return None
-
-        def _maybe_update_dimension_literal(row_dict: Dict[str, Any], key: str, value: Optional[float]) -> None:
-            if value is None:
-                return
-            raw_expr = (row_dict.get(key) or "").strip()
-            if raw_expr and not _NUMERIC_LITERAL_PATTERN.match(raw_expr):
-                return
-            formatted = self._format_result_number(value)
-            if formatted:
-                row_dict[key] = formatted
-
-        production_cost_changed = False
-
-        for row in self.rows:
-
-            row["_uid"] = row.get("_uid") or str(uuid.uuid4())
-
-            row["_comp_error"] = None
-            row["_comp_tooltip"] = None
-            row["_larg_error"] = None
-            row["_larg_tooltip"] = None
-            row["_esp_error"] = None
-            row["_esp_tooltip"] = None
-
-            row["comp_res"] = None
-            row["larg_res"] = None
-            row["esp_res"] = None
-
-            def_peca = row.get("def_peca") or ""
-            normalized_def_peca = self._normalize_def_peca(def_peca)
-
-            if not def_peca.strip():
-
-                row["_row_type"] = "separator"
-
-                row["_group_uid"] = row.get("_group_uid") or current_group_uid
-
-                row.pop("icon_hint", None)
-
-                row["_qt_divisor"] = divisor
-
-                row["_qt_parent_factor"] = None
-
-                row["_qt_child_factor"] = None
-
-                row["qt_total"] = None
-
-                current_parent_row = None
-
-                current_parent_uid = None
-                current_parent_child_tokens = []
-                current_parent_has_explicit_children = False
-
-                continue
-
-            is_division = self._is_division_row(row)
-
-            if is_division:
-
-                row["_row_type"] = "division"
-
-                try:
-
-                    divisor = float(row.get("qt_mod") or 1.0)
-
-                except Exception:
-
-                    divisor = 1.0
-
-                divisor = max(divisor, 1.0)
-
-                current_group_uid = row.get("_group_uid") or str(uuid.uuid4())
-
-                row["_group_uid"] = current_group_uid
-
-                row["_qt_divisor"] = divisor
-
-                row["_qt_parent_factor"] = None
-
-                row["_qt_child_factor"] = None
-
-                row["qt_und"] = None
-
-                row["qt_total"] = divisor
-
-                if getattr(self, "_page", None):
-
-                    if not row.get("icon_hint"):
-                        row["icon_hint"] = self._page._icon("division")
-
-                current_parent_row = None
-
-                current_parent_uid = None
-
-                row["_regra_nome"] = None
-                current_parent_child_tokens = []
-                current_parent_has_explicit_children = False
-
-            elif "+" in def_peca:
-
-                row["_row_type"] = "parent"
-                row["_is_parent"] = True
-
-                current_group_uid = row.get("_group_uid") or str(uuid.uuid4())
-
-                row["_group_uid"] = current_group_uid
-
-                current_parent_row = row
-
-                current_parent_uid = row["_uid"]
-
-                row["_regra_nome"] = None
-                current_parent_child_tokens = self._extract_child_tokens(def_peca)
-                current_parent_has_explicit_children = bool(current_parent_child_tokens)
-
-            else:
-
-                regra_nome = svc_custeio.identificar_regra(def_peca, rules)
-                attach_to_parent = False
-                if regra_nome and current_parent_row is not None:
-                    if current_parent_has_explicit_children:
-                        attach_to_parent = self._match_expected_child(
-                            normalized_def_peca,
-                            current_parent_child_tokens,
-                        )
-                    else:
-                        attach_to_parent = True
-
-                if attach_to_parent:
-
-                    row["_row_type"] = "child"
-                    row["_is_associated"] = True
-
-                    row["_group_uid"] = row.get("_group_uid") or current_group_uid
-
-                    row["_parent_uid"] = current_parent_uid
-
-                    row["_regra_nome"] = regra_nome
-
-                else:
-
-                    row["_row_type"] = "normal"
-
-                    row["_group_uid"] = row.get("_group_uid") or current_group_uid
-
-                    current_parent_row = None
-
-                    current_parent_uid = None
-
-                    row["_regra_nome"] = None
-                    current_parent_child_tokens = []
-                    current_parent_has_explicit_children = False
-
-            expr_comp = self._prepare_formula_expression(row.get("comp"))
-            row["comp"] = expr_comp
-            # Normalized token for this row (used to detect VARAO even when not a 'child')
-            raw_row_token = def_peca or row.get("descricao") or row.get("tipo") or ""
-            normalized_row_token = self._normalize_def_peca(raw_row_token)
-            if isinstance(row, dict):
-                row["_normalized_def"] = normalized_row_token
-            expr_larg = self._prepare_formula_expression(row.get("larg"))
-            row["larg"] = expr_larg
-            expr_esp = self._prepare_formula_expression(row.get("esp"))
-            row["esp"] = expr_esp
-
-            def_peca_value = (row.get("def_peca") or "").strip()
-            def_peca_norm = def_peca_value.casefold()
-
-            manual_cnc_override = None
-            if def_peca_norm == DEF_LABEL_CNC_5_MIN_NORM:
-                qt_und_manual = self._coerce_numeric(row.get("qt_und"))
-                if qt_und_manual not in (None, 0):
-                    manual_cnc_override = qt_und_manual * 5.0
-            elif def_peca_norm == DEF_LABEL_CNC_15_MIN_NORM:
-                qt_und_manual = self._coerce_numeric(row.get("qt_und"))
-                if qt_und_manual not in (None, 0):
-                    manual_cnc_override = qt_und_manual * 15.0
-            if manual_cnc_override is not None:
-                row["qt_total"] = manual_cnc_override
-
-            if row.get("_row_type") == "division":
-                division_env: Dict[str, Optional[float]] = dict(global_context_base)
-                for key in ("HM", "LM", "PM"):
-                    division_env.setdefault(key, None)
-                comp_val, comp_error, comp_sub = _evaluate_dimension(expr_comp, division_env)
-                row["comp_res"] = comp_val
-                row["_comp_error"] = comp_error
-                comp_expr_for_tooltip = row.get("comp") or expr_comp
-                comp_sub_for_tooltip = comp_sub
-                if comp_expr_for_tooltip != expr_comp:
-                    comp_sub_for_tooltip = self._render_formula_substitution(comp_expr_for_tooltip, division_env)
-                row["_comp_tooltip"] = self._build_formula_tooltip(comp_expr_for_tooltip, comp_val, comp_error, substitutions=comp_sub_for_tooltip)
-
-                larg_val, larg_error, larg_sub = _evaluate_dimension(expr_larg, division_env)
-                row["larg_res"] = larg_val
-                row["_larg_error"] = larg_error
-                larg_expr_for_tooltip = row.get("larg") or expr_larg
-                larg_sub_for_tooltip = larg_sub
-                if larg_expr_for_tooltip != expr_larg:
-                    larg_sub_for_tooltip = self._render_formula_substitution(larg_expr_for_tooltip, division_env)
-                row["_larg_tooltip"] = self._build_formula_tooltip(larg_expr_for_tooltip, larg_val, larg_error, substitutions=larg_sub_for_tooltip)
-
-                esp_val, esp_error, esp_sub = _evaluate_dimension(expr_esp, division_env)
-                row["esp_res"] = esp_val
-                row["_esp_error"] = esp_error
-                esp_expr_for_tooltip = row.get("esp") or expr_esp
-                esp_sub_for_tooltip = esp_sub
-                if esp_expr_for_tooltip != expr_esp:
-                    esp_sub_for_tooltip = self._render_formula_substitution(esp_expr_for_tooltip, division_env)
-                row["_esp_tooltip"] = self._build_formula_tooltip(esp_expr_for_tooltip, esp_val, esp_error, substitutions=esp_sub_for_tooltip)
-
-                current_local_dimensions["HM"] = comp_val
-                current_local_dimensions["LM"] = larg_val
-                current_local_dimensions["PM"] = esp_val
-                row["_qt_divisor"] = divisor
-                row["_qt_parent_factor"] = None
-                row["_qt_child_factor"] = None
-                row["qt_und"] = None
-                row["qt_total"] = divisor
-                row["spp_ml_und"] = None
-                current_parent_row = row
-                current_parent_uid = row["_uid"]
-                continue
-
-            merged_context = _build_eval_env()
-            comp_val, comp_error, comp_sub = _evaluate_dimension(expr_comp, merged_context)
-            row["comp_res"] = comp_val
-            row["_comp_error"] = comp_error
-            _maybe_update_dimension_literal(row, "comp", comp_val)
-            comp_expr_for_tooltip = row.get("comp") or expr_comp
-            comp_sub_for_tooltip = comp_sub
-            if comp_expr_for_tooltip != expr_comp:
-                comp_sub_for_tooltip = self._render_formula_substitution(comp_expr_for_tooltip, merged_context)
-            row["_comp_tooltip"] = self._build_formula_tooltip(comp_expr_for_tooltip, comp_val, comp_error, substitutions=comp_sub_for_tooltip)
-
-            larg_val, larg_error, larg_sub = _evaluate_dimension(expr_larg, merged_context)
-            row["larg_res"] = larg_val
-            row["_larg_error"] = larg_error
-            _maybe_update_dimension_literal(row, "larg", larg_val)
-            larg_expr_for_tooltip = row.get("larg") or expr_larg
-            larg_sub_for_tooltip = larg_sub
-            if larg_expr_for_tooltip != expr_larg:
-                larg_sub_for_tooltip = self._render_formula_substitution(larg_expr_for_tooltip, merged_context)
-            row["_larg_tooltip"] = self._build_formula_tooltip(larg_expr_for_tooltip, larg_val, larg_error, substitutions=larg_sub_for_tooltip)
-
-            esp_val, esp_error, esp_sub = _evaluate_dimension(expr_esp, merged_context)
-            row["esp_res"] = esp_val
-            row["_esp_error"] = esp_error
-            _maybe_update_dimension_literal(row, "esp", esp_val)
-            esp_expr_for_tooltip = row.get("esp") or expr_esp
-            esp_sub_for_tooltip = esp_sub
-            if esp_expr_for_tooltip != expr_esp:
-                esp_sub_for_tooltip = self._render_formula_substitution(esp_expr_for_tooltip, merged_context)
-            row["_esp_tooltip"] = self._build_formula_tooltip(esp_expr_for_tooltip, esp_val, esp_error, substitutions=esp_sub_for_tooltip)
-
-            # HeranÃ§a de comprimento para VARAO e componentes ML mesmo quando nÃ£o sÃ£o marcados como 'child'
-            # Isto garante que linhas "VARAO" exibam o comprimento do componente PAI (ex.: 1000)
-            # EXCETO para SUPORTE VARAO, que deve manter comp vazio (processado na seÃ§Ã£o de child mais abaixo)
-            try:
-                is_ml = (row.get("und") or "").strip().upper() == "ML"
-            except Exception:
-                is_ml = False
-            if current_parent_row is not None and row.get("_row_type") != "division" and row.get("_row_type") != "parent":
-                # Skip SUPORTE VARAO from inheriting comp: it handles its own comp clearing later in the child section
-                is_support_varao_check = normalized_row_token and "SUPORTE" in normalized_row_token
-                is_regular_varao_check = normalized_row_token and "VARAO" in normalized_row_token and not is_support_varao_check
-                if is_ml or is_regular_varao_check:
-                    inherited_comp = current_parent_row.get("comp_res")
-                    if inherited_comp is None:
-                        inherited_comp = _coerce_dimension(current_parent_row.get("comp"))
-                    if inherited_comp is not None:
-                        row["comp_res"] = inherited_comp
-                        row["_comp_error"] = None
-                        _maybe_update_dimension_literal(row, "comp", inherited_comp)
-                        formatted = self._format_result_number(inherited_comp)
-                        expr_for_tooltip = (row.get("comp") or formatted or "").strip()
-                        row["_comp_tooltip"] = self._build_formula_tooltip(expr_for_tooltip, inherited_comp, None, substitutions=formatted or None)
-            row["_qt_divisor"] = divisor
-
-            row_type = row.get("_row_type")
-
-            if row_type != "division":
-                row.pop("icon_hint", None)
-
-            if row_type == "child" and current_parent_row is not None:
-                try:
-                    parent_factor = float(current_parent_row.get("qt_und") or 1.0)
-                except Exception:
-                    parent_factor = 1.0
-            elif row_type == "parent":
-                try:
-                    parent_factor = float(row.get("qt_und") or 1.0)
-                except Exception:
-                    parent_factor = 1.0
-                if row.get("qt_und") in (None, ""):
-                    row["qt_und"] = parent_factor
-            else:
-                tipo_val = (row.get("tipo") or "").strip().casefold()
-                if tipo_val == "pai":
-                    try:
-                        parent_factor = float(row.get("qt_und") or 1.0)
-                    except Exception:
-                        parent_factor = 1.0
-                    if row.get("qt_und") in (None, ""):
-                        row["qt_und"] = parent_factor
-                else:
-                    raw_qt_mod = row.get("qt_mod")
-                    parent_factor = _coerce_factor_value(raw_qt_mod)
-                    qt_und_val = self._coerce_numeric(row.get("qt_und"))
-                    if qt_und_val is not None and qt_und_val > 0:
-                        parent_factor = qt_und_val
-                    elif parent_factor is None or parent_factor <= 0:
-                        parent_factor = 1.0
-                    if row_type not in ("child", "separator") and row.get("qt_mod") in (None, ""):
-                        row["qt_mod"] = parent_factor
-
-            if row_type != "child":
-                _update_qt_mod_expression(row, divisor, parent_factor)
-
-            if row_type == "child" and current_parent_row is not None:
-
-                regra_base = row.get("_regra_nome") or row.get("_child_source")
-
-                regra_nome = svc_custeio.identificar_regra(regra_base or "", rules)
-
-                rule_data = rules.get(regra_nome) if regra_nome else None
-
-                existing_child = self._coerce_numeric(row.get("qt_und"))
-
-                try:
-                    child_factor = svc_custeio.calcular_qt_filhos(regra_nome, current_parent_row, row, divisor, parent_factor, rules)
-                except Exception:
-                    try:
-                        child_factor = float(existing_child if existing_child is not None else 1.0)
-                    except Exception:
-                        child_factor = 1.0
-
-                try:
-                    parent_qt = float(current_parent_row.get("qt_und") or 1.0)
-                except Exception:
-                    parent_qt = 1.0
-
-                # Prefer explicit _child_source, fall back to descricao/tipo and lastly def_peca
-                raw_child_token = row.get("_child_source") or row.get("descricao") or row.get("tipo") or row.get("def_peca")
-                normalized_child = self._normalize_def_peca(raw_child_token)
-                row["_normalized_child"] = normalized_child
-
-                if "VARAO" in normalized_child:
-                    # VARAO (bar) children are measured in ML: default qt_und is 1 and
-                    # they inherit the parent's comp (length). For suporte varao we force the rule factor.
-                    if "SUPORTE" in normalized_child:
-                        # qt_und do SUPORTE VARAO = 2 x qt_und do VARAO (sibling base)
-                        # procura irmao VARAO com o mesmo _parent_uid; senao usa qt_und do pai
-                        base_qt = parent_qt
-                        try:
-                            parent_uid = row.get("_parent_uid")
-                            for sibling in self.rows:
-                                if sibling is row:
-                                    continue
-                                if sibling.get("_parent_uid") != parent_uid:
-                                    continue
-                                token = self._normalize_def_peca(
-                                    sibling.get("def_peca") or sibling.get("descricao") or sibling.get("tipo")
-                                )
-                                if token and "VARAO" in token and "SUPORTE" not in token:
-                                    sib_qt = self._coerce_numeric(sibling.get("qt_und")) or self._coerce_numeric(
-                                        sibling.get("_qt_formula_value")
-                                    )
-                                    if sib_qt not in (None, 0):
-                                        base_qt = sib_qt
-                                        break
-                        except Exception:
-                            base_qt = parent_qt
-                        try:
-                            child_factor = 2 * float(base_qt)
-                        except Exception:
-                            child_factor = 2.0
-                        # for supports we do not inherit comp; leave comp empty
-                        row["comp_res"] = None
-                        if isinstance(row, dict):
-                            row["comp"] = ""
-                        # ajuste de tooltip para refletir a regra fixa
-                        if rule_data is not None:
-                            rule_data = dict(rule_data)
-                            rule_data["tooltip"] = "SUPORTE VARAO = 2 x QT_PAI (valor do VARAO)."
-                        row["_qt_rule_tooltip"] = "SUPORTE VARAO = 2 x qt_und do VARAO."
-                    else:
-                        # regular VARAO: one rod per parent module; inherit length
-                        try:
-                            child_factor = 1
-                        except Exception:
-                            child_factor = 1
-                        # inherit comp_res from parent so comp shows parent's length
-                        inherited_comp = current_parent_row.get("comp_res")
-                        if inherited_comp is None:
-                            inherited_comp = _coerce_dimension(current_parent_row.get("comp"))
-                        if inherited_comp is not None:
-                            row["comp_res"] = inherited_comp
-                            row["_comp_error"] = None
-                            _maybe_update_dimension_literal(row, "comp", inherited_comp)
-                            formatted = self._format_result_number(inherited_comp)
-                            expr_for_tooltip = (row.get("comp") or formatted or "").strip()
-                            row["_comp_tooltip"] = self._build_formula_tooltip(expr_for_tooltip, inherited_comp, None, substitutions=formatted or None)
-
-                row["_regra_nome"] = regra_nome
-
-                row["_qt_rule_tooltip"] = rule_data.get("tooltip") if rule_data else None
-
-                formula_child = child_factor
-                row["_qt_formula_value"] = formula_child
-
-                manual_allowed = self._supports_qt_und_override(row)
-                manual_value = self._coerce_numeric(row.get("_qt_manual_value"))
-                stored_child = self._coerce_numeric(row.get("qt_und"))
-                manual_override_flag = bool(row.get("_qt_manual_override") or row.get("qt_manual_override"))
-
-                if manual_allowed:
-                    if manual_value is not None:
-                        effective_child = manual_value
-                        manual_override_flag = True
-                    elif manual_override_flag and stored_child is not None:
-                        manual_value = stored_child
-                        effective_child = stored_child
-                    else:
-                        manual_override_flag = False
-                        manual_value = None
-                        effective_child = formula_child
-                else:
-                    manual_override_flag = False
-                    manual_value = None
-                    effective_child = formula_child
-
-                row["qt_und"] = effective_child
-                row["qt_manual_override"] = manual_override_flag
-                row["_qt_manual_override"] = manual_override_flag
-                if manual_override_flag and manual_value is not None:
-                    row["_qt_manual_value"] = manual_value
-                    manual_formula = self._render_qt_mod_formula(divisor, parent_factor, manual_value)
-                    manual_total = self._format_result_number(float(divisor) * float(parent_factor) * float(manual_value))
-                    if manual_total:
-                        row["_qt_manual_tooltip"] = f"Formula local: {manual_formula} = {manual_total}"
-                    else:
-                        row["_qt_manual_tooltip"] = f"Formula local: {manual_formula}"
-                else:
-                    row["_qt_manual_value"] = None
-                    row["_qt_manual_tooltip"] = None
-
-                # HeranÃ§a de comprimento para VARAO e componentes ML (skip supports)
-                is_ml = ((row.get("und") or "").strip().upper() == "ML")
-                is_varao = ("VARAO" in (normalized_child or ""))
-                is_support_varao = ("SUPORTE" in (normalized_child or ""))
-                if (is_ml or is_varao) and current_parent_row is not None and not is_support_varao:
-                    inherited_comp = current_parent_row.get("comp_res")
-                    if inherited_comp is None:
-                        inherited_comp = _coerce_dimension(current_parent_row.get("comp"))
-                    row["comp_res"] = inherited_comp
-                    row["_comp_error"] = None
-                    _maybe_update_dimension_literal(row, "comp", inherited_comp)
-                    formatted = self._format_result_number(inherited_comp)
-                    expr_for_tooltip = (row.get("comp") or formatted or "").strip()
-                    row["_comp_tooltip"] = self._build_formula_tooltip(expr_for_tooltip, inherited_comp, None, substitutions=formatted or None)
-
-                if current_parent_has_explicit_children and not current_parent_child_tokens:
-                    current_parent_row = None
-                    current_parent_uid = None
-                    current_parent_has_explicit_children = False
-
-            else:
-
-                row["_qt_rule_tooltip"] = None
-
-                # Para linhas do tipo 'parent' nÃ£o tratamos qt_und como factor filho
-                if row_type == "parent":
-                    # parent rows contribute via _qt_parent_factor; child factor must be 1
-                    formula_child = 1.0
-                    row["_qt_formula_value"] = formula_child
-                    row["qt_manual_override"] = False
-                    row["_qt_manual_override"] = False
-                    row["_qt_manual_tooltip"] = None
-                    row["_qt_manual_value"] = None
-                    effective_child = formula_child
-                else:
-                    formula_child = 1.0
-                    row["_qt_formula_value"] = formula_child
-                    row["qt_manual_override"] = False
-                    row["_qt_manual_override"] = False
-                    row["_qt_manual_tooltip"] = None
-                    row["_qt_manual_value"] = None
-                    effective_child = formula_child
-
-            row["_qt_parent_factor"] = parent_factor
-
-            row["_qt_child_factor"] = effective_child
-
-            try:
-                total = float(divisor) * float(parent_factor) * float(effective_child)
-            except Exception:
-                total = 0.0
-
-            row["qt_total"] = total if total else None
-
-            # Atualizar mÃ©tricas derivadas (Ã¡rea e perÃ­metro por unidade)
-            comp_res_val = row.get("comp_res")
-            larg_res_val = row.get("larg_res")
-            area_val: Optional[float] = None
-            perimetro_val: Optional[float] = None
-            try:
-                comp_float = float(comp_res_val) if comp_res_val not in (None, "") else None
-            except (TypeError, ValueError):
-                comp_float = None
-            try:
-                larg_float = float(larg_res_val) if larg_res_val not in (None, "") else None
-            except (TypeError, ValueError):
-                larg_float = None
-            if comp_float is not None and larg_float is not None:
-                comp_m = comp_float / 1000.0
-                larg_m = larg_float / 1000.0
-                area_val = round(comp_m * larg_m, 4)
-                perimetro_val = round(2 * (comp_m + larg_m), 4)
-            row["area_m2_und"] = area_val
-            row["perimetro_und"] = perimetro_val
-            spp_precise_value: Optional[float] = None
-            custo_mp_und_value: Optional[float] = None
-            custo_mp_total_value: Optional[float] = None
-            mp_tooltip: Optional[str] = None
-            mp_total_tooltip: Optional[str] = None
-            qt_total_numeric = self._coerce_numeric(row.get("qt_total"))
-
-            mps_checked = self._coerce_checked(row.get("mps"))
-            mo_checked = self._coerce_checked(row.get("mo"))
-            orla_checked = self._coerce_checked(row.get("orla"))
-
-            if self._is_spp_row(row):
-                if comp_float is not None:
-                    comp_m_val = comp_float / 1000.0
-                    spp_precise_value = comp_m_val * (1.0 + SPP_WASTE_PERCENT)
-                    row["spp_ml_und"] = round(spp_precise_value, 2)
-                    row["_spp_ml_und_tooltip"] = (
-                        "SPP calculado com desperdicio padrao\n"
-                        f"COMP_res: {comp_float:.2f} mm -> {comp_m_val:.4f} ML\n"
-                        f"Desp_SPP: {SPP_WASTE_PERCENT * 100:.2f}% (fator {1.0 + SPP_WASTE_PERCENT:.3f})\n"
-                        f"Calculo: {comp_m_val:.4f} ML * (1 + {SPP_WASTE_PERCENT * 100:.2f}%) = {spp_precise_value:.4f} ML"
-                    )
-                else:
-                    row["spp_ml_und"] = None
-                    row["_spp_ml_und_tooltip"] = "Dimensoes insuficientes para calcular ML"
-            else:
-                row["spp_ml_und"] = None
-                row["_spp_ml_und_tooltip"] = None
-
-            if mps_checked:
-                custo_mp_und_value = 0.0
-                row["custo_mp_und"] = 0.0
-                mp_tooltip = "CUSTO_MP_und = 0 € (checkbox MPs ativo)."
-            elif row_type not in {"division", "separator"}:
-                pliq_value = self._coerce_numeric(row.get("pliq"))
-                desp_fraction = self._coerce_percent(row.get("desp"))
-                if desp_fraction is None:
-                    desp_fraction = DEFAULT_MP_DESP_FRACTION
-                fator_desp = 1.0 + max(desp_fraction, 0.0)
-                und_text = (row.get("und") or "").strip().upper()
-                base_value: Optional[float] = None
-                base_label: Optional[str] = None
-                if und_text == "M2" and area_val not in (None, 0):
-                    base_value = area_val
-                    base_label = "AREA_M2_und"
-                elif und_text == "ML" and spp_precise_value not in (None, 0):
-                    base_value = spp_precise_value
-                    base_label = "SPP_ML_und"
-                elif und_text == "UND":
-                    base_value = 1.0
-                    base_label = "UND"
-
-                if base_value is not None and pliq_value not in (None, 0):
-                    custo_mp_und_value = round(base_value * fator_desp * pliq_value, 2)
-                    row["custo_mp_und"] = custo_mp_und_value
-                    desp_percent = desp_fraction * 100.0
-                    base_desc = (
-                        f"{base_label}: {base_value:.4f} {'m2' if base_label == 'AREA_M2_und' else ('ML' if base_label == 'SPP_ML_und' else 'und')}"
-                    )
-                    mp_tooltip = "\n".join(
-                        [
-                            "Custo Materias Primas (por unidade)",
-                            f"Und: {und_text or '-'}",
-                            base_desc,
-                            f"PliQ: {pliq_value:.2f} €",
-                            f"Desperdicio: {desp_percent:.2f}% (fator {fator_desp:.3f})",
-                            f"Calculo: {base_value:.4f} x (1 + {desp_percent:.2f}%) x {pliq_value:.2f} € = {custo_mp_und_value:.2f} €",
-                        ]
-                    )
-                else:
-                    row["custo_mp_und"] = None
-                    if pliq_value in (None, 0):
-                        mp_tooltip = "CUSTO_MP_und indisponivel: PliQ sem valor."
-                    elif base_label is None:
-                        mp_tooltip = "CUSTO_MP_und indisponivel: dimensoes/und sem base valida."
-                    else:
-                        mp_tooltip = "CUSTO_MP_und indisponivel."
-            else:
-                row["custo_mp_und"] = None
-
-            if mps_checked:
-                custo_mp_total_value = 0.0
-                row["custo_mp_total"] = 0.0
-                mp_total_tooltip = "CUSTO_MP_Total = 0 € (checkbox MPs ativo)."
-            elif (
-                custo_mp_und_value is not None
-                and qt_total_numeric not in (None, 0)
-            ):
-                custo_mp_total_value = round(custo_mp_und_value * qt_total_numeric, 2)
-                row["custo_mp_total"] = custo_mp_total_value
-                mp_total_tooltip = "\n".join(
-                    [
-                        "Custo Materias Primas (total)",
-                        f"CUSTO_MP_und: {custo_mp_und_value:.2f} €",
-                        f"Qt_Total: {qt_total_numeric:.2f}",
-                        f"Calculo: {custo_mp_und_value:.2f} € * {qt_total_numeric:.2f} = {custo_mp_total_value:.2f} €",
-                    ]
-                )
-            elif row_type in {"division", "separator"}:
-                row["custo_mp_total"] = None
-                mp_total_tooltip = None
-            else:
-                row["custo_mp_total"] = None
-                if custo_mp_und_value is None:
-                    mp_total_tooltip = "CUSTO_MP_Total depende do valor unitario."
-                elif qt_total_numeric in (None, 0):
-                    mp_total_tooltip = "CUSTO_MP_Total indisponivel: Qt_Total sem valor."
-                else:
-                    mp_total_tooltip = None
-            row["_custo_mp_und_tooltip"] = mp_tooltip
-            row["_custo_mp_total_tooltip"] = mp_total_tooltip
-
-            cp_prev_val = self._coerce_numeric(row.get("cp01_sec_und"))
-            cp_factor = self._coerce_numeric(row.get("cp01_sec"))
-            perimetro_calc = perimetro_val if perimetro_val is not None else self._coerce_numeric(row.get("perimetro_und"))
-            tooltip_text: Optional[str] = None
-            new_cp_value: Optional[float] = None
-            if (
-                row_type not in {"division", "separator"}
-                and sec_rate_value is not None
-                and cp_factor is not None
-                and cp_factor > 0
-                and perimetro_calc is not None
-            ):
-                try:
-                    new_cp_value = round(cp_factor * perimetro_calc * sec_rate_value, 2)
-                except Exception:
-                    new_cp_value = None
-                if new_cp_value is not None:
-                    tooltip_lines = [
-                        f"Modo: {production_mode}",
-                        f"CP01_SEC: {cp_factor:.2f}",
-                        f"Perimetro_und: {perimetro_calc:.2f} ML",
-                        f"Tarifa {production_mode}: {sec_rate_value:.4f} \u20AC/ML",
-                        f"Calculo: {cp_factor:.2f} x {perimetro_calc:.2f} x {sec_rate_value:.4f} = {new_cp_value:.2f} \u20AC",
-                    ]
-                    if sec_rate_std is not None and sec_rate_serie is not None:
-                        tooltip_lines.append(
-                            f"STD: {sec_rate_std:.4f} \u20AC/ML | SERIE: {sec_rate_serie:.4f} \u20AC/ML"
-                        )
-                    tooltip_text = "\n".join(tooltip_lines)
-            else:
-                new_cp_value = None
-
-            if new_cp_value is None:
-                if cp_prev_val is not None:
-                    production_cost_changed = True
-                row["cp01_sec_und"] = None
-            else:
-                if cp_prev_val is None or not _float_almost_equal(cp_prev_val, new_cp_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp01_sec_und"] = new_cp_value
-            row["_cp01_sec_und_tooltip"] = tooltip_text
-
-            cp02_prev_val = self._coerce_numeric(row.get("cp02_orl_und"))
-            cp02_factor = self._coerce_numeric(row.get("cp02_orl"))
-            soma_ml_total = self._coerce_numeric(row.get("soma_total_ml_orla"))
-            qt_total_val = self._coerce_numeric(row.get("qt_total"))
-            tooltip_cp02: Optional[str] = None
-            cp02_new_value: Optional[float] = None
-            ml_per_piece: Optional[float] = None
-            if (
-                soma_ml_total is not None
-                and qt_total_val is not None
-                and qt_total_val > 0
-            ):
-                try:
-                    ml_per_piece = float(soma_ml_total) / float(qt_total_val)
-                except Exception:
-                    ml_per_piece = None
-            if (
-                row_type not in {"division", "separator"}
-                and orl_rate_value is not None
-                and cp02_factor is not None
-                and cp02_factor > 0
-                and ml_per_piece is not None
-            ):
-                try:
-                    cp02_new_value = round(cp02_factor * ml_per_piece * orl_rate_value, 2)
-                except Exception:
-                    cp02_new_value = None
-                if cp02_new_value is not None:
-                    tooltip_lines_cp02 = [
-                        f"Modo: {production_mode}",
-                        f"CP02_ORL: {cp02_factor:.2f}",
-                        f"SOMA_TOTAL_ML_ORLA: {(soma_ml_total or 0):.2f} ML",
-                        f"QT_total: {(qt_total_val or 0):.2f}",
-                        f"ML por unidade: {ml_per_piece:.4f} ML",
-                        f"Tarifa {production_mode}: {orl_rate_value:.4f} \u20AC/ML",
-                        f"Calculo: {cp02_factor:.2f} x {ml_per_piece:.4f} x {orl_rate_value:.4f} = {cp02_new_value:.2f} \u20AC",
-                    ]
-                    if orl_rate_std is not None and orl_rate_serie is not None:
-                        tooltip_lines_cp02.append(
-                            f"STD: {orl_rate_std:.4f} \u20AC/ML | SERIE: {orl_rate_serie:.4f} \u20AC/ML"
-                        )
-                    tooltip_cp02 = "\n".join(tooltip_lines_cp02)
-            else:
-                cp02_new_value = None
-
-            if cp02_new_value is None:
-                if cp02_prev_val is not None:
-                    production_cost_changed = True
-                row["cp02_orl_und"] = None
-            else:
-                if cp02_prev_val is None or not _float_almost_equal(cp02_prev_val, cp02_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp02_orl_und"] = cp02_new_value
-            row["_cp02_orl_und_tooltip"] = tooltip_cp02
-
-            cp03_prev_val = self._coerce_numeric(row.get("cp03_cnc_und"))
-            cp03_factor = self._coerce_numeric(row.get("cp03_cnc"))
-            tooltip_cp03: Optional[str] = None
-            cp03_new_value: Optional[float] = None
-            manual_cnc_applied = False
-            # For manual CNC service pieces, compute per-unit minutes from `qt_und` (e.g. 5,15)
-            # and compute cp03_cnc_und as cost per unit (minutes_per_unit * rate_per_minute).
-            minutes_per_unit: Optional[float] = None
-            if def_peca_norm in MANUAL_CNC_LABELS:
-                minutes_per_unit = self._coerce_numeric(row.get("qt_und")) or 1.0
-            if (
-                minutes_per_unit not in (None, 0)
-                and cnc_rate_hour not in (None, 0)
-                and row_type not in {"division", "separator"}
-                and def_peca_norm in MANUAL_CNC_LABELS
-            ):
-                try:
-                    rate_hour_val = float(cnc_rate_hour)
-                    per_minute = rate_hour_val / 60.0
-                    # cp03_cnc_und must represent the price PER MINUTE (not per-unit). Totais usam qt_total.
-                    cp03_new_value = round(per_minute, 4)
-                except Exception:
-                    cp03_new_value = None
-                if cp03_new_value is not None:
-                    tooltip_lines_cp03 = [
-                        f"Modo: {production_mode}",
-                        f"Tarifa EUROS_HORA_CNC: {rate_hour_val:.4f} €/hora",
-                        f"Calculo (por minuto): ({rate_hour_val:.4f} €/hora / 60) = {cp03_new_value:.4f} €/min",
-                        f"Observacao: Qt_total acumula minutos totais; cp03_cnc_und e' preco por minuto.",
-                    ]
-                    tooltip_cp03 = "\n".join(tooltip_lines_cp03)
-                    manual_cnc_applied = True
-            if (
-                not manual_cnc_applied
-                and row_type not in {"division", "separator"}
-                and cp03_factor is not None
-                and cp03_factor > 0
-            ):
-                familia_val = (row.get("familia") or "").strip().upper()
-                is_ferragens = familia_val == "FERRAGENS"
-                if is_ferragens and cnc_rate_hour not in (None, 0):
-                    try:
-                        rate_hour_val = float(cnc_rate_hour)
-                        per_minute = rate_hour_val / 60.0
-                        cp03_new_value = round(cp03_factor * per_minute, 2)
-                    except Exception:
-                        cp03_new_value = None
-                    if cp03_new_value is not None:
-                        tooltip_lines_cp03 = [
-                            f"Modo: {production_mode}",
-                            f"CP03_CNC: {cp03_factor:.2f}",
-                            f"Tarifa EUROS_HORA_CNC: {rate_hour_val:.4f} €/hora",
-                            f"Calculo: {cp03_factor:.2f} x ({rate_hour_val:.4f} €/hora / 60) = {cp03_new_value:.2f} €",
-                        ]
-                        tooltip_cp03 = "\n".join(tooltip_lines_cp03)
-                else:
-                    area_unit = self._coerce_numeric(row.get("area_m2_und"))
-                    if area_unit is not None and area_unit >= 0:
-                        rate_value: Optional[float] = None
-                        categoria = ""
-                        if area_unit < 0.7:
-                            rate_value = cnc_rate_low
-                            categoria = "CNC_PRECO_PECA_BAIXO"
-                        elif area_unit < 1.0:
-                            rate_value = cnc_rate_medium
-                            categoria = "CNC_PRECO_PECA_MEDIO"
-                        else:
-                            rate_value = cnc_rate_high
-                            categoria = "CNC_PRECO_PECA_ALTO"
-                        if rate_value is not None:
-                            try:
-                                rate_peca = float(rate_value)
-                                cp03_new_value = round(cp03_factor * rate_peca, 2)
-                            except Exception:
-                                cp03_new_value = None
-                            if cp03_new_value is not None:
-                                tooltip_lines_cp03 = [
-                                    f"Modo: {production_mode}",
-                                    f"CP03_CNC: {cp03_factor:.2f}",
-                                    f"AREA_M2_und: {area_unit:.4f} m2",
-                                    f"Tarifa {categoria}: {rate_peca:.4f} €/peca",
-                                    f"Calculo: {cp03_factor:.2f} x {rate_peca:.4f} = {cp03_new_value:.2f} €",
-                                    f"Criterio de selecao: AREA_M2_und = {area_unit:.4f} m2",
-                                ]
-                                tooltip_cp03 = "\n".join(tooltip_lines_cp03)
-            if cp03_new_value is None:
-                if cp03_prev_val is not None:
-                    production_cost_changed = True
-                row["cp03_cnc_und"] = None
-            else:
-                if cp03_prev_val is None or not _float_almost_equal(cp03_prev_val, cp03_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp03_cnc_und"] = cp03_new_value
-            row["_cp03_cnc_und_tooltip"] = tooltip_cp03
-
-            cp04_prev_val = self._coerce_numeric(row.get("cp04_abd_und"))
-            cp04_factor = self._coerce_numeric(row.get("cp04_abd"))
-            tooltip_cp04: Optional[str] = None
-            cp04_new_value: Optional[float] = None
-            if (
-                row_type not in {"division", "separator"}
-                and cp04_factor is not None
-                and cp04_factor > 0
-                and abd_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_abd = float(abd_rate_value)
-                    cp04_new_value = round(cp04_factor * rate_abd, 2)
-                except Exception:
-                    cp04_new_value = None
-                if cp04_new_value is not None:
-                    tooltip_lines_cp04 = [
-                        f"Modo: {production_mode}",
-                        f"CP04_ABD: {cp04_factor:.2f}",
-                        f"Tarifa VALOR_ABD: {rate_abd:.4f} €",
-                        f"Calculo: {cp04_factor:.2f} x {rate_abd:.4f} = {cp04_new_value:.2f} €",
-                    ]
-                    tooltip_cp04 = "\n".join(tooltip_lines_cp04)
-            if cp04_new_value is None:
-                if cp04_prev_val is not None:
-                    production_cost_changed = True
-                row["cp04_abd_und"] = None
-            else:
-                if cp04_prev_val is None or not _float_almost_equal(cp04_prev_val, cp04_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp04_abd_und"] = cp04_new_value
-            row["_cp04_abd_und_tooltip"] = tooltip_cp04
-
-            cp05_prev_val = self._coerce_numeric(row.get("cp05_prensa_und"))
-            cp05_factor = self._coerce_numeric(row.get("cp05_prensa"))
-            tooltip_cp05: Optional[str] = None
-            cp05_new_value: Optional[float] = None
-            rate_prensa: Optional[float] = None
-            per_min_prensa: Optional[float] = None
-            if (
-                row_type not in {"division", "separator"}
-                and cp05_factor is not None
-                and cp05_factor > 0
-                and prensa_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_prensa = float(prensa_rate_value)
-                    per_min_prensa = rate_prensa / 60.0
-                    cp05_new_value = round(per_min_prensa * cp05_factor, 2)
-                except Exception:
-                    cp05_new_value = None
-                if cp05_new_value is not None and per_min_prensa is not None and rate_prensa is not None:
-                    tooltip_lines_cp05 = [
-                        f"Modo: {production_mode}",
-                        f"CP05_PRENSA: {cp05_factor:.2f}",
-                        f"Tarifa EUROS_HORA_PRENSA: {rate_prensa:.4f} €/hora",
-                        f"Calculo: ({rate_prensa:.4f} €/hora / 60) x {cp05_factor:.2f} = {cp05_new_value:.2f} €",
-                    ]
-                    if prensa_rate_std is not None and prensa_rate_serie is not None:
-                        tooltip_lines_cp05.append(
-                            f"STD: {prensa_rate_std:.4f} €/hora | SERIE: {prensa_rate_serie:.4f} €/hora"
-                        )
-                    tooltip_cp05 = "\n".join(tooltip_lines_cp05)
-            if cp05_new_value is None:
-                if cp05_prev_val is not None:
-                    production_cost_changed = True
-                row["cp05_prensa_und"] = None
-                if tooltip_cp05 is None and cp05_factor not in (None, 0):
-                    tooltip_cp05 = "Tarifa nao disponivel para calcular PRENSA"
-            else:
-                if cp05_prev_val is None or not _float_almost_equal(cp05_prev_val, cp05_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp05_prensa_und"] = cp05_new_value
-            row["_cp05_prensa_und_tooltip"] = tooltip_cp05
-
-            cp06_prev_val = self._coerce_numeric(row.get("cp06_esquad_und"))
-            cp06_factor = self._coerce_numeric(row.get("cp06_esquad"))
-            tooltip_cp06: Optional[str] = None
-            cp06_new_value: Optional[float] = None
-            rate_esquad: Optional[float] = None
-            if (
-                row_type not in {"division", "separator"}
-                and cp06_factor is not None
-                and cp06_factor > 0
-                and esquad_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_esquad = float(esquad_rate_value)
-                    cp06_new_value = round(cp06_factor * (rate_esquad / 60.0), 2)
-                except Exception:
-                    cp06_new_value = None
-                if cp06_new_value is not None and rate_esquad is not None:
-                    tooltip_lines_cp06 = [
-                        f"Modo: {production_mode}",
-                        f"CP06_ESQUAD: {cp06_factor:.2f}",
-                        f"Tarifa EUROS_HORA_ESQUAD: {rate_esquad:.4f} €/hora",
-                        f"Calculo: {cp06_factor:.2f} x ({rate_esquad:.4f} €/hora / 60) = {cp06_new_value:.2f} €",
-                    ]
-                    if esquad_rate_std is not None and esquad_rate_serie is not None:
-                        tooltip_lines_cp06.append(
-                            f"STD: {esquad_rate_std:.4f} €/hora | SERIE: {esquad_rate_serie:.4f} €/hora"
-                        )
-                    tooltip_cp06 = "\n".join(tooltip_lines_cp06)
-            if cp06_new_value is None:
-                if cp06_prev_val is not None:
-                    production_cost_changed = True
-                row["cp06_esquad_und"] = None
-                if tooltip_cp06 is None and cp06_factor not in (None, 0):
-                    tooltip_cp06 = "Tarifa nao disponivel para calcular ESQUADREJADORA"
-            else:
-                if cp06_prev_val is None or not _float_almost_equal(cp06_prev_val, cp06_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp06_esquad_und"] = cp06_new_value
-            row["_cp06_esquad_und_tooltip"] = tooltip_cp06
-
-            cp07_prev_val = self._coerce_numeric(row.get("cp07_embalagem_und"))
-            cp07_factor = self._coerce_numeric(row.get("cp07_embalagem"))
-            tooltip_cp07: Optional[str] = None
-            cp07_new_value: Optional[float] = None
-            qt_total_calc = self._coerce_numeric(row.get("qt_total"))
-            comp_res = self._coerce_numeric(row.get("comp_res"))
-            larg_res = self._coerce_numeric(row.get("larg_res"))
-            esp_res = self._coerce_numeric(row.get("esp_res"))
-            volume_m3: Optional[float] = None
-            has_dimensions = (
-                qt_total_calc not in (None, 0)
-                and comp_res not in (None, 0)
-                and larg_res not in (None, 0)
-                and esp_res not in (None, 0)
-            )
-            manual_embalagem_applied = False
-            if (
-                def_peca_norm == DEF_LABEL_EMBALAGEM_NORM
-                and row_type not in {"division", "separator"}
-                and has_dimensions
-                and embal_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_embal = float(embal_rate_value)
-                    # Calculate volume per unit (m3) — do NOT multiply by qt_total here.
-                    volume_unit_m3 = (
-                        float(comp_res)
-                        * float(larg_res)
-                        * float(esp_res)
-                    ) / 1_000_000_000.0
-                    cp07_new_value = round(volume_unit_m3 * rate_embal, 2)
-                except Exception:
-                    cp07_new_value = None
-                if cp07_new_value is not None and volume_unit_m3 is not None:
-                    tooltip_lines_cp07 = [
-                        f"Modo: {production_mode}",
-                        f"Qt_total: {qt_total_calc:.2f}",
-                        f"Dimensoes por unidade (mm): {comp_res:.2f} x {larg_res:.2f} x {esp_res:.2f}",
-                        f"Volume por unidade: {volume_unit_m3:.6f} m\u00B3",
-                        f"Tarifa EUROS_EMBALAGEM_M3: {rate_embal:.4f} \u20AC/m\u00B3",
-                        f"Calculo (por unidade): ({comp_res:.2f} x {larg_res:.2f} x {esp_res:.2f} mm / 1e9) x {rate_embal:.4f} \u20AC/m\u00B3 = {cp07_new_value:.2f} \u20AC",
-                    ]
-                    if embal_rate_std is not None and embal_rate_serie is not None:
-                        tooltip_lines_cp07.append(
-                            f"STD: {embal_rate_std:.4f} \u20AC/m\u00B3 | SERIE: {embal_rate_serie:.4f} \u20AC/m\u00B3"
-                        )
-                    tooltip_cp07 = "\n".join(tooltip_lines_cp07)
-                    manual_embalagem_applied = True
-            if (
-                not manual_embalagem_applied
-                and row_type not in {"division", "separator"}
-                and cp07_factor is not None
-                and cp07_factor > 0
-                and has_dimensions
-                and embal_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_embal = float(embal_rate_value)
-                    volume_m3 = (
-                        float(qt_total_calc)
-                        * float(comp_res)
-                        * float(larg_res)
-                        * float(esp_res)
-                    ) / 1_000_000_000.0
-                    cp07_new_value = round(cp07_factor * volume_m3 * rate_embal, 2)
-                except Exception:
-                    cp07_new_value = None
-                if cp07_new_value is not None and volume_m3 is not None:
-                    tooltip_lines_cp07 = [
-                        f"Modo: {production_mode}",
-                        f"CP07_EMBALAGEM: {cp07_factor:.2f}",
-                    ]
-                    tooltip_lines_cp07.append(
-                        "Dimensoes (mm): "
-                        f"Qt_total {qt_total_calc:.2f} x {comp_res:.2f} x {larg_res:.2f} x {esp_res:.2f}"
-                    )
-                    tooltip_lines_cp07.append(
-                        f"Volume total: {volume_m3:.6f} m\u00B3"
-                    )
-                    tooltip_lines_cp07.append(
-                        f"Tarifa EUROS_EMBALAGEM_M3: {rate_embal:.4f} \u20AC/m\u00B3"
-                    )
-                    tooltip_lines_cp07.append(
-                        f"Calculo: {cp07_factor:.2f} x {volume_m3:.6f} m\u00B3 x {rate_embal:.4f} \u20AC/m\u00B3 = {cp07_new_value:.2f} \u20AC"
-                    )
-                    if embal_rate_std is not None and embal_rate_serie is not None:
-                        tooltip_lines_cp07.append(
-                            f"STD: {embal_rate_std:.4f} \u20AC/m\u00B3 | SERIE: {embal_rate_serie:.4f} \u20AC/m\u00B3"
-                        )
-                    tooltip_cp07 = "\n".join(tooltip_lines_cp07)
-            if cp07_new_value is None:
-                if cp07_prev_val is not None:
-                    production_cost_changed = True
-                row["cp07_embalagem_und"] = None
-                if tooltip_cp07 is None and cp07_factor not in (None, 0):
-                    tooltip_cp07 = "Volume ou tarifa nao disponivel para calcular EMBALAGEM"
-            else:
-                if cp07_prev_val is None or not _float_almost_equal(cp07_prev_val, cp07_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp07_embalagem_und"] = cp07_new_value
-            row["_cp07_embalagem_und_tooltip"] = tooltip_cp07
-
-            cp08_prev_val = self._coerce_numeric(row.get("cp08_mao_de_obra_und"))
-            cp08_factor = self._coerce_numeric(row.get("cp08_mao_de_obra"))
-            tooltip_cp08: Optional[str] = None
-            cp08_new_value: Optional[float] = None
-            rate_mo: Optional[float] = None
-            manual_mo_applied = False
-            if (
-                def_peca_norm == DEF_LABEL_MAO_OBRA_MIN_NORM
-                and row_type not in {"division", "separator"}
-                and mo_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_mo = float(mo_rate_value)
-                    per_minute_mo = rate_mo / 60.0
-                    # cp08_mao_de_obra_und = (€/min) × cp08_mao_de_obra (factor)
-                    if cp08_factor is not None and cp08_factor > 0:
-                        cp08_new_value = round(per_minute_mo * cp08_factor, 4)
-                    else:
-                        cp08_new_value = round(per_minute_mo, 4)
-                except Exception:
-                    cp08_new_value = None
-                if cp08_new_value is not None and rate_mo is not None:
-                    tooltip_lines_cp08 = [
-                        f"Modo: {production_mode}",
-                        f"Tarifa EUROS_HORA_MO: {rate_mo:.4f} \u20AC/hora",
-                    ]
-                    if cp08_factor is not None and cp08_factor > 0:
-                        tooltip_lines_cp08.append(
-                            f"Calculo: ({rate_mo:.4f} \u20AC/h / 60) × {cp08_factor} = {cp08_new_value:.4f} \u20AC"
-                        )
-                    else:
-                        tooltip_lines_cp08.append(
-                            f"Calculo (por minuto): ({rate_mo:.4f} \u20AC/h / 60) = {cp08_new_value:.4f} \u20AC/min"
-                        )
-                    if mo_rate_std is not None and mo_rate_serie is not None:
-                        tooltip_lines_cp08.append(
-                            f"STD: {mo_rate_std:.4f} \u20AC/hora | SERIE: {mo_rate_serie:.4f} \u20AC/hora"
-                        )
-                    tooltip_cp08 = "\n".join(tooltip_lines_cp08)
-                    manual_mo_applied = True
-            if (
-                not manual_mo_applied
-                and row_type not in {"division", "separator"}
-                and cp08_factor is not None
-                and cp08_factor > 0
-                and mo_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_mo = float(mo_rate_value)
-                    per_minute_mo = rate_mo / 60.0
-                    # cp08_mao_de_obra_und = (€/min) × cp08_mao_de_obra (factor)
-                    cp08_new_value = round(per_minute_mo * cp08_factor, 4)
-                except Exception:
-                    cp08_new_value = None
-                if cp08_new_value is not None and rate_mo is not None:
-                    tooltip_lines_cp08 = [
-                        f"Modo: {production_mode}",
-                        f"Tarifa EUROS_HORA_MO: {rate_mo:.4f} \u20AC/hora",
-                        f"CP08_MAO_DE_OBRA factor: {cp08_factor}",
-                        f"Calculo: ({rate_mo:.4f} \u20AC/h / 60) × {cp08_factor} = {cp08_new_value:.4f} \u20AC",
-                    ]
-                    if mo_rate_std is not None and mo_rate_serie is not None:
-                        tooltip_lines_cp08.append(
-                            f"STD: {mo_rate_std:.4f} \u20AC/hora | SERIE: {mo_rate_serie:.4f} \u20AC/hora"
-                        )
-                    tooltip_cp08 = "\n".join(tooltip_lines_cp08)
-            if cp08_new_value is None:
-                if cp08_prev_val is not None:
-                    production_cost_changed = True
-                row["cp08_mao_de_obra_und"] = None
-                if tooltip_cp08 is None and cp08_factor not in (None, 0):
-                    tooltip_cp08 = "Tarifa nao disponivel para calcular MAO DE OBRA"
-            else:
-                if cp08_prev_val is None or not _float_almost_equal(cp08_prev_val, cp08_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp08_mao_de_obra_und"] = cp08_new_value
-            row["_cp08_mao_de_obra_und_tooltip"] = tooltip_cp08
-
-            cp09_prev_val = self._coerce_numeric(row.get("cp09_colagem_und"))
-            tooltip_cp09: Optional[str] = None
-            cp09_new_value: Optional[float] = None
-            if (
-                def_peca_norm == DEF_LABEL_COLAGEM_NORM
-                and row_type not in {"division", "separator"}
-                and comp_res not in (None, 0)
-                and larg_res not in (None, 0)
-                and colagem_rate_value not in (None, 0)
-            ):
-                try:
-                    rate_colagem = float(colagem_rate_value)
-                    # calc area per unit (m2) and store cp09 as cost PER UNIT
-                    area_m2 = (float(comp_res) * float(larg_res)) / 1_000_000.0
-                    cp09_unit = round(area_m2 * rate_colagem, 4)
-                    cp09_new_value = round(cp09_unit, 4)
-                except Exception:
-                    cp09_new_value = None
-                if cp09_new_value is not None:
-                    total_area_example = None
-                    try:
-                        total_area_example = area_m2 * float(qt_total_calc) if qt_total_calc not in (None, 0) else None
-                    except Exception:
-                        total_area_example = None
-                    tooltip_lines_cp09 = [
-                        f"Modo: {production_mode}",
-                        f"Dimensoes por unidade (mm): {comp_res:.2f} x {larg_res:.2f}",
-                        f"Area por unidade: {area_m2:.6f} m\u00B2",
-                        f"Tarifa COLAGEM/REVESTIMENTO: {rate_colagem:.4f} \u20AC/m\u00B2",
-                        f"Calculo (por unidade): ({comp_res:.2f} x {larg_res:.2f} mm / 1e6) x {rate_colagem:.4f} = {cp09_new_value:.4f} \u20AC/und",
-                    ]
-                    if total_area_example is not None:
-                        tooltip_lines_cp09.insert(2, f"Qt_total (exemplo): {qt_total_calc:.2f} -> Area total: {total_area_example:.6f} m\u00B2")
-                    if colagem_rate_std is not None and colagem_rate_serie is not None:
-                        tooltip_lines_cp09.append(
-                            f"STD: {colagem_rate_std:.4f} \u20AC/m\u00B2 | SERIE: {colagem_rate_serie:.4f} \u20AC/m\u00B2"
-                        )
-                    tooltip_cp09 = "\n".join(tooltip_lines_cp09)
-            if cp09_new_value is None:
-                if cp09_prev_val is not None:
-                    production_cost_changed = True
-                row["cp09_colagem_und"] = None
-            else:
-                if cp09_prev_val is None or not _float_almost_equal(cp09_prev_val, cp09_new_value, tol=1e-4):
-                    production_cost_changed = True
-                row["cp09_colagem_und"] = cp09_new_value
-            row["_cp09_colagem_und_tooltip"] = tooltip_cp09
-
-            if row_type not in {"division", "separator"}:
-                cp_cost_pairs: List[Tuple[str, float]] = []
-                soma_custo_und_float = 0.0
-                for key, label in PRODUCTION_CP_SUM_KEYS:
-                    cp_value = self._coerce_numeric(row.get(key)) or 0.0
-                    cp_cost_pairs.append((label, cp_value))
-                    soma_custo_und_float += cp_value
-                base_soma_value = round(soma_custo_und_float, 2)
-                soma_custo_und_value = 0.0 if mo_checked else base_soma_value
-                row["soma_custo_und"] = soma_custo_und_value
-                soma_lines = ["SOMA_CUSTO_und = CP01_SEC_und + ... + CP08_MAO_DE_OBRA_und"]
-                soma_lines.extend(f"{label}: {value:.2f} €" for label, value in cp_cost_pairs)
-                if mo_checked:
-                    soma_lines.append("Resultado: 0.00 € (checkbox MO ativo)")
-                else:
-                    soma_lines.append(f"Resultado: {soma_custo_und_value:.2f} €")
-                row["_soma_custo_und_tooltip"] = "\n".join(soma_lines)
-
-                if qt_total_numeric not in (None, 0) and not mo_checked:
-                    maquinas_total_value: Optional[float] = round(soma_custo_und_value * qt_total_numeric, 2)
-                elif mo_checked:
-                    maquinas_total_value = 0.0
-                else:
-                    maquinas_total_value = None
-
-                custo_total_orla_value = self._coerce_numeric(row.get("custo_total_orla"))
-                if custo_total_orla_value is None:
-                    custo_total_orla_value = 0.0
-                if orla_checked:
-                    custo_total_orla_value = 0.0
-                    row["custo_total_orla"] = 0.0
-
-                if mps_checked:
-                    mp_component_total = 0.0
-                else:
-                    mp_component_total = custo_mp_total_value if custo_mp_total_value is not None else 0.0
-
-                cp09_unit_value = self._coerce_numeric(row.get("cp09_colagem_und"))
-                if cp09_unit_value is None:
-                    cp09_unit_value = 0.0
-                # cp09 contribution to total must be multiplied by qt_total (per-unit -> total)
-                cp09_component_total = round((cp09_unit_value * (qt_total_numeric or 0.0)), 2)
-
-                soma_custo_total_value = (
-                    (maquinas_total_value or 0.0)
-                    + custo_total_orla_value
-                    + mp_component_total
-                    + cp09_component_total
-                )
-                soma_custo_total_value = round(soma_custo_total_value, 2)
-                row["soma_custo_total"] = soma_custo_total_value
-
-                if mo_checked:
-                    maquinas_line = "SOMA_CUSTO_und * Qt_Total = 0.00 € (checkbox MO ativo)"
-                elif qt_total_numeric not in (None, 0) and maquinas_total_value is not None:
-                    maquinas_line = (
-                        f"SOMA_CUSTO_und * Qt_Total = {soma_custo_und_value:.2f} € * {qt_total_numeric:.2f} = {maquinas_total_value:.2f} €"
-                    )
-                else:
-                    maquinas_line = "SOMA_CUSTO_und * Qt_Total: Qt_Total sem valor"
-
-                if mps_checked:
-                    mp_line = "CUSTO_MP_und * Qt_Total = 0.00 € (checkbox MPs ativo)"
-                elif custo_mp_und_value is not None and qt_total_numeric not in (None, 0) and custo_mp_total_value is not None:
-                    mp_line = (
-                        f"CUSTO_MP_und * Qt_Total = {custo_mp_und_value:.2f} € * {qt_total_numeric:.2f} = {custo_mp_total_value:.2f} €"
-                    )
-                elif custo_mp_und_value is None:
-                    mp_line = "CUSTO_MP_und * Qt_Total: valor unitario indisponivel"
-                else:
-                    mp_line = "CUSTO_MP_und * Qt_Total: Qt_Total sem valor"
-
-                custo_orla_line = (
-                    f"CUSTO_TOTAL_ORLA = {custo_total_orla_value:.2f} € (checkbox Orla ativo)"
-                    if orla_checked
-                    else f"CUSTO_TOTAL_ORLA = {custo_total_orla_value:.2f} €"
-                )
-
-                cp09_line = f"CP09_COLAGEM_und (por unidade) = {cp09_unit_value:.4f} € | Total: {cp09_component_total:.2f} €"
-
-                soma_total_lines = [
-                    "SOMA_CUSTO_TOTAL = (SOMA_CUSTO_und * Qt_Total) + CUSTO_TOTAL_ORLA + (CUSTO_MP_und * Qt_Total) + (CP09_COLAGEM_und * Qt_Total)",
-                    maquinas_line,
-                    custo_orla_line,
-                    mp_line,
-                    cp09_line,
-                    f"Resultado: {soma_custo_total_value:.2f} €",
-                ]
-                row["_soma_custo_total_tooltip"] = "\n".join(soma_total_lines)
-            else:
-                row["soma_custo_und"] = None
-                row["soma_custo_total"] = None
-                row["_soma_custo_und_tooltip"] = None
-                row["_soma_custo_total_tooltip"] = None
-
-            if row.get("esp_mp") not in (None, "") and not expr_esp:
-
-                default_esp = _coerce_dimension(row.get("esp_mp"))
-
-                row["esp_res"] = default_esp
-
-                row["_esp_error"] = None
-
-                substitution = self._format_result_number(default_esp) or row.get("esp")
-
-                row["_esp_tooltip"] = self._build_formula_tooltip(expr_esp or (row.get("esp") or substitution or ""), default_esp, None, substitutions=substitution or None)
+        page = getattr(self, "_page", None)
+        orcamento_id = getattr(getattr(page, "context", None), "orcamento_id", None)
+        with svc_metricas.medir("recalculate_all", orcamento_id):
+            resultado = self.recalcular_linhas(self.rows, page)
 
-        if production_cost_changed:
+        if resultado.custos_producao_alterados:
             self._mark_dirty()
 
-        if session is not None:
+        if getattr(page, "session", None) is not None:
+            self._materiais_orla = resultado.materiais_orla
             self._orla_info_cache.clear()
-            ref_cache: Dict[str, Tuple[float, float, Optional[str]]] = {}
-            for row in self.rows:
-                try:
-                    svc_custeio.preencher_info_orlas_linha(session, row, ref_cache)
-                except Exception:
-                    continue
 
         left = self._column_index.get("qt_mod")
 
@@ -4272,6 +2319,72 @@ class CusteioTableModel(QtCore.QAbstractTableModel):
         if getattr(self, "_page", None):
             self._page._apply_collapse_state()
 
+    def recalculate_rows(self, row_indices: Sequence[int]) -> None:
+        """Recalcula só as linhas que dependem de `row_indices` e notifica as células alteradas."""
+
+        if not self.rows:
+
+            return
+
+        inicio, fim = self.intervalo_dependente(self.rows, row_indices)
+        if inicio == 0 and fim == len(self.rows):
+            self.recalculate_all()
+            return
+
+        antes = [dict(row) for row in self.rows[inicio:fim]]
+        page = getattr(self, "_page", None)
+        resultado = self.recalcular_linhas(
+            self.rows,
+            page,
+            intervalo=(inicio, fim),
+            materiais_orla=self._materiais_orla,
+        )
+
+        if resultado.custos_producao_alterados:
+            self._mark_dirty()
+
+        if getattr(page, "session", None) is not None:
+            self._materiais_orla = resultado.materiais_orla
+            self._orla_info_cache.clear()
+
+        last_col = len(self.columns) - 1
+        grupos_alterados = False
+        bloco: Optional[List[int]] = None  # [primeira linha, ultima linha, coluna min, coluna max]
+        for offset, anterior in enumerate(antes):
+            row_index = inicio + offset
+            atual = self.rows[row_index]
+            alteradas = [key for key in anterior.keys() | atual.keys() if anterior.get(key) != atual.get(key)]
+            if not alteradas:
+                continue
+            if "_row_type" in alteradas or "_group_uid" in alteradas:
+                grupos_alterados = True
+            cols = [self._column_index.get(key) for key in alteradas]
+            if any(col is None for col in cols):
+                # Campos internos (tooltips, fatores) afetam várias colunas: toda a linha.
+                col_min, col_max = 0, last_col
+            else:
+                col_min, col_max = min(cols), max(cols)
+            if bloco is not None and bloco[1] == row_index - 1:
+                bloco[1] = row_index
+                bloco[2] = min(bloco[2], col_min)
+                bloco[3] = max(bloco[3], col_max)
+                continue
+            if bloco is not None:
+                self._emit_block_changed(*bloco)
+            bloco = [row_index, row_index, col_min, col_max]
+        if bloco is not None:
+            self._emit_block_changed(*bloco)
+
+        if grupos_alterados and page is not None:
+            page._apply_collapse_state()
+
+    def _emit_block_changed(self, first_row: int, last_row: int, first_col: int, last_col: int) -> None:
+        self.dataChanged.emit(
+            self.index(first_row, first_col),
+            self.index(last_row, last_col),
+            [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole, QtCore.Qt.ToolTipRole],
+        )
+
 
     def update_row_fields(self, row_index: int, updates: Mapping[str, Any], skip_keys: Optional[Sequence[str]] = None) -> None:
 
@@ -5966,7 +4079,7 @@ class CusteioItemsPage(QtWidgets.QWidget):
 
 
 
-        numero = getattr(item, "item_ord", None) or getattr(item, "item", None) or getattr(item, "id_item", None)
+        numero = numero_item(self.session, item)
 
         self.lbl_title.setText(f"{base_title} - Item: {numero}")
 
@@ -6542,7 +4655,9 @@ class CusteioItemsPage(QtWidgets.QWidget):
         try:
             self._persist_pending_module_imports()
 
-            svc_custeio.salvar_custeio_items(self.session, self.context, linhas, dimensoes)
+            gravacao = svc_custeio.salvar_custeio_items(
+                self.session, self.context, linhas, dimensoes, incremental=True
+            )
 
         except Exception as exc:
 
@@ -6595,11 +4710,15 @@ class CusteioItemsPage(QtWidgets.QWidget):
 
         self._update_save_button_text()
         logger.info(
-            "custeio.save ok auto=%s orcamento_id=%s item_id=%s user_id=%s",
+            "custeio.save ok auto=%s orcamento_id=%s item_id=%s user_id=%s inseridas=%s atualizadas=%s removidas=%s inalteradas=%s",
             auto,
             getattr(ctx, "orcamento_id", None),
             getattr(ctx, "item_id", None) if ctx else self.current_item_id,
             self.current_user_id,
+            gravacao.inseridas,
+            gravacao.atualizadas,
+            gravacao.removidas,
+            gravacao.inalteradas,
         )
 
         if should_disable_button:
@@ -7440,7 +5559,7 @@ class CusteioItemsPage(QtWidgets.QWidget):
 
         cache: Dict[str, Any] = {}
         orla_lookup = svc_custeio.obter_mapa_orlas(self.session)
-        cp_cache = svc_def_pecas.mapa_por_nome(self.session)
+        cp_cache = svc_custeio.obter_mapa_definicoes_cp(self.session)
         uid_map = {row.get("_uid"): row for row in self.table_model.rows if row.get("_uid")}
 
         for idx, row in enumerate(self.table_model.rows):
@@ -7638,7 +5757,7 @@ class CusteioItemsPage(QtWidgets.QWidget):
             pass
 
         orla_lookup = svc_custeio.obter_mapa_orlas(self.session)
-        cp_cache = svc_def_pecas.mapa_por_nome(self.session)
+        cp_cache = svc_custeio.obter_mapa_definicoes_cp(self.session)
         uid_map = {r.get("_uid"): r for r in self.table_model.rows if r.get("_uid")}
 
         row_type = row.get("_row_type")
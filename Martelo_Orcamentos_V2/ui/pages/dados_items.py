@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 from Martelo_Orcamentos_V2.app.services import dados_items as svc_di
 from Martelo_Orcamentos_V2.app.services import dados_gerais as svc_dg
 from Martelo_Orcamentos_V2.app.services import materias_primas as svc_mp
+from Martelo_Orcamentos_V2.app.services.orcamentos import numero_item
 from Martelo_Orcamentos_V2.ui.delegates import DadosGeraisDelegate
 
 from .dados_gerais import (
@@ -429,7 +430,7 @@ class DadosItemsPage(DadosGeraisPage):
             self.lbl_item_description.setText("-")
             self._update_dimensions_labels(visible=False)
             return
-        numero = getattr(item, "item_ord", None) or getattr(item, "item", None) or item_id
+        numero = numero_item(self.session, item)
         descricao = (item.descricao or "").strip()
         self.lbl_title.setText(f"{self.page_title} - Item: {numero}")
         self.lbl_item_description.setText(descricao or "-")
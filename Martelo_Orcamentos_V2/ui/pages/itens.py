@@ -38,6 +38,7 @@ from Martelo_Orcamentos_V2.app.services import custeio_items as svc_custeio
 from Martelo_Orcamentos_V2.app.services import dados_items as svc_dados_items
 from Martelo_Orcamentos_V2.app.services import producao as svc_producao
 from Martelo_Orcamentos_V2.app.services import margens as svc_margens
+from Martelo_Orcamentos_V2.ui.dialogs.custeio_metricas import CusteioMetricasDialog
 from Martelo_Orcamentos_V2.ui.dialogs.descricoes_predefinidas import DescricoesPredefinidasDialog
 from ..models.qt_table import SimpleTableModel
 from ..utils.header import apply_highlight_text, init_highlight_label
@@ -414,6 +415,13 @@ class ItensPage(QtWidgets.QWidget):
         self._costs_dirty = False
         self._base_update_costs_text = self.btn_update_costs.text()
 
+        self.btn_custeio_metricas = QtWidgets.QPushButton("Metricas")
+        self.btn_custeio_metricas.setToolTip(
+            "Tempos e nº de SQL por etapa do calculo de custos deste orcamento (diagnostico)."
+        )
+        self.btn_custeio_metricas.setEnabled(False)
+        self.btn_custeio_metricas.clicked.connect(self._on_custeio_metricas_clicked)
+
         self.lbl_custeio_status = QtWidgets.QLabel("", self)
         self.lbl_custeio_status.setObjectName("lbl_custeio_status")
         self.lbl_custeio_status.setStyleSheet("color: #666; font-size: 11px;")
@@ -493,7 +501,8 @@ class ItensPage(QtWidgets.QWidget):
         margem_layout.addWidget(self.lbl_soma_preco, objetivo_row, 3)
 
         update_row = objetivo_row + 1
-        margem_layout.addWidget(self.btn_update_costs, update_row, 0, 1, 4)
+        margem_layout.addWidget(self.btn_update_costs, update_row, 0, 1, 3)
+        margem_layout.addWidget(self.btn_custeio_metricas, update_row, 3)
         margem_layout.addWidget(self.lbl_custeio_status, update_row + 1, 0, 1, 4)
 
         self.btn_objetivo_apply = QtWidgets.QPushButton("Ajustar Margens (Objetivo)", self._margem_panel)
@@ -786,7 +795,7 @@ class ItensPage(QtWidgets.QWidget):
 
         table_columns = [
             _col("ID", "id_item", tooltip="Identificador interno do item no orçamento."),
-            _col("Item", "item_nome", tooltip="Referência sequencial apresentada ao utilizador."),
+            _col("Item", "numero_visivel", tooltip="Referência sequencial apresentada ao utilizador."),
             _col("Código", "codigo", tooltip="Código do catálogo/dados do item."),
             _col("Descrição", "descricao", tooltip="Descrição resumida do item."),
             _col("Altura (mm)", "altura", _fmt_int, "Altura principal em milímetros."),
@@ -949,7 +958,7 @@ class ItensPage(QtWidgets.QWidget):
         # Larguras iniciais (podes ajustar no runtime/UI)
         column_widths = {
             "id_item": 55,
-            "item_nome": 70,
+            "numero_visivel": 70,
             "codigo": 110,
             "descricao": 360,
             "altura": 80,
@@ -1273,6 +1282,8 @@ class ItensPage(QtWidgets.QWidget):
         if hasattr(self, "btn_update_costs"):
             self.btn_update_costs.setEnabled(bool(self._orc_id))
             self._apply_costs_button_text()
+        if hasattr(self, "btn_custeio_metricas"):
+            self.btn_custeio_metricas.setEnabled(bool(self._orc_id))
 
     def _apply_costs_button_text(self) -> None:
         if not hasattr(self, "btn_update_costs"):
@@ -1766,6 +1777,13 @@ class ItensPage(QtWidgets.QWidget):
         self._update_mode_buttons()
         self.production_mode_changed.emit(mode)
 
+    def _on_custeio_metricas_clicked(self) -> None:
+        titulo = " / ".join(
+            texto for texto in (self.lbl_num_val.text(), self.lbl_ver_val.text(), self.lbl_cliente_val.text()) if texto
+        )
+        dialog = CusteioMetricasDialog(self._orc_id, titulo_orcamento=titulo, parent=self)
+        dialog.exec()
+
     def _on_update_item_costs_clicked(self) -> None:
         if not self._orc_id:
             QtWidgets.QMessageBox.information(self, "Atualizar Custos", "Nenhum orçamento carregado.")
@@ -1905,7 +1923,7 @@ class ItensPage(QtWidgets.QWidget):
             else:
                 self._show_toast(
                     button or self.table,
-                    "Custeio dos Items sem dados para este orçamento/versão.",
+                    "Custos dos items sem alterações para este orçamento/versão.",
                 )
         finally:
             _schedule_unlock_update_costs()
@@ -2394,7 +2412,7 @@ class ItensPage(QtWidgets.QWidget):
     def _populate_form(self, item):
         self._loading_item_form = True
         try:
-            self.edit_item.setText(getattr(item, "item_nome", "") or "")
+            self.edit_item.setText(getattr(item, "numero_visivel", None) or getattr(item, "item_nome", "") or "")
             self.edit_codigo.setText((getattr(item, "codigo", "") or "").upper())
             self.edit_descricao.setPlainText(getattr(item, "descricao", "") or "")
             self.edit_altura.setText(self._format_decimal(getattr(item, "altura", None)))
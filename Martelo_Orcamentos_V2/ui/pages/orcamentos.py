@@ -9,7 +9,10 @@ from Martelo_Orcamentos_V2.app.db import SessionLocal
 from Martelo_Orcamentos_V2.app.utils.display import format_currency_pt, parse_currency_pt, repair_mojibake
 from Martelo_Orcamentos_V2.app.utils.date_utils import format_date_storage, parse_date_value
 from Martelo_Orcamentos_V2.app.services.orcamentos import (
-    list_orcamentos,
+    ORCAMENTOS_POR_PAGINA,
+    count_orcamentos,
+    list_orcamento_filter_values,
+    list_orcamentos_pagina,
     next_seq_for_year,
     search_orcamentos,
     PRECO_MANUAL_KEY,
@@ -44,6 +47,7 @@ from Martelo_Orcamentos_V2.ui.pages.orcamentos_persistence_support import (
 )
 from Martelo_Orcamentos_V2.ui.pages.orcamentos_support import (
     ClienteComboItem,
+    OrcamentosPaginados,
     build_auto_refresh_state,
     build_cliente_change_plan,
     build_focus_request,
@@ -93,6 +97,7 @@ class OrcamentosPage(QtWidgets.QWidget):
         self._search_text: str = ""  # Texto da pesquisa ativa
         self._table_user_scrolling: bool = False  # Utilizador a fazer scroll
         self._creating_new_orcamento: bool = False  # Em modo novo orcamento
+        self._suggested_seq: Optional[str] = None  # numero sugerido (reservado so ao gravar)
         self._last_row_count: int = 0  # Para detectar novos orcamentos
         self._refresh_scroll_position: int = 0  # Guardar posicao de scroll
 
@@ -752,18 +757,48 @@ class OrcamentosPage(QtWidgets.QWidget):
                 w.textChanged.connect(self._on_form_change)
 
     # Dados
+    def _paginador_orcamentos(self, *, estado_f: str = "", cliente_f: str = "", user_f: str = "") -> OrcamentosPaginados:
+        return OrcamentosPaginados(
+            lambda depois_de, limite: list_orcamentos_pagina(
+                self.db,
+                depois_de=depois_de,
+                limite=limite,
+                estado=estado_f,
+                cliente=cliente_f,
+                utilizador=user_f,
+            ),
+            estado_filter=estado_f,
+            cliente_filter=cliente_f,
+            user_filter=user_f,
+            por_pagina=ORCAMENTOS_POR_PAGINA,
+        )
+
+    def _load_orcamento_rows(self, *, minimo: int = 1, filtered: bool = True) -> list:
+        """Primeiras linhas da lista (so o necessario para o ecra); as restantes sao
+        pedidas pela tabela ao fazer scroll (SimpleTableModel.fetchMore)."""
+        filtros = {}
+        if filtered:
+            filtros = {
+                "estado_f": self.cb_estado_filter.currentText().strip(),
+                "cliente_f": self.cb_cliente_filter.currentText().strip(),
+                "user_f": self.cb_user_filter.currentText().strip(),
+            }
+        paginador = self._paginador_orcamentos(**filtros)
+        rows = paginador.proxima(minimo)
+        self.model.set_rows(rows, fetch_more=None if paginador.esgotado else paginador.proxima)
+        return rows
+
     def refresh(self, select_first: bool = True):
         prev_id = self.selected_id()
         estado_f = self.cb_estado_filter.currentText().strip()
         cliente_f = self.cb_cliente_filter.currentText().strip()
         user_f = self.cb_user_filter.currentText().strip()
         table_state = build_orcamento_table_state(
-            list_orcamentos(self.db),
+            self._load_orcamento_rows(),
             estado_filter=estado_f,
             cliente_filter=cliente_f,
             user_filter=user_f,
         )
-        self.model.set_rows(table_state.rows)
 
         def _reload_combo(combo, values, current):
             combo.blockSignals(True)
@@ -775,9 +810,11 @@ class OrcamentosPage(QtWidgets.QWidget):
                 combo.setCurrentText(current)
             combo.blockSignals(False)
 
-        _reload_combo(self.cb_estado_filter, table_state.estados, estado_f)
-        _reload_combo(self.cb_cliente_filter, table_state.clientes, cliente_f)
-        _reload_combo(self.cb_user_filter, table_state.users, user_f)
+        # valores de todos os orcamentos (nao so das linhas carregadas nem so das filtradas)
+        estados, clientes, users = list_orcamento_filter_values(self.db)
+        _reload_combo(self.cb_estado_filter, estados, estado_f)
+        _reload_combo(self.cb_cliente_filter, clientes, cliente_f)
+        _reload_combo(self.cb_user_filter, users, user_f)
 
         selection_plan = plan_table_selection(
             table_state.rows,
@@ -842,8 +879,9 @@ class OrcamentosPage(QtWidgets.QWidget):
             except Exception:
                 pass
             
-            # 2. Carregar dados atualizados
-            rows = list_orcamentos(self.db)
+            # 2. Carregar dados atualizados (tantas linhas quantas as ja carregadas)
+            total = count_orcamentos(self.db)
+            rows = self._load_orcamento_rows(minimo=self.model.rowCount())
             estado_f = self.cb_estado_filter.currentText().strip()
             cliente_f = self.cb_cliente_filter.currentText().strip()
             user_f = self.cb_user_filter.currentText().strip()
@@ -853,6 +891,7 @@ class OrcamentosPage(QtWidgets.QWidget):
                 estado_filter=estado_f,
                 cliente_filter=cliente_f,
                 user_filter=user_f,
+                total_rows=total,
             )
             
             # 3. Detectar novos orcamentos e mostrar aviso
@@ -861,9 +900,6 @@ class OrcamentosPage(QtWidgets.QWidget):
             
             self._last_row_count = refresh_state.current_row_count
             
-            # 4. Atualizar tabela
-            self.model.set_rows(refresh_state.table_state.rows)
-            
             # 5. Restaurar posicao visual (sem interromper scroll do utilizador)
             if prev_scroll_row >= 0 and prev_scroll_row < len(refresh_state.table_state.rows):
                 try:
@@ -915,6 +951,10 @@ class OrcamentosPage(QtWidgets.QWidget):
             return False
         try:
             idx = find_row_index_by_id(self.model._rows, oid)
+            # a linha pode estar numa pagina ainda nao carregada
+            while idx is None and self.model.canFetchMore():
+                self.model.fetchMore()
+                idx = find_row_index_by_id(self.model._rows, oid)
         except Exception:
             idx = None
         if idx is None:
@@ -1133,6 +1173,7 @@ class OrcamentosPage(QtWidgets.QWidget):
             seq_txt = next_seq_for_year(self.db, ano_txt)
         except Exception:
             seq_txt = "0001"
+        self._suggested_seq = seq_txt
         self.ed_num.setText(seq_txt)
 
     def _on_ano_editing_finished(self) -> None:
@@ -1471,6 +1512,7 @@ class OrcamentosPage(QtWidgets.QWidget):
             seq_text=seq_txt,
         )
         self._set_year_text(new_state.ano_text, ensure_in_list=True)
+        self._suggested_seq = new_state.seq_text
         self.ed_num.setText(new_state.seq_text)
 
         # Valores iniciais padrao
@@ -1545,6 +1587,7 @@ class OrcamentosPage(QtWidgets.QWidget):
                 localizacao=self.ed_loc.text().strip() or None,
                 info_1=self.ed_info1.toPlainText() or None,
                 info_2=self.ed_info2.toPlainText() or None,
+                suggested_seq_text=self._suggested_seq if self._current_id is None else None,
             )
         except ValueError as exc:
             title = "Ano" if "AAAA" in str(exc) else "Cliente"
@@ -1591,10 +1634,17 @@ class OrcamentosPage(QtWidgets.QWidget):
                 getattr(o, "id", None),
                 request.client_id,
                 request.ano_txt,
-                request.num_orcamento,
+                getattr(o, "num_orcamento", request.num_orcamento),
                 request.versao_txt,
                 getattr(self.current_user, "id", None),
             )
+            if was_new and getattr(o, "num_orcamento", None) != request.num_orcamento:
+                QtWidgets.QMessageBox.information(
+                    self,
+                    "Numero atribuido",
+                    f"O numero {request.num_orcamento} ja foi usado noutro posto.\n"
+                    f"O orcamento foi gravado com o numero {o.num_orcamento}.",
+                )
             self._apply_post_save_plan(
                 was_new=was_new,
                 saved_id=getattr(o, "id", None),
@@ -1803,12 +1853,13 @@ class OrcamentosPage(QtWidgets.QWidget):
         # Atualizar flag de pesquisa ativa (para evitar auto-refresh durante pesquisa)
         self._search_text = text.strip()
 
-        rows = search_orcamentos(self.db, text)
         if self._search_text:
+            rows = search_orcamentos(self.db, text)
             self.table.setSortingEnabled(False)
+            self.model.set_rows(rows)
         else:
             self.table.setSortingEnabled(True)
-        self.model.set_rows(rows)
+            self._load_orcamento_rows(filtered=False)
 
     def on_search(self, text: str):
         # Atualizar flag de pesquisa ativa (para evitar auto-refresh durante pesquisa)
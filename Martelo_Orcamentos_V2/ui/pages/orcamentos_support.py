@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterable, Optional, Sequence
+from typing import Any, Callable, Iterable, Optional, Sequence
 
 
 @dataclass
@@ -191,6 +191,41 @@ def build_orcamento_table_state(rows: Iterable, *, estado_filter: str, cliente_f
     )
 
 
+class OrcamentosPaginados:
+    """Lista de orcamentos carregada por paginas, com os filtros da tabela.
+
+    `carregar(depois_de, limite)` devolve um objeto com `rows` e `seguinte`
+    (ver `list_orcamentos_pagina`, que ja filtra no BD); os filtros sao confirmados
+    em cada pagina sobre as colunas mostradas. `proxima()` serve de `fetch_more`
+    do SimpleTableModel.
+    """
+
+    def __init__(
+        self,
+        carregar: Callable[[Optional[tuple], int], Any],
+        *,
+        estado_filter: str = "",
+        cliente_filter: str = "",
+        user_filter: str = "",
+        por_pagina: int = 200,
+    ) -> None:
+        self._carregar = carregar
+        self._filtros = {"estado_filter": estado_filter, "cliente_filter": cliente_filter, "user_filter": user_filter}
+        self.por_pagina = max(1, int(por_pagina))
+        self._seguinte: Optional[tuple] = None
+        self.esgotado = False
+
+    def proxima(self, minimo: int = 1) -> list:
+        """Proximas linhas que passam os filtros: le paginas ate juntar `minimo` linhas ou acabar."""
+        linhas: list = []
+        while not self.esgotado and len(linhas) < max(1, int(minimo)):
+            pagina = self._carregar(self._seguinte, self.por_pagina)
+            self._seguinte = pagina.seguinte
+            self.esgotado = pagina.seguinte is None
+            linhas.extend(filter_orcamento_rows(pagina.rows, **self._filtros))
+        return linhas
+
+
 def plan_table_selection(rows: Sequence, *, preferred_id: Optional[int], select_first: bool) -> OrcamentoSelectionPlan:
     return OrcamentoSelectionPlan(
         preferred_id=preferred_id,
@@ -206,8 +241,10 @@ def build_auto_refresh_state(
     estado_filter: str,
     cliente_filter: str,
     user_filter: str,
+    total_rows: Optional[int] = None,
 ) -> OrcamentoAutoRefreshState:
-    current_row_count = len(rows)
+    """`total_rows`: nº total de orcamentos quando `rows` e so a parte ja carregada."""
+    current_row_count = len(rows) if total_rows is None else int(total_rows)
     return OrcamentoAutoRefreshState(
         table_state=build_orcamento_table_state(
             rows,
@@ -128,6 +128,13 @@ class ProducaoPage(QtWidgets.QWidget):
         self._build_ui()
         self._load_table()
         QtCore.QTimer.singleShot(0, self._run_daily_phc_status_sync_if_needed)
+        self._start_folder_index()
+
+    def _start_folder_index(self) -> None:
+        try:
+            svc_producao.iniciar_indice_pastas(self.db, base_dir=self._base_producao)
+        except Exception as exc:
+            logger.warning("Falha ao iniciar o indice de pastas da producao: %s", exc)
 
     def _current_username(self) -> str:
         return (
@@ -340,7 +347,7 @@ class ProducaoPage(QtWidgets.QWidget):
 
         self.btn_refresh = QtWidgets.QPushButton("Atualizar")
         self.btn_refresh.setIcon(s.standardIcon(QStyle.SP_BrowserReload))
-        self.btn_refresh.setToolTip("Atualizar a lista de processos.")
+        self.btn_refresh.setToolTip("Atualizar a lista de processos e reler as pastas do servidor.")
         _style_secondary(self.btn_refresh)
         self.btn_refresh.clicked.connect(self._on_refresh_clicked)
 
@@ -1060,6 +1067,7 @@ class ProducaoPage(QtWidgets.QWidget):
             self._clear_form()
 
     def _on_refresh_clicked(self) -> None:
+        svc_producao.atualizar_indice_pastas()
         self._load_table()
         self._run_daily_phc_status_sync_if_needed()
 
@@ -1223,6 +1231,7 @@ class ProducaoPage(QtWidgets.QWidget):
             result = svc_producao_workflow.sync_producao_statuses_from_phc(
                 self.db,
                 current_user_id=self._current_user_id(),
+                incremental=True,
             )
             self.db.commit()
         except Exception as exc:
@@ -104,8 +104,10 @@ from sqlalchemy.exc import OperationalError
 
 from Martelo_Orcamentos_V2.app.db import SessionLocal
 from Martelo_Orcamentos_V2.app.models import Client, Orcamento, OrcamentoItem, CusteioItem, CusteioDespBackup
-from Martelo_Orcamentos_V2.app.services.custeio_items import atualizar_orlas_custeio
+from Martelo_Orcamentos_V2.app.services.custeio_bulk import recalcular_custeio_orcamento
+from Martelo_Orcamentos_V2.app.services.custeio_items import projetar_custeio
 from Martelo_Orcamentos_V2.app.services.orcamentos import (
+    numerar_items,
     resolve_orcamento_cliente_nome,
     resolve_orcamento_temp_cliente,
 )
@@ -535,15 +537,16 @@ class RelatoriosPage(QtWidgets.QWidget):
             stmt = (
                 select(OrcamentoItem)
                 .where(OrcamentoItem.id_orcamento == orcamento_id)
-                .order_by(OrcamentoItem.item_ord)
+                .order_by(OrcamentoItem.item_ord, OrcamentoItem.id_item)
             )
             items = session.execute(stmt).scalars().all()
+            numerar_items(items)
 
         parsed_rows: List[ItemPreview] = []
         for it in items:
             parsed_rows.append(
                 ItemPreview(
-                    item=str(it.item or ""),
+                    item=str(it.numero_visivel or it.item or ""),
                     codigo=str(it.codigo or ""),
                     descricao=str(it.descricao or ""),
                     altura=Decimal(it.altura) if it.altura is not None else None,
@@ -1005,12 +1008,7 @@ class RelatoriosPage(QtWidgets.QWidget):
             return result
         try:
             with SessionLocal() as session:
-                cust_rows = (
-                    session.query(CusteioItem)
-                    .filter(CusteioItem.orcamento_id == orc.id, CusteioItem.versao == orc.versao)
-                    .order_by(CusteioItem.ordem)
-                    .all()
-                )
+                cust_rows = list(projetar_custeio(session, orc.id, versao=orc.versao))
                 
                 # ✅ Carregar também os OrcamentoItem para ter acesso à quantidade real
                 orc_items = (
@@ -1517,11 +1515,11 @@ class RelatoriosPage(QtWidgets.QWidget):
                         if item_id:
                             touched_items.add(item_id)
 
-                for item_id in touched_items:
+                if touched_items:
                     try:
-                        atualizar_orlas_custeio(session, orcamento_id=orc.id, item_id=item_id)
+                        recalcular_custeio_orcamento(session, orc.id, touched_items)
                     except Exception:
-                        logger.exception("Falha ao recalcular custos para item %s", item_id)
+                        logger.exception("Falha ao recalcular custos para items %s", sorted(touched_items))
 
                 session.commit()
         except OperationalError as exc:
@@ -3343,11 +3341,8 @@ def _export_resumo_custos_full(self, export_dir: Path, orc: Orcamento, client: O
 
     try:
         with SessionLocal() as session:
-            cust_rows = (
-                session.query(CusteioItem)
-                .filter(CusteioItem.orcamento_id == orc.id, CusteioItem.versao == orc.versao)
-                .order_by(CusteioItem.ordem)
-                .all()
+            cust_rows = list(
+                projetar_custeio(session, orc.id, versao=orc.versao, colunas=("item_id", *col_order))
             )
             
             # ✅ Carregar também os OrcamentoItem para ter acesso à quantidade real de cada item
@@ -0,0 +1,208 @@
+"""Base SQLite sintetica para os benchmarks (escala configuravel por variaveis de ambiente)."""
+
+from __future__ import annotations
+
+import os
+import random
+from dataclasses import asdict, dataclass, replace
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import BigInteger, Integer, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.materia_prima import MateriaPrima
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.producao import Producao
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_items
+from Martelo_Orcamentos_V2.app.services.dados_items import DadosItemsContext
+
+ENV_ESCALA = "MARTELO_BENCH_ESCALA"
+
+ORCAMENTO_ALVO = 1
+DIMENSOES = {"H": 2200.0, "L": 1200.0, "P": 600.0}
+
+_PALAVRAS = (
+    "ROUPEIRO", "COZINHA", "PORTAS", "ABRIR", "CORRER", "MODULO", "PRATELEIRAS", "GAVETAS", "ILHA",
+    "LACADO", "CARVALHO", "LINHO", "TERMO", "WC", "LAVATORIO", "ESTANTE", "TV", "SAPATEIRA",
+)
+_CLIENTES = ("MOVEIS J.F. VIVA", "GSW, LDA", "CASA NOVA", "ATELIER ROSA", "OBRAS DO NORTE", "LUZ & MADEIRA")
+
+
+@dataclass(frozen=True)
+class EscalaBenchmark:
+    orcamentos: int = 200  # orcamentos para a pesquisa (o alvo e o 1)
+    items: int = 20  # items do orcamento alvo
+    linhas: int = 25  # linhas de custeio por item
+    materias_primas: int = 300
+    processos: int = 300
+
+    @property
+    def nome(self) -> str:
+        return "x".join(str(valor) for valor in asdict(self).values())
+
+
+ESCALAS: Dict[str, EscalaBenchmark] = {
+    "pequena": EscalaBenchmark(orcamentos=50, items=5, linhas=10, materias_primas=60, processos=50),
+    "media": EscalaBenchmark(),
+    "grande": EscalaBenchmark(orcamentos=2000, items=80, linhas=40, materias_primas=3000, processos=3000),
+}
+
+
+def escala_do_ambiente() -> EscalaBenchmark:
+    """MARTELO_BENCH_ESCALA: pequena|media|grande, opcionalmente com ajustes (ex.: "media,items=50,linhas=30")."""
+    texto = (os.environ.get(ENV_ESCALA) or "media").strip()
+    partes = [parte.strip() for parte in texto.split(",") if parte.strip()]
+    base = "media"
+    if partes and "=" not in partes[0]:
+        base = partes.pop(0).lower()
+    if base not in ESCALAS:
+        raise ValueError(f"Escala de benchmark desconhecida: {base!r} (use {', '.join(ESCALAS)})")
+    ajustes = {}
+    for parte in partes:
+        chave, _, valor = parte.partition("=")
+        ajustes[chave.strip()] = int(valor)
+    return replace(ESCALAS[base], **ajustes)
+
+
+def usar_inteiros_nas_chaves() -> List[Tuple[object, object]]:
+    """SQLite so gera ids para INTEGER PRIMARY KEY: troca BigInteger -> Integer nas chaves primarias."""
+    trocas = []
+    for tabela in Base.metadata.sorted_tables:
+        for coluna in tabela.primary_key.columns:
+            if isinstance(coluna.type, BigInteger):
+                trocas.append((coluna, coluna.type))
+                coluna.type = Integer()
+    return trocas
+
+
+def repor_tipos(trocas: List[Tuple[object, object]]) -> None:
+    for coluna, tipo in trocas:
+        coluna.type = tipo
+
+
+def _materias_primas(rng: random.Random, total: int) -> List[MateriaPrima]:
+    registos = []
+    for pos in range(total):
+        orla = pos % 3 == 0
+        ref = f"{'ORL' if orla else 'PLA'}{pos:05d}"
+        registos.append(
+            MateriaPrima(
+                id_mp=ref,
+                ref_le=ref,
+                descricao_orcamento=f"{'ORLA' if orla else 'PLACA'} {ref} {rng.choice(_PALAVRAS)}",
+                pliq=Decimal(str(round(rng.uniform(0.5, 40), 2))),
+                und="ML" if orla else "M2",
+                desp=Decimal("10"),
+                familia="ORLAS" if orla else "PLACAS",
+                esp_mp=Decimal("1.0") if orla else Decimal("19"),
+                comp_mp=None if orla else Decimal("2800"),
+                larg_mp=None if orla else Decimal("2070"),
+            )
+        )
+    return registos
+
+
+def _linhas_item(rng: random.Random, escala: EscalaBenchmark, orlas: List[str], placas: List[str]) -> List[dict]:
+    linhas: List[dict] = [{"def_peca": "DIVISAO INDEPENDENTE", "qt_mod": rng.choice([1, 2])}]
+    modelos = (
+        {"def_peca": "LATERAL [2222]", "und": "M2", "comp": "HM", "larg": "PM", "qt_und": 2, "cp01_sec": 1, "cp02_orl": 1},
+        {"def_peca": "PRATELEIRA [1100]", "und": "M2", "comp": "LM-38", "larg": "PM-20", "qt_und": 3, "cp01_sec": 1},
+        {"def_peca": "COSTA [0000]", "und": "M2", "comp": "HM", "larg": "LM", "qt_und": 1},
+        {"def_peca": "VARAO SPP", "und": "ML", "comp": "LM", "qt_und": 1, "pliq": 4.2},
+        {"def_peca": "PUXADOR", "und": "UND", "qt_und": 2, "pliq": 3},
+    )
+    while len(linhas) < escala.linhas:
+        linha = dict(rng.choice(modelos))
+        if linha["und"] == "M2":
+            linha["ref_le"] = rng.choice(placas)
+            linha["pliq"] = round(rng.uniform(5, 30), 2)
+            linha["orl_0_4"] = rng.choice(orlas)
+            linha["orl_1_0"] = rng.choice(orlas)
+        linhas.append(linha)
+    return linhas
+
+
+def criar_base(caminho: str, escala: EscalaBenchmark, *, semente: int = 2026) -> Engine:
+    """Cria (e povoa) uma base SQLite em `caminho`. Devolve o engine."""
+    rng = random.Random(semente)
+    engine = create_engine(f"sqlite:///{caminho}")
+    Base.metadata.create_all(engine)
+    session: Session = sessionmaker(bind=engine)()
+    try:
+        session.add(User(id=1, username="bench", email="bench@example.com", pass_hash="x"))
+        for idx, nome in enumerate(_CLIENTES, start=1):
+            session.add(Client(id=idx, nome=nome, nome_simplex=nome.split()[0]))
+        mps = _materias_primas(rng, escala.materias_primas)
+        session.add_all(mps)
+        orlas = [mp.ref_le for mp in mps if mp.familia == "ORLAS"] or ["ORL00000"]
+        placas = [mp.ref_le for mp in mps if mp.familia == "PLACAS"] or ["PLA00001"]
+
+        for oid in range(1, escala.orcamentos + 1):
+            descricao = " ".join(rng.sample(_PALAVRAS, 4))
+            session.add(
+                Orcamento(
+                    id=oid,
+                    ano="2026",
+                    num_orcamento=f"26{oid:04d}",
+                    versao="01",
+                    client_id=rng.randint(1, len(_CLIENTES)),
+                    status=rng.choice(["Falta Orcamentar", "Enviado", "Adjudicado"]),
+                    data="09-05-2026",
+                    ref_cliente=f"REF{oid:05d}",
+                    descricao_orcamento=descricao,
+                    created_by=1,
+                    preco_total_manual=0,
+                )
+            )
+            n_items = escala.items if oid == ORCAMENTO_ALVO else 2
+            for pos in range(1, n_items + 1):
+                session.add(
+                    OrcamentoItem(
+                        id_orcamento=oid,
+                        versao="01",
+                        item_ord=pos,
+                        item=f"Item {pos}",
+                        codigo=f"C{oid}-{pos}",
+                        descricao=" ".join(rng.sample(_PALAVRAS, 3)),
+                        qt=Decimal(rng.randint(1, 4)),
+                        und="und",
+                        created_by=1,
+                    )
+                )
+
+        for pid in range(1, escala.processos + 1):
+            session.add(
+                Producao(
+                    codigo_processo=f"26.{pid:04d}_01_01_BENCH",
+                    ano="2026",
+                    num_enc_phc=f"{pid:04d}",
+                    estado=rng.choice(["Planeamento", "Producao", "Concluido"]),
+                    responsavel=rng.choice(["Paulo", "Dario", "Ana"]),
+                    nome_cliente=rng.choice(_CLIENTES),
+                    ref_cliente=f"REF{pid:05d}",
+                    descricao_producao=" ".join(rng.sample(_PALAVRAS, 3)),
+                    descricao_artigos=" ".join(rng.sample(_PALAVRAS, 5)),
+                )
+            )
+        session.commit()
+
+        item_ids = [
+            item.id_item
+            for item in session.query(OrcamentoItem)
+            .filter(OrcamentoItem.id_orcamento == ORCAMENTO_ALVO)
+            .order_by(OrcamentoItem.item_ord)
+        ]
+        for pos, item_id in enumerate(item_ids, start=1):
+            ctx = DadosItemsContext(ORCAMENTO_ALVO, item_id, 1, 1, "2026", f"26{ORCAMENTO_ALVO:04d}", "01", pos)
+            custeio_items.salvar_custeio_items(
+                session, ctx, _linhas_item(rng, escala, orlas, placas), DIMENSOES, incremental=True
+            )
+        session.commit()
+    finally:
+        session.close()
+    return engine
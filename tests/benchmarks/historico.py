@@ -0,0 +1,137 @@
+"""Historico JSON dos benchmarks e comparacao entre execucoes.
+
+Uso: python -m tests.benchmarks.historico [caminho]
+(compara a ultima execucao com a anterior da mesma escala)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from Martelo_Orcamentos_V2.version import get_app_version
+
+ENV_HISTORICO = "MARTELO_BENCH_HISTORICO"
+HISTORICO_PADRAO = Path(__file__).resolve().parent / "historico_benchmarks.json"
+# Variacao (fracao) a partir da qual uma operacao e assinalada como regressao.
+LIMITE_REGRESSAO = 0.20
+
+
+def caminho_historico() -> Path:
+    valor = (os.environ.get(ENV_HISTORICO) or "").strip()
+    return Path(valor) if valor else HISTORICO_PADRAO
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        resultado = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except Exception:
+        return None
+    if resultado.returncode != 0:
+        return None
+    return resultado.stdout.strip() or None
+
+
+def carregar(caminho: Optional[Path] = None) -> List[Dict[str, Any]]:
+    caminho = caminho or caminho_historico()
+    try:
+        dados = json.loads(Path(caminho).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    return list(dados.get("execucoes", [])) if isinstance(dados, dict) else []
+
+
+def registar(
+    resultados: Mapping[str, Mapping[str, Any]],
+    escala: Mapping[str, Any],
+    caminho: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """Acrescenta uma execucao (resultados por operacao) ao historico e devolve-a."""
+    caminho = Path(caminho or caminho_historico())
+    execucao = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "versao_app": get_app_version(),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "escala": dict(escala),
+        "resultados": {nome: dict(valores) for nome, valores in sorted(resultados.items())},
+    }
+    execucoes = carregar(caminho)
+    execucoes.append(execucao)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.write_text(json.dumps({"execucoes": execucoes}, ensure_ascii=False, indent=2), encoding="utf-8")
+    return execucao
+
+
+def _chave_escala(execucao: Mapping[str, Any]) -> Dict[str, Any]:
+    """Parametros de escala que tornam duas execucoes comparaveis."""
+    escala = dict(execucao.get("escala") or {})
+    escala.pop("criacao_base_s", None)
+    escala.pop("repeticoes", None)
+    return escala
+
+
+def comparar(anterior: Mapping[str, Any], atual: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """Variacao da mediana por operacao (so operacoes presentes nas duas execucoes)."""
+    linhas = []
+    res_ant = anterior.get("resultados", {})
+    for nome, valores in atual.get("resultados", {}).items():
+        if nome not in res_ant:
+            continue
+        antes = float(res_ant[nome].get("mediana_ms") or 0.0)
+        depois = float(valores.get("mediana_ms") or 0.0)
+        variacao = (depois - antes) / antes if antes else 0.0
+        linhas.append(
+            {
+                "operacao": nome,
+                "antes_ms": antes,
+                "depois_ms": depois,
+                "variacao": variacao,
+                "regressao": variacao > LIMITE_REGRESSAO,
+            }
+        )
+    return linhas
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    caminho = Path(argv[0]) if argv else caminho_historico()
+    execucoes = carregar(caminho)
+    if len(execucoes) < 2:
+        print(f"Historico com {len(execucoes)} execucao(oes) em {caminho}; nada a comparar.")
+        return 0
+    atual = execucoes[-1]
+    anterior = next(
+        (execucao for execucao in reversed(execucoes[:-1]) if _chave_escala(execucao) == _chave_escala(atual)),
+        None,
+    )
+    if anterior is None:
+        print("Nenhuma execucao anterior com a mesma escala; nada a comparar.")
+        return 0
+    print(f"{anterior.get('versao_app')} ({anterior.get('commit')}) -> {atual.get('versao_app')} ({atual.get('commit')})")
+    regressoes = 0
+    for linha in comparar(anterior, atual):
+        marca = "  REGRESSAO" if linha["regressao"] else ""
+        regressoes += int(linha["regressao"])
+        print(
+            f"{linha['operacao']:<36} {linha['antes_ms']:>10.1f} ms -> {linha['depois_ms']:>10.1f} ms "
+            f"({linha['variacao']:+.0%}){marca}"
+        )
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
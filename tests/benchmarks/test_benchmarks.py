@@ -0,0 +1,191 @@
+"""Benchmarks do Custeio, pesquisa e duplicacao de orcamentos (SQLite).
+
+Desligados por omissao. Para correr:
+
+    MARTELO_BENCH=1 python -m pytest -q tests/benchmarks
+    MARTELO_BENCH=1 MARTELO_BENCH_ESCALA="grande,items=120" python -m pytest -q tests/benchmarks
+
+Cada execucao e acrescentada a tests/benchmarks/historico_benchmarks.json (ou a
+MARTELO_BENCH_HISTORICO); `python -m tests.benchmarks.historico` compara as duas
+ultimas.
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import tempfile
+import time
+import unittest
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Optional
+from unittest import mock
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.services import custeio_engine, custeio_items, custeio_lote, margens
+from Martelo_Orcamentos_V2.app.services.dados_items import carregar_contexto
+from Martelo_Orcamentos_V2.app.services.orcamentos import (
+    ENV_INDICE_PESQUISA_DIR,
+    duplicate_orcamento_version,
+    search_orcamentos,
+)
+from Martelo_Orcamentos_V2.app.services.producao_processos import listar_processos
+from tests.benchmarks import dados_sinteticos, historico
+
+ENV_BENCH = "MARTELO_BENCH"
+ENV_REPETICOES = "MARTELO_BENCH_REPETICOES"
+
+TAXAS = custeio_engine.AmbienteCusteio.taxas_de_entradas(
+    [
+        {"descricao_equipamento": "VALOR_SECCIONADORA", "abreviatura": "SEC", "valor_std": 1.5, "valor_serie": 1.0},
+        {"descricao_equipamento": "VALOR_ORLADORA", "abreviatura": "ORL", "valor_std": 0.8, "valor_serie": 0.6},
+    ]
+)
+
+
+@unittest.skipUnless(os.environ.get(ENV_BENCH) == "1", f"benchmarks desligados (defina {ENV_BENCH}=1)")
+class BenchmarksTests(unittest.TestCase):
+    resultados: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.escala = dados_sinteticos.escala_do_ambiente()
+        cls.repeticoes = max(1, int(os.environ.get(ENV_REPETICOES) or 5))
+        cls._trocas = dados_sinteticos.usar_inteiros_nas_chaves()
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._env = mock.patch.dict(os.environ, {ENV_INDICE_PESQUISA_DIR: cls._tmp.name})
+        cls._env.start()
+        inicio = time.perf_counter()
+        cls.engine = dados_sinteticos.criar_base(os.path.join(cls._tmp.name, "bench.db"), cls.escala)
+        cls.tempo_criacao_s = time.perf_counter() - inicio
+        cls.Session = sessionmaker(bind=cls.engine, autoflush=False)
+        cls.resultados = {}
+        cls._sql = 0
+        event.listen(cls.engine, "before_cursor_execute", cls._contar_sql)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        event.remove(cls.engine, "before_cursor_execute", cls._contar_sql)
+        cls.engine.dispose()
+        cls._env.stop()
+        cls._tmp.cleanup()
+        dados_sinteticos.repor_tipos(cls._trocas)
+        if cls.resultados:
+            escala = {**asdict(cls.escala), "repeticoes": cls.repeticoes, "criacao_base_s": round(cls.tempo_criacao_s, 2)}
+            historico.registar(cls.resultados, escala)
+
+    @classmethod
+    def _contar_sql(cls, *_args) -> None:
+        cls._sql += 1
+
+    def setUp(self) -> None:
+        self.session = self.Session()
+        self.addCleanup(self.session.close)
+        self.item_ids = custeio_lote.listar_item_ids(self.session, dados_sinteticos.ORCAMENTO_ALVO)
+
+    def _medir(
+        self,
+        nome: str,
+        operacao: Callable[[int], Any],
+        *,
+        depois: Optional[Callable[[], None]] = None,
+        repeticoes: Optional[int] = None,
+    ) -> Any:
+        """Corre `operacao(indice)` N vezes e guarda mediana/min/max (ms) e SQL por chamada."""
+        tempos = []
+        sql = []
+        resultado = None
+        for indice in range(repeticoes or self.repeticoes):
+            antes_sql = type(self)._sql
+            inicio = time.perf_counter()
+            resultado = operacao(indice)
+            tempos.append((time.perf_counter() - inicio) * 1000.0)
+            sql.append(type(self)._sql - antes_sql)
+            if depois is not None:
+                depois()
+        type(self).resultados[nome] = {
+            "mediana_ms": round(statistics.median(tempos), 3),
+            "min_ms": round(min(tempos), 3),
+            "max_ms": round(max(tempos), 3),
+            "repeticoes": len(tempos),
+            "sql_por_chamada": round(statistics.mean(sql), 1),
+        }
+        return resultado
+
+    def test_listar_custeio_items(self) -> None:
+        oid = dados_sinteticos.ORCAMENTO_ALVO
+
+        def _listar(_indice: int):
+            return [custeio_items.listar_custeio_items(self.session, oid, item_id) for item_id in self.item_ids]
+
+        linhas = self._medir("listar_custeio_items", _listar, depois=self.session.expire_all)
+        self.assertEqual(sum(len(lista) for lista in linhas), self.escala.items * self.escala.linhas)
+
+    def test_salvar_custeio_items(self) -> None:
+        oid = dados_sinteticos.ORCAMENTO_ALVO
+        item_id = self.item_ids[0]
+        ctx = carregar_contexto(self.session, oid, item_id=item_id)
+        base = custeio_items.listar_custeio_items(self.session, oid, item_id)
+
+        def _salvar(indice: int):
+            linhas = [dict(linha, qt_und=(linha.get("qt_und") or 1) + indice % 2) for linha in base]
+            return custeio_items.salvar_custeio_items(
+                self.session, ctx, linhas, dados_sinteticos.DIMENSOES, incremental=True
+            )
+
+        resultado = self._medir("salvar_custeio_items", _salvar)
+        self.assertEqual(resultado.linhas_tocadas + resultado.inalteradas, len(base))
+
+    def test_recalculo_completo_orcamento(self) -> None:
+        def _recalcular(_indice: int):
+            return custeio_lote.recalcular_orcamento(
+                self.session,
+                dados_sinteticos.ORCAMENTO_ALVO,
+                production_mode="STD",
+                taxas=TAXAS,
+                max_processos=1,
+            )
+
+        relatorio = self._medir("recalculo_completo_orcamento", _recalcular, repeticoes=min(self.repeticoes, 3))
+        self.assertTrue(relatorio.ok, relatorio.resumo())
+        self.assertEqual(len(relatorio.atualizados), self.escala.items)
+
+    def test_search_orcamentos(self) -> None:
+        consultas = ("roupeiro portas", "cozinha ilha lacado", "REF00042", "rupeiro cozinah")
+
+        def _pesquisar(indice: int):
+            return search_orcamentos(self.session, consultas[indice % len(consultas)])
+
+        self._medir("search_orcamentos", _pesquisar, repeticoes=max(self.repeticoes, len(consultas)))
+        self.assertTrue(search_orcamentos(self.session, "roupeiro"))
+
+    def test_listar_processos(self) -> None:
+        consultas = ("cozinha ilha", "gavetas carvalho", "26.0007", "cozihna")
+
+        def _listar(indice: int):
+            return listar_processos(self.session, search=consultas[indice % len(consultas)])
+
+        self._medir("listar_processos", _listar, repeticoes=max(self.repeticoes, len(consultas)))
+        self.assertTrue(listar_processos(self.session, search="cozinha"))
+
+    def test_duplicate_orcamento_version(self) -> None:
+        def _duplicar(_indice: int):
+            return duplicate_orcamento_version(self.session, dados_sinteticos.ORCAMENTO_ALVO, created_by=1)
+
+        novo = self._medir("duplicate_orcamento_version", _duplicar, depois=self.session.rollback)
+        self.assertIsNotNone(novo)
+
+    def test_aplicar_margens_orcamento(self) -> None:
+        percentagens = {"margem_lucro_perc": 12, "custos_admin_perc": 4, "margem_mao_obra_perc": 8}
+
+        def _aplicar(_indice: int):
+            return margens.aplicar_margens_orcamento(self.session, dados_sinteticos.ORCAMENTO_ALVO, percentagens)
+
+        total = self._medir("aplicar_margens_orcamento", _aplicar, depois=self.session.rollback)
+        self.assertGreaterEqual(total, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import random
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioItem
+from Martelo_Orcamentos_V2.app.models.materia_prima import MateriaPrima
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_bulk, custeio_items
+
+DERIVED_FIELDS = (
+    "area_m2_und",
+    "perimetro_und",
+    "spp_ml_und",
+    "custo_mp_und",
+    "custo_mp_total",
+    "soma_custo_und",
+    "soma_custo_total",
+    "ml_orl_c1",
+    "ml_orl_c2",
+    "ml_orl_l1",
+    "ml_orl_l2",
+    "custo_orl_c1",
+    "custo_orl_c2",
+    "custo_orl_l1",
+    "custo_orl_l2",
+    "soma_total_ml_orla",
+    "custo_total_orla",
+)
+
+INPUT_FIELDS = (
+    "item_id",
+    "def_peca",
+    "und",
+    "comp_res",
+    "larg_res",
+    "esp_res",
+    "qt_total",
+    "pliq",
+    "desp",
+    "mps",
+    "mo",
+    "orla",
+    "orl_0_4",
+    "orl_1_0",
+    "orl_c1",
+    "orl_c2",
+    "orl_l1",
+    "orl_l2",
+    "cp01_sec_und",
+    "cp02_orl_und",
+    "cp03_cnc_und",
+    "cp08_mao_de_obra_und",
+    "cp09_colagem_und",
+    "custo_total_orla",
+)
+
+
+def _random_row(rng: random.Random, item_id: int) -> CusteioItem:
+    def dec(value: float, places: int = 2) -> Decimal:
+        return Decimal(f"{value:.{places}f}")
+
+    und = rng.choice(["M2", "ML", "UND", None])
+    def_peca = rng.choice(
+        ["LATERAL [2222]", "COSTA [0000]", "PRATELEIRA [1100]", "DIVISAO INDEPENDENTE", "SPP VARAO", "PORTA [2111]"]
+    )
+    comp = rng.choice([None, dec(rng.randint(50, 2800), 0), dec(rng.uniform(50, 2800), 1), Decimal("1005"), Decimal("715")])
+    larg = rng.choice([None, dec(rng.randint(50, 1200), 0), dec(rng.uniform(50, 1200), 1), Decimal("530"), Decimal("0")])
+    return CusteioItem(
+        item_id=item_id,
+        def_peca=def_peca,
+        und=und,
+        comp_res=comp,
+        larg_res=larg,
+        esp_res=rng.choice([None, Decimal("6"), Decimal("19"), Decimal("25"), Decimal("35"), Decimal("50")]),
+        qt_total=rng.choice([None, Decimal("0"), Decimal("1"), Decimal("2"), Decimal("3.5"), dec(rng.uniform(0, 40), 4)]),
+        pliq=rng.choice([None, Decimal("0"), dec(rng.uniform(0.5, 90), 4), Decimal("12.345")]),
+        desp=rng.choice([None, Decimal("0"), Decimal("0.15"), Decimal("10"), Decimal("18.5"), Decimal("7.3333")]),
+        mps=rng.random() < 0.1,
+        mo=rng.random() < 0.1,
+        orla=rng.random() < 0.1,
+        orl_0_4=rng.choice([None, "ORL04A", "ORLA ORL04A"]),
+        orl_1_0=rng.choice([None, "ORL10A", "ORL10B", "FER0085", "orla orl10b"]),
+        orl_c1=rng.choice([None, Decimal("0"), Decimal("0.4"), Decimal("1.0"), Decimal("2.0")]),
+        orl_c2=rng.choice([None, Decimal("0.4"), Decimal("1.0")]),
+        orl_l1=rng.choice([None, Decimal("1.0"), Decimal("0.4")]),
+        orl_l2=rng.choice([None, Decimal("1.0")]),
+        cp01_sec_und=rng.choice([None, dec(rng.uniform(0, 3), 4)]),
+        cp02_orl_und=rng.choice([None, Decimal("0.125"), Decimal("1.005")]),
+        cp03_cnc_und=rng.choice([None, dec(rng.uniform(0, 5), 4)]),
+        cp08_mao_de_obra_und=rng.choice([None, Decimal("2.5")]),
+        cp09_colagem_und=rng.choice([None, Decimal("0"), dec(rng.uniform(0, 4), 4)]),
+        custo_total_orla=rng.choice([None, dec(rng.uniform(0, 30), 4)]),
+    )
+
+
+def _clone(reg: CusteioItem) -> CusteioItem:
+    return CusteioItem(**{field: getattr(reg, field) for field in INPUT_FIELDS})
+
+
+class CusteioBulkTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        for ref_le, pliq, und, desp in (
+            ("ORL04A", "0.85", "ML", "0.07"),
+            ("ORL10A", "140", "M2", "10"),
+            ("ORL10B", "95.5", "M2", "0"),
+            ("FER0085", "1.20", "ML", "10"),
+        ):
+            self.session.add(
+                MateriaPrima(
+                    id_mp=ref_le,
+                    ref_le=ref_le,
+                    descricao_orcamento=f"ORLA {ref_le}",
+                    pliq=Decimal(pliq),
+                    und=und,
+                    desp=Decimal(desp),
+                    familia="ORLAS",
+                    esp_mp=Decimal("1.0"),
+                )
+            )
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.engine.dispose()
+
+    def _assert_same_as_per_row(self, registros: list[CusteioItem]) -> custeio_bulk.ResultadoRecalculo:
+        referencia = [_clone(reg) for reg in registros]
+        caches: dict = {}
+        for reg in referencia:
+            custeio_items._recalcular_registro_custeio(self.session, reg, caches.setdefault(reg.item_id, {}))
+
+        resultado = custeio_bulk.recalcular_registros(self.session, registros)
+
+        for pos, (esperado, obtido) in enumerate(zip(referencia, registros)):
+            for field in DERIVED_FIELDS:
+                valor_esperado = getattr(esperado, field)
+                valor_obtido = getattr(obtido, field)
+                self.assertEqual(
+                    (str(valor_esperado), valor_esperado),
+                    (str(valor_obtido), valor_obtido),
+                    f"linha {pos} campo {field}",
+                )
+        return resultado
+
+    @unittest.skipUnless(custeio_bulk.numpy_disponivel(), "numpy nao instalado")
+    def test_bulk_matches_per_row_path_on_random_rows(self) -> None:
+        rng = random.Random(20240611)
+        registros = [_random_row(rng, item_id=1 + (i // 80)) for i in range(480)]
+
+        resultado = self._assert_same_as_per_row(registros)
+
+        self.assertEqual(resultado.total, 480)
+        self.assertGreater(resultado.vetorizadas, resultado.linha_a_linha)
+
+    @unittest.skipUnless(custeio_bulk.numpy_disponivel(), "numpy nao instalado")
+    def test_rounding_ties_are_resolved_exactly(self) -> None:
+        registros = [
+            CusteioItem(item_id=1, def_peca="COSTA", und="M2", comp_res=Decimal("715"), larg_res=Decimal("530"),
+                        qt_total=Decimal("1"), pliq=Decimal("10"), desp=Decimal("0")),
+            CusteioItem(item_id=1, def_peca="LATERAL [1000]", und="M2", comp_res=Decimal("1005"),
+                        larg_res=Decimal("400"), orl_1_0="ORL10A", orl_c1=Decimal("1.0"), esp_res=Decimal("19")),
+        ]
+
+        resultado = self._assert_same_as_per_row(registros)
+
+        self.assertEqual(registros[0].area_m2_und, Decimal("0.3790"))
+        self.assertEqual(resultado.vetorizadas, 2)
+
+    def test_without_numpy_uses_per_row_path(self) -> None:
+        rng = random.Random(7)
+        registros = [_random_row(rng, item_id=1) for _ in range(20)]
+        original_np = custeio_bulk.np
+        custeio_bulk.np = None
+        try:
+            resultado = self._assert_same_as_per_row(registros)
+        finally:
+            custeio_bulk.np = original_np
+        self.assertEqual(resultado.linha_a_linha, 20)
+
+    def test_recalcular_custeio_orcamento_updates_all_items(self) -> None:
+        self.session.add(User(id=1, username="tester", email="tester@example.com", pass_hash="x"))
+        self.session.add(Client(id=1, nome="Cliente Teste"))
+        self.session.add(Orcamento(id=1, ano="2026", num_orcamento="260001", versao="01", client_id=1))
+        for item_id in (1, 2):
+            self.session.add(OrcamentoItem(id_item=item_id, id_orcamento=1, item_ord=item_id, versao="01"))
+            self.session.add(
+                CusteioItem(
+                    id=item_id,
+                    orcamento_id=1,
+                    item_id=item_id,
+                    cliente_id=1,
+                    ano="2026",
+                    num_orcamento="260001",
+                    versao="01",
+                    ordem=0,
+                    def_peca="COSTA",
+                    und="M2",
+                    comp_res=Decimal("1000"),
+                    larg_res=Decimal("500"),
+                    qt_total=Decimal("2"),
+                    pliq=Decimal("20"),
+                    desp=Decimal("10"),
+                )
+            )
+        self.session.commit()
+
+        resultado = custeio_bulk.recalcular_custeio_orcamento(self.session, 1)
+        self.session.commit()
+
+        self.assertEqual(resultado.total, 2)
+        for reg in self.session.query(CusteioItem).all():
+            self.assertEqual(reg.area_m2_und, Decimal("0.5000"))
+            self.assertEqual(reg.custo_mp_und, Decimal("11.00"))
+            self.assertEqual(reg.custo_mp_total, Decimal("22.00"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6 import QtCore, QtWidgets
+
+from Martelo_Orcamentos_V2.app.services import custeio_engine
+from Martelo_Orcamentos_V2.ui.pages.custeio_items import CusteioTableModel
+
+DIMENSOES = {"H": 2400.0, "L": 600.0, "P": 550.0, "H1": 720.0}
+TAXAS = custeio_engine.AmbienteCusteio.taxas_de_entradas(
+    [
+        {"descricao_equipamento": "VALOR_SECCIONADORA", "abreviatura": "SEC", "valor_std": 1.2, "valor_serie": 0.9},
+        {"descricao_equipamento": "VALOR_ORLADORA", "abreviatura": "ORL", "valor_std": 0.8, "valor_serie": 0.6},
+        {"descricao_equipamento": "EUROS_HORA_CNC", "abreviatura": "CNC", "valor_std": 60, "valor_serie": 50},
+        {"descricao_equipamento": "EUROS_HORA_MO", "abreviatura": "MO", "valor_std": 22, "valor_serie": 18},
+    ]
+)
+
+
+def _linhas():
+    return [
+        {"def_peca": "DIVISAO INDEPENDENTE", "qt_mod": 2},
+        {"def_peca": "LATERAL [2222]", "und": "M2", "comp": "H", "larg": "P-10", "esp": "19",
+         "qt_und": 2, "pliq": 12.5, "desp": 10, "cp01_sec": 1, "cp02_orl": 1},
+        {"def_peca": "PRATELEIRA [1100]", "und": "M2", "comp": "L/2", "larg": "P", "qt_und": 3, "pliq": "3,5"},
+        {"def_peca": "SPP VARAO", "und": "ML", "comp": "L", "qt_und": 1, "pliq": 4.2},
+        {"def_peca": "CNC (Min)", "und": "UND", "qt_und": 15},
+        {"def_peca": "MAO OBRA (Min)", "und": "UND", "qt_und": 30},
+        {"def_peca": "COSTA [0000]", "und": "M2", "comp": "H1", "larg": "ABC", "qt_und": 1},
+    ]
+
+
+class _Pagina(QtCore.QObject):
+    def __init__(self) -> None:
+        super().__init__()
+        self.session = None
+        self.context = None
+        self.dirty = False
+        self._ambiente = custeio_engine.AmbienteCusteio(
+            production_mode="SERIE", dimension_values=DIMENSOES, production_rates=TAXAS
+        )
+
+    def dimension_values(self):
+        return self._ambiente.dimension_values()
+
+    def production_mode(self) -> str:
+        return self._ambiente.production_mode()
+
+    def get_production_rate_info(self, key: str):
+        return self._ambiente.get_production_rate_info(key)
+
+    def _set_rows_dirty(self, dirty: bool = True) -> None:
+        self.dirty = dirty
+
+    def _apply_collapse_state(self) -> None:
+        return None
+
+    def _icon(self, key: str):
+        return None
+
+
+def _sem_uids(rows):
+    ignorar = {"_uid", "_group_uid", "_parent_uid"}
+    return [{k: v for k, v in row.items() if k not in ignorar} for row in rows]
+
+
+class CusteioEngineTests(unittest.TestCase):
+    def test_engine_does_not_import_qt(self) -> None:
+        codigo = (
+            "import sys\n"
+            "from Martelo_Orcamentos_V2.app.services import custeio_engine\n"
+            "custeio_engine.recalcular_linhas([{'def_peca': 'COSTA', 'und': 'M2', 'comp': '500', 'larg': '400'}])\n"
+            "sys.exit(1 if any(m.split('.')[0] == 'PySide6' for m in sys.modules) else 0)\n"
+        )
+        resultado = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True)
+        self.assertEqual(resultado.returncode, 0, resultado.stderr)
+
+    def test_engine_matches_table_model(self) -> None:
+        QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        pagina = _Pagina()
+        model = CusteioTableModel(pagina)
+        model.load_rows(_linhas())
+        model.recalculate_all()
+
+        ambiente = custeio_engine.AmbienteCusteio(
+            production_mode="SERIE", dimension_values=DIMENSOES, production_rates=TAXAS
+        )
+        rows, resultado = custeio_engine.recalcular_linhas(_linhas(), ambiente)
+
+        self.assertEqual(_sem_uids(model.export_rows()), _sem_uids(rows))
+        self.assertEqual(pagina.dirty, resultado.custos_producao_alterados)
+        lateral = rows[1]
+        self.assertEqual(lateral["comp_res"], 2400.0)
+        self.assertEqual(lateral["larg_res"], 540.0)
+        self.assertIsNotNone(rows[6].get("_larg_error"))
+
+    def test_taxas_prefer_description_over_abbreviation(self) -> None:
+        taxas = custeio_engine.AmbienteCusteio.taxas_de_entradas(
+            [
+                {"descricao_equipamento": "ORL", "abreviatura": "X", "valor_std": 1, "valor_serie": None},
+                {"descricao_equipamento": "VALOR_ORLADORA", "abreviatura": "ORL", "valor_std": 2, "valor_serie": 3},
+            ]
+        )
+        ambiente = custeio_engine.AmbienteCusteio(production_rates=taxas)
+
+        self.assertEqual(ambiente.get_production_rate_info(" orl ")["valor_std"], 1.0)
+        self.assertEqual(ambiente.get_production_rate_info("valor_orladora")["valor_serie"], 3.0)
+        self.assertEqual(ambiente.get_production_rate_info("x")["valor_serie"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import ast
+import unittest
+from unittest.mock import patch
+
+from Martelo_Orcamentos_V2.app.services import custeio_engine
+
+CONTEXTO = {"H": 2400.0, "L": 600.0, "P": 550.0, "HM": 720.0, "LM": None, "ESP": 19.0, "INF": float("inf")}
+
+
+INVALIDA = "invalid syntax (<unknown>, line 1)"
+INFINITO = "cannot convert float infinity to integer"
+
+ESPERADOS = {
+    "HM-2*ESP": (682.0, None),
+    "(L-20)/2": (290.0, None),
+    "-H+ +P": (-1850.0, None),
+    "H*True": (2400.0, None),
+    "LM-10": (None, "Variavel local nao definida: Variavel LM sem valor"),
+    "PM": (None, "Variavel local nao definida: Variavel PM desconhecida"),
+    "X+1": (None, "Variavel X desconhecida"),
+    "Q**2+Z": (None, "Variavel Q desconhecida"),
+    "H/0": (None, "Divisao por zero"),
+    "H**2": (None, "Operador nao suportado"),
+    "H%3": (None, "Operador nao suportado"),
+    "H//2": (None, "Operador nao suportado"),
+    "10**400/1": (None, "Operador nao suportado"),
+    "not H": (None, "Operador nao suportado"),
+    "'A'": (None, "Constante invalida"),
+    "H(2)": (None, "Expressao invalida"),
+    "1E999": (None, INFINITO),
+    "INF*0": (None, INFINITO),
+    "H+": (None, INVALIDA),
+    "H * * 2": (None, INVALIDA),
+    "H 1": (None, INVALIDA),
+    "": (None, None),
+    "   ": (None, None),
+}
+
+
+class CacheFormulasTests(unittest.TestCase):
+    def setUp(self) -> None:
+        custeio_engine.FORMULAS.limpar()
+        self.motor = custeio_engine.MotorCusteio()
+
+    def test_formulas_evaluate_to_the_expected_values(self) -> None:
+        for expr, esperado in ESPERADOS.items():
+            for _ in range(2):  # primeira chamada compila, a segunda usa a cache
+                self.assertEqual(self.motor._evaluate_formula_expression(expr, CONTEXTO), esperado, expr)
+
+    def test_case_and_spacing_share_one_cache_entry(self) -> None:
+        variantes = ["HM-2*ESP", " hm - 2 * esp ", "Hm-2 *Esp", "HM -\t2*ESP"]
+        for expr in variantes:
+            self.assertEqual(self.motor._evaluate_formula_expression(expr, CONTEXTO), (682.0, None), expr)
+
+        stats = custeio_engine.FORMULAS.estatisticas()
+        self.assertEqual((stats["hits"], stats["misses"], stats["tamanho"]), (3, 1, 1))
+        # espacos que separam tokens e palavras reservadas nao sao alterados
+        self.assertEqual(custeio_engine._chave_formula("h * * 2"), "H* *2")
+        self.assertEqual(custeio_engine._chave_formula("not h or True"), "not H or True")
+
+    def test_repeated_evaluation_does_not_parse_again(self) -> None:
+        contextos = [{"HM": float(h), "ESP": 19.0} for h in range(400)]
+        with patch.object(ast, "parse", wraps=ast.parse) as parse:
+            for contexto in contextos:
+                self.motor._evaluate_formula_expression("HM-2*ESP", contexto)
+
+        self.assertEqual(parse.call_count, 1)
+        stats = custeio_engine.FORMULAS.estatisticas()
+        self.assertEqual((stats["hits"], stats["misses"], stats["tamanho"]), (399, 1, 1))
+
+    def test_cache_is_bounded_lru(self) -> None:
+        cache = custeio_engine.CacheFormulas(limite=2)
+        cache.compilar("H+1")
+        cache.compilar("H+2")
+        cache.compilar("H+1")
+        cache.compilar("H+3")  # remove "H+2", o menos usado
+
+        self.assertEqual(cache.compilar("H+1")({"H": 1.0}), 2.0)
+        self.assertEqual(cache.estatisticas()["tamanho"], 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        cache.compilar("H+2")
+        self.assertEqual(cache.misses, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
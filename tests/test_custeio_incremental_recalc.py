@@ -0,0 +1,118 @@
+import os
+import random
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6 import QtCore, QtWidgets
+
+from Martelo_Orcamentos_V2.ui.pages.custeio_items import CusteioTableModel
+
+DIMENSOES = {"H": 2000.0, "L": 900.0, "P": 560.0}
+
+
+class _Pagina(QtCore.QObject):
+    def __init__(self) -> None:
+        super().__init__()
+        self.session = None
+        self.context = None
+        self.collapse_calls = 0
+
+    def dimension_values(self):
+        return dict(DIMENSOES)
+
+    def production_mode(self) -> str:
+        return "STD"
+
+    def get_production_rate_info(self, key: str):
+        return {"valor_std": 1.5, "valor_serie": 1.0} if key == "VALOR_SECCIONADORA" else None
+
+    def confirm_qt_und_override(self, row_data, new_value) -> bool:
+        return True
+
+    def _set_rows_dirty(self, dirty: bool = True) -> None:
+        return None
+
+    def _apply_collapse_state(self) -> None:
+        self.collapse_calls += 1
+
+    def _icon(self, key: str):
+        return None
+
+
+def _linhas(rng: random.Random, blocos: int = 6):
+    linhas = []
+    for _ in range(blocos):
+        linhas.append({"def_peca": "DIVISAO INDEPENDENTE", "qt_mod": rng.choice([1, 2, 3]),
+                       "comp": rng.choice(["H", "H-100", ""]), "larg": "L", "esp": "P"})
+        linhas.append({"def_peca": "PORTA ABRIR [2222] + DOBRADICA + PUXADOR", "und": "M2",
+                       "comp": "HM", "larg": "LM/2", "qt_und": 2, "pliq": 20})
+        linhas.append({"def_peca": "DOBRADICA", "und": "UND", "pliq": 1.2})
+        linhas.append({"def_peca": "PUXADOR", "und": "UND", "pliq": 3})
+        linhas.append({"def_peca": "PRATELEIRA [1111] + SUPORTE PRATELEIRA", "und": "M2",
+                       "comp": "LM-20", "larg": "PM", "qt_und": 3, "cp01_sec": 1})
+        linhas.append({"def_peca": "SUPORTE PRATELEIRA", "und": "UND"})
+        linhas.append({"def_peca": "VARAO SPP + SUPORTE VARAO", "und": "ML", "comp": "LM", "qt_und": 1})
+        linhas.append({"def_peca": "VARAO SPP", "und": "ML"})
+        linhas.append({"def_peca": "SUPORTE VARAO", "und": "UND"})
+        linhas.append({"def_peca": "COSTA [0000]", "und": "M2", "comp": "HM", "larg": "LM", "qt_und": 1})
+    return linhas
+
+
+def _sem_uids(rows):
+    ignorar = {"_uid", "_group_uid", "_parent_uid"}
+    return [{k: v for k, v in row.items() if k not in ignorar} for row in rows]
+
+
+class CusteioIncrementalRecalcTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    def _modelos(self, seed: int):
+        linhas = _linhas(random.Random(seed))
+        incremental = CusteioTableModel(_Pagina())
+        completo = CusteioTableModel(_Pagina())
+        for model in (incremental, completo):
+            model.load_rows(linhas)
+            model.recalculate_all()
+        # Referencia: mesmo setData, mas sempre com recalculo total.
+        completo.recalculate_rows = lambda _indices: completo.recalculate_all()  # type: ignore[method-assign]
+        return incremental, completo
+
+    def test_random_edits_match_full_recalculation(self) -> None:
+        incremental, completo = self._modelos(11)
+        rng = random.Random(5)
+        edicoes = {
+            "comp": ["H", "HM-40", "LM", "500", "", "L/3"],
+            "larg": ["P", "PM-10", "300", "LM/2"],
+            "qt_mod": ["1", "2", "4"],
+            "qt_und": ["1", "2", "5", ""],
+        }
+        for _ in range(150):
+            linha = rng.randrange(len(incremental.rows))
+            chave = rng.choice(list(edicoes))
+            valor = rng.choice(edicoes[chave])
+            coluna = incremental.column_keys.index(chave)
+            ok_inc = incremental.setData(incremental.index(linha, coluna), valor, QtCore.Qt.EditRole)
+            ok_full = completo.setData(completo.index(linha, coluna), valor, QtCore.Qt.EditRole)
+            self.assertEqual(ok_inc, ok_full)
+            self.assertEqual(_sem_uids(incremental.rows), _sem_uids(completo.rows), (linha, chave, valor))
+
+    def test_edit_only_notifies_rows_of_its_division(self) -> None:
+        model, _ = self._modelos(3)
+        ranges = []
+        model.dataChanged.connect(lambda tl, br, _roles=None: ranges.append((tl.row(), br.row(), tl.column(), br.column())))
+        coluna = model.column_keys.index("comp")
+
+        # Linha 11 = PORTA da segunda divisao (linhas 10..19).
+        self.assertTrue(model.setData(model.index(11, coluna), "HM-40", QtCore.Qt.EditRole))
+
+        self.assertTrue(ranges)
+        self.assertTrue(all(10 <= top <= bottom < 20 for top, bottom, _, _ in ranges), ranges)
+        self.assertEqual(model.intervalo_dependente(model.rows, [11]), (10, 20))
+        self.assertEqual(model._page.collapse_calls, 1)  # so o recalculo inicial
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from sqlalchemy import Integer, create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioDespBackup, CusteioItem, CusteioItemDimensoes
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_items
+from Martelo_Orcamentos_V2.app.services.dados_items import DadosItemsContext
+
+_ATUALIZAR_ORLAS = custeio_items.atualizar_orlas_custeio
+
+
+class CusteioIncrementalSaveTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._orig_id_types = (CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type)
+        CusteioItem.__table__.c.id.type = Integer()
+        CusteioItemDimensoes.__table__.c.id.type = Integer()
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add(User(id=1, username="tester", email="tester@example.com", pass_hash="x"))
+        self.session.add(Client(id=1, nome="Cliente Teste"))
+        self.session.add(Orcamento(id=1, ano="2026", num_orcamento="260001", versao="01", client_id=1))
+        self.session.add(OrcamentoItem(id_item=1, id_orcamento=1, item_ord=1, versao="01"))
+        self.session.commit()
+        self.ctx = DadosItemsContext(
+            orcamento_id=1,
+            item_id=1,
+            cliente_id=1,
+            user_id=1,
+            ano="2026",
+            num_orcamento="260001",
+            versao="01",
+            item_ordem=1,
+        )
+        self.patches = [
+            patch.object(custeio_items.svc_def_pecas, "mapa_por_nome", return_value={}),
+            patch.object(custeio_items, "aplicar_definicao_cp_linha", return_value={}),
+            patch.object(custeio_items, "atualizar_orlas_custeio", return_value=None),
+            patch.object(custeio_items, "_calcular_custo_acabamento_para_registro", return_value=0),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.session.close()
+        self.engine.dispose()
+        CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type = self._orig_id_types
+
+    def _linhas(self) -> list[dict]:
+        return [
+            {"def_peca": "LATERAL", "descricao": "Lateral", "qt_und": 2, "comp": "HM", "comp_res": 720,
+             "larg": "PM", "larg_res": 550, "pliq": 12.5},
+            {"def_peca": "COSTA", "descricao": "Costa", "qt_und": 1, "comp": "HM", "comp_res": 720,
+             "larg": "LM", "larg_res": 600, "pliq": 4.1},
+            {"def_peca": "PRATELEIRA", "descricao": "Prateleira", "qt_und": 3, "comp": "LM-20", "comp_res": 580,
+             "larg": "PM-20", "larg_res": 530},
+        ]
+
+    def _listar(self) -> list[dict]:
+        return custeio_items.listar_custeio_items(self.session, 1, 1)
+
+    def _count_statements(self) -> list[str]:
+        statements: list[str] = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def _capture(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+            statements.append(statement.split(None, 1)[0].upper())
+
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", _capture)
+        return statements
+
+    def test_first_save_inserts_all_rows(self) -> None:
+        resultado = custeio_items.salvar_custeio_items(self.session, self.ctx, self._linhas(), incremental=True)
+
+        self.assertEqual((resultado.inseridas, resultado.atualizadas, resultado.removidas), (3, 0, 0))
+        self.assertEqual([row["def_peca"] for row in self._listar()], ["LATERAL", "COSTA", "PRATELEIRA"])
+
+    def test_unchanged_save_touches_no_rows_and_keeps_ids(self) -> None:
+        custeio_items.salvar_custeio_items(self.session, self.ctx, self._linhas(), incremental=True)
+        linhas = self._listar()
+        ids = [row["id"] for row in linhas]
+
+        statements = self._count_statements()
+        resultado = custeio_items.salvar_custeio_items(self.session, self.ctx, linhas, incremental=True)
+
+        self.assertEqual(resultado.linhas_tocadas, 0)
+        self.assertEqual(resultado.inalteradas, 3)
+        self.assertNotIn("UPDATE", statements)
+        self.assertNotIn("DELETE", statements)
+        self.assertEqual([row["id"] for row in self._listar()], ids)
+
+    def test_unchanged_save_after_derived_recompute_touches_no_rows(self) -> None:
+        linhas = self._linhas()
+        linhas[0]["mps"] = True
+        with patch.object(custeio_items, "atualizar_orlas_custeio", side_effect=_ATUALIZAR_ORLAS):
+            custeio_items.salvar_custeio_items(self.session, self.ctx, linhas, incremental=True)
+            for _ in range(2):
+                resultado = custeio_items.salvar_custeio_items(self.session, self.ctx, self._listar(), incremental=True)
+                self.assertEqual((resultado.atualizadas, resultado.inalteradas), (0, 3))
+
+    def test_changed_removed_and_new_rows_are_diffed(self) -> None:
+        custeio_items.salvar_custeio_items(self.session, self.ctx, self._linhas(), incremental=True)
+        linhas = self._listar()
+        lateral_id, costa_id, prat_id = (row["id"] for row in linhas)
+        self.session.add(CusteioDespBackup(id=1, orcamento_id=1, versao="01", custeio_item_id=lateral_id, desp_original=Decimal("0.1")))
+        self.session.commit()
+
+        linhas[0]["qt_und"] = 4
+        del linhas[1]
+        linhas.append({"def_peca": "TETO", "descricao": "Teto", "qt_und": 1, "comp": "LM", "larg": "PM"})
+
+        resultado = custeio_items.salvar_custeio_items(self.session, self.ctx, linhas, incremental=True)
+
+        self.assertEqual(
+            (resultado.inseridas, resultado.atualizadas, resultado.removidas, resultado.inalteradas),
+            (1, 2, 1, 0),
+        )
+        listed = self._listar()
+        self.assertEqual([row["def_peca"] for row in listed], ["LATERAL", "PRATELEIRA", "TETO"])
+        self.assertEqual(listed[0]["id"], lateral_id)
+        self.assertEqual(listed[0]["qt_und"], 4.0)
+        self.assertEqual(listed[1]["id"], prat_id)
+        self.assertNotIn(costa_id, [row["id"] for row in listed])
+        backup = self.session.execute(select(CusteioDespBackup)).scalar_one()
+        self.assertEqual(backup.custeio_item_id, lateral_id)
+
+    def test_duplicate_ids_are_inserted_as_new_rows(self) -> None:
+        custeio_items.salvar_custeio_items(self.session, self.ctx, self._linhas()[:1], incremental=True)
+        linha = self._listar()[0]
+
+        resultado = custeio_items.salvar_custeio_items(self.session, self.ctx, [linha, dict(linha)], incremental=True)
+
+        self.assertEqual((resultado.inseridas, resultado.inalteradas), (1, 1))
+        self.assertEqual(len(self._listar()), 2)
+
+    def test_replace_mode_still_rewrites_everything(self) -> None:
+        custeio_items.salvar_custeio_items(self.session, self.ctx, self._linhas())
+        linhas = self._listar()
+
+        resultado = custeio_items.salvar_custeio_items(self.session, self.ctx, linhas)
+
+        self.assertEqual((resultado.inseridas, resultado.removidas), (3, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,6 +17,19 @@ class _ScalarResult:
     def all(self):
         return list(self._values)
 
+    def mappings(self):
+        return [_RegistroMapping(value) for value in self._values]
+
+
+class _RegistroMapping(dict):
+    """Linha projetada: colunas ausentes no registro de teste valem None."""
+
+    def __init__(self, registro):
+        super().__init__(vars(registro))
+
+    def __missing__(self, key):
+        return None
+
 
 class CusteioItemsListReadonlyTests(unittest.TestCase):
     def test_listar_custeio_items_does_not_persist_recalculos(self) -> None:
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import Integer, create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioItem, CusteioItemDimensoes
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_engine, custeio_items, custeio_lote, custeio_metricas
+from Martelo_Orcamentos_V2.app.services.dados_items import DadosItemsContext
+
+TAXAS = custeio_engine.AmbienteCusteio.taxas_de_entradas(
+    [
+        {"descricao_equipamento": "VALOR_SECCIONADORA", "abreviatura": "SEC", "valor_std": 1.5, "valor_serie": 1.0},
+        {"descricao_equipamento": "VALOR_ORLADORA", "abreviatura": "ORL", "valor_std": 0.8, "valor_serie": 0.6},
+    ]
+)
+CAMPOS = ("item_id", "def_peca", "qt_total", "comp_res", "larg_res", "area_m2_und", "cp01_sec_und", "soma_custo_total")
+
+
+class CusteioLoteTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._orig_id_types = (CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type)
+        CusteioItem.__table__.c.id.type = Integer()
+        CusteioItemDimensoes.__table__.c.id.type = Integer()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type = self._orig_id_types
+        self.tmp.cleanup()
+
+    def _criar_base(self, nome: str, n_items: int = 4):
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, nome)}")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        self.addCleanup(session.close)
+        session.add(User(id=1, username="tester", email="tester@example.com", pass_hash="x"))
+        session.add(Client(id=1, nome="Cliente Teste"))
+        session.add(Orcamento(id=1, ano="2026", num_orcamento="260001", versao="01", client_id=1, created_by=1))
+        for item_id in range(1, n_items + 1):
+            session.add(OrcamentoItem(id_item=item_id, id_orcamento=1, item_ord=n_items - item_id + 1, versao="01"))
+        session.commit()
+        for item_id in range(1, n_items + 1):
+            ctx = DadosItemsContext(1, item_id, 1, 1, "2026", "260001", "01", n_items - item_id + 1)
+            linhas = [
+                {"def_peca": "LATERAL", "und": "M2", "comp": "H", "larg": "P", "qt_und": item_id, "pliq": 10,
+                 "cp01_sec": 1},
+                {"def_peca": "PRATELEIRA", "und": "M2", "comp": "L-20", "larg": "P-20", "qt_und": 2, "pliq": 8},
+            ]
+            dimensoes = {"H": 700.0 + item_id, "L": 600.0, "P": 500.0}
+            custeio_items.salvar_custeio_items(session, ctx, linhas, dimensoes, incremental=True)
+        return session
+
+    def _estado(self, session):
+        session.expire_all()
+        registros = session.execute(select(CusteioItem).order_by(CusteioItem.item_id, CusteioItem.ordem)).scalars()
+        return [tuple(getattr(reg, campo) for campo in CAMPOS) for reg in registros]
+
+    def test_parallel_recompute_matches_sequential(self) -> None:
+        sequencial = self._criar_base("seq.db")
+        paralelo = self._criar_base("par.db")
+        progresso: list[tuple[int, int]] = []
+
+        rel_seq = custeio_lote.recalcular_orcamento(
+            sequencial, 1, production_mode="STD", taxas=TAXAS, max_processos=1
+        )
+        rel_par = custeio_lote.recalcular_orcamento(
+            paralelo, 1, production_mode="STD", taxas=TAXAS, max_processos=2,
+            progresso=lambda feito, total: progresso.append((feito, total)),
+        )
+
+        self.assertTrue(rel_seq.ok and rel_par.ok)
+        # Commits pela ordem de item_ord, independentemente de quem termina primeiro.
+        self.assertEqual(rel_par.atualizados, [4, 3, 2, 1])
+        self.assertEqual(rel_seq.atualizados, rel_par.atualizados)
+        self.assertEqual(progresso, [(1, 4), (2, 4), (3, 4), (4, 4)])
+        estado = self._estado(paralelo)
+        self.assertEqual(estado, self._estado(sequencial))
+        self.assertTrue(all(linha[6] for linha in estado if linha[1] == "LATERAL"))
+
+    def test_parallel_recompute_reports_worker_metrics(self) -> None:
+        session = self._criar_base("metricas.db", n_items=3)
+        custeio_metricas.limpar(todos=True)
+        self.addCleanup(custeio_metricas.limpar, todos=True)
+        self.addCleanup(custeio_metricas.ativar, custeio_metricas.esta_ativo())
+        custeio_metricas.ativar(True)
+        custeio_items.listar_custeio_items(session, 1, 1)  # medido no chamador antes de criar os processos
+
+        relatorio = custeio_lote.recalcular_orcamento(
+            session, 1, production_mode="STD", taxas=TAXAS, max_processos=2
+        )
+
+        self.assertTrue(relatorio.ok)
+        etapas = {linha["etapa"]: linha for linha in custeio_metricas.resultados(1)}
+        self.assertEqual(etapas["listar_custeio_items"]["chamadas"], 4)
+        self.assertEqual(etapas["recalculate_all"]["chamadas"], 3)
+        self.assertIn("aplicar_definicao_cp_linha", etapas)
+        self.assertIn("preencher_info_orlas_linha", etapas)
+        self.assertEqual(etapas["salvar_custeio_items"]["chamadas"], 3)
+
+    def test_failures_are_reported_per_item(self) -> None:
+        session = self._criar_base("falhas.db", n_items=3)
+        original = custeio_items.listar_custeio_items
+
+        def _listar(sess, orcamento_id, item_id):
+            if item_id == 2:
+                raise RuntimeError("linha corrompida")
+            return original(sess, orcamento_id, item_id)
+
+        with patch.object(custeio_items, "listar_custeio_items", side_effect=_listar):
+            relatorio = custeio_lote.recalcular_orcamento(
+                session, 1, production_mode="STD", taxas=TAXAS, max_processos=1
+            )
+
+        self.assertFalse(relatorio.ok)
+        self.assertEqual(relatorio.atualizados, [3, 1])
+        self.assertEqual(relatorio.falhas, [custeio_lote.FalhaItem(2, "calculo", "RuntimeError: linha corrompida")])
+        self.assertIn("Item 2 (calculo)", relatorio.resumo())
+
+    def test_cancel_stops_between_items(self) -> None:
+        session = self._criar_base("cancel.db", n_items=3)
+        feitos: list[int] = []
+
+        relatorio = custeio_lote.recalcular_orcamento(
+            session, 1, production_mode="STD", taxas=TAXAS, max_processos=2,
+            progresso=lambda feito, total: feitos.append(feito),
+            cancelado=lambda: bool(feitos),
+        )
+
+        self.assertTrue(relatorio.cancelado)
+        self.assertEqual(relatorio.atualizados, [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import Integer, create_engine
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioItem, CusteioItemDimensoes
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_engine, custeio_items, custeio_metricas
+from Martelo_Orcamentos_V2.app.services.dados_items import DadosItemsContext
+
+
+class CusteioMetricasTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._orig_id_types = (CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type)
+        CusteioItem.__table__.c.id.type = Integer()
+        CusteioItemDimensoes.__table__.c.id.type = Integer()
+        engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+        self.session.add(User(id=1, username="tester", email="tester@example.com", pass_hash="x"))
+        self.session.add(Client(id=1, nome="Cliente Teste"))
+        self.session.add(Orcamento(id=7, ano="2026", num_orcamento="260007", versao="01", client_id=1, created_by=1))
+        # custo desatualizado: o resumo tem de o regravar
+        self.session.add(OrcamentoItem(id_item=1, id_orcamento=7, item_ord=1, versao="01", custo_produzido=Decimal("99.00")))
+        self.session.commit()
+        self.ctx = DadosItemsContext(7, 1, 1, 1, "2026", "260007", "01", 1)
+        self.linhas = [
+            {"def_peca": "LATERAL [2222]", "und": "M2", "comp": "H", "larg": "P", "qt_und": 2, "pliq": 10},
+            {"def_peca": "PRATELEIRA", "und": "M2", "comp": "L", "larg": "P", "qt_und": 1, "pliq": 8},
+        ]
+        custeio_metricas.limpar(todos=True)
+        self.addCleanup(custeio_metricas.limpar, todos=True)
+        self.addCleanup(custeio_metricas.ativar, custeio_metricas.esta_ativo())
+
+    def tearDown(self) -> None:
+        CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type = self._orig_id_types
+
+    def _pipeline(self) -> None:
+        custeio_items.salvar_custeio_items(self.session, self.ctx, self.linhas, {"H": 700.0, "L": 600.0, "P": 500.0})
+        linhas = custeio_items.listar_custeio_items(self.session, 7, 1)
+        ambiente = custeio_engine.AmbienteCusteio(self.session, self.ctx, dimension_values={"H": 700.0, "L": 600.0, "P": 500.0})
+        custeio_engine.recalcular_linhas(linhas, ambiente)
+        custeio_items.atualizar_resumo_custos_orcamento(self.session, 7)
+
+    def test_disabled_records_nothing(self) -> None:
+        custeio_metricas.ativar(False)
+        self._pipeline()
+
+        self.assertEqual(custeio_metricas.orcamentos_medidos(), [])
+
+    def test_stages_are_timed_and_sql_counted_per_orcamento(self) -> None:
+        custeio_metricas.ativar(True)
+        self._pipeline()
+
+        etapas = {linha["etapa"]: linha for linha in custeio_metricas.resultados(7)}
+        for etapa in (
+            "salvar_custeio_items",
+            "listar_custeio_items",
+            "aplicar_definicao_cp_linha",
+            "preencher_info_orlas_linha",
+            "recalculate_all",
+            "atualizar_resumo_custos_orcamento",
+        ):
+            self.assertIn(etapa, etapas)
+            self.assertGreaterEqual(etapas[etapa]["chamadas"], 1)
+            self.assertGreaterEqual(etapas[etapa]["tempo_total_ms"], etapas[etapa]["tempo_max_ms"])
+        self.assertEqual(custeio_metricas.orcamentos_medidos(), [7])  # etapas internas herdam o orcamento
+        self.assertEqual(etapas["listar_custeio_items"]["chamadas"], 1)
+        self.assertGreater(etapas["listar_custeio_items"]["sql"], 0)
+        self.assertEqual(etapas["atualizar_resumo_custos_orcamento"]["sql"], 2)  # SELECT + UPDATE
+        self.assertGreaterEqual(etapas["salvar_custeio_items"]["sql"], etapas["aplicar_definicao_cp_linha"]["sql"])
+
+        exportado = json.loads(custeio_metricas.exportar_json(7))
+        self.assertEqual(exportado["orcamento_id"], 7)
+        self.assertEqual({linha["etapa"] for linha in exportado["etapas"]}, set(etapas))
+
+        custeio_metricas.limpar(7)
+        self.assertEqual(custeio_metricas.resultados(7), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import Integer, create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioItem, CusteioItemDimensoes
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_items
+from Martelo_Orcamentos_V2.app.services.dados_items import DadosItemsContext
+
+
+def _linha_orm(registro: CusteioItem):
+    """Conversao anterior (entidade ORM atributo a atributo)."""
+    linha = custeio_items._empty_row()
+    linha["id"] = registro.id
+    for spec in custeio_items.CUSTEIO_COLUMN_SPECS:
+        key = spec["key"]
+        if key == "id":
+            continue
+        if key in {"comp", "larg", "esp"}:
+            expr_val = getattr(registro, f"{key}_expr", None)
+            linha[key] = expr_val if expr_val not in (None, "") else custeio_items._format_formula_value(
+                getattr(registro, key, None)
+            )
+            continue
+        valor = getattr(registro, key, None)
+        if spec["type"] == "numeric":
+            linha[key] = custeio_items._decimal_to_float(valor)
+        elif spec["type"] == "bool":
+            linha[key] = custeio_items._coerce_checkbox_to_bool(valor)
+        else:
+            linha[key] = valor
+    linha["qt_manual_override"] = bool(getattr(registro, "qt_manual_override", False))
+    return linha
+
+
+class CusteioProjecaoTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._orig_id_types = (CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type)
+        CusteioItem.__table__.c.id.type = Integer()
+        CusteioItemDimensoes.__table__.c.id.type = Integer()
+        engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+        self.session.add(User(id=1, username="tester", email="tester@example.com", pass_hash="x"))
+        self.session.add(Client(id=1, nome="Cliente Teste"))
+        self.session.add(Orcamento(id=1, ano="2026", num_orcamento="260001", versao="01", client_id=1, created_by=1))
+        self.session.add(OrcamentoItem(id_item=1, id_orcamento=1, item_ord=1, versao="01"))
+        self.session.commit()
+        ctx = DadosItemsContext(1, 1, 1, 1, "2026", "260001", "01", 1)
+        linhas = [
+            {"def_peca": "DIVISAO INDEPENDENTE", "qt_mod": 2},
+            {"def_peca": "LATERAL [2222]", "und": "M2", "comp": "H", "larg": "P-10", "esp": "19",
+             "qt_und": 2, "pliq": 12.5, "cp01_sec": 1, "blk": True, "qt_manual_override": True},
+            {"def_peca": "PRATELEIRA [1100]", "und": "M2", "comp": "733.5", "larg": "P", "qt_und": 3},
+            {"def_peca": "SPP VARAO", "und": "ML", "comp": "L", "qt_und": 1, "pliq": 4.2},
+        ]
+        custeio_items.salvar_custeio_items(self.session, ctx, linhas, {"H": 2000.0, "L": 900.0, "P": 560.0})
+
+    def tearDown(self) -> None:
+        CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type = self._orig_id_types
+
+    def test_projection_matches_orm_conversion(self) -> None:
+        registros = self.session.execute(
+            select(CusteioItem).order_by(CusteioItem.ordem, CusteioItem.id)
+        ).scalars().all()
+        esperado = [_linha_orm(reg) for reg in registros]
+        self.session.expunge_all()
+
+        for tamanho_lote in (None, 1):
+            linhas = list(custeio_items.iterar_linhas_custeio(self.session, 1, 1, tamanho_lote=tamanho_lote))
+            self.assertEqual(linhas, esperado)
+            self.assertEqual(list(linhas[0]), list(esperado[0]))  # mesma ordem de chaves
+        self.assertEqual(len(self.session.identity_map), 0)
+        self.assertEqual(esperado[1]["comp"], "H")
+        self.assertTrue(esperado[1]["qt_manual_override"])
+
+    def test_listar_uses_projection(self) -> None:
+        linhas = custeio_items.listar_custeio_items(self.session, 1, 1)
+
+        self.assertEqual([linha["def_peca"] for linha in linhas][1:], ["LATERAL [2222]", "PRATELEIRA [1100]", "SPP VARAO"])
+        self.assertEqual(len(self.session.identity_map), 0)
+        self.assertIn("_nst_source", linhas[1])
+
+    def test_raw_projection_for_reports(self) -> None:
+        rows = list(
+            custeio_items.projetar_custeio(
+                self.session, 1, versao="01", colunas=("item_id", "def_peca", "qt_und", "nst", "inexistente"),
+                tamanho_lote=2,
+            )
+        )
+
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1].def_peca, "LATERAL [2222]")
+        self.assertIsInstance(rows[1].qt_und, Decimal)
+        self.assertIsNone(getattr(rows[1], "inexistente", None))
+        self.assertIsNone(getattr(rows[1], "pliq", None))
+        self.assertEqual(list(custeio_items.projetar_custeio(self.session, 1, versao="02")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
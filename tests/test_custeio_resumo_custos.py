@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import Integer, create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioItem, CusteioItemDimensoes
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import custeio_items
+
+CAMPOS = (
+    "custo_total_orlas",
+    "custo_total_mao_obra",
+    "custo_total_materia_prima",
+    "custo_total_acabamentos",
+    "custo_colagem",
+    "custo_produzido",
+)
+
+
+class ResumoCustosTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._orig_id_types = (CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type)
+        CusteioItem.__table__.c.id.type = Integer()
+        CusteioItemDimensoes.__table__.c.id.type = Integer()
+        self.engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.session.close)
+        s = self.session
+        s.add(User(id=1, username="tester", email="tester@example.com", pass_hash="x"))
+        s.add(Client(id=1, nome="Cliente Teste"))
+        s.add(Orcamento(id=1, ano="2026", num_orcamento="260001", versao="01", client_id=1, created_by=1))
+        s.add(Orcamento(id=2, ano="2026", num_orcamento="260002", versao="01", client_id=1, created_by=1))
+        # item 3 nao tem custeio; item 4 e de outra versao; item 9 e de outro orcamento.
+        for id_item, id_orc, versao in ((1, 1, "01"), (2, 1, "01"), (3, 1, "01"), (4, 1, "02"), (9, 2, "01")):
+            s.add(OrcamentoItem(id_item=id_item, id_orcamento=id_orc, item_ord=id_item, versao=versao,
+                                custo_produzido=Decimal("99.00")))
+        linhas = [
+            (1, 1, "01", "100.005", "10.10", "40.00", "5.50", "2.00", "3"),
+            (1, 1, "01", "20.00", "0", "15.25", None, None, None),
+            (2, 1, "01", "10.00", "6.00", "8.00", "1.00", "1.00", "1"),  # M.O. negativa -> 0
+            (2, 1, "02", "500.00", "0", "0", "0", "0", "0"),  # versao diferente: ignorada
+            (4, 1, "02", "70.00", "5.00", "30.00", "0", "0.5", "4"),
+            (9, 2, "01", "1.00", "0", "0", "0", "0", "0"),
+        ]
+        for idx, (item_id, orc_id, versao, total, orla, mp, acb, colagem, qt) in enumerate(linhas, start=1):
+            s.add(CusteioItem(
+                id=idx, orcamento_id=orc_id, item_id=item_id, cliente_id=1, user_id=1, ano="2026",
+                num_orcamento="260001", versao=versao, ordem=idx, def_peca="PECA",
+                soma_custo_total=Decimal(total), custo_total_orla=Decimal(orla), custo_mp_total=Decimal(mp),
+                soma_custo_acb=None if acb is None else Decimal(acb),
+                cp09_colagem_und=None if colagem is None else Decimal(colagem),
+                qt_total=None if qt is None else Decimal(qt),
+            ))
+        s.commit()
+
+    def tearDown(self) -> None:
+        CusteioItem.__table__.c.id.type, CusteioItemDimensoes.__table__.c.id.type = self._orig_id_types
+
+    def _totais(self):
+        self.session.expire_all()
+        itens = self.session.execute(select(OrcamentoItem).order_by(OrcamentoItem.id_item)).scalars()
+        return {item.id_item: tuple(getattr(item, campo) for campo in CAMPOS) for item in itens}
+
+    def test_group_by_matches_per_item_rollup(self) -> None:
+        for item in self.session.execute(
+            select(OrcamentoItem).where(OrcamentoItem.id_orcamento == 1)
+        ).scalars():
+            custeio_items._aplicar_resumo_custos_item(self.session, item)
+        self.session.flush()
+        esperado = self._totais()
+        self.session.rollback()
+
+        statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        self.assertEqual(custeio_items.atualizar_resumo_custos_orcamento(self.session, 1), 4)
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+        updates = [sql for sql in statements if sql.lstrip().upper().startswith("UPDATE")]
+        self.assertEqual((len(selects), len(updates)), (1, 1))
+
+        totais = self._totais()
+        self.assertEqual(totais, esperado)
+        self.assertEqual(
+            totais[1],
+            (Decimal("10.10"), Decimal("48.66"), Decimal("55.25"), Decimal("5.50"), Decimal("6.00"), Decimal("125.51")),
+        )
+        self.assertEqual(totais[2][1], Decimal("0.00"))
+        self.assertEqual(totais[3], (Decimal("0.00"),) * 6)
+        self.assertEqual(totais[4][4], Decimal("2.00"))
+        self.assertEqual(totais[9][5], Decimal("99.00"))
+
+    def test_unchanged_totals_are_not_rewritten(self) -> None:
+        self.assertEqual(custeio_items.atualizar_resumo_custos_orcamento(self.session, 1), 4)
+        self.session.commit()
+        self.session.get(CusteioItem, 3).soma_custo_total = Decimal("12.00")  # so o item 2 muda
+        self.session.commit()
+
+        statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: statements.append((args[2], args[3])))
+        self.assertEqual(custeio_items.atualizar_resumo_custos_orcamento(self.session, 1), 1)
+        self.assertEqual(custeio_items.atualizar_resumo_custos_orcamento(self.session, 1), 0)
+
+        updates = [params for sql, params in statements if sql.lstrip().upper().startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._totais()[2][5], Decimal("13.00"))
+
+    def test_loaded_items_see_new_totals(self) -> None:
+        item = self.session.get(OrcamentoItem, 3)
+        self.assertEqual(item.custo_produzido, Decimal("99.00"))
+
+        custeio_items.atualizar_resumo_custos_orcamento(self.session, 1)
+
+        self.assertEqual(item.custo_produzido, Decimal("0.00"))
+        self.assertEqual(custeio_items.atualizar_resumo_custos_orcamento(self.session, None), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.app_setting import AppSetting
+from Martelo_Orcamentos_V2.app.services import custeio_items
+from Martelo_Orcamentos_V2.app.services import dados_referencia
+from Martelo_Orcamentos_V2.app.services import def_pecas
+
+
+class DadosReferenciaCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.engine.dispose()
+
+    def test_loader_runs_once_while_version_is_unchanged(self) -> None:
+        chamadas = []
+
+        def carregar(_session):
+            chamadas.append(1)
+            return {"orla x": "1.0"}
+
+        primeiro = dados_referencia.obter(self.session, "teste", carregar)
+        segundo = dados_referencia.obter(self.Session(), "teste", carregar)
+
+        self.assertIs(primeiro, segundo)
+        self.assertEqual(len(chamadas), 1)
+
+    def test_guardar_definicoes_bumps_version_and_refreshes_cp_map(self) -> None:
+        def_pecas.guardar_definicoes(self.session, [{"id": 1, "nome_da_peca": "LATERAL", "cp01_sec": "1"}])
+        versao = dados_referencia.ler_versao(self.session)
+        self.assertEqual(custeio_items.obter_mapa_definicoes_cp(self.session)["lateral"]["cp01_sec"], 1.0)
+
+        with patch.object(def_pecas, "listar_definicoes", wraps=def_pecas.listar_definicoes) as listar:
+            custeio_items.obter_mapa_definicoes_cp(self.session)
+            listar.assert_not_called()
+
+        def_pecas.guardar_definicoes(self.session, [{"id": 1, "nome_da_peca": "LATERAL", "cp01_sec": "2"}])
+
+        self.assertNotEqual(dados_referencia.ler_versao(self.session), versao)
+        self.assertEqual(custeio_items.obter_mapa_definicoes_cp(self.session)["lateral"]["cp01_sec"], 2.0)
+
+    def test_version_bumped_elsewhere_is_detected(self) -> None:
+        carregar = lambda _session: object()  # noqa: E731
+        antes = dados_referencia.obter(self.session, "teste", carregar)
+
+        outra = self.Session()
+        outra.add(AppSetting(key=dados_referencia.VERSAO_SETTING_KEY, value="99"))
+        outra.commit()
+        self.session.commit()
+
+        with patch.object(dados_referencia, "INTERVALO_VERIFICACAO", 0.0):
+            depois = dados_referencia.obter(self.session, "teste", carregar)
+
+        self.assertIsNot(antes, depois)
+
+
+if __name__ == "__main__":
+    unittest.main()
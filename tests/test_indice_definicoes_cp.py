@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import random
+import re
+import unittest
+from typing import Dict, Optional
+
+from Martelo_Orcamentos_V2.app.services import custeio_items
+
+
+def _procura_linear(mapa: Dict[str, Dict[str, float]], chave_normalizada: str) -> Optional[Dict[str, float]]:
+    """Copia da procura linear original de aplicar_definicao_cp_linha."""
+    if not chave_normalizada:
+        return None
+    if chave_normalizada in mapa:
+        return mapa[chave_normalizada]
+    chave_sem_sufixo = re.sub(r"[_\\s]+\\d+$", "", chave_normalizada)
+    if chave_sem_sufixo and chave_sem_sufixo in mapa:
+        return mapa[chave_sem_sufixo]
+    for k, v in mapa.items():
+        if not k:
+            continue
+        if chave_sem_sufixo and (k.startswith(chave_sem_sufixo) or chave_sem_sufixo.startswith(k)):
+            return v
+        if k in chave_normalizada or chave_normalizada in k:
+            return v
+    return None
+
+
+class IndiceDefinicoesCPTests(unittest.TestCase):
+    def test_matches_linear_scan_on_random_keys(self) -> None:
+        rng = random.Random(4242)
+        alfabeto = "abd _s\\0"
+        for _ in range(60):
+            mapa: Dict[str, Dict[str, float]] = {}
+            for pos in range(rng.randint(0, 40)):
+                chave = "".join(rng.choice(alfabeto) for _ in range(rng.randint(0, 9)))
+                mapa.setdefault(chave, {"cp01_sec": float(pos)})
+            indice = custeio_items._IndiceDefinicoesCP(mapa)
+            for _ in range(200):
+                consulta = "".join(rng.choice(alfabeto) for _ in range(rng.randint(0, 11)))
+                self.assertIs(indice.procurar(consulta), _procura_linear(mapa, consulta), repr((consulta, list(mapa))))
+
+    def test_matches_linear_scan_on_piece_names(self) -> None:
+        nomes = [
+            "lateral",
+            "lateral acabamento",
+            "costa",
+            "prateleira",
+            "prat. amov.",
+            "porta abrir",
+            "divisao",
+            "tampo",
+            "fundo gaveta",
+            "fundo",
+            "frente gaveta",
+        ]
+        mapa = {nome: {"cp01_sec": float(pos)} for pos, nome in enumerate(nomes)}
+        indice = custeio_items._IndiceDefinicoesCP(mapa)
+        consultas = [
+            "lateral [2222]",
+            "lat",
+            "costa_2",
+            "prateleira amovivel",
+            "porta",
+            "gaveta",
+            "fundo gaveta [0022]",
+            "tampo\\\\d",
+            "xpto",
+            "o",
+            "",
+        ]
+        for consulta in consultas:
+            self.assertIs(indice.procurar(consulta), _procura_linear(mapa, consulta), consulta)
+
+    def test_index_is_reused_for_the_same_map(self) -> None:
+        mapa = {"lateral": {"cp01_sec": 1.0}}
+        primeiro = custeio_items._indice_definicoes_cp(mapa)
+        self.assertIs(custeio_items._indice_definicoes_cp(mapa), primeiro)
+        self.assertIsNot(custeio_items._indice_definicoes_cp(dict(mapa)), primeiro)
+
+
+if __name__ == "__main__":
+    unittest.main()
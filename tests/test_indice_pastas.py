@@ -0,0 +1,119 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from Martelo_Orcamentos_V2.app.services import indice_pastas as svc_indice
+from Martelo_Orcamentos_V2.app.services import producao_processos as svc_producao
+
+
+class IndicePastasTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.raiz = Path(tmp.name) / "2026"
+        for nome in ("0501_JF_VIVA/0501_01_JF_VIVA/0501_01_01_JF_VIVA", "0702_GSW/0702_01_GSW"):
+            (self.raiz / "Encomenda de Cliente" / nome).mkdir(parents=True)
+        (self.raiz / "Encomenda de Cliente" / "notas.txt").write_text("x", encoding="utf-8")
+        self.indice = svc_indice.IndicePastas()
+        self.addCleanup(self.indice.parar)
+
+    def _contar_listagens(self):
+        listagens = []
+        original = os.scandir
+
+        def _scandir(caminho):
+            listagens.append(str(caminho))
+            return original(caminho)
+
+        patcher = mock.patch.object(svc_indice.os, "scandir", side_effect=_scandir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return listagens
+
+    def _tocar(self, pasta):
+        # garante um mtime diferente mesmo em sistemas de ficheiros com pouca resolucao
+        futuro = time.time() + 5
+        os.utime(pasta, (futuro, futuro))
+
+    def test_lists_only_folders_and_relists_when_mtime_changes(self):
+        tipo = self.raiz / "Encomenda de Cliente"
+        listagens = self._contar_listagens()
+        self.assertEqual(self.indice.subpastas(tipo), ("0501_JF_VIVA", "0702_GSW"))
+        self.assertEqual(self.indice.subpastas(tipo), ("0501_JF_VIVA", "0702_GSW"))
+        self.assertEqual(len(listagens), 1)
+
+        (tipo / "0650_NOVO").mkdir()
+        self._tocar(tipo)
+        self.assertEqual(self.indice.subpastas(tipo), ("0501_JF_VIVA", "0650_NOVO", "0702_GSW"))
+        self.assertEqual(len(listagens), 2)
+        self.assertIsNone(self.indice.subpastas(tipo / "nao_existe"))
+        self.assertIsNone(self.indice.subpastas(tipo / "notas.txt"))
+
+    def test_validity_window_skips_disk_until_invalidated(self):
+        tipo = self.raiz / "Encomenda de Cliente"
+        self.indice.validade_s = 60.0
+        self.indice.subpastas(tipo)
+        (tipo / "0650_NOVO").mkdir()
+        self._tocar(tipo)
+        self.assertNotIn("0650_NOVO", self.indice.subpastas(tipo))
+        self.assertIn("0650_NOVO", self.indice.subpastas(tipo, revalidar=True))
+
+        (tipo / "0651_OUTRO").mkdir()
+        self.indice.invalidar(tipo / "0651_OUTRO")
+        self.assertIn("0651_OUTRO", self.indice.subpastas(tipo))
+
+    def test_refresh_walks_the_tree_and_survives_a_restart(self):
+        self.assertEqual(self.indice.atualizar(self.raiz, profundidade=3), 6)
+        listagens = self._contar_listagens()
+        self.assertEqual(self.indice.atualizar(self.raiz, profundidade=3), 6)
+        self.assertEqual(listagens, [])
+        self.indice.atualizar(self.raiz, profundidade=3, forcar=True)
+        self.assertEqual(len(listagens), 6)
+
+        self.indice.caminho = self.raiz.parent / "indice" / "pastas.json"
+        self.assertTrue(self.indice.guardar_se_necessario())
+        outro = svc_indice.IndicePastas()
+        outro.caminho = self.indice.caminho
+        outro._carregar()
+        self.assertEqual(len(outro), 6)
+        del listagens[:]
+        self.assertEqual(outro.subpastas(self.raiz / "Encomenda de Cliente"), ("0501_JF_VIVA", "0702_GSW"))
+        self.assertEqual(listagens, [])
+
+    def test_background_refresh_picks_up_new_folders(self):
+        enc = self.raiz / "Encomenda de Cliente" / "0702_GSW"
+        self.indice.iniciar([self.raiz], profundidade=3, intervalo_s=60.0)
+        for _ in range(200):
+            if self.indice.subpastas(enc) is not None:
+                break
+            time.sleep(0.01)
+        (enc / "0702_02_GSW").mkdir()
+        self._tocar(enc)
+        self.indice.pedir_atualizacao(forcar=False)
+        for _ in range(200):
+            if "0702_02_GSW" in (self.indice.subpastas(enc) or ()):
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.indice.subpastas(enc), ("0702_01_GSW", "0702_02_GSW"))
+
+    def test_version_suggestion_revalidates_cached_folders(self):
+        self.indice.validade_s = 60.0
+        session = mock.MagicMock()
+        session.execute.return_value.scalars.return_value.all.return_value = []
+        kwargs = dict(ano=2026, num_enc_phc="0702", tipo_pasta="Encomenda de Cliente")
+        with mock.patch.object(svc_producao, "indice_pastas", return_value=self.indice), \
+             mock.patch.object(svc_producao, "_resolve_base_dir", return_value=str(self.raiz.parent)):
+            self.assertEqual(svc_producao.sugerir_proxima_versao_obra(session, **kwargs), "02")
+            enc = self.raiz / "Encomenda de Cliente" / "0702_GSW"
+            (enc / "0702_02_GSW").mkdir()
+            self._tocar(enc)
+            # a listagem para mostrar fica com a cache; a sugestao confirma no disco
+            self.assertEqual(svc_producao.listar_versoes_obra_em_pastas(session, **kwargs), {"01"})
+            self.assertEqual(svc_producao.sugerir_proxima_versao_obra(session, **kwargs), "03")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import difflib
+import random
+import unittest
+
+from Martelo_Orcamentos_V2.app.services.indice_texto import IndiceTexto, IndiceTrigramas
+
+PALAVRAS = (
+    "roupeiro", "roupeiros", "cozinha", "cozinhas", "lacado", "lacada", "carvalho", "gaveta", "gavetas",
+    "porta", "portas", "abrir", "correr", "sapateira", "estante", "suspensa", "lavatorio", "bancada",
+    "ilha", "tampo", "puxador", "dobradica", "corredica", "mdf", "hidrofugo", "wc", "moradia", "apartamento",
+)
+
+
+def _com_erro(palavra, rng):
+    pos = rng.randrange(len(palavra))
+    operacao = rng.choice(("troca", "apaga", "insere", "transpoe"))
+    if operacao == "troca":
+        return palavra[:pos] + rng.choice("aeiourstnc") + palavra[pos + 1 :]
+    if operacao == "apaga":
+        return palavra[:pos] + palavra[pos + 1 :]
+    if operacao == "insere":
+        return palavra[:pos] + rng.choice("aeiourstnc") + palavra[pos:]
+    if pos + 1 < len(palavra):
+        return palavra[:pos] + palavra[pos + 1] + palavra[pos] + palavra[pos + 2 :]
+    return palavra
+
+
+def _pontuacao_por_blob(blob, termos, cutoff, alternativas):
+    """Referencia: teste termo a termo contra as palavras de um documento."""
+    palavras = set(blob.split())
+    total = 0.0
+    for termo in termos:
+        if termo in blob:
+            total += 1.0
+            continue
+        if any(alternativa in blob for alternativa in alternativas.get(termo, ())):
+            total += 0.95
+            continue
+        if len(termo) < 4:
+            return None
+        proxima = difflib.get_close_matches(termo, palavras, n=1, cutoff=cutoff)
+        if not proxima:
+            return None
+        total += difflib.SequenceMatcher(None, termo, proxima[0]).ratio()
+    return total
+
+
+class IndiceTrigramasTests(unittest.TestCase):
+    def test_shortlist_never_drops_close_words(self):
+        rng = random.Random(42)
+        trigramas = IndiceTrigramas(PALAVRAS)
+        for _ in range(400):
+            termo = _com_erro(rng.choice(PALAVRAS), rng)
+            for cutoff in (0.7, 0.8, 0.82, 0.84, 0.9):
+                self.assertEqual(
+                    trigramas.proximas(termo, cutoff=cutoff),
+                    difflib.get_close_matches(termo, PALAVRAS, n=len(PALAVRAS), cutoff=cutoff),
+                    (termo, cutoff),
+                )
+
+    def test_remove_keeps_words_added_more_than_once(self):
+        trigramas = IndiceTrigramas(["cozinha", "cozinha", "gaveta"])
+        trigramas.remover("cozinha")
+        self.assertEqual(trigramas.proximas("cozihna", cutoff=0.82), ["cozinha"])
+        trigramas.remover("cozinha")
+        self.assertEqual(trigramas.proximas("cozihna", cutoff=0.82), [])
+        self.assertEqual(len(trigramas), 1)
+
+
+class IndiceTextoAproximadoTests(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.indice = IndiceTexto(("a", "b"))
+        self.blobs = {}
+        for doc_id in range(60):
+            a = " ".join(rng.sample(PALAVRAS, 4))
+            b = " ".join(rng.sample(PALAVRAS, 3))
+            self.indice.definir(doc_id, {"a": a, "b": b})
+            self.blobs[doc_id] = f"{a} {b}"
+
+    def _referencia(self, termos, alternativas=None):
+        resultado = {}
+        for doc_id, blob in self.blobs.items():
+            pontuacao = _pontuacao_por_blob(blob, termos, 0.82, alternativas or {})
+            if pontuacao is not None:
+                resultado[doc_id] = pontuacao
+        return resultado
+
+    def test_matches_per_document_scoring(self):
+        alternativas = {"armario": ("roupeiro",)}
+        for termos in (["rouperio"], ["cozihna", "lacdo"], ["armario", "gavtas"], ["wc", "suspensa"], ["xyzw"]):
+            esperado = self._referencia(termos, alternativas)
+            obtido = self.indice.pontuacao_aproximada(termos, cutoff=0.82, alternativas=alternativas)
+            self.assertEqual(sorted(obtido), sorted(esperado), termos)
+            for doc_id, pontuacao in esperado.items():
+                self.assertAlmostEqual(obtido[doc_id], pontuacao, places=9)
+
+    def test_updates_and_removals_refresh_vocabulary(self):
+        self.indice.definir(0, {"a": "escadote", "b": ""})
+        self.assertIn(0, self.indice.pontuacao_aproximada(["escadotte"], cutoff=0.82))
+        self.indice.remover(0)
+        self.assertEqual(self.indice.palavras_proximas("escadotte", cutoff=0.82), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import unittest
 from types import SimpleNamespace
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock
 
 from Martelo_Orcamentos_V2.app.models import (
     CusteioDespBackup,
@@ -17,6 +17,7 @@ from Martelo_Orcamentos_V2.app.models import (
     DadosItemsSistemaCorrer,
     DadosModuloMedidas,
 )
+from Martelo_Orcamentos_V2.app.models.orcamento import OrcamentoItem
 from Martelo_Orcamentos_V2.app.services import orcamentos
 
 
@@ -47,12 +48,22 @@ class OrcamentosDeleteItemTests(unittest.TestCase):
 
         db.execute.side_effect = _execute_side_effect
 
-        with patch.object(orcamentos, "_reindex_items") as reindex_mock:
-            deleted = orcamentos.delete_item(db, 515, deleted_by=9)
+        deleted = orcamentos.delete_item(db, 515, deleted_by=9)
 
         self.assertTrue(deleted)
         db.delete.assert_called_once_with(item)
-        reindex_mock.assert_called_once_with(db, 33, versao="01", updated_by=9)
+        # os restantes items nao sao renumerados (item_ord esparso): so o SELECT dos modelos do
+        # item e DELETEs das tabelas dependentes; a linha do item sai por db.delete
+        consultas = [stmt for stmt in executed if getattr(stmt, "table", None) is None]
+        self.assertEqual(
+            [[tabela.name for tabela in stmt.get_final_froms()] for stmt in consultas],
+            [[DadosItemsModelo.__tablename__]],
+        )
+        self.assertTrue(all(stmt.is_delete for stmt in executed if getattr(stmt, "table", None) is not None))
+        self.assertNotIn(
+            OrcamentoItem.__tablename__,
+            [stmt.table.name for stmt in executed if getattr(stmt, "table", None) is not None],
+        )
 
         delete_tables = [stmt.table.name for stmt in executed if getattr(stmt, "table", None) is not None]
         self.assertEqual(
@@ -0,0 +1,213 @@
+import os
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from sqlalchemy import BigInteger, Integer, create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.custeio import CusteioDespBackup, CusteioItem, CusteioItemDimensoes
+from Martelo_Orcamentos_V2.app.models.custeio_producao import CusteioProducaoConfig, CusteioProducaoValor
+from Martelo_Orcamentos_V2.app.models.dados_gerais import (
+    DadosGeraisMaterial,
+    DadosItemsMaterial,
+    DadosItemsModelo,
+    DadosItemsModeloItem,
+)
+from Martelo_Orcamentos_V2.app.models.item_children import DadosModuloMedidas
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem, OrcamentoPesquisa
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import orcamentos as svc_orcamentos
+
+
+def _contexto(orc, item_id, versao="01"):
+    return dict(
+        orcamento_id=orc.id,
+        item_id=item_id,
+        cliente_id=orc.client_id,
+        ano=orc.ano,
+        num_orcamento=orc.num_orcamento,
+        versao=versao,
+    )
+
+
+class DuplicarOrcamentoTests(unittest.TestCase):
+    def setUp(self):
+        self._orig_types = []
+        for tabela in Base.metadata.sorted_tables:
+            for coluna in tabela.primary_key.columns:
+                if isinstance(coluna.type, BigInteger):
+                    self._orig_types.append((coluna, coluna.type))
+                    coluna.type = Integer()
+        patcher = mock.patch.dict(os.environ, {svc_orcamentos.ENV_INDICE_PESQUISA_DIR: "off"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = create_engine("sqlite://")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.session.close)
+
+        s = self.session
+        s.add(User(id=7, username="paulo", pass_hash="x"))
+        s.add(User(id=8, username="ana", pass_hash="x"))
+        s.add(Client(id=1, nome="MOVEIS J.F. VIVA", nome_simplex="JF_VIVA"))
+        orc = Orcamento(
+            id=10, ano="2026", num_orcamento="260531", versao="01", client_id=1, obra="Moradia", created_by=7
+        )
+        outro = Orcamento(id=11, ano="2026", num_orcamento="260532", versao="01", client_id=1, created_by=7)
+        s.add_all([orc, outro])
+        s.flush()
+        # ids dos items fora de ordem em relacao a item_ord
+        s.add_all(
+            [
+                OrcamentoItem(id_item=105, id_orcamento=10, versao="01", item_ord=1, item="1", descricao="Roupeiro"),
+                OrcamentoItem(id_item=101, id_orcamento=10, versao="01", item_ord=2, item="2", descricao="Sapateira"),
+                OrcamentoItem(id_item=110, id_orcamento=11, versao="01", item_ord=1, item="1", descricao="Cozinha"),
+            ]
+        )
+        s.add(DadosGeraisMaterial(ano="2026", num_orcamento="260531", versao="01", cliente_id=1, descricao="MDF"))
+        for item_id, largura in ((105, 1200), (101, 600), (110, 900)):
+            dono = orc if item_id != 110 else outro
+            s.add(DadosModuloMedidas(id_item_fk=item_id, H=2400, L=largura, P=600))
+            s.add(DadosItemsMaterial(**_contexto(dono, item_id), descricao=f"placa {item_id}", preco_liq=Decimal("12.5")))
+            s.add(CusteioItemDimensoes(**_contexto(dono, item_id), h=2400, l=largura, p=600))
+            for ordem in range(3):
+                custeio = CusteioItem(**_contexto(dono, item_id), ordem=ordem, def_peca=f"LATERAL {item_id}.{ordem}")
+                s.add(custeio)
+                s.flush()
+                if ordem == 1:
+                    s.add(
+                        CusteioDespBackup(
+                            orcamento_id=dono.id, versao="01", custeio_item_id=custeio.id, desp_original=ordem
+                        )
+                    )
+        modelo_item = DadosItemsModelo(orcamento_id=10, item_id=101, nome_modelo="Do item", tipo_menu="materiais")
+        modelo_livre = DadosItemsModelo(orcamento_id=10, item_id=None, nome_modelo="Livre", tipo_menu="ferragens")
+        s.add_all([modelo_item, modelo_livre])
+        s.flush()
+        s.add(DadosItemsModeloItem(modelo_id=modelo_item.id, tipo_menu="materiais", ordem=1, dados="{}"))
+        s.add(DadosItemsModeloItem(modelo_id=modelo_livre.id, tipo_menu="ferragens", ordem=2, dados="[]"))
+        config = CusteioProducaoConfig(
+            orcamento_id=10, cliente_id=1, ano="2026", num_orcamento="260531", versao="01", modo="SERIE"
+        )
+        s.add(config)
+        s.flush()
+        s.add(
+            CusteioProducaoValor(
+                config_id=config.id, descricao_equipamento="ORLADORA", abreviatura="ORL", valor_std=1, valor_serie=2
+            )
+        )
+        s.commit()
+
+    def tearDown(self):
+        for coluna, tipo in self._orig_types:
+            coluna.type = tipo
+
+    def _linhas(self, model, *filters, ignorar=()):
+        ignorar = {"id", "created_at", "updated_at", *ignorar}
+        colunas = [col for col in model.__table__.columns if col.name not in ignorar]
+        stmt = select(*colunas).where(*filters).order_by(*model.__table__.primary_key.columns)
+        return [dict(row._mapping) for row in self.session.execute(stmt)]
+
+    def _remapear(self, linhas, coluna, mapa):
+        return [dict(linha, **{coluna: mapa[linha[coluna]]}) for linha in linhas]
+
+    def test_copies_every_child_table_with_remapped_keys(self):
+        dup = svc_orcamentos.duplicate_orcamento_version(self.session, 10, created_by=8)
+        self.session.commit()
+        self.assertEqual(dup.versao, "02")
+
+        itens = self.session.execute(
+            select(OrcamentoItem).where(OrcamentoItem.id_orcamento == dup.id).order_by(OrcamentoItem.item_ord)
+        ).scalars().all()
+        self.assertEqual([(i.descricao, i.versao, i.created_by) for i in itens], [("Roupeiro", "02", 8), ("Sapateira", "02", 8)])
+        mapa = {105: itens[0].id_item, 101: itens[1].id_item}
+        self.assertTrue(all(novo not in (101, 105, 110) for novo in mapa.values()))
+
+        self.assertEqual(
+            self._linhas(DadosModuloMedidas, DadosModuloMedidas.id_item_fk.in_(list(mapa.values()))),
+            self._remapear(
+                self._linhas(DadosModuloMedidas, DadosModuloMedidas.id_item_fk.in_(list(mapa))), "id_item_fk", mapa
+            ),
+        )
+
+        ignorar = ("orcamento_id", "versao")
+        for model in (DadosItemsMaterial, CusteioItemDimensoes, CusteioItem):
+            self.assertEqual(
+                self._linhas(model, model.orcamento_id == dup.id, ignorar=ignorar),
+                self._remapear(self._linhas(model, model.orcamento_id == 10, ignorar=ignorar), "item_id", mapa),
+                model.__name__,
+            )
+            self.assertEqual(
+                set(self.session.execute(select(model.versao).where(model.orcamento_id == dup.id)).scalars()), {"02"}
+            )
+
+        backups = self.session.execute(
+            select(CusteioItem.def_peca, CusteioDespBackup.versao)
+            .join(CusteioItem, CusteioItem.id == CusteioDespBackup.custeio_item_id)
+            .where(CusteioDespBackup.orcamento_id == dup.id)
+            .order_by(CusteioItem.def_peca)
+        ).all()
+        self.assertEqual(backups, [("LATERAL 101.1", "02"), ("LATERAL 105.1", "02")])
+        self.assertTrue(
+            all(
+                orc_id == dup.id
+                for orc_id in self.session.execute(
+                    select(CusteioItem.orcamento_id)
+                    .join(CusteioDespBackup, CusteioDespBackup.custeio_item_id == CusteioItem.id)
+                    .where(CusteioDespBackup.orcamento_id == dup.id)
+                ).scalars()
+            )
+        )
+
+        modelos = self.session.execute(
+            select(DadosItemsModelo.nome_modelo, DadosItemsModelo.item_id, DadosItemsModeloItem.dados)
+            .join(DadosItemsModeloItem, DadosItemsModeloItem.modelo_id == DadosItemsModelo.id)
+            .where(DadosItemsModelo.orcamento_id == dup.id)
+            .order_by(DadosItemsModelo.nome_modelo)
+        ).all()
+        self.assertEqual(modelos, [("Do item", mapa[101], "{}"), ("Livre", None, "[]")])
+
+        valores = self.session.execute(
+            select(CusteioProducaoConfig.modo, CusteioProducaoConfig.versao, CusteioProducaoValor.abreviatura)
+            .join(CusteioProducaoValor, CusteioProducaoValor.config_id == CusteioProducaoConfig.id)
+            .where(CusteioProducaoConfig.orcamento_id == dup.id)
+        ).all()
+        self.assertEqual(valores, [("SERIE", "02", "ORL")])
+        self.assertEqual(
+            self._linhas(DadosGeraisMaterial, DadosGeraisMaterial.versao == "02", ignorar=("versao",)),
+            self._linhas(DadosGeraisMaterial, DadosGeraisMaterial.versao == "01", ignorar=("versao",)),
+        )
+
+        # o outro orcamento fica intacto e o texto de pesquisa inclui os items copiados
+        self.assertEqual(len(self._linhas(CusteioItem, CusteioItem.orcamento_id == 11)), 3)
+        self.assertIn("sapateira", self.session.get(OrcamentoPesquisa, dup.id).items)
+
+    def test_statement_count_does_not_grow_with_rows(self):
+        contagens = [0]
+
+        def _contar(*_args):
+            contagens[-1] += 1
+
+        event.listen(self.engine, "before_cursor_execute", _contar)
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", _contar)
+        orc = self.session.get(Orcamento, 10)
+        for volta in range(2):
+            contagens.append(0)
+            self.session.expire_all()
+            svc_orcamentos.duplicate_orcamento_version(self.session, 10)
+            self.session.rollback()
+            contagens.append(0)
+            # mais linhas de custeio para a proxima volta
+            for ordem in range(20):
+                self.session.add(CusteioItem(**_contexto(orc, 105), ordem=10 + 20 * volta + ordem))
+            self.session.commit()
+        self.assertEqual(contagens[1], contagens[3])
+        self.assertLess(contagens[1], 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import Integer, create_engine, delete, update
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import orcamentos as svc_orcamentos
+from Martelo_Orcamentos_V2.app.services.indice_texto import IndiceTexto
+
+
+def _ids(rows):
+    return [row.id for row in rows]
+
+
+class OrcamentosIndicePesquisaTests(unittest.TestCase):
+    def setUp(self):
+        colunas = (Orcamento.__table__.c.id, OrcamentoItem.__table__.c.id_item, Client.__table__.c.id)
+        self._orig_types = [(coluna, coluna.type) for coluna in colunas]
+        for coluna in colunas:
+            coluna.type = Integer()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = mock.patch.dict(os.environ, {svc_orcamentos.ENV_INDICE_PESQUISA_DIR: self._tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db_path = os.path.join(self._tmp.name, "orcamentos.db")
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.addCleanup(self.session.close)
+        self.session.add(User(id=7, username="paulo", pass_hash="x"))
+        self.session.add(Client(id=1, nome="MOVEIS J.F. VIVA", nome_simplex="JF_VIVA"))
+        self.session.add(
+            Orcamento(
+                id=10,
+                ano="2026",
+                num_orcamento="260531",
+                versao="01",
+                client_id=1,
+                descricao_orcamento="ROUPEIRO PORTAS ABRIR",
+                created_by=7,
+                preco_total_manual=0,
+            )
+        )
+        self.session.add(
+            OrcamentoItem(id_item=101, id_orcamento=10, versao="01", item_ord=1, item="1", descricao="Sapateira lacada")
+        )
+        self.session.commit()
+
+    def tearDown(self):
+        for coluna, tipo in self._orig_types:
+            coluna.type = tipo
+
+    def test_service_writes_update_the_index(self):
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "sapateira")), [10])
+
+        novo = svc_orcamentos.create_orcamento(
+            self.session, ano="2026", num_orcamento="260600", client_id=1, created_by=7
+        )
+        item = svc_orcamentos.create_item(self.session, novo.id, "01", descricao="Estante TV suspensa")
+        self.session.commit()
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "estante suspensa")), [novo.id])
+
+        svc_orcamentos.update_item(self.session, item.id_item, descricao="Movel WC lavatorio")
+        self.session.commit()
+        self.assertEqual(svc_orcamentos.search_orcamentos(self.session, "suspensa", approx=False), [])
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "lavatorio")), [novo.id])
+
+        svc_orcamentos.delete_item(self.session, item.id_item)
+        self.session.commit()
+        self.assertEqual(svc_orcamentos.search_orcamentos(self.session, "lavatorio", approx=False), [])
+
+        svc_orcamentos.delete_orcamento(self.session, novo.id)
+        self.session.commit()
+        self.assertEqual(sorted(svc_orcamentos.indice_pesquisa_orcamentos(self.session).documentos), [10])
+
+    def test_changes_from_other_sessions_are_picked_up(self):
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "viva")), [10])
+
+        outro = self.Session()
+        self.addCleanup(outro.close)
+        outro.get(Client, 1).nome = "CARPINTARIA ALVES"
+        outro.add(Orcamento(id=11, ano="2026", num_orcamento="260601", versao="01", client_id=1, obra="Moradia Alves"))
+        outro.commit()
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "carpintaria")), [11, 10])
+
+        outro.execute(delete(OrcamentoItem).where(OrcamentoItem.id_item == 101))
+        outro.execute(delete(Orcamento).where(Orcamento.id == 11))
+        outro.commit()
+        self.assertEqual(svc_orcamentos.search_orcamentos(self.session, "sapateira", approx=False), [])
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "carpintaria")), [10])
+
+    def test_rows_committed_with_an_older_updated_at_are_picked_up(self):
+        recente = datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(minutes=5)
+        for modelo in (Orcamento, OrcamentoItem, Client):
+            self.session.execute(update(modelo).values(updated_at=recente))
+        self.session.commit()
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "sapateira")), [10])
+
+        # transacao longa noutro posto (outro engine): updated_at ficou minutos antes do commit
+        engine = create_engine(f"sqlite:///{self.db_path}")
+        self.addCleanup(engine.dispose)
+        outro = sessionmaker(bind=engine)()
+        self.addCleanup(outro.close)
+        item = outro.get(OrcamentoItem, 101)
+        item.descricao = "Estante TV suspensa"
+        item.updated_at = recente - datetime.timedelta(minutes=3)
+        outro.commit()
+
+        self.assertEqual(_ids(svc_orcamentos.search_orcamentos(self.session, "suspensa")), [10])
+
+    def test_old_index_is_rebuilt(self):
+        indice = svc_orcamentos.indice_pesquisa_orcamentos(self.session)
+        construido_em = datetime.datetime.fromisoformat(indice.estado["construido_em"])
+        indice.estado["construido_em"] = (construido_em - datetime.timedelta(days=2)).isoformat()
+
+        with mock.patch.object(
+            svc_orcamentos, "_reindexar_orcamentos", wraps=svc_orcamentos._reindexar_orcamentos
+        ) as reindexar:
+            svc_orcamentos.indice_pesquisa_orcamentos(self.session)
+            svc_orcamentos.indice_pesquisa_orcamentos(self.session)
+
+        pedidos = [chamada.args[2] for chamada in reindexar.call_args_list]
+        self.assertIsNone(pedidos[0])
+        self.assertEqual(pedidos.count(None), 1)
+
+    def test_index_is_persisted_and_reused(self):
+        svc_orcamentos.search_orcamentos(self.session, "roupeiro")
+        indice = svc_orcamentos.indice_pesquisa_orcamentos(self.session)
+        indice.guardar()
+        self.assertIsNotNone(indice.caminho)
+
+        guardado = IndiceTexto.carregar(indice.caminho, indice.campos)
+        self.assertIsNotNone(guardado)
+        self.assertEqual(guardado.documentos, indice.documentos)
+        self.assertTrue(guardado.estado.get("construido"))
+
+        # novo processo (novo engine): o indice vem do disco e a pesquisa nao volta a indexar tudo
+        engine = create_engine(f"sqlite:///{self.db_path}")
+        self.addCleanup(engine.dispose)
+        session = sessionmaker(bind=engine)()
+        self.addCleanup(session.close)
+
+        with mock.patch.object(
+            svc_orcamentos, "_reindexar_orcamentos", wraps=svc_orcamentos._reindexar_orcamentos
+        ) as reindexar:
+            rows = svc_orcamentos.search_orcamentos(session, "rouperio")
+
+        self.assertEqual(_ids(rows), [10])
+        self.assertIn("aproximacao", rows[0].search_reason)
+        self.assertNotIn(None, [chamada.args[2] for chamada in reindexar.call_args_list])
+
+
+if __name__ == "__main__":
+    unittest.main()
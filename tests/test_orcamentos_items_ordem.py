@@ -0,0 +1,125 @@
+import os
+import unittest
+from unittest import mock
+
+from sqlalchemy import Integer, create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import orcamentos as svc_orcamentos
+
+
+class ItemsOrdemEsparsaTests(unittest.TestCase):
+    def setUp(self):
+        colunas = (Orcamento.__table__.c.id, OrcamentoItem.__table__.c.id_item, Client.__table__.c.id)
+        self._orig_types = [(coluna, coluna.type) for coluna in colunas]
+        for coluna in colunas:
+            coluna.type = Integer()
+        patcher = mock.patch.dict(os.environ, {svc_orcamentos.ENV_INDICE_PESQUISA_DIR: "off"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = create_engine("sqlite://")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.session.close)
+        self.session.add(User(id=7, username="paulo", pass_hash="x"))
+        self.session.add(Client(id=1, nome="MOVEIS J.F. VIVA", nome_simplex="JF_VIVA"))
+        self.session.add(Orcamento(id=10, ano="2026", num_orcamento="260531", versao="01", client_id=1))
+        self.session.commit()
+        self.ids = [
+            svc_orcamentos.create_item(self.session, 10, "01", descricao=f"Item {pos}").id_item for pos in range(1, 6)
+        ]
+        self.session.commit()
+
+    def tearDown(self):
+        for coluna, tipo in self._orig_types:
+            coluna.type = tipo
+
+    def _ordem(self):
+        self.session.expire_all()
+        return [(row.id_item, row.numero_visivel) for row in svc_orcamentos.list_items(self.session, 10, "01")]
+
+    def _updates(self, operacao):
+        updates = []
+
+        def _contar(_conn, _cursor, statement, *_args):
+            if statement.lstrip().upper().startswith("UPDATE"):
+                updates.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", _contar)
+        try:
+            resultado = operacao()
+            self.session.commit()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", _contar)
+        return resultado, updates
+
+    def test_new_items_are_numbered_in_sequence(self):
+        self.assertEqual(self._ordem(), [(item_id, str(pos)) for pos, item_id in enumerate(self.ids, start=1)])
+        item = self.session.get(OrcamentoItem, self.ids[3])
+        self.assertEqual(svc_orcamentos.numero_item(self.session, item), 4)
+
+    def test_move_writes_only_the_moved_row(self):
+        a, b, c, d, e = self.ids
+        movido, updates = self._updates(lambda: svc_orcamentos.move_item(self.session, c, -1, moved_by=7))
+        self.assertTrue(movido)
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._ordem(), [(a, "1"), (c, "2"), (b, "3"), (d, "4"), (e, "5")])
+
+        for _ in range(3):
+            svc_orcamentos.move_item(self.session, a, +1)
+        self.session.commit()
+        self.assertEqual([item_id for item_id, _ in self._ordem()], [c, b, d, a, e])
+        self.assertFalse(svc_orcamentos.move_item(self.session, c, -1))
+        self.assertFalse(svc_orcamentos.move_item(self.session, e, +1))
+
+    def test_delete_keeps_other_rows_untouched(self):
+        a, b, c, d, e = self.ids
+        _, updates = self._updates(lambda: svc_orcamentos.delete_item(self.session, b))
+        self.assertEqual(updates, [])
+        self.assertEqual(self._ordem(), [(a, "1"), (c, "2"), (d, "3"), (e, "4")])
+        novo = svc_orcamentos.create_item(self.session, 10, "01", descricao="Novo")
+        self.assertEqual(novo.item, "5")
+
+    def test_user_labels_survive_numbering(self):
+        a, b, c, d, e = self.ids
+        svc_orcamentos.update_item(self.session, c, item="Cozinha A")
+        self.session.commit()
+        svc_orcamentos.delete_item(self.session, a)
+        self.session.commit()
+
+        self.assertEqual(self._ordem(), [(b, "1"), (c, "Cozinha A"), (d, "3"), (e, "4")])
+        # a coluna gravada nao e substituida pela numeracao
+        self.assertEqual(self.session.get(OrcamentoItem, d).item, "4")
+        self.assertNotIn(d, [obj.id_item for obj in self.session.dirty])
+        texto_items = svc_orcamentos._calcular_pesquisa_orcamentos(self.session, [10])[10]["items"]
+        self.assertIn("cozinha a", texto_items)
+        self.assertNotIn("4 item 4", texto_items)  # o "4" gravado ja nao e a posicao do item
+
+    def test_rebalances_when_there_is_no_gap_left(self):
+        # ordem contigua (1..N) como nas versoes antigas
+        for pos, item_id in enumerate(self.ids, start=1):
+            self.session.get(OrcamentoItem, item_id).item_ord = pos
+        self.session.commit()
+        a, b, c, d, e = self.ids
+        self.assertTrue(svc_orcamentos.move_item(self.session, d, -1))
+        self.session.commit()
+        self.assertEqual([item_id for item_id, _ in self._ordem()], [a, b, d, c, e])
+        ordens = [self.session.get(OrcamentoItem, item_id).item_ord for item_id in (a, b, d, c, e)]
+        self.assertEqual(ordens, sorted(ordens))
+        self.assertGreaterEqual(min(depois - antes for antes, depois in zip(ordens, ordens[1:])), 2)
+
+        # muitos movimentos seguidos no mesmo intervalo continuam a ordenar corretamente
+        for _ in range(40):
+            self.assertTrue(svc_orcamentos.move_item(self.session, c, -1))
+            self.assertTrue(svc_orcamentos.move_item(self.session, d, -1))
+        self.session.commit()
+        self.assertEqual([item_id for item_id, _ in self._ordem()], [a, b, d, c, e])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.cliente_temporario import ClienteTemporario
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services.orcamentos import (
+    count_orcamentos,
+    list_orcamento_filter_values,
+    list_orcamentos,
+    list_orcamentos_pagina,
+)
+from Martelo_Orcamentos_V2.ui.pages.orcamentos_support import collect_orcamento_filter_values, filter_orcamento_rows
+
+
+TABLES = [
+    User.__table__,
+    Client.__table__,
+    ClienteTemporario.__table__,
+    Orcamento.__table__,
+    OrcamentoItem.__table__,
+]
+
+
+class OrcamentosPaginacaoTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine, tables=TABLES)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add(User(id=7, username="paulo", pass_hash="x"))
+        self.session.add(Client(id=1, nome="MOVEIS J.F. VIVA", nome_simplex="JF_VIVA"))
+        orc_id = 1
+        for ano in ("2025", "2026"):
+            for num in range(5):
+                # versoes antigas gravadas sem zero a esquerda ("1") misturadas com "02"
+                for versao in (("1", "02") if num % 2 else ("01",)):
+                    self.session.add(
+                        Orcamento(
+                            id=orc_id,
+                            ano=ano,
+                            num_orcamento=f"{ano[2:]}{num:04d}",
+                            versao=versao,
+                            client_id=1,
+                            created_by=7,
+                            preco_total_manual=0,
+                        )
+                    )
+                    orc_id += 1
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def _todas_as_paginas(self, limite):
+        ids = []
+        depois_de = None
+        paginas = 0
+        while True:
+            pagina = list_orcamentos_pagina(self.session, depois_de=depois_de, limite=limite)
+            paginas += 1
+            self.assertLessEqual(len(pagina.rows), limite)
+            ids.extend(row.id for row in pagina.rows)
+            if pagina.seguinte is None:
+                return ids, paginas
+            depois_de = pagina.seguinte
+
+    def test_pages_follow_list_order_without_gaps(self):
+        esperado = [row.id for row in list_orcamentos(self.session)]
+        self.assertEqual(count_orcamentos(self.session), len(esperado))
+        for limite in (1, 3, 7, len(esperado), len(esperado) + 5):
+            ids, paginas = self._todas_as_paginas(limite)
+            self.assertEqual(ids, esperado, limite)
+            self.assertEqual(paginas, max(1, -(-len(esperado) // limite)), limite)
+
+    def test_cursor_uses_stored_versao(self):
+        pagina = list_orcamentos_pagina(self.session, limite=2)
+        self.assertEqual([row.versao for row in pagina.rows], ["01", "02"])
+        self.assertEqual(pagina.seguinte, ("2026", "260003", "02"))
+        pagina = list_orcamentos_pagina(self.session, depois_de=pagina.seguinte, limite=1)
+        self.assertEqual(pagina.rows[0].versao, "01")
+        self.assertEqual(pagina.seguinte, ("2026", "260003", "1"))
+
+
+    def _extra_orcamentos(self):
+        self.session.add(User(id=8, username="ana", pass_hash="x"))
+        self.session.add(Client(id=2, nome="CARPINTARIA ANTIGA", nome_simplex=""))
+        self.session.add(ClienteTemporario(id=5, nome="Cliente Temp", nome_simplex="CLIENTE_TEMP"))
+        self.session.add_all(
+            [
+                Orcamento(id=100, ano="2019", num_orcamento="190001", versao="01", client_id=2, created_by=8, status="Adjudicado"),
+                Orcamento(
+                    id=101,
+                    ano="2019",
+                    num_orcamento="190002",
+                    versao="01",
+                    client_id=1,
+                    status="Enviado",
+                    extras={"temp_client_id": 5, "temp_client_nome": "Cliente Temp"},
+                ),
+            ]
+        )
+        self.session.commit()
+
+    def test_filter_values_cover_orcamentos_outside_the_first_page(self):
+        self._extra_orcamentos()
+
+        primeira = list_orcamentos_pagina(self.session, limite=3).rows
+        self.assertNotIn("CARPINTARIA ANTIGA", {row.cliente for row in primeira})
+        estados, clientes, users = list_orcamento_filter_values(self.session)
+        self.assertEqual(clientes, ["CARPINTARIA ANTIGA", "CLIENTE_TEMP", "JF_VIVA"])
+        self.assertEqual(estados, ["Adjudicado", "Enviado"])
+        self.assertEqual(users, ["ana", "paulo"])
+        self.assertEqual((estados, clientes, users), collect_orcamento_filter_values(list_orcamentos(self.session)))
+
+    def test_filters_are_applied_in_the_query(self):
+        self._extra_orcamentos()
+        todos = list_orcamentos(self.session)
+        casos = [
+            {"estado": "adjud"},
+            {"utilizador": "ANA"},
+            {"cliente": "carpintaria"},
+            {"cliente": "cliente_temp"},
+            {"cliente": "viva"},
+            {"cliente": "temp", "estado": "enviado"},
+            {"estado": "Todos"},
+        ]
+        for filtros in casos:
+            argumentos = {
+                "estado_filter": filtros.get("estado", ""),
+                "cliente_filter": filtros.get("cliente", ""),
+                "user_filter": filtros.get("utilizador", ""),
+            }
+            pagina = list_orcamentos_pagina(self.session, limite=len(todos), **filtros)
+            esperado = [row.id for row in filter_orcamento_rows(todos, **argumentos)]
+            # o WHERE pode aceitar a mais (o cliente temporario substitui o cliente), nunca a menos
+            self.assertLessEqual(set(esperado), {row.id for row in pagina.rows}, filtros)
+            self.assertEqual([row.id for row in filter_orcamento_rows(pagina.rows, **argumentos)], esperado, filtros)
+
+        self.assertEqual([row.id for row in list_orcamentos_pagina(self.session, estado="adjud").rows], [100])
+        self.assertEqual([row.id for row in list_orcamentos_pagina(self.session, cliente="carpint").rows], [100])
+        self.assertEqual([row.id for row in list_orcamentos_pagina(self.session, cliente="cliente temp").rows], [101])
+        self.assertEqual(list_orcamentos_pagina(self.session, cliente="sem correspondencia").rows, [])
+
+if __name__ == "__main__":
+    unittest.main()
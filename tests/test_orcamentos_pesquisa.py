@@ -0,0 +1,164 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import Integer, create_engine, delete, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.client import Client
+from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento, OrcamentoItem, OrcamentoPesquisa
+from Martelo_Orcamentos_V2.app.models.user import User
+from Martelo_Orcamentos_V2.app.services import orcamentos as svc_orcamentos
+
+
+class OrcamentoPesquisaTests(unittest.TestCase):
+    def setUp(self):
+        colunas = (Orcamento.__table__.c.id, OrcamentoItem.__table__.c.id_item, Client.__table__.c.id)
+        self._orig_types = [(coluna, coluna.type) for coluna in colunas]
+        for coluna in colunas:
+            coluna.type = Integer()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = mock.patch.dict(os.environ, {svc_orcamentos.ENV_INDICE_PESQUISA_DIR: "off"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = create_engine(f"sqlite:///{os.path.join(self._tmp.name, 'orcamentos.db')}")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.addCleanup(self.session.close)
+        self.session.add(User(id=7, username="paulo", pass_hash="x"))
+        self.session.add(Client(id=1, nome="MOVEIS J.F. VIVA", nome_simplex="JF_VIVA"))
+        self.session.add(
+            Orcamento(
+                id=10,
+                ano="2026",
+                num_orcamento="260531",
+                versao="01",
+                client_id=1,
+                obra="Moradia Guimarães",
+                descricao_orcamento="ROUPEIRO PORTAS ABRIR",
+                created_by=7,
+                preco_total_manual=0,
+            )
+        )
+        self.session.add(
+            OrcamentoItem(id_item=101, id_orcamento=10, versao="01", item_ord=1, item="1", descricao="Sapateira lacada")
+        )
+        self.session.commit()
+
+    def tearDown(self):
+        for coluna, tipo in self._orig_types:
+            coluna.type = tipo
+
+    def _pesquisa(self, orc_id):
+        self.session.expire_all()
+        return self.session.get(OrcamentoPesquisa, orc_id)
+
+    def test_orm_writes_keep_search_text_current(self):
+        linha = self._pesquisa(10)
+        self.assertIsNotNone(linha)
+        self.assertIn("moradia guimaraes", linha.obra)
+        self.assertIn("sapateira lacada", linha.items)
+        self.assertIn("jf viva", linha.texto)
+        self.assertEqual(linha.n_items, 1)
+
+        self.session.get(OrcamentoItem, 101).descricao = "Estante TV"
+        self.session.commit()
+        linha = self._pesquisa(10)
+        self.assertIn("estante tv", linha.items)
+        self.assertNotIn("sapateira", linha.items)
+
+        self.session.get(Client, 1).nome = "CARPINTARIA ALVES"
+        self.session.commit()
+        self.assertIn("carpintaria alves", self._pesquisa(10).texto)
+
+        self.session.delete(self.session.get(OrcamentoItem, 101))
+        self.session.delete(self.session.get(Orcamento, 10))
+        self.session.commit()
+        self.assertIsNone(self._pesquisa(10))
+
+    def test_cost_only_changes_do_not_recompute(self):
+        with mock.patch.object(
+            svc_orcamentos, "atualizar_pesquisa_orcamentos", wraps=svc_orcamentos.atualizar_pesquisa_orcamentos
+        ) as atualizar:
+            item = self.session.get(OrcamentoItem, 101)
+            item.custo_produzido = 123
+            item.preco_unitario = 150
+            self.session.commit()
+            atualizar.assert_not_called()
+
+            self.session.get(Orcamento, 10).obra = "Apartamento Braga"
+            self.session.commit()
+            atualizar.assert_called_once()
+        self.assertIn("apartamento braga", self._pesquisa(10).obra)
+
+    def test_search_refresh_failure_keeps_the_save(self):
+        def _falha(session, orc_ids):
+            session.execute(delete(OrcamentoPesquisa))
+            raise OperationalError("UPDATE orcamento_pesquisa", {}, Exception("lock wait timeout"))
+
+        with mock.patch.object(svc_orcamentos, "atualizar_pesquisa_orcamentos", side_effect=_falha):
+            self.session.get(Orcamento, 10).obra = "Apartamento Braga"
+            with self.assertLogs(svc_orcamentos.logger, "WARNING"):
+                self.session.commit()
+
+        self.session.expire_all()
+        self.assertEqual(self.session.get(Orcamento, 10).obra, "Apartamento Braga")
+        self.assertIn("moradia guimaraes", self._pesquisa(10).obra)
+
+    def test_rollback_discards_pending_changes(self):
+        self.session.get(Orcamento, 10).obra = "Apartamento Braga"
+        self.session.flush()
+        self.session.rollback()
+        self.session.commit()
+        self.assertIn("moradia guimaraes", self._pesquisa(10).obra)
+
+    def test_index_is_built_from_stored_text(self):
+        with mock.patch.object(
+            svc_orcamentos, "_calcular_pesquisa_orcamentos", wraps=svc_orcamentos._calcular_pesquisa_orcamentos
+        ) as calcular:
+            indice = svc_orcamentos.reconstruir_indice_pesquisa(self.session)
+            calcular.assert_not_called()
+        self.assertIn("sapateira", indice.texto(10, "items"))
+        self.assertEqual([row.id for row in svc_orcamentos.search_orcamentos(self.session, "sapateira")], [10])
+
+    def test_ranking_with_stored_sections_matches_computed(self):
+        self.session.add(
+            Orcamento(id=11, ano="2026", num_orcamento="260532", versao="01", client_id=1, obra="Roupeiro quarto")
+        )
+        self.session.commit()
+        stmt = svc_orcamentos._select_orcamentos().order_by(Orcamento.id)
+        stored = {
+            orc_id: {chave: valores[chave] for chave, _, _ in svc_orcamentos._SECOES_PESQUISA}
+            for orc_id, valores in svc_orcamentos._pesquisa_guardada(self.session).items()
+        }
+        self.assertEqual(sorted(stored), [10, 11])
+
+        for consulta in ("roupeiro", "sapateira viva", "rouperio", "2026 roupeiro"):
+            calculado = svc_orcamentos._rank_orcamento_rows(
+                self.session, svc_orcamentos._rows_from_stmt(self.session, stmt), consulta
+            )
+            guardado = svc_orcamentos._rank_orcamento_rows(
+                self.session, svc_orcamentos._rows_from_stmt(self.session, stmt), consulta, secoes=stored
+            )
+            self.assertEqual(
+                [(row.id, row.search_score, row.search_reason) for row in calculado],
+                [(row.id, row.search_score, row.search_reason) for row in guardado],
+                consulta,
+            )
+
+    def test_backfill_fills_missing_rows(self):
+        self.session.execute(OrcamentoPesquisa.__table__.delete())
+        self.session.commit()
+        self.assertEqual(svc_orcamentos.atualizar_pesquisa_orcamentos(self.session), 1)
+        self.session.commit()
+        self.assertEqual(self.session.execute(select(OrcamentoPesquisa.id_orcamento)).scalars().all(), [10])
+
+
+if __name__ == "__main__":
+    unittest.main()
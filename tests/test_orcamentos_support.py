@@ -3,6 +3,7 @@ from types import SimpleNamespace
 
 from Martelo_Orcamentos_V2.ui.pages.orcamentos_support import (
     ClienteComboItem,
+    OrcamentosPaginados,
     build_auto_refresh_state,
     build_cliente_change_plan,
     build_focus_request,
@@ -113,6 +114,38 @@ class OrcamentosSupportTests(unittest.TestCase):
         self.assertEqual(state.new_count, 1)
         self.assertEqual(len(state.table_state.rows), 2)
 
+    def test_build_auto_refresh_state_uses_total_when_rows_are_partial(self):
+        rows = [SimpleNamespace(estado="Enviado", cliente="ACME", utilizador="Paulo")]
+        state = build_auto_refresh_state(
+            rows,
+            last_row_count=40,
+            estado_filter="",
+            cliente_filter="",
+            user_filter="",
+            total_rows=42,
+        )
+        self.assertEqual(state.current_row_count, 42)
+        self.assertEqual(state.new_count, 2)
+        self.assertEqual(len(state.table_state.rows), 1)
+
+    def test_orcamentos_paginados_filters_each_page_until_enough_rows(self):
+        todos = [SimpleNamespace(id=i, estado="Adjudicado" if i % 5 == 0 else "Enviado", cliente="", utilizador="") for i in range(12)]
+        pedidos = []
+
+        def carregar(depois_de, limite):
+            pedidos.append(depois_de)
+            inicio = 0 if depois_de is None else depois_de[0]
+            fim = inicio + limite
+            return SimpleNamespace(rows=todos[inicio:fim], seguinte=(fim,) if fim < len(todos) else None)
+
+        paginador = OrcamentosPaginados(carregar, estado_filter="adjud", por_pagina=3)
+        self.assertEqual([row.id for row in paginador.proxima()], [0])
+        self.assertEqual([row.id for row in paginador.proxima()], [5])
+        self.assertEqual([row.id for row in paginador.proxima()], [10])
+        self.assertTrue(paginador.esgotado)
+        self.assertEqual(paginador.proxima(), [])
+        self.assertEqual(pedidos, [None, (3,), (6,), (9,)])
+
     def test_build_focus_request_normalizes_id_and_flag(self):
         request = build_focus_request("15", open_items=True)
         self.assertIsNotNone(request)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from Martelo_Orcamentos_V2.app.db import Base
+from Martelo_Orcamentos_V2.app.models.materia_prima import MateriaPrima
+from Martelo_Orcamentos_V2.app.services import custeio_items
+
+
+class OrlaPrefetchTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        for pos in range(12):
+            ref_le = f"ORL{pos:02d}"
+            self.session.add(
+                MateriaPrima(
+                    id_mp=ref_le,
+                    ref_le=ref_le,
+                    descricao_orcamento=f"ORLA {ref_le} Carvalho",
+                    pliq=Decimal(str(1 + pos)),
+                    und="ML" if pos % 2 else "M2",
+                    desp=Decimal("10"),
+                    familia="ORLAS",
+                    esp_mp=Decimal("1.0"),
+                )
+            )
+        self.session.commit()
+        self.statements: list[str] = []
+        event.listen(self.engine, "before_cursor_execute", self._capture)
+
+    def tearDown(self) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._capture)
+        self.session.close()
+        self.engine.dispose()
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+        self.statements.append(statement)
+
+    def test_prefetched_details_match_individual_lookups(self) -> None:
+        refs = ["ORL00", "ORL03", "orla orl05 carvalho", "ORLA ORL07 CARVALHO", "orl09", "INEXISTENTE"]
+        esperado = [custeio_items._obter_detalhes_orla_por_ref(self.session, ref) for ref in refs]
+
+        materiais = custeio_items.MateriaisOrla(self.session, refs)
+        self.statements.clear()
+        obtido = [custeio_items._obter_detalhes_orla_por_ref(self.session, ref, materiais=materiais) for ref in refs]
+
+        self.assertEqual(obtido, esperado)
+        # Apenas as refs sem correspondencia exata voltam a consultar a base de dados.
+        self.assertEqual(len(self.statements), 2 * 2)
+
+    def test_filling_many_lines_uses_a_single_query(self) -> None:
+        linhas = [
+            {"orl_0_4": f"ORL{pos:02d}", "orl_1_0": f"ORL{pos + 1:02d}", "orl_c1": 0.4, "orl_l1": 1.0}
+            for pos in range(0, 10, 2)
+        ]
+        esperado = [dict(linha) for linha in linhas]
+        for linha in esperado:
+            custeio_items.preencher_info_orlas_linha(self.session, linha, {})
+
+        self.statements.clear()
+        materiais = custeio_items.carregar_materiais_orla(self.session, linhas)
+        for linha in linhas:
+            custeio_items.preencher_info_orlas_linha(self.session, linha, {}, materiais)
+
+        self.assertEqual(linhas, esperado)
+        self.assertEqual(len(self.statements), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -433,6 +433,162 @@ class ProducaoPreparacaoTests(unittest.TestCase):
             self.assertTrue(output_path.is_dir())
             self.assertTrue((output_path / "M1" / "p1.mpr").is_file())
 
+    def test_snapshot_tree_counts_nested_files_and_reuses_unchanged_trees(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = Path(tmp) / "PROC"
+            (folder / "M1" / "M2").mkdir(parents=True)
+            for index, path in enumerate((folder / "a.mpr", folder / "M1" / "b.mpr", folder / "M1" / "M2" / "c.mpr")):
+                path.write_text("x", encoding="utf-8")
+                os.utime(path, (1_700_000_000 + index, 1_700_000_000 + index))
+
+            snapshot = producao_preparacao._snapshot_tree(folder)
+            self.assertEqual(snapshot, producao_preparacao.FolderSnapshot(file_count=3, latest_mtime=1_700_000_002))
+
+            with patch.object(producao_preparacao.os, "scandir", side_effect=AssertionError("listou de novo")):
+                self.assertEqual(producao_preparacao._snapshot_tree(folder), snapshot)
+
+            (folder / "M1" / "M2" / "d.mpr").write_text("x", encoding="utf-8")
+            os.utime(folder / "M1" / "M2", (1_800_000_000, 1_800_000_000))
+            self.assertEqual(producao_preparacao._snapshot_tree(folder).file_count, 4)
+
+            stop = producao_preparacao.threading.Event()
+            stop.set()
+            self.assertIsNone(producao_preparacao._snapshot_tree(Path(tmp) / "OUTRA", stop=stop))
+            self.assertIsNone(producao_preparacao._snapshot_tree(Path(tmp) / "nao_existe"))
+
+    def test_cnc_statuses_skip_mpr_walk_when_year_folder_is_missing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            source_folder = base / "cnc_root" / "PROC"
+            source_folder.mkdir(parents=True)
+            (source_folder / "a.mpr").write_text("x", encoding="utf-8")
+            work_folder = base / "obra"
+            work_folder.mkdir()
+            context = producao_preparacao.ProducaoPreparacaoContext(
+                processo=SimpleNamespace(id=1),
+                work_folder=work_folder,
+                nome_enc_imos="PROC",
+                nome_plano_cut_rite="PROC_PLANO",
+                cnc_source_root=base / "cnc_root",
+                cnc_source_folder=source_folder,
+                work_programs_folder=work_folder / "PROC",
+                mpr_root=base / "mpr_root",
+                mpr_year_folder=base / "mpr_root" / "2026_MPR",
+                mpr_programs_folder=base / "mpr_root" / "2026_MPR" / "PROC",
+                conj_pdf_path=work_folder / producao_preparacao.CONJ_PDF_FILENAME,
+                projeto_pdf_path=work_folder / producao_preparacao.PROJETO_PRODUCAO_PDF_FILENAME,
+            )
+
+            walked = []
+            original = producao_preparacao._snapshot_tree
+
+            def _snapshot(folder, **kwargs):
+                walked.append(folder)
+                return original(folder, **kwargs)
+
+            with patch.object(producao_preparacao, "_snapshot_tree", side_effect=_snapshot):
+                statuses = {status.key: status for status in producao_preparacao._build_cnc_statuses(context, set())}
+            self.assertNotIn(context.mpr_programs_folder, walked)
+            self.assertEqual(statuses["cnc_work"].state, producao_preparacao.STATUS_MISSING)
+            self.assertEqual(statuses["mpr_sent"].state, producao_preparacao.STATUS_BLOCKED)
+
+            producao_preparacao.copy_programas_para_obra(context)
+            statuses = {status.key: status for status in producao_preparacao._build_cnc_statuses(context, set())}
+            self.assertEqual(statuses["cnc_work"].state, producao_preparacao.STATUS_OK)
+
+    def _context_for(self, base: Path):
+        work_folder = base / "obra"
+        work_folder.mkdir(exist_ok=True)
+        return producao_preparacao.ProducaoPreparacaoContext(
+            processo=SimpleNamespace(id=1),
+            work_folder=work_folder,
+            nome_enc_imos="PROC",
+            nome_plano_cut_rite="PROC_PLANO",
+            cnc_source_root=base / "cnc_root",
+            cnc_source_folder=base / "cnc_root" / "PROC",
+            work_programs_folder=work_folder / "PROC",
+            mpr_root=base / "mpr_root",
+            mpr_year_folder=base / "mpr_root" / "2026_MPR",
+            mpr_programs_folder=base / "mpr_root" / "2026_MPR" / "PROC",
+            conj_pdf_path=work_folder / producao_preparacao.CONJ_PDF_FILENAME,
+            projeto_pdf_path=work_folder / producao_preparacao.PROJETO_PRODUCAO_PDF_FILENAME,
+            cutrite_export_root=base / "cutrite_exports",
+        )
+
+    def test_collect_preparacao_statuses_lists_work_folder_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            context = self._context_for(Path(tmp))
+            for name in ("1_List_Ferragens.xlsx", "1_List_FerragensA4.pdf", "3_Resumo_Geral_Encomenda.pdf", "CONJ.pdf"):
+                (context.work_folder / name).write_text("x", encoding="utf-8")
+            os.utime(context.work_folder / "1_List_Ferragens.xlsx", (1_800_000_000, 1_800_000_000))
+
+            listed = []
+            original = os.scandir
+
+            def _scandir(path):
+                listed.append(os.path.normcase(os.path.abspath(str(path))))
+                return original(path)
+
+            with patch.object(producao_preparacao.os, "scandir", side_effect=_scandir):
+                statuses = producao_preparacao.collect_preparacao_statuses(
+                    context,
+                    required_keys={"ferragens_a4_pdf", "resumo_geral_pdf", "etiqueta_palete_pdf", "conj_pdf", "projeto_pdf"},
+                )
+
+        self.assertEqual(listed.count(os.path.normcase(os.path.abspath(str(context.work_folder)))), 1)
+        states = {status.key: status.state for status in statuses}
+        self.assertEqual(states["ferragens_a4_pdf"], producao_preparacao.STATUS_OUTDATED)
+        self.assertEqual(states["resumo_geral_pdf"], producao_preparacao.STATUS_OK)
+        self.assertEqual(states["etiqueta_palete_pdf"], producao_preparacao.STATUS_MISSING)
+        self.assertEqual(states["conj_pdf"], producao_preparacao.STATUS_OK)
+        self.assertEqual(states["projeto_pdf"], producao_preparacao.STATUS_MISSING)
+
+    def test_collect_preparacao_statuses_keeps_order_and_times_out_slow_checks(self):
+        release = producao_preparacao.threading.Event()
+        self.addCleanup(release.set)
+        original = producao_preparacao._build_file_status
+
+        def _build(context, spec, is_required, cache=None):
+            if spec.key == "resumo_geral_pdf":
+                release.wait(10)
+            return original(context, spec, is_required, cache)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            context = self._context_for(Path(tmp))
+            required = set(producao_preparacao.CONFIGURABLE_FILE_KEYS) - {"caderno_encargos"}
+            required |= set(producao_preparacao.ALWAYS_REQUIRED_KEYS)
+            with patch.object(producao_preparacao, "_build_file_status", side_effect=_build):
+                statuses = producao_preparacao.collect_preparacao_statuses(context, required_keys=required, timeout_s=0.3)
+            release.set()
+
+        expected = [key for key in producao_preparacao.CONFIGURABLE_FILE_KEYS if key in required]
+        expected += list(producao_preparacao.ALWAYS_REQUIRED_KEYS) + ["obra_pronta"]
+        self.assertEqual([status.key for status in statuses], expected)
+        slow = next(status for status in statuses if status.key == "resumo_geral_pdf")
+        self.assertEqual(slow.state, producao_preparacao.STATUS_BLOCKED)
+        self.assertIn("Sem resposta", slow.detail)
+        self.assertEqual(statuses[-1].state, producao_preparacao.STATUS_BLOCKED)
+
+    def test_collect_preparacao_statuses_prepares_caderno_outside_daemon_checks(self):
+        threads = {}
+        original = producao_preparacao._build_file_status
+
+        def _build(context, spec, is_required, cache=None):
+            threads[spec.key] = producao_preparacao.threading.current_thread()
+            if spec.key == "caderno_encargos":
+                return producao_preparacao._timeout_status(spec.key, spec.label, 0, required=True, configurable=True)
+            return original(context, spec, is_required, cache)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            context = self._context_for(Path(tmp))
+            required = {"caderno_encargos", "resumo_geral_pdf", "conj_pdf"}
+            with patch.object(producao_preparacao, "_build_file_status", side_effect=_build):
+                producao_preparacao.collect_preparacao_statuses(context, required_keys=required)
+
+        self.assertIs(threads["caderno_encargos"], producao_preparacao.threading.current_thread())
+        self.assertTrue(threads["resumo_geral_pdf"].daemon)
+        self.assertTrue(threads["conj_pdf"].daemon)
+
     def test_copy_cutrite_pdf_para_obra_copies_exported_pdf(self):
         with tempfile.TemporaryDirectory() as tmp:
             base = Path(tmp)
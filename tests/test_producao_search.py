@@ -1,6 +1,6 @@
 import unittest
 
-from sqlalchemy import create_engine
+from sqlalchemy import Integer, create_engine
 from sqlalchemy.orm import sessionmaker
 
 from Martelo_Orcamentos_V2.app.db import Base
@@ -8,7 +8,12 @@ from Martelo_Orcamentos_V2.app.models.client import Client
 from Martelo_Orcamentos_V2.app.models.orcamento import Orcamento
 from Martelo_Orcamentos_V2.app.models.producao import Producao
 from Martelo_Orcamentos_V2.app.models.user import User
-from Martelo_Orcamentos_V2.app.services.producao_processos import listar_processos
+from Martelo_Orcamentos_V2.app.services.producao_processos import (
+    atualizar_processo,
+    criar_processo,
+    eliminar_processo,
+    listar_processos,
+)
 
 
 SEARCH_TABLES = [User.__table__, Client.__table__, Orcamento.__table__, Producao.__table__]
@@ -16,6 +21,9 @@ SEARCH_TABLES = [User.__table__, Client.__table__, Orcamento.__table__, Producao
 
 class ProducaoSearchTests(unittest.TestCase):
     def setUp(self):
+        # BigInteger nao tem autoincremento em SQLite
+        self._orig_type = Producao.__table__.c.id.type
+        Producao.__table__.c.id.type = Integer()
         self.engine = create_engine("sqlite:///:memory:")
         Base.metadata.create_all(self.engine, tables=SEARCH_TABLES)
         self.Session = sessionmaker(bind=self.engine)
@@ -73,6 +81,7 @@ class ProducaoSearchTests(unittest.TestCase):
         self.session.close()
         Base.metadata.drop_all(self.engine, tables=list(reversed(SEARCH_TABLES)))
         self.engine.dispose()
+        Producao.__table__.c.id.type = self._orig_type
 
     def test_search_uses_domain_synonyms_as_fallback(self):
         rows = listar_processos(self.session, search="armario batente")
@@ -94,6 +103,42 @@ class ProducaoSearchTests(unittest.TestCase):
         self.assertIn("Cliente", rows[0].search_reason)
         self.assertGreater(rows[0].search_score, rows[1].search_score)
 
+    def _ids(self, search, session=None, **kwargs):
+        return [row.id for row in listar_processos(session or self.session, search=search, **kwargs)]
+
+    def test_index_follows_service_changes_before_commit(self):
+        self.assertEqual(self._ids("escadote", approx=False), [])
+        proc = criar_processo(
+            self.session, ano="2026", num_enc_phc="0950", nome_cliente="ESCADAS LDA", descricao_producao="Escadote"
+        )
+        self.assertEqual(self._ids("escadote"), [proc.id])
+        self.session.commit()
+
+        atualizar_processo(self.session, proc.id, {"descricao_producao": "Estante suspensa"})
+        self.assertEqual(self._ids("escadote", approx=False), [])
+        self.assertEqual(self._ids("estante"), [proc.id])
+        self.session.rollback()
+        self.assertEqual(self._ids("escadote"), [proc.id])
+        self.assertEqual(self._ids("estante", approx=False), [])
+
+        eliminar_processo(self.session, proc.id)
+        self.session.commit()
+        self.assertEqual(self._ids("escadote", approx=False), [])
+
+    def test_index_picks_up_changes_from_other_sessions(self):
+        self.assertEqual(self._ids("sintra", approx=False), [])
+        with self.Session() as outra:
+            outra.get(Producao, 11).obra = "Moradia Sintra"
+            outra.delete(outra.get(Producao, 12))
+            outra.commit()
+        self.assertEqual(self._ids("sintra"), [11])
+        self.assertEqual(self._ids("cozinha"), [11])
+
+    def test_filters_apply_to_index_results(self):
+        self.assertEqual(self._ids("cozinha", responsavel="andreia"), [12])
+        self.assertEqual(self._ids("cozihna", responsavel="dario"), [11])
+        self.assertEqual(self._ids("rouperio", estado="Concluido"), [])
+
 
 if __name__ == "__main__":
     unittest.main()
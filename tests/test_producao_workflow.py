@@ -1,7 +1,7 @@
 import unittest
 import tempfile
 from pathlib import Path
-from datetime import date
+from datetime import date, datetime
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
@@ -496,6 +496,114 @@ class ProducaoWorkflowTests(unittest.TestCase):
         self.assertIn("163", result.issues[0].phc_num_clientes)
         self.assertEqual(result.issues[0].responsavel, "Paulo")
 
+    def test_sync_producao_statuses_from_phc_matches_through_normalized_index(self):
+        session = MagicMock()
+        processes = [
+            SimpleNamespace(
+                id=20 + pos,
+                codigo_processo=f"26.{enc}_01_01_CLIENTE",
+                ano="2026",
+                num_enc_phc=enc,
+                num_cliente_phc="0163",
+                nome_cliente="Vitor  José Pereira",
+                responsavel="Paulo",
+                estado="Planeamento",
+                tipo_pasta="Encomenda de Cliente",
+                updated_by=None,
+            )
+            for pos, enc in enumerate(("0402", "402", "0403"))
+        ]
+        session.execute.return_value.scalars.return_value.all.return_value = processes
+        phc_rows = [
+            {"Ano": 2026, "Enc_No": "0402", "Num_PHC": "163", "CL_Nome": "VITOR JOSE PEREIRA", "Estado_PHC": "5 - FINALIZADO"},
+            {"Ano": 2026, "Enc_No": 402, "Num_PHC": "163", "CL_Nome": "VITOR JOSE PEREIRA", "Estado_PHC": "7 - ARQUIVADO"},
+            {"Ano": 2025, "Enc_No": 403, "Num_PHC": "163", "CL_Nome": "VITOR JOSE PEREIRA", "Estado_PHC": "7 - ARQUIVADO"},
+        ]
+
+        with patch.object(producao_workflow, "get_setting", return_value=""), \
+             patch.object(producao_workflow, "set_setting"), \
+             patch.object(producao_workflow.svc_phc, "query_phc_estado_debug_rows", return_value=phc_rows) as query_mock:
+            result = producao_workflow.sync_producao_statuses_from_phc(session, force=True, today=date(2026, 3, 20))
+
+        query_mock.assert_called_once()
+        self.assertEqual([proc.estado for proc in processes], ["Finalizado", "Finalizado", "Planeamento"])
+        self.assertEqual(len(result.issues), 1)
+        self.assertEqual(result.issues[0].processo_id, 22)
+        self.assertEqual(result.issues[0].phc_anos, ("2025",))
+
+    def test_sync_producao_statuses_from_phc_incremental_only_checks_changed_processes(self):
+        store = {
+            producao_workflow.KEY_PRODUCAO_PHC_STATUS_LAST_SYNC_DATE: "2026-03-20",
+            producao_workflow.KEY_PRODUCAO_PHC_STATUS_WATERMARK: "2026-03-20T08:00:00",
+        }
+
+        def _issue(processo_id, codigo):
+            return producao_workflow.PHCStatusSyncIssue(
+                processo_id=processo_id,
+                codigo_processo=codigo,
+                responsavel="Paulo",
+                reason="Divergencia",
+                martelo_ano="2026",
+                martelo_num_enc_phc=codigo[3:7],
+                martelo_num_cliente_phc="1",
+                martelo_nome_cliente="OUTRO",
+                phc_anos=(),
+                phc_num_encs=(),
+                phc_num_clientes=(),
+                phc_nomes=(),
+                phc_estados=(),
+            )
+
+        cached = [_issue(30, "26.0500_01_01_ANTIGO"), _issue(31, "26.0501_01_01_OUTRO"), _issue(32, "26.0502_01_01_ARQ")]
+        editado = SimpleNamespace(
+            id=31,
+            codigo_processo="26.0501_01_01_OUTRO",
+            ano="2026",
+            num_enc_phc="0501",
+            num_cliente_phc="1",
+            nome_cliente="OUTRO",
+            responsavel="Paulo",
+            estado="Producao",
+            tipo_pasta="Encomenda de Cliente",
+            updated_by=None,
+            updated_at=datetime(2026, 3, 20, 9, 30),
+        )
+        arquivado = SimpleNamespace(
+            id=32,
+            ano="2026",
+            num_enc_phc="0502",
+            estado="Arquivado",
+            tipo_pasta="Encomenda de Cliente",
+            updated_at=datetime(2026, 3, 20, 10, 0),
+        )
+        session = MagicMock()
+        session.execute.return_value.scalars.return_value.all.return_value = [arquivado, editado]
+        phc_rows = [{"Ano": 2026, "Enc_No": 501, "Num_PHC": "1", "CL_Nome": "OUTRO", "Estado_PHC": "5 - FINALIZADO"}]
+
+        def fake_get_setting(_db, key, default=None):
+            return store.get(key, default)
+
+        def fake_set_setting(_db, key, value):
+            store[key] = value
+
+        with patch.object(producao_workflow, "get_setting", side_effect=fake_get_setting), \
+             patch.object(producao_workflow, "set_setting", side_effect=fake_set_setting), \
+             patch.object(producao_workflow.svc_phc, "query_phc_estado_debug_rows", return_value=phc_rows):
+            producao_workflow._cache_phc_status_issues(object(), issues=cached, today_text="2026-03-20")
+            result = producao_workflow.sync_producao_statuses_from_phc(
+                session, incremental=True, today=date(2026, 3, 20)
+            )
+            remaining = producao_workflow.load_cached_phc_status_issues(object(), today=date(2026, 3, 20))
+
+        self.assertFalse(result.skipped_daily)
+        self.assertEqual(result.checked_total, 1)
+        self.assertEqual(editado.estado, "Finalizado")
+        self.assertEqual([issue.processo_id for issue in remaining], [30])
+        self.assertEqual(store[producao_workflow.KEY_PRODUCAO_PHC_STATUS_WATERMARK], "2026-03-20T10:00:00")
+        self.assertEqual(store[producao_workflow.KEY_PRODUCAO_PHC_STATUS_LAST_SYNC_DATE], "2026-03-20")
+        where = str(session.execute.call_args.args[0])
+        self.assertIn("updated_at >=", where)
+
     def test_build_user_phc_status_issue_summary_filters_by_user_and_hidden_state(self):
         store = {}
         issue_paulo = producao_workflow.PHCStatusSyncIssue(
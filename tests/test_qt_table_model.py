@@ -27,5 +27,48 @@ class SimpleTableModelSortTests(unittest.TestCase):
         self.assertEqual(ordered, ["2", "10", "11", "100"])
 
 
+class SimpleTableModelFetchMoreTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def _model(self, total=7, batch=3):
+        pending = [{"n": i} for i in range(batch, total)]
+
+        def fetch_more():
+            lote = pending[:batch]
+            del pending[:batch]
+            return lote
+
+        model = SimpleTableModel(columns=[{"header": "N", "attr": "n", "type": "int"}])
+        model.set_rows([{"n": i} for i in range(batch)], fetch_more=fetch_more)
+        return model
+
+    def test_fetch_more_appends_batches_until_empty(self):
+        model = self._model()
+        inserted = []
+        model.rowsInserted.connect(lambda _parent, first, last: inserted.append((first, last)))
+
+        self.assertTrue(model.canFetchMore())
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), 6)
+        model.fetchMore()
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), 7)
+        self.assertFalse(model.canFetchMore())
+        self.assertEqual(inserted, [(3, 5), (6, 6)])
+
+    def test_sort_and_export_load_every_batch(self):
+        model = self._model()
+        model.sort(0, QtCore.Qt.SortOrder.DescendingOrder)
+        self.assertEqual([model.get_row(i)["n"] for i in range(model.rowCount())], [6, 5, 4, 3, 2, 1, 0])
+        self.assertEqual(len(self._model().export_rows()), 7)
+
+    def test_set_rows_without_fetcher_stops_loading(self):
+        model = self._model()
+        model.set_rows([{"n": 1}])
+        self.assertFalse(model.canFetchMore())
+
+
 if __name__ == "__main__":
     unittest.main()